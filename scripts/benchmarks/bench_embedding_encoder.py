@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Query embedding memo / batched encoding benchmark
+
+Per request: english_to_sql and the API layer embed the same question for the
+referential check (plus the previous question), table retrieval, the semantic
+cache lookup and storing the pattern. The baseline calls model.encode(text) for
+each, like get_embedding did; the EmbeddingEncoder memoizes by normalized text.
+Reports model.encode calls and embedding time per request.
+
+Schema indexing: the old create_schema_embeddings loop encoded one description
+per call; the encoder encodes them in batches. Each is timed cold (first
+indexing after the model loads) and warm (re-indexing in the same process).
+
+Usage:
+    python scripts/benchmarks/bench_embedding_encoder.py [--model all-MiniLM-L6-v2] [--requests 50] [--tables 300]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, PROJECT_ROOT)
+
+from sentence_transformers import SentenceTransformer
+
+from src.nlp.embedding_encoder import EmbeddingEncoder
+
+QUESTIONS = [
+    "show distance travelled by {vehicle} last week",
+    "how many trips did {vehicle} make yesterday",
+    "list stoppages longer than 2 hours at {plant} plant",
+    "fuel consumption of {vehicle} this month",
+    "top 5 drivers by distance at {plant} plant",
+    "open complaints for {plant} site",
+]
+PLANTS = ['Pune', 'Nashik', 'Mumbai', 'Nagpur', 'Aurangabad']
+WORDS = ['trip', 'vehicle', 'master', 'driver', 'route', 'fuel', 'alert', 'gps', 'report', 'status', 'so', 'details']
+
+
+class CountingModel:
+    """Counts encode() calls on the wrapped model"""
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = 0
+
+    def encode(self, *args, **kwargs):
+        self.calls += 1
+        return self.model.encode(*args, **kwargs)
+
+
+def make_requests(count, seed=42):
+    rng = random.Random(seed)
+    return [
+        rng.choice(QUESTIONS).format(vehicle=f"MH{rng.randint(10, 50)}AB{rng.randint(1000, 9999)}",
+                                     plant=rng.choice(PLANTS))
+        for _ in range(count)
+    ]
+
+
+def make_descriptions(count, seed=42):
+    rng = random.Random(seed)
+    descriptions = []
+    for index in range(count):
+        table = '_'.join(rng.sample(WORDS, 2)) + f"_{index}"
+        columns = ['id'] + [f"{rng.choice(WORDS)}_{rng.choice(['name', 'date', 'km', 'status', 'count'])}"
+                            for _ in range(rng.randint(5, 25))]
+        descriptions.append(
+            f"Database table named {table} relates to {' '.join(rng.sample(WORDS, 4))}. "
+            f"Contains data columns: {', '.join(columns)}. "
+            f"This table stores identifier, temporal data, status information, numerical aggregate."
+        )
+    return descriptions
+
+
+def request_flow(embed, questions):
+    """The embeddings one request asks for, in pipeline order"""
+    previous = None
+    for question in questions:
+        embed(question)                 # referential check: current question
+        if previous:
+            embed(previous)             # ... and the previous one
+        embed(question)                 # find_relevant_tables
+        embed(question)                 # semantic cache find_similar_queries
+        embed(question)                 # add_query_pattern after execution
+        previous = question
+
+
+def bench_requests(model_name, questions):
+    counting = CountingModel(SentenceTransformer(model_name))
+    counting.model.encode("warm up")
+
+    started = time.perf_counter()
+    request_flow(lambda text: counting.encode(text, convert_to_tensor=False).tolist(), questions)
+    baseline = (time.perf_counter() - started, counting.calls)
+
+    counting.calls = 0
+    encoder = EmbeddingEncoder(counting)
+    started = time.perf_counter()
+    request_flow(encoder.encode, questions)
+    memoized = (time.perf_counter() - started, counting.calls)
+    return baseline, memoized
+
+
+def bench_indexing(model_name, descriptions, batched):
+    counting = CountingModel(SentenceTransformer(model_name))
+    encoder = EmbeddingEncoder(counting)
+    timings = []
+    for _ in range(2):     # cold, warm
+        counting.calls = 0
+        started = time.perf_counter()
+        if batched:
+            encoder.encode_many(descriptions, memoize=False)
+        else:
+            for description in descriptions:
+                counting.encode(description, convert_to_tensor=False).tolist()
+        timings.append((time.perf_counter() - started, counting.calls))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='all-MiniLM-L6-v2', help='SentenceTransformer name or local path')
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--tables', type=int, default=300)
+    args = parser.parse_args()
+
+    questions = make_requests(args.requests)
+    (base_seconds, base_calls), (memo_seconds, memo_calls) = bench_requests(args.model, questions)
+    print(f"Per request ({args.requests} requests)")
+    print(f"{'method':>10} {'encodes/req':>12} {'ms/req':>9}")
+    print(f"{'baseline':>10} {base_calls / args.requests:>12.2f} {base_seconds / args.requests * 1000:>9.2f}")
+    print(f"{'memoized':>10} {memo_calls / args.requests:>12.2f} {memo_seconds / args.requests * 1000:>9.2f}")
+
+    descriptions = make_descriptions(args.tables)
+    print(f"\nSchema indexing ({args.tables} tables)")
+    print(f"{'method':>10} {'cold s':>8} {'warm s':>8} {'encode calls':>13}")
+    for label, batched in (('per-table', False), ('batched', True)):
+        (cold, calls), (warm, _) = bench_indexing(args.model, descriptions, batched)
+        print(f"{label:>10} {cold:>8.2f} {warm:>8.2f} {calls:>13}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Shared embedding service benchmark
+
+Simulates --workers app processes that each embed --requests questions, one
+at a time from --threads threads (like concurrent pipeline stages), and
+compares:
+
+- local: every worker loads its own SentenceTransformer (the previous setup)
+- service: one EmbeddingServer process; workers use RemoteEmbeddingModel and
+  their requests are batched together inside the batch window
+
+Reports total throughput, worker startup time and resident memory of the
+workers (plus the service process). RSS is read from /proc, so Linux only.
+
+Usage:
+    python scripts/benchmarks/bench_embedding_service.py [--model all-MiniLM-L6-v2] [--workers 4] [--threads 4] [--requests 100]
+"""
+
+import argparse
+import multiprocessing
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, PROJECT_ROOT)
+
+
+def rss_mb(pid='self'):
+    with open(f"/proc/{pid}/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+def worker(mode, model_name, socket_path, threads, requests, index, start_barrier, results):
+    started = time.perf_counter()
+    if mode == 'local':
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name)
+    else:
+        from src.nlp.embedding_service import RemoteEmbeddingModel
+        model = RemoteEmbeddingModel(socket_path, model_name=model_name)
+    startup = time.perf_counter() - started
+
+    questions = [f"show distance travelled by MH{index:02d}AB{1000 + n} last week" for n in range(requests)]
+    start_barrier.wait()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda text: model.encode([text]), questions))
+    results.put((startup, time.perf_counter() - started, rss_mb()))
+
+
+def run(mode, args, socket_path):
+    start_barrier = multiprocessing.Barrier(args.workers)
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker, args=(mode, args.model, socket_path, args.threads,
+                                                     args.requests, index, start_barrier, results))
+        for index in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    rows = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='all-MiniLM-L6-v2', help='SentenceTransformer name or local path')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=100, help='questions per worker')
+    args = parser.parse_args()
+
+    # mkdtemp() is private to this user, as the service requires; the key is inherited by service and workers
+    socket_path = os.path.join(tempfile.mkdtemp(), 'embeddings.sock')
+    os.environ.setdefault('EMBEDDING_SERVICE_AUTHKEY', secrets.token_hex(16))
+    service = subprocess.Popen(
+        [sys.executable, '-m', 'src.nlp.embedding_service', '--model', args.model, '--socket', socket_path],
+        cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while not os.path.exists(socket_path):
+            if service.poll() is not None:
+                raise SystemExit("Embedding service failed to start")
+            time.sleep(0.2)
+
+        total = args.workers * args.requests
+        print(f"{args.workers} workers x {args.threads} threads x {args.requests} questions\n")
+        print(f"{'mode':>8} {'texts/s':>9} {'startup s':>10} {'worker RSS MB':>14} {'service RSS MB':>15}")
+        for mode in ('local', 'service'):
+            rows = run(mode, args, socket_path)
+            wall = max(seconds for _, seconds, _ in rows)
+            startup = sum(startup for startup, _, _ in rows) / len(rows)
+            worker_rss = sum(rss for _, _, rss in rows)
+            service_rss = f"{rss_mb(service.pid):.0f}" if mode == 'service' else '-'
+            print(f"{mode:>8} {total / wall:>9.1f} {startup:>10.2f} {worker_rss:>14.0f} {service_rss:>15}")
+    finally:
+        service.terminate()
+        service.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Intent dispatch benchmark
+
+Runs a corpus of user questions through IntelligentReasoning's intent table two ways:
+- linear:      re.search() with every pattern string, in order (previous behaviour)
+- dispatcher:  IntentDispatcher - compiled patterns behind a keyword prefilter
+
+First checks that both produce the same ordered list of matching patterns for
+every question (so priority semantics are unchanged), then reports time per
+question for the first-match lookup. Extractors are not timed; both paths call
+the same ones.
+
+Usage:
+    python scripts/benchmarks/bench_intent_dispatch.py [--rounds 200] [--questions extra.txt]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, PROJECT_ROOT)
+
+from src.core.intelligent_reasoning import IntelligentReasoning
+
+# Questions users actually ask (docs, chat history), matched and unmatched alike
+CORPUS = [
+    "What zone does vehicle MH12AB1234 belong to?",
+    "Which region is vehicle KA05CD5678 in?",
+    "What districts are in zone North?",
+    "What plant does vehicle TN09EF9012 belong to?",
+    "Which plant does this vehicle belong to?",
+    "What about their regions?",
+    "What are their plant names?",
+    "what vehicle types do we have?",
+    "How many trucks do we have?",
+    "How many vehicles are in each district?",
+    "What's the status of vehicle RJ14GR6754?",
+    "What's the status of vehicles in Gujarat?",
+    "Which vehicles need maintenance?",
+    "What's the total distance covered by all vehicles in km?",
+    "show all regions",
+    "list all plants",
+    "show zones",
+    "vehicles in plant Mohali",
+    "show me the vehicles of Derabassi plant",
+    "trucks in region Punjab",
+    "hierarchy for vehicle PB65AX1234",
+    "plant name for plant id 460",
+    "what is the plant id of Ludhiana plant",
+    "site visit details for Mohali plant",
+    "customer name for customer id 1023",
+    "status of complaint 5678",
+    "show complaints with status open",
+    "who is handling complaint 4321",
+    "complaint 4321 pending with whom",
+    "overall status of complaint 998",
+    "show complaints pending with Rahul Sharma",
+    "approval status for complaint 1200",
+    "has ho qc approved complaint 1200",
+    "list complaints rejected by cfo",
+    "show complaints where product correction is done",
+    "show complaints with product correction pending",
+    "product correction status for complaint 77",
+    "how many complaints are in operations",
+    "count of complaints from technical",
+    "show operations complaints",
+    "technical complaints this month",
+    "show distance report",
+    "distance report for vehicle MH12AB1234",
+    "show drum rotation for PB10XY2233",
+    "total distance travelled last week",
+    "inter plant distance",
+    "monthly distance report",
+    "stoppage report for July 2025",
+    "show stoppages yesterday for PB65AX1234",
+    "list drum trips for today",
+    "What is the average trip time per plant?",
+    "top 10 vehicles by distance",
+    "show dpr for yesterday",
+    "drivers assigned to plant 460",
+    "hello",
+    "thanks, that helps",
+    "can you make that a table?",
+    "explain the last result",
+]
+
+
+def linear_matches(intent_patterns, query_lower):
+    """Every matching pattern index, in table order, the way the old loop searched"""
+    return [index for index, config in enumerate(intent_patterns)
+            if re.search(config['pattern'], query_lower, re.IGNORECASE)]
+
+
+def linear_first(intent_patterns, query_lower):
+    for index, config in enumerate(intent_patterns):
+        if re.search(config['pattern'], query_lower, re.IGNORECASE):
+            return index
+    return None
+
+
+def dispatcher_first(dispatcher, query_lower):
+    for index, _, _ in dispatcher.candidates(query_lower):
+        return index
+    return None
+
+
+def time_per_question(func, table, questions, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for question in questions:
+            func(table, question)
+    return (time.perf_counter() - start) / (rounds * len(questions)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--questions', help='Extra questions, one per line')
+    args = parser.parse_args()
+
+    questions = list(CORPUS)
+    if args.questions:
+        with open(args.questions) as f:
+            questions.extend(line.strip() for line in f if line.strip())
+    questions = [q.lower().strip() for q in questions]
+
+    reasoning = IntelligentReasoning()
+    patterns = reasoning.intent_patterns
+    dispatcher = reasoning.intent_dispatcher
+
+    mismatches = 0
+    for question in questions:
+        expected = linear_matches(patterns, question)
+        actual = [index for index, _, _ in dispatcher.candidates(question)]
+        if expected != actual:
+            mismatches += 1
+            print(f"❌ '{question}': linear {expected} vs dispatcher {actual}")
+    matched = sum(1 for q in questions if linear_first(patterns, q) is not None)
+    print(f"✅ {len(questions) - mismatches}/{len(questions)} questions dispatch identically "
+          f"({matched} match an intent, {len(patterns)} patterns, {len(dispatcher.keywords)} keywords)")
+
+    # Warm re's internal cache so the linear path is measured at its best
+    for question in questions:
+        linear_first(patterns, question)
+
+    linear_us = time_per_question(linear_first, patterns, questions, args.rounds)
+    dispatch_us = time_per_question(dispatcher_first, dispatcher, questions, args.rounds)
+    print(f"\n{'strategy':<12} {'µs/question':>12}")
+    print("=" * 25)
+    print(f"{'linear':<12} {linear_us:>12.1f}")
+    print(f"{'dispatcher':<12} {dispatch_us:>12.1f}")
+    print(f"\nSpeed-up: {linear_us / dispatch_us:.1f}x")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Result cache serialization benchmark
+
+Compares the previous Redis payload format (json.dumps with DecimalEncoder)
+against the binary result codec on synthetic util_report-shaped results:
+encode/decode time, payload size, and whether the decoded cells keep their types.
+
+The JSON baseline falls back to str() for datetime/timedelta (the old
+DecimalEncoder raised TypeError on them, so such results were never cached).
+
+Usage:
+    python scripts/benchmarks/bench_result_codec.py [--rows 100 1000 10000] [--rounds 5]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, PROJECT_ROOT)
+
+from src.core.result_codec import encode_result, decode_result
+
+
+class DecimalEncoder(json.JSONEncoder):
+    """Same as src.core.sql.DecimalEncoder, plus str() for values it could not encode"""
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return float(obj)
+        return str(obj)
+
+
+COLUMNS = ['id', 'reg_no', 'from_tm', 'to_tm', 'duration', 'distance_km', 'site_name', 'is_stoppage']
+
+
+def make_rows(count, seed=42):
+    rng = random.Random(seed)
+    start = datetime(2024, 6, 1)
+    rows = []
+    for index in range(count):
+        from_tm = start + timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+        duration = timedelta(seconds=rng.randint(60, 4 * 3600))
+        rows.append((
+            index + 1,
+            f"MH{rng.randint(10, 50)}AB{rng.randint(1000, 9999)}",
+            from_tm,
+            from_tm + duration,
+            duration,
+            Decimal(f"{rng.uniform(0, 250):.2f}"),
+            rng.choice(['Pune Plant', 'Mumbai Depot', 'Nashik Yard', None]),
+            rng.random() < 0.3,
+        ))
+    return rows
+
+
+def json_encode(columns, rows):
+    return json.dumps({'columns': columns, 'rows': rows}, cls=DecimalEncoder).encode()
+
+
+def json_decode(payload):
+    data = json.loads(payload)
+    return data['columns'], data['rows']
+
+
+def best_of(func, rounds):
+    best = float('inf')
+    result = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def types_preserved(original_rows, decoded_rows):
+    return all(type(a) is type(b) and a == b
+               for original, decoded in zip(original_rows, decoded_rows)
+               for a, b in zip(original, decoded))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    formats = [
+        ('json', json_encode, json_decode),
+        ('codec', lambda c, r: encode_result(c, r, compress=False), lambda p: decode_result(p)[:2]),
+        ('codec+zlib', lambda c, r: encode_result(c, r, compress=True), lambda p: decode_result(p)[:2]),
+    ]
+
+    print(f"{'rows':>7}  {'format':<11} {'encode ms':>10} {'decode ms':>10} {'bytes':>10} {'types kept':>11}")
+    print("=" * 66)
+    for count in args.rows:
+        rows = make_rows(count)
+        for name, encode, decode in formats:
+            encode_time, payload = best_of(lambda: encode(COLUMNS, rows), args.rounds)
+            decode_time, (_, decoded) = best_of(lambda: decode(payload), args.rounds)
+            print(f"{count:>7}  {name:<11} {encode_time * 1000:>10.2f} {decode_time * 1000:>10.2f} "
+                  f"{len(payload):>10,} {'yes' if types_preserved(rows, decoded) else 'no':>11}")
+        print("-" * 66)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Sargable date predicate benchmark
+
+Builds an indexed util_report-shaped fixture as a TEMP table (nothing persistent
+is created), then runs the date filters our SQL generators emit - before and after
+src.core.sql_rewrite.make_sargable() - and reports execution time, whether the
+from_tm index was used, and that both forms return the same row count.
+
+Also reports the rewrite's own cost per statement (no database needed for that part).
+
+Usage:
+    python scripts/benchmarks/bench_sargable_dates.py [--rows 1000000] [--rounds 5]
+    python scripts/benchmarks/bench_sargable_dates.py --rewrite-only
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, PROJECT_ROOT)
+
+from src.core.sql_rewrite import make_sargable
+
+FIXTURE = 'util_report_fixture'
+
+# Shapes taken from StoppageReportAIOptimizer._build_time_filter and the LLM prompt examples
+QUERIES = {
+    'today': f"SELECT reg_no, from_tm, duration FROM {FIXTURE} WHERE DATE({FIXTURE}.from_tm) = CURRENT_DATE ORDER BY from_tm DESC LIMIT 50",
+    'yesterday': f"SELECT reg_no, from_tm, duration FROM {FIXTURE} WHERE DATE(from_tm) = CURRENT_DATE - INTERVAL '1 day' LIMIT 50",
+    'fixed day': f"SELECT count(*) FROM {FIXTURE} WHERE DATE(from_tm) = '{{day}}'",
+    'date range': f"SELECT reg_no, count(*) FROM {FIXTURE} WHERE from_tm::date BETWEEN '{{day}}' AND '{{day5}}' GROUP BY reg_no",
+    'month': f"SELECT reg_no, sum(duration) FROM {FIXTURE} WHERE EXTRACT(MONTH FROM from_tm) = {{month}} AND EXTRACT(YEAR FROM from_tm) = {{year}} GROUP BY reg_no",
+    'since week start': f"SELECT count(*) FROM {FIXTURE} WHERE DATE(from_tm) >= DATE_TRUNC('week', CURRENT_DATE)",
+}
+
+
+def get_connection():
+    import psycopg2
+    from dotenv import load_dotenv
+    load_dotenv()
+    return psycopg2.connect(
+        host=os.getenv("hostname", "localhost"),
+        dbname=os.getenv("dbname", "rdc_dump"),
+        user=os.getenv("user_name", "postgres"),
+        password=os.getenv("password", "Akshit@123"),
+        port=int(os.getenv("port", 5432))
+    )
+
+
+def build_fixture(cursor, rows):
+    """~rows stoppages spread over the last 400 days, indexed on from_tm"""
+    cursor.execute(f"""
+        CREATE TEMP TABLE {FIXTURE} AS
+        SELECT g AS id,
+               'MH' || (10 + g %% 40) || 'AB' || (1000 + g %% 9000) AS reg_no,
+               CURRENT_DATE - INTERVAL '400 days' + (g * (400.0 * 86400 / %s)) * INTERVAL '1 second' AS from_tm,
+               (60 + g %% 14400) * INTERVAL '1 second' AS duration,
+               CASE WHEN g %% 5 = 0 THEN NULL ELSE 'stoppage' END AS report_type
+        FROM generate_series(1, %s) AS g
+    """, (rows, rows))
+    cursor.execute(f"CREATE INDEX ON {FIXTURE} (from_tm)")
+    cursor.execute(f"ANALYZE {FIXTURE}")
+
+
+def explain(cursor, sql):
+    cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+def uses_index(plan):
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if node.get('Node Type') in ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan'):
+            return True
+        stack.extend(node.get('Plans', []))
+    return False
+
+
+def row_count(cursor, sql):
+    cursor.execute(f"SELECT count(*) FROM ({sql}) AS q")
+    return cursor.fetchone()[0]
+
+
+def bench_rewrite_overhead(rounds=2000):
+    print(f"{'query':<18} {'rewrite µs':>11}")
+    print("=" * 31)
+    for name, template in QUERIES.items():
+        sql = template.format(day='2025-07-10', day5='2025-07-15', month=7, year=2025)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            make_sargable(sql)
+        print(f"{name:<18} {(time.perf_counter() - start) / rounds * 1e6:>11.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--rewrite-only', action='store_true', help='Only measure the rewrite itself')
+    args = parser.parse_args()
+
+    bench_rewrite_overhead()
+    if args.rewrite_only:
+        return
+
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        print(f"\n🔧 Building {args.rows:,}-row fixture...")
+        build_fixture(cursor, args.rows)
+        cursor.execute(f"SELECT (max(from_tm) - INTERVAL '30 days')::date FROM {FIXTURE}")
+        day = cursor.fetchone()[0]
+        params = {'day': day.isoformat(), 'day5': (day + timedelta(days=5)).isoformat(),
+                  'month': day.month, 'year': day.year}
+
+        print(f"\n{'query':<18} {'form':<10} {'median ms':>10} {'index':>6} {'rows':>9}")
+        print("=" * 58)
+        for name, template in QUERIES.items():
+            original = template.format(**params)
+            rewritten = make_sargable(original)
+            counts = []
+            for form, sql in (('original', original), ('sargable', rewritten)):
+                timings = []
+                plan = None
+                for _ in range(args.rounds):
+                    plan = explain(cursor, sql)
+                    timings.append(plan['Execution Time'])
+                counts.append(row_count(cursor, sql))
+                print(f"{name:<18} {form:<10} {statistics.median(timings):>10.2f} "
+                      f"{'yes' if uses_index(plan['Plan']) else 'no':>6} {counts[-1]:>9,}")
+            if counts[0] != counts[1]:
+                print(f"   ❌ row counts differ for '{name}':\n      {original}\n      {rewritten}")
+            print("-" * 58)
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
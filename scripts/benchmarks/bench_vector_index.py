@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Fallback-mode similarity search benchmark
+
+Compares three ways of answering "top-k most similar stored embeddings" when
+pgvector is not available:
+
+- baseline: what find_similar_query did before - json.loads every stored
+  embedding and score it on its own (cosine_similarity([q], [e]) per row,
+  reproduced with numpy so scikit-learn is not needed). Measured on at most
+  --baseline-max rows and scaled linearly to the full size.
+- exact: VectorIndex with the normalized float32 matrix (one matmul per query)
+- hnsw: VectorIndex with the HNSW graph (needs hnswlib); recall@k is measured
+  against the exact results
+
+Vectors are synthetic and clustered (sentence embeddings of similar questions
+sit close together), dimension 384 like all-MiniLM-L6-v2.
+
+Usage:
+    python scripts/benchmarks/bench_vector_index.py [--sizes 1000 100000 1000000] [--dim 384] [--queries 50]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, PROJECT_ROOT)
+
+from src.nlp.vector_index import HNSW_AVAILABLE, VectorIndex
+
+
+def make_vectors(count, dim, seed=42, clusters=200):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = np.empty((count, dim), dtype=np.float32)
+    chunk = 100000
+    for start in range(0, count, chunk):
+        stop = min(start + chunk, count)
+        labels = rng.integers(0, clusters, stop - start)
+        vectors[start:stop] = centers[labels] + 0.6 * rng.standard_normal((stop - start, dim)).astype(np.float32)
+    return vectors
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q)) * 1000
+
+
+def bench_baseline(vectors, queries, k, baseline_max):
+    rows = min(len(vectors), baseline_max)
+    stored = [json.dumps(vector.tolist()) for vector in vectors[:rows]]
+    timings = []
+    for query in queries[:5]:
+        started = time.perf_counter()
+        query_list = query.tolist()
+        scored = []
+        for position, embedding_json in enumerate(stored):
+            embedding = np.asarray([json.loads(embedding_json)])
+            q = np.asarray([query_list])
+            similarity = (q @ embedding.T)[0][0] / (np.linalg.norm(q) * np.linalg.norm(embedding))
+            scored.append((position, similarity))
+        scored.sort(key=lambda row: row[1], reverse=True)
+        scored[:k]
+        timings.append((time.perf_counter() - started) * len(vectors) / rows)
+    return timings, rows
+
+
+def bench_index(vectors, queries, k, hnsw_threshold):
+    index = VectorIndex(vectors.shape[1], name='bench', hnsw_threshold=hnsw_threshold)
+    started = time.perf_counter()
+    index.add_batch(range(len(vectors)), vectors)
+    build_seconds = time.perf_counter() - started
+
+    timings, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits = index.search(query, k=k)
+        timings.append(time.perf_counter() - started)
+        results.append([key for key, _, _ in hits])
+    return index, build_seconds, timings, results
+
+
+def recall(approximate, exact):
+    found = sum(len(set(a) & set(e)) for a, e in zip(approximate, exact))
+    return found / sum(len(e) for e in exact)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--baseline-max', type=int, default=10000,
+                        help='rows the per-row baseline is measured on before scaling')
+    parser.add_argument('--no-hnsw', action='store_true')
+    args = parser.parse_args()
+
+    print(f"dim={args.dim} k={args.k} queries={args.queries} hnswlib={'yes' if HNSW_AVAILABLE else 'no'}\n")
+    header = f"{'vectors':>9} {'method':>9} {'build s':>9} {'p50 ms':>10} {'p95 ms':>10} {'recall@k':>9}"
+    print(header)
+    print('-' * len(header))
+
+    for size in args.sizes:
+        vectors = make_vectors(size, args.dim)
+        # Queries are perturbed stored vectors - near-duplicate questions
+        rng = np.random.default_rng(7)
+        picks = rng.integers(0, size, args.queries)
+        queries = vectors[picks] + 0.3 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+        timings, measured = bench_baseline(vectors, queries, args.k, args.baseline_max)
+        note = '' if measured == size else f"  (scaled from {measured} rows)"
+        print(f"{size:>9} {'baseline':>9} {'-':>9} {percentile_ms(timings, 50):>10.2f} "
+              f"{percentile_ms(timings, 95):>10.2f} {'1.000':>9}{note}")
+
+        index, build, timings, exact = bench_index(vectors, queries, args.k, hnsw_threshold=size + 1)
+        print(f"{size:>9} {'exact':>9} {build:>9.2f} {percentile_ms(timings, 50):>10.3f} "
+              f"{percentile_ms(timings, 95):>10.3f} {'1.000':>9}")
+        del index
+
+        if HNSW_AVAILABLE and not args.no_hnsw:
+            index, build, timings, approximate = bench_index(vectors, queries, args.k, hnsw_threshold=0)
+            print(f"{size:>9} {'hnsw':>9} {build:>9.2f} {percentile_ms(timings, 50):>10.3f} "
+                  f"{percentile_ms(timings, 95):>10.3f} {recall(approximate, exact):>9.3f}")
+            del index
+        del vectors
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Cache invalidation trigger setup for Diya Chatbot
+
+Installs a statement-level trigger that sends NOTIFY <channel>, '<schema>.<table>'
+after every INSERT/UPDATE/DELETE/TRUNCATE, so cached query results are dropped
+as soon as a table they read from changes. Without these triggers the app still
+invalidates by polling pg_stat_user_tables (CACHE_CHANGE_POLL_SECONDS).
+
+Usage:
+    python scripts/database/setup_cache_invalidation.py                 # all tables in public
+    python scripts/database/setup_cache_invalidation.py util_report ...  # specific tables
+    python scripts/database/setup_cache_invalidation.py --remove         # drop the triggers
+"""
+
+import argparse
+import os
+import re
+
+import psycopg2
+from psycopg2 import sql
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRIGGER_NAME = 'chatbot_cache_invalidation'
+FUNCTION_NAME = 'chatbot_notify_table_change'
+
+
+def get_connection():
+    return psycopg2.connect(
+        host=os.getenv("hostname", "localhost"),
+        dbname=os.getenv("dbname", "rdc_dump"),
+        user=os.getenv("user_name", "postgres"),
+        password=os.getenv("password", "Akshit@123"),
+        port=int(os.getenv("port", 5432))
+    )
+
+
+def get_channel():
+    channel = os.getenv('CACHE_CHANGE_CHANNEL', 'chatbot_table_changes')
+    if not re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', channel):
+        raise ValueError(f"Invalid CACHE_CHANGE_CHANNEL: {channel!r}")
+    return channel
+
+
+def list_tables(cursor, schema):
+    cursor.execute("""
+        SELECT table_name FROM information_schema.tables
+        WHERE table_schema = %s AND table_type = 'BASE TABLE'
+        ORDER BY table_name
+    """, (schema,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def install_triggers(cursor, schema, tables, channel):
+    """Create the notify function and attach it to each table"""
+    cursor.execute(sql.SQL("""
+        CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify({channel}, lower(TG_TABLE_SCHEMA || '.' || TG_TABLE_NAME));
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """).format(function=sql.Identifier(FUNCTION_NAME), channel=sql.Literal(channel)))
+
+    for table in tables:
+        target = sql.Identifier(schema, table)
+        cursor.execute(sql.SQL("DROP TRIGGER IF EXISTS {trigger} ON {table}").format(
+            trigger=sql.Identifier(TRIGGER_NAME), table=target))
+        cursor.execute(sql.SQL("""
+            CREATE TRIGGER {trigger}
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION {function}()
+        """).format(trigger=sql.Identifier(TRIGGER_NAME), table=target, function=sql.Identifier(FUNCTION_NAME)))
+        print(f"   ✅ {schema}.{table}")
+
+
+def remove_triggers(cursor, schema, tables):
+    for table in tables:
+        cursor.execute(sql.SQL("DROP TRIGGER IF EXISTS {trigger} ON {table}").format(
+            trigger=sql.Identifier(TRIGGER_NAME), table=sql.Identifier(schema, table)))
+        print(f"   🗑️ {schema}.{table}")
+    cursor.execute(sql.SQL("DROP FUNCTION IF EXISTS {function}()").format(function=sql.Identifier(FUNCTION_NAME)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Install cache invalidation NOTIFY triggers")
+    parser.add_argument('tables', nargs='*', help='Tables to watch (default: every table in the schema)')
+    parser.add_argument('--schema', default='public')
+    parser.add_argument('--remove', action='store_true', help='Remove the triggers instead of installing them')
+    args = parser.parse_args()
+
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        tables = args.tables or list_tables(cursor, args.schema)
+
+        if args.remove:
+            print(f"🔧 Removing cache invalidation triggers from {len(tables)} table(s)...")
+            remove_triggers(cursor, args.schema, tables)
+        else:
+            channel = get_channel()
+            print(f"🔧 Installing cache invalidation triggers on {len(tables)} table(s) (channel '{channel}')...")
+            install_triggers(cursor, args.schema, tables, channel)
+
+        conn.commit()
+        print("🎉 Done")
+    except Exception as e:
+        print(f"❌ Cache invalidation setup failed: {e}")
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ sys.path.append('/home/linux/Documents/chatbot-diya')
 
 from src.core.query_agent import english_to_sql, generate_final_response, gemini_direct_answer, validate_sql_query
 from src.core.sql import run_query
+from src.core.semantic_cache import semantic_cache
+from src.core.template_fast_path import LLM_PATH
 from decimal import Decimal
 import markdown
 from markdown.extensions.tables import TableExtension
@@ -207,8 +209,10 @@ if st.session_state.chat_history and st.session_state.chat_history[-1]['response
 
     if st.session_state.awaiting_refinement and st.session_state.pending_prompt:
         enriched_prompt = f"{st.session_state.pending_prompt}. The user clarifies: {user_input}"
+        asked_prompt = enriched_prompt
         parsed = english_to_sql(enriched_prompt, chat_context=st.session_state.chat_history[:-1])
     else:
+        asked_prompt = user_input
         parsed = english_to_sql(user_input, chat_context=st.session_state.chat_history[:-1])
 
     sql_query = parsed.get("sql")
@@ -226,7 +230,14 @@ if st.session_state.chat_history and st.session_state.chat_history[-1]['response
             final_answer = f"❌ **Query Validation Error:** {validation_error}\n\n💡 **Suggestion:** Please rephrase your question or specify which columns you'd like to analyze."
         else:
             try:
-                columns, results = run_query(final_sql)
+                statement = parsed.get("statement")
+                if statement and not suggested_sql:
+                    # Template answer - run the registered statement with bound params
+                    columns, results = run_query(statement["sql"], params=statement["params"])
+                else:
+                    columns, results = run_query(final_sql)
+                if parsed.get("answered_by") == LLM_PATH and parsed.get("semantic_cacheable"):
+                    semantic_cache.remember(asked_prompt, sql_query)
                 results = sanitize_results(results)
                 st.session_state.last_result = {
                     "columns": columns,
@@ -236,6 +247,8 @@ if st.session_state.chat_history and st.session_state.chat_history[-1]['response
                 final_answer = generate_final_response(user_input, columns, results)
             except Exception as e:
                 print(f"💥 QUERY EXECUTION ERROR: {e}")
+                # Cached SQL the database rejects (syntax / undefined object) is not served again
+                semantic_cache.forget_if_rejected(parsed, e)
                 # Convert technical errors to user-friendly messages
                 error_str = str(e)
                 if "Object of type Decimal is not JSON serializable" in error_str:
@@ -1,9 +1,9 @@
 import sys
 sys.path.append('/home/linux/Documents/chatbot-diya')
 
-from flask import Flask, request, jsonify, send_from_directory, session
+from flask import Flask, request, jsonify, send_from_directory, session, g
 from src.core.query_agent import english_to_sql, generate_final_response, gemini_direct_answer, validate_sql_query
-from src.core.sql import run_query, get_performance_metrics
+from src.core.sql import run_query_iter, collect_query_stream, get_performance_metrics, get_last_cache_info
 from src.nlp.sentence_embeddings import sentence_embedding_manager
 from decimal import Decimal
 import os
@@ -12,6 +12,10 @@ import time
 from functools import wraps
 from src.core.user_manager import user_manager, chat_history_manager
 from src.core.config import DevelopmentConfig, ProductionConfig
+from src.core.deadline import Deadline, DeadlineExceeded, set_current_deadline, reset_current_deadline
+from src.core.query_guard import query_guard
+from src.core.semantic_cache import semantic_cache
+from src.core.template_fast_path import LLM_PATH
 
 # Load environment variables
 load_dotenv()
@@ -67,6 +71,23 @@ def rate_limit(requests_per_minute=10):
         return decorated_function
     return decorator
 
+# --- Request deadlines ---
+@app.teardown_request
+def clear_request_deadline(exc=None):
+    token = g.pop('deadline_token', None)
+    if token is not None:
+        reset_current_deadline(token)
+
+@app.errorhandler(DeadlineExceeded)
+def handle_deadline_exceeded(e):
+    print(f"⏱️ {e}")
+    return jsonify({
+        'response': "⏱️ This request took too long to answer. Please try a narrower question or a shorter date range.",
+        'follow_up': None,
+        'columns': None,
+        'rows': None
+    }), 504
+
 # --- Authentication endpoints ---
 @app.route('/api/login', methods=['POST'])
 def login():
@@ -169,6 +190,13 @@ def get_user_context(session_id):
         user_contexts[session_id] = ChatContext()
     return user_contexts[session_id]
 
+def _parsed_query_stream(parsed, deadline):
+    """Run an english_to_sql result - template answers execute as prepared statements"""
+    statement = parsed.get('statement')
+    if statement:
+        return run_query_iter(statement['sql'], params=statement['params'], deadline=deadline)
+    return run_query_iter(parsed['sql'], deadline=deadline)
+
 @app.route('/api/chat/context/<session_id>', methods=['GET'])
 def get_conversation_context(session_id):
     """Get conversational context and suggested follow-up questions for a session"""
@@ -231,6 +259,10 @@ def chat():
     # Check authentication
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
+    
+    # One time budget (REQUEST_DEADLINE_SECONDS) for LLM calls, pool waits, SQL and retries
+    deadline = Deadline()
+    g.deadline_token = set_current_deadline(deadline)
         
     data = request.get_json()
     user_input = data.get('message', '')
@@ -245,11 +277,13 @@ def chat():
         context.history.append({'user': user_input, 'response': None})
     if chat_history and chat_history[-1].get('follow_up'):
         enriched_prompt = f"{chat_history[-1]['follow_up']}. The user clarifies: {user_input}"
-        parsed = english_to_sql(enriched_prompt, chat_context=context, session_id=session_id)
+        asked_prompt = enriched_prompt
+        parsed = english_to_sql(enriched_prompt, chat_context=context, session_id=session_id, deadline=deadline)
         print(f"\n🔍 USER QUERY (Follow-up): {user_input}")
         print(f"📝 ENRICHED PROMPT: {enriched_prompt}")
     else:
-        parsed = english_to_sql(user_input, chat_context=context, session_id=session_id)
+        asked_prompt = user_input
+        parsed = english_to_sql(user_input, chat_context=context, session_id=session_id, deadline=deadline)
         print(f"\n🔍 USER QUERY: {user_input}")
     
     # 🚀 Check if this is an AI referential response (follow-up query)
@@ -268,11 +302,11 @@ def chat():
             friendly_response = f"Sure! Let me get you detailed information about {entity}..."
             
             # Generate SQL for detailed information
-            detailed_parsed = english_to_sql(detail_query, chat_context=context, session_id=session_id)
+            detailed_parsed = english_to_sql(detail_query, chat_context=context, session_id=session_id, deadline=deadline)
             
             if detailed_parsed.get('sql'):
                 try:
-                    columns, results = run_query(detailed_parsed['sql'])
+                    columns, results, _, _ = collect_query_stream(_parsed_query_stream(detailed_parsed, deadline))
                     print(f"✅ DETAIL EXPANSION QUERY EXECUTED - Returned {len(results)} rows")
                     
                     # Convert results for conversation chain
@@ -395,7 +429,7 @@ def chat():
         # Execute the intelligent SQL to get actual data
         if sql_query and sql_query.strip().lower() != "null":
             try:
-                columns, results = run_query(sql_query)
+                columns, results, _, _ = collect_query_stream(_parsed_query_stream(parsed, deadline))
                 print(f"✅ INTELLIGENT QUERY EXECUTED - Returned {len(results)} rows")
                 
                 # 🚀 STORE RESULTS IN CONVERSATION CHAIN for follow-up queries
@@ -428,7 +462,7 @@ def chat():
                 
                 # Generate a rich response with the actual data
                 if results:
-                    enhanced_response = generate_final_response(user_input, columns, results, chat_context=context)
+                    enhanced_response = generate_final_response(user_input, columns, results, chat_context=context, deadline=deadline)
                     final_answer = f"{final_answer}\n\n{enhanced_response}"
                 
             except Exception as e:
@@ -441,7 +475,8 @@ def chat():
             'columns': columns if 'columns' in locals() else None,
             'rows': results if 'results' in locals() else None,
             'sql': sql_query,
-            'reasoning_applied': True
+            'reasoning_applied': True,
+            'answered_by': parsed.get('answered_by')
         })
     
     sql_query = parsed.get("sql")
@@ -450,6 +485,7 @@ def chat():
     follow_up = parsed.get("follow_up")
     latest_follow_up = follow_up or ""
     columns = rows = None
+    data_freshness = None
     if sql_query and sql_query.strip().lower() != "null":
         # Validate SQL query and get suggestions for type casting
         is_valid, validation_error, suggested_sql = validate_sql_query(sql_query)
@@ -459,20 +495,34 @@ def chat():
         
         # Use suggested SQL if available (for type casting)
         final_sql = suggested_sql if suggested_sql else sql_query
+        
+        # Pre-flight cost check: may rewrite, reject or defer the query to the background
+        guard = query_guard.check(final_sql, deadline=deadline) if is_valid else None
+        if guard and guard.action == 'rewrite':
+            print(f"🛡️ QUERY GUARD REWRITE: {guard.reason}")
+            final_sql = guard.sql
         print(f"⚡ FINAL SQL TO EXECUTE: {final_sql}")
         
         if not is_valid:
             print(f"❌ VALIDATION ERROR: {validation_error}")
             final_answer = f"❌ **Query Validation Error:** {validation_error}\n\n💡 **Suggestion:** Please rephrase your question or specify which columns you'd like to analyze."
+        elif guard.blocked:
+            print(f"🛡️ QUERY GUARD {guard.action.upper()}: {guard.reason}")
+            final_answer = guard.user_message
         else:
             try:
                 print(f"🔄 EXECUTING QUERY...")
-                columns, results = run_query(final_sql)
-                print(f"✅ QUERY EXECUTED SUCCESSFULLY - Returned {len(results)} rows")
-                results = [
-                    [float(cell) if isinstance(cell, Decimal) else cell for cell in row]
-                    for row in results
-                ]
+                # Stream the result: only the first rows are kept, the rest are just counted
+                columns, results, total_rows, scan_truncated = collect_query_stream(
+                    run_query_iter(final_sql, deadline=deadline),
+                    row_transform=lambda row: [float(cell) if isinstance(cell, Decimal) else cell for cell in row]
+                )
+                print(f"✅ QUERY EXECUTED SUCCESSFULLY - Returned {total_rows}{'+' if scan_truncated else ''} rows ({len(results)} kept)")
+                data_freshness = get_last_cache_info()
+                
+                # LLM-written SQL that ran cleanly can answer near-duplicate questions later
+                if parsed.get('answered_by') == LLM_PATH and parsed.get('semantic_cacheable'):
+                    semantic_cache.remember(asked_prompt, sql_query)
                 
                 # 🚀 STORE RESULTS IN CONVERSATION CHAIN for follow-up queries
                 try:
@@ -494,7 +544,7 @@ def chat():
                     print(f"⚠️ Failed to store results in conversation chain: {e}")
                 
                 # Handle large result sets to prevent API quota issues
-                total_rows = len(results)
+                total_rows_label = f"{total_rows:,}+" if scan_truncated else f"{total_rows:,}"
                 MAX_ROWS = 50
                 
                 # Store results in context immediately for ordinal reference
@@ -519,7 +569,7 @@ def chat():
                     }
                     
                     # Create a simple response for large datasets
-                    final_answer = f"**Query Results (Showing top {MAX_ROWS} of {total_rows:,} total rows)**\n\n"
+                    final_answer = f"**Query Results (Showing top {MAX_ROWS} of {total_rows_label} total rows)**\n\n"
                     
                     # Add a simple table view
                     if columns and limited_results:
@@ -545,7 +595,7 @@ def chat():
                         if display_rows < len(limited_results):
                             final_answer += f"\n*... and {len(limited_results) - display_rows} more rows shown in the limited dataset*\n"
                     
-                    final_answer += f"\n📊 **Note:** This query returned {total_rows:,} rows, which is quite large! I'm showing you the top {MAX_ROWS} results to keep things manageable.\n\n"
+                    final_answer += f"\n📊 **Note:** This query returned {total_rows_label} rows, which is quite large! I'm showing you the top {MAX_ROWS} results to keep things manageable.\n\n"
                     final_answer += "💡 **Suggestions:**\n"
                     final_answer += "- Add `LIMIT 50` to your query for faster results\n"
                     final_answer += "- Use filters like `WHERE` conditions to narrow down the data\n"
@@ -577,19 +627,21 @@ def chat():
                                             break
                                     
                                     if identifier:
-                                        final_answer = generate_final_response(f"{user_input} (for {identifier})", columns, results, chat_context=context)
+                                        final_answer = generate_final_response(f"{user_input} (for {identifier})", columns, results, chat_context=context, deadline=deadline)
                                     else:
-                                        final_answer = generate_final_response(user_input, columns, results, chat_context=context)
+                                        final_answer = generate_final_response(user_input, columns, results, chat_context=context, deadline=deadline)
                                 else:
-                                    final_answer = generate_final_response(user_input, columns, results, chat_context=context)
+                                    final_answer = generate_final_response(user_input, columns, results, chat_context=context, deadline=deadline)
                             else:
-                                final_answer = generate_final_response(user_input, columns, results, chat_context=context)
+                                final_answer = generate_final_response(user_input, columns, results, chat_context=context, deadline=deadline)
                         else:
-                            final_answer = generate_final_response(user_input, columns, results, chat_context=context)
+                            final_answer = generate_final_response(user_input, columns, results, chat_context=context, deadline=deadline)
                     else:
-                        final_answer = generate_final_response(user_input, columns, results, chat_context=context)
+                        final_answer = generate_final_response(user_input, columns, results, chat_context=context, deadline=deadline)
             except Exception as e:
                 print(f"💥 QUERY EXECUTION ERROR: {e}")
+                # Cached SQL the database rejects (syntax / undefined object) is not served again
+                semantic_cache.forget_if_rejected(parsed, e)
                 # Convert technical errors to user-friendly messages
                 error_str = str(e)
                 if "Object of type Decimal is not JSON serializable" in error_str:
@@ -605,18 +657,22 @@ def chat():
                 else:
                     # Generic user-friendly error for other technical issues
                     final_answer = "I encountered an unexpected issue while processing your request. Please try rephrasing your question or contact support if the problem continues."
+            
+            # Tell the user when the guard narrowed their question
+            if guard.action == 'rewrite' and columns is not None:
+                final_answer = f"{final_answer}\n\n{guard.user_message}"
     elif parsed.get("force_format_response"):
         payload = parsed["force_format_response"]
         if isinstance(payload, dict):
             question = payload["question"]
             columns = payload["columns"]
             rows = payload["rows"]
-            final_answer = generate_final_response(f"{question} ({user_input})", columns, rows, chat_context=context)
+            final_answer = generate_final_response(f"{question} ({user_input})", columns, rows, chat_context=context, deadline=deadline)
         else:
             final_answer = str(payload)
     else:
         try:
-            final_answer = gemini_direct_answer(user_input, chat_context=context)
+            final_answer = gemini_direct_answer(user_input, chat_context=context, deadline=deadline)
         except Exception as e:
             error_msg = str(e)
             if "429" in error_msg or "quota" in error_msg.lower():
@@ -677,7 +733,9 @@ def chat():
         'response': final_answer,
         'follow_up': latest_follow_up,
         'columns': columns,
-        'rows': rows
+        'rows': rows,
+        'data_freshness': data_freshness,
+        'answered_by': parsed.get('answered_by')
     })
 
 
@@ -1,3 +1,367 @@
 import sys
 sys.path.append('/home/linux/Documents/chatbot-diya')
 
+"""
+LLM Service
+===========
+
+One client for every Gemini call. query_agent, query_agent_enhanced and the
+embedding manager used to call model.generate_content directly - synchronously
+and, outside a request deadline, without any timeout - so a slow Gemini response
+could hold a gunicorn worker indefinitely.
+
+LLMClient.generate(prompt, deadline=None, timeout=None) / agenerate(...):
+- every call has a timeout: the request deadline's remaining time (see
+  src.core.deadline), capped by LLM_TIMEOUT_SECONDS or the timeout argument
+- 429 / ResourceExhausted is retried with exponential backoff and full jitter
+  (LLM_MAX_RETRIES, LLM_RETRY_BASE_DELAY), never past the deadline
+- at most LLM_MAX_CONCURRENCY calls per model are in flight; callers wait for a
+  slot no longer than their timeout
+- LLM_HEDGE_AFTER_SECONDS > 0 sends a second identical request when the first
+  has not answered by then (and a slot is free); the first answer wins
+- agenerate runs the call on a worker thread with the caller's context, for
+  asyncio callers
+
+LLM_BACKEND selects where prompts go:
+- gemini: google.generativeai (default)
+- stub:   deterministic offline answers - regex fixtures from LLM_STUB_FIXTURES
+          (JSON list of {"pattern": ..., "response": ...}), otherwise a canned
+          JSON answer; LLM_STUB_LATENCY_MS simulates model latency
+- record: answer from LLM_REPLAY_PATH when the prompt was seen, otherwise call
+          Gemini and append the answer there
+- replay: answer only from LLM_REPLAY_PATH, falling back to the stub on a miss,
+          so recorded sessions can be benchmarked and tested without network
+"""
+
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from src.core.deadline import DeadlineExceeded, resolve_deadline
+
+DEFAULT_MODEL = os.getenv('LLM_MODEL', 'gemini-2.5-flash')
+
+# Upper bound for a single LLM call; the request deadline can only shorten it
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', 60))
+
+
+@dataclass(frozen=True)
+class LLMResponse:
+    """Model output; .text matches the attribute callers used on Gemini responses"""
+    text: str
+    model: str
+    backend: str
+    latency_seconds: float = 0.0
+    hedged: bool = False        # answered by the hedge request
+
+
+def _is_rate_limited(error) -> bool:
+    """429 from Gemini (google.api_core ResourceExhausted) or any client reporting it"""
+    code = getattr(error, 'code', None)
+    if code == 429 or getattr(code, 'value', None) == 429:
+        return True
+    return type(error).__name__ in ('ResourceExhausted', 'TooManyRequests') or '429' in str(error)
+
+
+def _prompt_key(model_name: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{prompt}".encode('utf-8')).hexdigest()
+
+
+class GeminiBackend:
+    """google.generativeai, configured on first use so offline backends never import it"""
+    name = 'gemini'
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate(self, prompt: str, timeout: float) -> str:
+        response = self._get_model().generate_content(prompt, request_options={"timeout": timeout})
+        return response.text
+
+
+class StubBackend:
+    """Deterministic offline answers for tests and benchmarks"""
+    name = 'stub'
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.latency = float(os.getenv('LLM_STUB_LATENCY_MS', 0)) / 1000
+        self.rules = []
+        fixtures_path = os.getenv('LLM_STUB_FIXTURES')
+        if fixtures_path:
+            with open(fixtures_path) as f:
+                self.rules = [(re.compile(rule['pattern'], re.IGNORECASE | re.DOTALL), rule['response'])
+                              for rule in json.load(f)]
+
+    def generate(self, prompt: str, timeout: float) -> str:
+        if self.latency:
+            time.sleep(min(self.latency, timeout))
+            if self.latency > timeout:
+                raise TimeoutError(f"Stub LLM call exceeded {timeout:.1f}s")
+        for pattern, response in self.rules:
+            if pattern.search(prompt):
+                return response if isinstance(response, str) else json.dumps(response)
+        digest = _prompt_key(self.model_name, prompt)[:12]
+        return json.dumps({
+            "sql": None,
+            "response": f"[stub {digest}] No fixture matched this prompt.",
+            "follow_up": None
+        })
+
+
+class RecordReplayBackend:
+    """Answers from a JSONL file of recorded prompts; records new ones in record mode"""
+
+    def __init__(self, model_name: str, path: str, mode: str):
+        self.model_name = model_name
+        self.path = path
+        self.mode = mode
+        self.name = mode
+        self.live = GeminiBackend(model_name) if mode == 'record' else None
+        self.fallback = StubBackend(model_name)
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._recordings = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._recordings[entry['key']] = entry['response']
+        print(f"📼 LLM {mode} backend: {len(self._recordings)} recorded responses in {path}")
+
+    def generate(self, prompt: str, timeout: float) -> str:
+        key = _prompt_key(self.model_name, prompt)
+        with self._lock:
+            recorded = self._recordings.get(key)
+        if recorded is not None:
+            return recorded
+
+        if self.live is None:
+            with self._lock:
+                self.misses += 1
+            print(f"⚠️ LLM replay miss for prompt {key[:12]} - answering from the stub")
+            return self.fallback.generate(prompt, timeout)
+
+        text = self.live.generate(prompt, timeout)
+        with self._lock:
+            self._recordings[key] = text
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps({'key': key, 'model': self.model_name, 'response': text}) + '\n')
+        return text
+
+
+def _create_backend(model_name: str):
+    kind = os.getenv('LLM_BACKEND', 'gemini').lower()
+    if kind == 'stub':
+        return StubBackend(model_name)
+    if kind in ('record', 'replay'):
+        path = os.getenv('LLM_REPLAY_PATH', '/home/linux/Documents/chatbot-diya/data/llm_recordings.jsonl')
+        return RecordReplayBackend(model_name, path, kind)
+    return GeminiBackend(model_name)
+
+
+class LLMClient:
+    """Timeouts, 429 retries, concurrency limit and optional hedging around one backend"""
+
+    def __init__(self, model_name: str, backend=None):
+        self.model_name = model_name
+        self.backend = backend or _create_backend(model_name)
+        self.max_concurrency = int(os.getenv('LLM_MAX_CONCURRENCY', 8))
+        self.max_retries = int(os.getenv('LLM_MAX_RETRIES', 3))
+        self.retry_base_delay = float(os.getenv('LLM_RETRY_BASE_DELAY', 1.0))
+        self.hedge_after = float(os.getenv('LLM_HEDGE_AFTER_SECONDS', 0))
+
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._hedge_executor = None
+        self._lock = threading.Lock()
+        self.stats = {
+            'calls': 0,
+            'errors': 0,
+            'timeouts': 0,
+            'rate_limited': 0,
+            'retries': 0,
+            'hedges': 0,
+            'hedge_wins': 0,
+            'in_flight': 0,
+            'total_seconds': 0.0,
+        }
+
+    # ------------------------------------------------------------------ calls
+
+    def generate(self, prompt: str, deadline=None, timeout: float = None) -> LLMResponse:
+        """
+        Blocking call bounded by the request deadline (explicit or current) and
+        timeout (default LLM_TIMEOUT_SECONDS); 429s are retried with jitter.
+        """
+        deadline = resolve_deadline(deadline)
+        self._count('calls')
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                text, hedged = self._attempt(prompt, deadline, timeout)
+                break
+            except TimeoutError:
+                self._count('timeouts')
+                raise
+            except Exception as e:
+                if not _is_rate_limited(e):
+                    self._count('errors')
+                    raise
+                self._count('rate_limited')
+                delay = random.uniform(0, self.retry_base_delay * (2 ** attempt))
+                if attempt >= self.max_retries or (deadline and not deadline.allows_retry(delay)):
+                    self._count('errors')
+                    raise
+                attempt += 1
+                self._count('retries')
+                print(f"⏳ LLM rate limited, retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.stats['total_seconds'] += elapsed
+        return LLMResponse(text=text, model=self.model_name, backend=self.backend.name,
+                           latency_seconds=elapsed, hedged=hedged)
+
+    async def agenerate(self, prompt: str, deadline=None, timeout: float = None) -> LLMResponse:
+        """generate() on a worker thread; the caller's context (deadline) goes with it"""
+        return await asyncio.to_thread(self.generate, prompt, deadline=deadline, timeout=timeout)
+
+    def _call_timeout(self, deadline, timeout) -> float:
+        cap = LLM_TIMEOUT_SECONDS if timeout is None else timeout
+        if deadline is None:
+            return cap
+        deadline.check("LLM call")
+        return deadline.timeout(cap=cap)
+
+    def _attempt(self, prompt, deadline, timeout):
+        call_timeout = self._call_timeout(deadline, timeout)
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=call_timeout):
+            raise DeadlineExceeded(
+                f"No LLM slot free within {call_timeout:.1f}s ({self.max_concurrency} calls in flight)"
+            )
+        remaining = max(call_timeout - (time.perf_counter() - started), 0.001)
+        if self.hedge_after <= 0:
+            return self._call_and_release(prompt, remaining), False
+        return self._hedged(prompt, remaining)
+
+    def _call_and_release(self, prompt, timeout):
+        """Backend call holding a slot the caller already acquired"""
+        with self._lock:
+            self.stats['in_flight'] += 1
+        try:
+            return self.backend.generate(prompt, timeout)
+        finally:
+            with self._lock:
+                self.stats['in_flight'] -= 1
+            self._slots.release()
+
+    def _hedged(self, prompt, timeout):
+        executor = self._get_hedge_executor()
+        expires_at = time.perf_counter() + timeout
+        primary = executor.submit(self._call_and_release, prompt, timeout)
+        hedge = None
+
+        done, _ = wait([primary], timeout=min(self.hedge_after, timeout))
+        if not done and self._slots.acquire(blocking=False):
+            hedge = executor.submit(self._call_and_release, prompt, max(expires_at - time.perf_counter(), 0.001))
+            self._count('hedges')
+
+        # First successful answer wins; the loser finishes in the background
+        pending = {primary} if hedge is None else {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(expires_at - time.perf_counter(), 0),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count('hedge_wins')
+                    return future.result(), future is hedge
+                error = future.exception()
+        if error is not None:
+            raise error
+        raise TimeoutError(f"LLM call exceeded {timeout:.1f}s")
+
+    def _get_hedge_executor(self):
+        with self._lock:
+            if self._hedge_executor is None:
+                # Primary + hedge for every slot
+                self._hedge_executor = ThreadPoolExecutor(max_workers=self.max_concurrency * 2,
+                                                          thread_name_prefix="llm_hedge")
+            return self._hedge_executor
+
+    # ------------------------------------------------------------------ stats
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def get_status(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        calls = stats.pop('calls')
+        total_seconds = stats.pop('total_seconds')
+        completed = calls - stats['errors'] - stats['timeouts']
+        status = {
+            'model': self.model_name,
+            'backend': self.backend.name,
+            'max_concurrency': self.max_concurrency,
+            'hedge_after_seconds': self.hedge_after or None,
+            'calls': calls,
+            'avg_latency_ms': round(total_seconds / completed * 1000, 1) if completed > 0 else 0.0,
+            **stats,
+        }
+        if hasattr(self.backend, 'misses'):
+            status['replay_misses'] = self.backend.misses
+        return status
+
+
+_clients: Dict[str, LLMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm_client(model_name: Optional[str] = None) -> LLMClient:
+    """Shared client per model - concurrency limits apply across all its callers"""
+    model_name = model_name or DEFAULT_MODEL
+    with _clients_lock:
+        client = _clients.get(model_name)
+        if client is None:
+            client = LLMClient(model_name)
+            _clients[model_name] = client
+        return client
+
+
+def get_llm_status() -> dict:
+    with _clients_lock:
+        clients = list(_clients.values())
+    return {client.model_name: client.get_status() for client in clients}
+
+
+# Global client for the default model (SQL generation, responses, referential fallback)
+llm_client = get_llm_client()
@@ -0,0 +1,111 @@
+"""
+Request Deadlines
+=================
+
+A Deadline is created once per user request (flask_app.chat) and consulted by
+every layer that can block - LLM calls, pool acquisition, statement execution
+and retry sleeps - so no layer waits or retries past the user's remaining time.
+
+Entry points take an explicit deadline argument; internally the active deadline
+is also published through a context variable so helpers deep in the call chain
+can find it without every signature changing. Background work (cache
+revalidation, warming) runs on executor threads, which start with no deadline.
+"""
+
+import os
+import time
+import contextvars
+import functools
+from contextlib import contextmanager
+from typing import Optional
+
+# Default end-to-end budget for one chat request
+REQUEST_DEADLINE_SECONDS = float(os.getenv('REQUEST_DEADLINE_SECONDS', 30))
+
+_current_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request runs out of time; its message reads as a timeout to ErrorClassifier"""
+
+
+class Deadline:
+    """Absolute point in time by which a request must finish"""
+
+    def __init__(self, budget_seconds: float = None):
+        self.budget = REQUEST_DEADLINE_SECONDS if budget_seconds is None else float(budget_seconds)
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + self.budget
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, stage: str = None):
+        """Raise DeadlineExceeded if no time is left"""
+        if self.expired():
+            where = f" before {stage}" if stage else ""
+            raise DeadlineExceeded(f"Request timed out after {self.budget:.1f}s{where}")
+
+    def timeout(self, cap: float = None) -> float:
+        """Remaining time, optionally capped by a layer's own timeout"""
+        remaining = self.remaining()
+        return remaining if cap is None else min(remaining, cap)
+
+    def statement_timeout_ms(self) -> int:
+        """Remaining time as a PostgreSQL statement_timeout (never 0, which would disable it)"""
+        return max(int(self.remaining() * 1000), 1)
+
+    def allows_retry(self, delay: float, min_attempt: float = 0.5) -> bool:
+        """True if sleeping delay seconds still leaves min_attempt seconds for another attempt"""
+        return self.remaining() > delay + min_attempt
+
+    def __repr__(self):
+        return f"Deadline(budget={self.budget:.1f}s, remaining={self.remaining():.2f}s)"
+
+
+def current_deadline() -> Optional[Deadline]:
+    """The deadline of the request being served on this thread/context, if any"""
+    return _current_deadline.get()
+
+
+def set_current_deadline(deadline: Optional[Deadline]):
+    """Publish deadline for the current context; returns a token for reset_current_deadline()"""
+    return _current_deadline.set(deadline)
+
+
+def reset_current_deadline(token):
+    _current_deadline.reset(token)
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """Make deadline the current one for the duration of the block"""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def resolve_deadline(deadline: Optional[Deadline] = None) -> Optional[Deadline]:
+    """An explicitly passed deadline wins over the context one"""
+    return deadline if deadline is not None else _current_deadline.get()
+
+
+def accepts_deadline(func):
+    """
+    Let func take an optional deadline= keyword without threading it through its
+    body: the deadline becomes the current one while func runs, so every blocking
+    call underneath (LLM, pool, statement) picks it up via resolve_deadline().
+    """
+    @functools.wraps(func)
+    def wrapper(*args, deadline: Optional[Deadline] = None, **kwargs):
+        with deadline_scope(resolve_deadline(deadline)):
+            return func(*args, **kwargs)
+    return wrapper
@@ -8,8 +8,96 @@ Intelligent Contextual Reasoning Enhancement for Chatbot
 
 import re
 import json
+from datetime import timedelta
 from typing import Dict, List, Optional, Tuple
 
+from src.utils.date_range_parser import parse_date_range
+from src.core.prepared_statements import BoundQuery, ParamList, statement_registry
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse, sre_constants
+
+# Literals shorter than this ("id", "md") are too common to prefilter on
+MIN_KEYWORD_LENGTH = 3
+
+
+def _required_keyword_sets(parsed) -> List[frozenset]:
+    """
+    Keyword sets a regex cannot match without: for each returned set, at least
+    one of its strings occurs in every string the pattern matches.
+    """
+    required = []
+    run = []
+
+    def flush():
+        if len(run) >= MIN_KEYWORD_LENGTH:
+            required.append(frozenset([''.join(run).lower()]))
+        run.clear()
+
+    for op, av in parsed:
+        if op is sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        flush()
+        if op is sre_constants.SUBPATTERN:
+            required.extend(_required_keyword_sets(av[-1]))
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+            required.extend(_required_keyword_sets(av[2]))
+        elif op is sre_constants.BRANCH:
+            # Every alternative must contribute, otherwise the branch guarantees nothing
+            alternatives = []
+            for branch in av[1]:
+                sets = _required_keyword_sets(branch)
+                if not sets:
+                    alternatives = None
+                    break
+                alternatives.append(max(sets, key=lambda keywords: min(map(len, keywords))))
+            if alternatives:
+                required.append(frozenset().union(*alternatives))
+    flush()
+    return required
+
+
+class IntentDispatcher:
+    """
+    intent_patterns compiled once, with a keyword prefilter in front.
+
+    Each pattern's required keywords are derived from the regex itself, so a
+    query is only searched with the patterns whose keywords it contains.
+    Candidates are tried in the table's original order and the first one whose
+    extractor returns data wins - the same priority as a linear scan.
+    """
+
+    def __init__(self, intent_patterns: List[Dict]):
+        # Each distinct keyword set gets a bit; a pattern is a candidate when all its bits are set
+        set_bits = {}
+        self.keyword_masks = {}
+        self.entries = []
+        for config in intent_patterns:
+            required_mask = 0
+            for keywords in _required_keyword_sets(sre_parse.parse(config['pattern'], re.IGNORECASE)):
+                bit = set_bits.setdefault(keywords, 1 << len(set_bits))
+                required_mask |= bit
+                for keyword in keywords:
+                    self.keyword_masks[keyword] = self.keyword_masks.get(keyword, 0) | bit
+            self.entries.append((re.compile(config['pattern'], re.IGNORECASE), required_mask, config))
+        self.keywords = frozenset(self.keyword_masks)
+
+    def candidates(self, query_lower: str):
+        """Yield (index, match, config) for patterns that match, in priority order"""
+        satisfied = 0
+        for keyword, mask in self.keyword_masks.items():
+            if keyword in query_lower:
+                satisfied |= mask
+        for index, (pattern, required_mask, config) in enumerate(self.entries):
+            if required_mask & satisfied == required_mask:
+                match = pattern.search(query_lower)
+                if match:
+                    yield index, match, config
+
+
 class IntelligentReasoning:
     """
     Adds intelligent contextual reasoning to the chatbot
@@ -22,6 +110,19 @@ class IntelligentReasoning:
     - vehicle_master = VEHICLES/TRUCKS/FLEET
     """
     
+    # Intents whose entities come from earlier turns rather than the question itself
+    CONTEXTUAL_INTENTS = {
+        'get_vehicle_hierarchy_contextual',
+        'get_plant_name_from_context',
+        'get_details_from_last_context',
+    }
+    
+    # Words a pattern's capture group can pick up that are not entity values
+    NON_ENTITY_WORDS = {
+        'who', 'whom', 'what', 'which', 'me', 'it', 'this', 'that', 'them', 'these', 'those',
+        'the', 'a', 'an', 'all', 'is', 'are', 'of', 'for',
+    }
+    
     def __init__(self):
         # CRITICAL: Define the core hierarchical relationships using exact ID columns
         # These ID relationships are MANDATORY and must NEVER be missed:
@@ -693,6 +794,7 @@ class IntelligentReasoning:
                 'extractor': self._extract_time_distance_criteria
             }
         ]
+        self.intent_dispatcher = IntentDispatcher(self.intent_patterns)
     
     def analyze_query_intent(self, user_query: str, chat_context) -> Optional[Dict]:
         """
@@ -700,36 +802,54 @@ class IntelligentReasoning:
         Returns enhanced query info if reasoning is needed, None otherwise
         """
         user_query_lower = user_query.lower().strip()
-        print(f"🧠 [DEBUG] Analyzing query: '{user_query}'")
+        skipped_intents = []
         
-        # Check each intent pattern
-        for i, intent_config in enumerate(self.intent_patterns):
-            pattern = intent_config['pattern']
+        # Only patterns whose keywords occur in the query are searched, in priority order
+        candidates = self.intent_dispatcher.candidates(user_query_lower)
+        for i, match, intent_config in candidates:
             intent = intent_config['intent']
-            extractor = intent_config['extractor']
+            print(f"🎯 [DEBUG] Pattern {i+1} matched! Intent: {intent}")
             
-            match = re.search(pattern, user_query_lower, re.IGNORECASE)
-            if match:
-                print(f"🎯 [DEBUG] Pattern {i+1} matched! Intent: {intent}")
-                print(f"📝 [DEBUG] Pattern: {pattern}")
-                print(f"🔍 [DEBUG] Match groups: {match.groups()}")
-                
-                # Extract relevant data using the specific extractor
-                extracted_data = extractor(user_query, match, chat_context)
-                
-                if extracted_data:
-                    print(f"✅ [DEBUG] Data extracted: {extracted_data}")
-                    return {
-                        'original_query': user_query,
-                        'intent': intent,
-                        'extracted_data': extracted_data,
-                        'reasoning_type': 'contextual_auto_resolve'
-                    }
-                else:
-                    print(f"❌ [DEBUG] No data extracted from pattern match")
+            # Extract relevant data using the specific extractor
+            extracted_data = intent_config['extractor'](user_query, match, chat_context)
+            
+            if extracted_data:
+                print(f"✅ [DEBUG] Data extracted: {extracted_data}")
+                # Lower-priority patterns that also match make the intent ambiguous
+                competing_intents = {config['intent'] for _, _, config in candidates} | set(skipped_intents)
+                competing_intents.discard(intent)
+                return {
+                    'original_query': user_query,
+                    'intent': intent,
+                    'extracted_data': extracted_data,
+                    'reasoning_type': 'contextual_auto_resolve',
+                    'competing_intents': sorted(competing_intents),
+                    'confidence': self._intent_confidence(intent, match, competing_intents, skipped_intents)
+                }
+            else:
+                print(f"❌ [DEBUG] No data extracted from pattern match")
+                skipped_intents.append(intent)
         
-        print(f"🚫 [DEBUG] No intelligent reasoning patterns matched")
         return None
+
+    def _intent_confidence(self, intent: str, match, competing_intents, skipped_intents) -> float:
+        """
+        How safely the intent's SQL template can answer without the LLM: an
+        unambiguous match on entities taken from the question itself scores high.
+        """
+        confidence = 0.95
+        if competing_intents:
+            confidence -= 0.3
+        if skipped_intents:
+            # A higher-priority pattern matched but found nothing to extract
+            confidence -= 0.1
+        if intent in self.CONTEXTUAL_INTENTS:
+            confidence -= 0.2
+        # Loose captures like (\w+) after .* can grab a stray character or a pronoun
+        captured = [value.strip().lower() for value in match.groups() if value is not None]
+        if any(len(value) < 2 or value in self.NON_ENTITY_WORDS for value in captured):
+            confidence -= 0.3
+        return round(max(confidence, 0.0), 2)
     
     def _extract_plant_id_direct(self, query: str, match, chat_context) -> Optional[Dict]:
         """Extract plant ID directly mentioned in query"""
@@ -1022,9 +1142,12 @@ class IntelligentReasoning:
             }
         return None
     
-    def generate_intelligent_query(self, reasoning_result: Dict) -> Optional[str]:
+    def generate_intelligent_query(self, reasoning_result: Dict) -> Optional[BoundQuery]:
         """
         Generate SQL query based on intelligent reasoning result - ENHANCED HIERARCHICAL
+        
+        Returns a BoundQuery: a registered statement with $n placeholders plus the
+        extracted values to bind (see src.core.prepared_statements).
         """
         intent = reasoning_result['intent']
         extracted_data = reasoning_result['extracted_data']
@@ -1037,15 +1160,15 @@ class IntelligentReasoning:
             status = extracted_data.get('status')
             if status:
                 print(f"🎯 [DEBUG] Generating complaints by status query for: {status}")
-                return f"""SELECT COUNT(T1.id_no)
+                return statement_registry.bind('complaints_by_status', """SELECT COUNT(T1.id_no)
                           FROM public.crm_complaint_dtls AS T1 
-                          WHERE T1.active_status ILIKE '{status}'"""
+                          WHERE T1.active_status ILIKE $1""", status)
         
         elif intent == 'get_complaint_status':
             complaint_id = extracted_data.get('complaint_id')
             if complaint_id:
                 print(f"🎯 [DEBUG] Generating complaint status query for ID: {complaint_id}")
-                return f"""
+                return statement_registry.bind('complaint_status', """
                     SELECT 
                         cd.id_no as complaint_id,
                         cd.complaint_date,
@@ -1073,15 +1196,15 @@ class IntelligentReasoning:
                         END as category_type
                     FROM crm_complaint_dtls cd
                     LEFT JOIN crm_site_visit_dtls csv ON cd.id_no = csv.complaint_id
-                    WHERE cd.id_no = {complaint_id}
+                    WHERE cd.id_no = $1
                     LIMIT 1;
-                """
+                """, complaint_id)
         
         elif intent == 'get_complaint_pending_with':
             complaint_id = extracted_data.get('complaint_id')
             if complaint_id:
                 print(f"🎯 [DEBUG] Generating pending with query for complaint: {complaint_id}")
-                return f"""
+                return statement_registry.bind('complaint_pending_with', """
                     SELECT 
                         cd.id_no as complaint_id,
                         cd.complaint_date,
@@ -1109,9 +1232,9 @@ class IntelligentReasoning:
                         END as category_type
                     FROM crm_complaint_dtls cd
                     LEFT JOIN crm_site_visit_dtls csv ON cd.id_no = csv.complaint_id
-                    WHERE cd.id_no = {complaint_id}
+                    WHERE cd.id_no = $1
                     LIMIT 1;
-                """
+                """, complaint_id)
         
         elif intent == 'get_complaints_by_assignee':
             assignee = extracted_data.get('assignee')
@@ -1120,7 +1243,7 @@ class IntelligentReasoning:
                 
                 # This is the key logic you mentioned!
                 if assignee == 'Plant Incharge':
-                    return f"""
+                    return statement_registry.bind('complaints_pending_plant_incharge', """
                         SELECT 
                             cd.id_no as complaint_id,
                             cd.complaint_date,
@@ -1134,9 +1257,9 @@ class IntelligentReasoning:
                           AND cd.complaint_category_id = '1'
                         ORDER BY cd.complaint_date DESC
                         LIMIT 50;
-                    """
+                    """)
                 elif assignee == 'Technical Manager/Incharge':
-                    return f"""
+                    return statement_registry.bind('complaints_pending_technical_manager', """
                         SELECT 
                             cd.id_no as complaint_id,
                             cd.complaint_date,
@@ -1150,7 +1273,7 @@ class IntelligentReasoning:
                           AND cd.complaint_category_id = '2'
                         ORDER BY cd.complaint_date DESC
                         LIMIT 50;
-                    """
+                    """)
                 else:
                     # For other assignees (QC, BH, TH, CF, MD)
                     status_mapping = {
@@ -1161,13 +1284,13 @@ class IntelligentReasoning:
                         'MD': 'MD'
                     }
                     status = status_mapping.get(assignee, assignee)
-                    return f"""
+                    return statement_registry.bind('complaints_pending_with_authority', """
                         SELECT 
                             cd.id_no as complaint_id,
                             cd.complaint_date,
                             csv.complaint_status,
                             cd.complaint_category_id,
-                            '{assignee}' as pending_with,
+                            $1::text as pending_with,
                             CASE 
                                 WHEN cd.complaint_category_id = '1' THEN 'Operations'
                                 WHEN cd.complaint_category_id = '2' THEN 'Technical'
@@ -1175,16 +1298,16 @@ class IntelligentReasoning:
                             END as category_type
                         FROM crm_complaint_dtls cd
                         LEFT JOIN crm_site_visit_dtls csv ON cd.id_no = csv.complaint_id
-                        WHERE csv.complaint_status = '{status}'
+                        WHERE csv.complaint_status = $2
                         ORDER BY cd.complaint_date DESC
                         LIMIT 50;
-                    """
+                    """, assignee, status)
         
         elif intent == 'get_complaint_workflow_status':
             complaint_id = extracted_data.get('complaint_id')
             if complaint_id:
                 print(f"🎯 [DEBUG] Generating workflow status query for complaint: {complaint_id}")
-                return f"""
+                return statement_registry.bind('complaint_workflow_status', """
                     SELECT 
                         cd.id_no as complaint_id,
                         cd.complaint_date,
@@ -1213,16 +1336,17 @@ class IntelligentReasoning:
                         END as category_type
                     FROM crm_complaint_dtls cd
                     LEFT JOIN crm_site_visit_dtls csv ON cd.id_no = csv.complaint_id
-                    WHERE cd.id_no = {complaint_id}
+                    WHERE cd.id_no = $1
                     LIMIT 1;
-                """
+                """, complaint_id)
         
         elif intent == 'get_specific_action_status':
             complaint_id = extracted_data.get('complaint_id')
             authority_column = extracted_data.get('authority_column')
             if complaint_id and authority_column:
                 print(f"🎯 [DEBUG] Generating specific action status query for complaint {complaint_id}, authority: {authority_column}")
-                return f"""
+                # authority_column is an identifier from _extract_complaint_and_authority's fixed mapping - never user text
+                return statement_registry.bind(f'specific_action_status_{authority_column}', f"""
                     SELECT 
                         cd.id_no as complaint_id,
                         cd.complaint_date,
@@ -1234,9 +1358,9 @@ class IntelligentReasoning:
                         END as action_status_description
                     FROM crm_complaint_dtls cd
                     LEFT JOIN crm_site_visit_dtls csv ON cd.id_no = csv.complaint_id
-                    WHERE cd.id_no = {complaint_id}
+                    WHERE cd.id_no = $1
                     LIMIT 1;
-                """
+                """, complaint_id)
         
         elif intent == 'get_complaints_by_action_status':
             authority_column = extracted_data.get('authority_column')
@@ -1244,7 +1368,8 @@ class IntelligentReasoning:
             authority_name = extracted_data.get('authority_name')
             if authority_column and action_type:
                 print(f"🎯 [DEBUG] Generating complaints by action status query for {authority_name}: {action_type}")
-                return f"""
+                # authority_column comes from the fixed authority mapping - only the values are bound
+                return statement_registry.bind(f'complaints_by_action_status_{authority_column}', f"""
                     SELECT 
                         cd.id_no as complaint_id,
                         cd.complaint_date,
@@ -1254,18 +1379,18 @@ class IntelligentReasoning:
                             WHEN 'R' THEN 'Rejected'
                             ELSE 'Pending'
                         END as action_status_description,
-                        '{authority_name}' as authority
+                        $1::text as authority
                     FROM crm_complaint_dtls cd
                     LEFT JOIN crm_site_visit_dtls csv ON cd.id_no = csv.complaint_id
-                    WHERE csv.{authority_column} = '{action_type}'
+                    WHERE csv.{authority_column} = $2
                     ORDER BY cd.complaint_date DESC
                     LIMIT 50;
-                """
+                """, authority_name, action_type)
         
         # Product Correction Status Queries
         elif intent == 'get_complaints_with_product_correction_done':
             print(f"🎯 [DEBUG] Generating complaints with product correction done query")
-            return f"""
+            return statement_registry.bind('complaints_product_correction_done', """
                 SELECT 
                     cd.id_no as complaint_id,
                     cd.complaint_date,
@@ -1283,11 +1408,11 @@ class IntelligentReasoning:
                 WHERE csv.product_correction = 'Y'
                 ORDER BY cd.complaint_date DESC
                 LIMIT 50;
-            """
+            """)
         
         elif intent == 'get_complaints_without_product_correction':
             print(f"🎯 [DEBUG] Generating complaints without product correction query")
-            return f"""
+            return statement_registry.bind('complaints_without_product_correction', """
                 SELECT 
                     cd.id_no as complaint_id,
                     cd.complaint_date,
@@ -1311,13 +1436,13 @@ class IntelligentReasoning:
                    OR csv.product_correction = ''
                 ORDER BY cd.complaint_date DESC
                 LIMIT 50;
-            """
+            """)
         
         elif intent == 'get_complaint_product_correction_status':
             complaint_id = extracted_data.get('complaint_id')
             if complaint_id:
                 print(f"🎯 [DEBUG] Generating product correction status query for complaint: {complaint_id}")
-                return f"""
+                return statement_registry.bind('complaint_product_correction_status', """
                     SELECT 
                         cd.id_no as complaint_id,
                         cd.complaint_date,
@@ -1337,9 +1462,9 @@ class IntelligentReasoning:
                         END as category_type
                     FROM crm_complaint_dtls cd
                     LEFT JOIN crm_site_visit_dtls csv ON cd.id_no = csv.complaint_id
-                    WHERE cd.id_no = {complaint_id}
+                    WHERE cd.id_no = $1
                     LIMIT 1;
-                """
+                """, complaint_id)
         
         # Category-based complaint queries
         elif intent == 'get_complaints_count_by_category':
@@ -1347,28 +1472,28 @@ class IntelligentReasoning:
             category_name = extracted_data.get('category_name')
             if category_id and category_name:
                 print(f"🎯 [DEBUG] Generating complaints count by category query for: {category_name} (ID: {category_id})")
-                return f"""
+                return statement_registry.bind('complaints_count_by_category', """
                     SELECT COUNT(cd.id_no) as complaint_count,
-                           '{category_name}' as category_name,
-                           '{category_id}' as category_id
+                           $1::text as category_name,
+                           $2::text as category_id
                     FROM crm_complaint_dtls cd
-                    WHERE cd.complaint_category_id = '{category_id}'
+                    WHERE cd.complaint_category_id = $2
                     AND cd.active_status = 'Y';
-                """
+                """, category_name, category_id)
         
         elif intent == 'get_complaints_by_category':
             category_id = extracted_data.get('category_id')
             category_name = extracted_data.get('category_name')
             if category_id and category_name:
                 print(f"🎯 [DEBUG] Generating complaints by category query for: {category_name} (ID: {category_id})")
-                return f"""
+                return statement_registry.bind('complaints_by_category', """
                     SELECT 
                         cd.id_no as complaint_id,
                         cd.complaint_date,
                         cd.complaint_subject,
                         csv.complaint_status,
                         cd.complaint_category_id,
-                        '{category_name}' as category_name,
+                        $1::text as category_name,
                         CASE 
                             WHEN csv.complaint_status = 'P' AND cd.complaint_category_id = '1' THEN 'Plant Incharge'
                             WHEN csv.complaint_status = 'P' AND cd.complaint_category_id = '2' THEN 'Technical Manager/Incharge'
@@ -1386,11 +1511,11 @@ class IntelligentReasoning:
                         END as final_status
                     FROM crm_complaint_dtls cd
                     LEFT JOIN crm_site_visit_dtls csv ON cd.id_no = csv.complaint_id
-                    WHERE cd.complaint_category_id = '{category_id}'
+                    WHERE cd.complaint_category_id = $2
                     AND cd.active_status = 'Y'
                     ORDER BY cd.complaint_date DESC
                     LIMIT 50;
-                """
+                """, category_name, category_id)
         
         # Check for hierarchical queries first
         if intent.startswith(('get_zone_', 'get_region_', 'get_plant_', 'get_vehicles_', 'get_vehicle_hierarchy')):
@@ -1403,39 +1528,39 @@ class IntelligentReasoning:
             plant_id = extracted_data.get('plant_id')
             if plant_id:
                 # Use hosp_master for plant information - STRICT HIERARCHICAL
-                return f"""SELECT DISTINCT hm.id_no as plant_id, hm.name as plant_name, hm.address
+                return statement_registry.bind('plant_name_from_id', """SELECT DISTINCT hm.id_no as plant_id, hm.name as plant_name, hm.address
                           FROM hosp_master hm  
-                          WHERE hm.id_no = {plant_id} 
-                          LIMIT 5;"""
+                          WHERE hm.id_no = $1 
+                          LIMIT 5;""", plant_id)
         
         elif intent == 'get_plant_id_from_name':
             plant_name = extracted_data.get('plant_name')
             if plant_name:
-                return f"""SELECT DISTINCT hm.id_no as plant_id, hm.name as plant_name, hm.address
+                return statement_registry.bind('plant_id_from_name', """SELECT DISTINCT hm.id_no as plant_id, hm.name as plant_name, hm.address
                           FROM hosp_master hm 
-                          WHERE hm.name ILIKE '%{plant_name}%'
-                          LIMIT 10;"""
+                          WHERE hm.name ILIKE $1
+                          LIMIT 10;""", f"%{plant_name}%")
         
         elif intent == 'get_site_visit_for_plant':
             plant_reference = extracted_data.get('plant_reference')
             if plant_reference:
-                return f"""SELECT DISTINCT csv.*, hm.name as plant_name, hm.address
+                return statement_registry.bind('site_visit_for_plant', """SELECT DISTINCT csv.*, hm.name as plant_name, hm.address
                           FROM public.crm_site_visit_dtls csv
                           JOIN hosp_master hm ON csv.plant_id = hm.id_no
-                          WHERE hm.name ILIKE '%{plant_reference}%'
-                          LIMIT 10;"""
+                          WHERE hm.name ILIKE $1
+                          LIMIT 10;""", f"%{plant_reference}%")
         
         elif intent == 'get_customer_name_from_id':
             customer_id = extracted_data.get('customer_id') 
             if customer_id:
-                return f"""SELECT DISTINCT customer_id, customer_name 
+                return statement_registry.bind('customer_name_from_id', """SELECT DISTINCT customer_id, customer_name 
                           FROM public.customer_master 
-                          WHERE customer_id = {customer_id} 
-                          LIMIT 1;"""
+                          WHERE customer_id = $1 
+                          LIMIT 1;""", customer_id)
         
         # Distance Report Queries
         elif intent == 'show_distance_report':
-            return f"""
+            return statement_registry.bind('distance_report', """
                 SELECT dr.reg_no, dr.from_tm, dr.to_tm,
                        ROUND(dr.distance / 1000.0, 2) as distance_km,
                        CONCAT(LPAD((ROUND(dr.drum_rotation / 2.0)::integer / 60)::text, 2, '0'), ':', 
@@ -1448,12 +1573,12 @@ class IntelligentReasoning:
                 JOIN public.district_master dm ON hm.id_dist = dm.id_no
                 ORDER BY dr.from_tm DESC
                 LIMIT 50;
-            """
+            """)
         
         elif intent == 'vehicle_distance_report':
             vehicle_reg = extracted_data.get('vehicle_reg')
             if vehicle_reg:
-                return f"""
+                return statement_registry.bind('vehicle_distance_report', """
                     SELECT dr.reg_no, dr.from_tm, dr.to_tm,
                            ROUND(dr.distance / 1000.0, 2) as distance_km,
                            CONCAT(LPAD((ROUND(dr.drum_rotation / 2.0)::integer / 60)::text, 2, '0'), ':', 
@@ -1464,29 +1589,29 @@ class IntelligentReasoning:
                     JOIN public.vehicle_master vm ON dr.reg_no = vm.reg_no
                     JOIN public.hosp_master hm ON vm.id_hosp = hm.id_no
                     JOIN public.district_master dm ON hm.id_dist = dm.id_no
-                    WHERE dr.reg_no ILIKE '{vehicle_reg}'
+                    WHERE dr.reg_no ILIKE $1
                     ORDER BY dr.from_tm DESC
                     LIMIT 50;
-                """
+                """, vehicle_reg)
         
         elif intent == 'vehicle_drum_rotation':
             vehicle_reg = extracted_data.get('vehicle_reg')
             if vehicle_reg:
-                return f"""
+                return statement_registry.bind('vehicle_drum_rotation', """
                     SELECT dr.reg_no, dr.from_tm, dr.to_tm,
                            CONCAT(LPAD((ROUND(dr.drum_rotation / 2.0)::integer / 60)::text, 2, '0'), ':', 
                                   LPAD((ROUND(dr.drum_rotation / 2.0)::integer % 60)::text, 2, '0')) as drum_rotation_time,
                            ROUND(dr.distance / 1000.0, 2) as distance_km
                     FROM public.distance_report dr
-                    WHERE dr.reg_no ILIKE '{vehicle_reg}'
+                    WHERE dr.reg_no ILIKE $1
                     ORDER BY dr.from_tm DESC
                     LIMIT 20;
-                """
+                """, vehicle_reg)
         
         elif intent == 'total_distance_traveled':
             aggregation = extracted_data.get('aggregation', 'total')
             if aggregation == 'total':
-                return f"""
+                return statement_registry.bind('total_distance_by_vehicle', """
                     SELECT dr.reg_no,
                            SUM(ROUND(dr.distance / 1000.0, 2)) as total_distance_km,
                            COUNT(*) as total_trips
@@ -1494,9 +1619,9 @@ class IntelligentReasoning:
                     GROUP BY dr.reg_no
                     ORDER BY total_distance_km DESC
                     LIMIT 20;
-                """
+                """)
             elif aggregation == 'average':
-                return f"""
+                return statement_registry.bind('average_distance_by_vehicle', """
                     SELECT dr.reg_no,
                            AVG(ROUND(dr.distance / 1000.0, 2)) as avg_distance_km,
                            COUNT(*) as total_trips
@@ -1504,10 +1629,10 @@ class IntelligentReasoning:
                     GROUP BY dr.reg_no
                     ORDER BY avg_distance_km DESC
                     LIMIT 20;
-                """
+                """)
         
         elif intent == 'inter_plant_distance':
-            return f"""
+            return statement_registry.bind('inter_plant_distance', """
                 SELECT hm.name as plant_name,
                        COUNT(*) as trips,
                        SUM(ROUND(dr.distance / 1000.0, 2)) as total_distance_km,
@@ -1520,10 +1645,10 @@ class IntelligentReasoning:
                 GROUP BY hm.name, dm.name
                 ORDER BY total_distance_km DESC
                 LIMIT 20;
-            """
+            """)
         
         elif intent == 'inter_plant_vehicle_travel':
-            return f"""
+            return statement_registry.bind('inter_plant_vehicle_travel', """
                 SELECT dr.reg_no,
                        hm.name as vehicle_plant,
                        dm.name as region,
@@ -1537,12 +1662,12 @@ class IntelligentReasoning:
                 HAVING COUNT(*) > 1
                 ORDER BY total_travel_km DESC
                 LIMIT 20;
-            """
+            """)
         
         elif intent == 'time_based_distance_report':
             time_period = extracted_data.get('time_period', 'daily')
             if time_period == 'daily':
-                return f"""
+                return statement_registry.bind('daily_distance_report', """
                     SELECT DATE(dr.from_tm) as travel_date,
                            COUNT(*) as trips,
                            SUM(ROUND(dr.distance / 1000.0, 2)) as total_km,
@@ -1551,9 +1676,9 @@ class IntelligentReasoning:
                     GROUP BY DATE(dr.from_tm)
                     ORDER BY travel_date DESC
                     LIMIT 30;
-                """
+                """)
             elif time_period == 'monthly':
-                return f"""
+                return statement_registry.bind('monthly_distance_report', """
                     SELECT EXTRACT(YEAR FROM dr.from_tm) as year,
                            EXTRACT(MONTH FROM dr.from_tm) as month,
                            COUNT(*) as trips,
@@ -1563,9 +1688,9 @@ class IntelligentReasoning:
                     GROUP BY EXTRACT(YEAR FROM dr.from_tm), EXTRACT(MONTH FROM dr.from_tm)
                     ORDER BY year DESC, month DESC
                     LIMIT 12;
-                """
+                """)
             elif time_period == 'weekly':
-                return f"""
+                return statement_registry.bind('weekly_distance_report', """
                     SELECT DATE_TRUNC('week', dr.from_tm) as week_start,
                            COUNT(*) as trips,
                            SUM(ROUND(dr.distance / 1000.0, 2)) as total_km,
@@ -1574,7 +1699,7 @@ class IntelligentReasoning:
                     GROUP BY DATE_TRUNC('week', dr.from_tm)
                     ORDER BY week_start DESC
                     LIMIT 10;
-                """
+                """)
         
         print(f"❌ [DEBUG] No query generation logic found for intent: {intent}")
         return None
@@ -1854,34 +1979,34 @@ class IntelligentReasoning:
             return {'plant_name': plant_name} if plant_name else None
         return None
 
-    def generate_hierarchical_query(self, reasoning_result):
-        """Generate SQL queries for hierarchical relationships"""
+    def generate_hierarchical_query(self, reasoning_result) -> Optional[BoundQuery]:
+        """Generate SQL queries for hierarchical relationships (as bound registered statements)"""
         intent = reasoning_result['intent']
         extracted_data = reasoning_result['extracted_data']
         
         hierarchical_queries = {
-            'show_all_regions': lambda data: """
+            'show_all_regions': lambda data: statement_registry.bind('show_all_regions', """
                 SELECT DISTINCT dm.name as region_name, dm.id_no as region_id
                 FROM district_master dm 
                 WHERE dm.name IS NOT NULL AND dm.name != ''
                 ORDER BY dm.name
-            """,
+            """),
             
-            'show_all_zones': lambda data: """
+            'show_all_zones': lambda data: statement_registry.bind('show_all_zones', """
                 SELECT DISTINCT zm.zone_name, zm.id_no as zone_id
                 FROM zone_master zm 
                 WHERE zm.zone_name IS NOT NULL AND zm.zone_name != ''
                 ORDER BY zm.zone_name
-            """,
+            """),
             
-            'show_all_plants': lambda data: """
+            'show_all_plants': lambda data: statement_registry.bind('show_all_plants', """
                 SELECT DISTINCT hm.name as plant_name, hm.id_no as plant_id
                 FROM hosp_master hm 
                 WHERE hm.name IS NOT NULL AND hm.name != ''
                 ORDER BY hm.name
-            """,
+            """),
             
-            'get_zone_from_vehicle': lambda data: f"""
+            'get_zone_from_vehicle': lambda data: statement_registry.bind('get_zone_from_vehicle', """
                 SELECT 
                     CASE WHEN zm.zone_name = 'EONINFOTECH' THEN 'Inactive Region' ELSE zm.zone_name END as zone_name,
                     CASE WHEN dm.name = 'EONINFOTECH' THEN 'Inactive Region' ELSE dm.name END as district_name,
@@ -1896,10 +2021,10 @@ class IntelligentReasoning:
                 JOIN district_master dm ON zm.id_no = dm.id_zone 
                 JOIN hosp_master hm ON dm.id_no = hm.id_dist 
                 JOIN vehicle_master vm ON hm.id_no = vm.id_hosp 
-                WHERE vm.reg_no = '{data.get('vehicle_reg', '')}'
-            """,
+                WHERE vm.reg_no = $1
+            """, data.get('vehicle_reg', '')),
             
-            'get_region_from_vehicle': lambda data: f"""
+            'get_region_from_vehicle': lambda data: statement_registry.bind('get_region_from_vehicle', """
                 SELECT 
                     CASE WHEN dm.name = 'EONINFOTECH' THEN 'Inactive Region' ELSE dm.name END as region_name,
                     CASE WHEN hm.name ILIKE '%EON OFFICE%' THEN 'Removed Facility' ELSE hm.name END as plant_name, 
@@ -1912,17 +2037,17 @@ class IntelligentReasoning:
                 FROM district_master dm 
                 JOIN hosp_master hm ON dm.id_no = hm.id_dist 
                 JOIN vehicle_master vm ON hm.id_no = vm.id_hosp 
-                WHERE vm.reg_no = '{data.get('vehicle_reg', '')}'
-            """,
+                WHERE vm.reg_no = $1
+            """, data.get('vehicle_reg', '')),
             
-            'get_plant_from_vehicle': lambda data: f"""
+            'get_plant_from_vehicle': lambda data: statement_registry.bind('get_plant_from_vehicle', """
                 SELECT hm.name as plant_name, hm.address, vm.reg_no
                 FROM hosp_master hm 
                 JOIN vehicle_master vm ON hm.id_no = vm.id_hosp 
-                WHERE vm.reg_no = '{data.get('vehicle_reg', '')}'
-            """,
+                WHERE vm.reg_no = $1
+            """, data.get('vehicle_reg', '')),
             
-            'get_vehicles_in_zone': lambda data: f"""
+            'get_vehicles_in_zone': lambda data: statement_registry.bind('get_vehicles_in_zone', """
                 SELECT 
                     vm.reg_no, 
                     CASE WHEN hm.name ILIKE '%EON OFFICE%' THEN 'Removed Facility' ELSE hm.name END as plant_name, 
@@ -1936,12 +2061,12 @@ class IntelligentReasoning:
                 JOIN hosp_master hm ON vm.id_hosp = hm.id_no 
                 JOIN district_master dm ON hm.id_dist = dm.id_no 
                 JOIN zone_master zm ON dm.id_zone = zm.id_no 
-                WHERE zm.zone_name ILIKE '%{data.get('zone_name', '')}%'
-                   OR ('{data.get('zone_name', '').lower()}' IN ('eoninfotech', 'eon infotech') AND dm.name = 'EONINFOTECH')
+                WHERE zm.zone_name ILIKE '%' || $1::text || '%'
+                   OR (lower($1::text) IN ('eoninfotech', 'eon infotech') AND dm.name = 'EONINFOTECH')
                 ORDER BY vm.reg_no
-            """,
+            """, data.get('zone_name', '')),
             
-            'get_vehicles_in_region': lambda data: f"""
+            'get_vehicles_in_region': lambda data: statement_registry.bind('get_vehicles_in_region', """
                 SELECT 
                     vm.reg_no, 
                     CASE WHEN hm.name ILIKE '%EON OFFICE%' THEN 'Removed Facility' ELSE hm.name END as plant_name,
@@ -1953,12 +2078,12 @@ class IntelligentReasoning:
                 FROM vehicle_master vm 
                 JOIN hosp_master hm ON vm.id_hosp = hm.id_no 
                 JOIN district_master dm ON hm.id_dist = dm.id_no 
-                WHERE dm.name ILIKE '%{data.get('region_name', '')}%'
-                   OR ('{data.get('region_name', '').lower()}' IN ('eoninfotech', 'eon infotech') AND dm.name = 'EONINFOTECH')
+                WHERE dm.name ILIKE '%' || $1::text || '%'
+                   OR (lower($1::text) IN ('eoninfotech', 'eon infotech') AND dm.name = 'EONINFOTECH')
                 ORDER BY vm.reg_no
-            """,
+            """, data.get('region_name', '')),
             
-            'get_vehicles_in_plant': lambda data: f"""
+            'get_vehicles_in_plant': lambda data: statement_registry.bind('get_vehicles_in_plant', """
                 SELECT 
                     vm.reg_no, 
                     vm.regional_name,
@@ -1966,11 +2091,11 @@ class IntelligentReasoning:
                 FROM vehicle_master vm 
                 JOIN hosp_master hm ON vm.id_hosp = hm.id_no 
                 LEFT JOIN district_master dm ON hm.id_dist = dm.id_no
-                WHERE hm.name ILIKE '%{data.get('plant_name', '')}%'
+                WHERE hm.name ILIKE $1
                 ORDER BY vm.reg_no
-            """,
+            """, f"%{data.get('plant_name', '')}%"),
             
-            'get_vehicles_of_plant': lambda data: f"""
+            'get_vehicles_of_plant': lambda data: statement_registry.bind('get_vehicles_of_plant', """
                 SELECT 
                     vm.reg_no, 
                     vm.bus_id, 
@@ -1979,12 +2104,12 @@ class IntelligentReasoning:
                 FROM vehicle_master vm 
                 JOIN hosp_master hm ON vm.id_hosp = hm.id_no 
                 LEFT JOIN district_master dm ON hm.id_dist = dm.id_no
-                WHERE hm.name ILIKE '%{data.get('plant_name', '')}%'
+                WHERE hm.name ILIKE $1
                 ORDER BY vm.reg_no
                 LIMIT 50
-            """,
+            """, f"%{data.get('plant_name', '')}%"),
             
-            'get_vehicle_hierarchy': lambda data: f"""
+            'get_vehicle_hierarchy': lambda data: statement_registry.bind('get_vehicle_hierarchy', """
                 SELECT 
                     vm.reg_no, 
                     CASE WHEN hm.name ILIKE '%EON OFFICE%' THEN 'Removed Facility' ELSE hm.name END as plant_name, 
@@ -1999,10 +2124,10 @@ class IntelligentReasoning:
                 LEFT JOIN hosp_master hm ON vm.id_hosp = hm.id_no 
                 LEFT JOIN district_master dm ON hm.id_dist = dm.id_no 
                 LEFT JOIN zone_master zm ON dm.id_zone = zm.id_no 
-                WHERE vm.reg_no = '{data.get('vehicle_reg', '')}'
-            """,
+                WHERE vm.reg_no = $1
+            """, data.get('vehicle_reg', '')),
             
-            'get_vehicle_hierarchy_contextual': lambda data: f"""
+            'get_vehicle_hierarchy_contextual': lambda data: statement_registry.bind('get_vehicle_hierarchy_contextual', """
                 SELECT 
                     vm.reg_no, 
                     CASE WHEN hm.name ILIKE '%EON OFFICE%' THEN 'Removed Facility' ELSE hm.name END as plant_name, 
@@ -2010,13 +2135,13 @@ class IntelligentReasoning:
                 FROM vehicle_master vm 
                 LEFT JOIN hosp_master hm ON vm.id_hosp = hm.id_no 
                 LEFT JOIN district_master dm ON hm.id_dist = dm.id_no 
-                WHERE vm.reg_no = '{data.get('vehicle_reg', '')}'
-            """
+                WHERE vm.reg_no = $1
+            """, data.get('vehicle_reg', ''))
         }
         
         query_generator = hierarchical_queries.get(intent)
         if query_generator:
-            return query_generator(extracted_data).strip()
+            return query_generator(extracted_data)
         
         return None
 
@@ -2554,10 +2679,11 @@ class IntelligentReasoning:
         
         return None
 
-    def generate_dpr_sql(self, user_input, entities):
-        """Generate SQL for Daily Production Report queries"""
+    def generate_dpr_sql(self, user_input, entities) -> BoundQuery:
+        """Generate SQL for Daily Production Report queries (as a bound registered statement)"""
         query_type = self.detect_dpr_query_type(user_input)
         user_input_lower = user_input.lower()
+        params = ParamList()
         
         base_query = """
         SELECT 
@@ -2596,7 +2722,7 @@ class IntelligentReasoning:
                 # Extract customer name if mentioned
                 for entity in entities:
                     if entity.get('entity_type') == 'customer':
-                        conditions.append(f"dpr.cust_name ILIKE '%{entity['value']}%'")
+                        conditions.append(f"dpr.cust_name ILIKE {params.add('%' + str(entity['value']) + '%')}")
             
         elif query_type == 'transit_mixer':
             if 'utilization' in user_input_lower:
@@ -2610,7 +2736,7 @@ class IntelligentReasoning:
                 FROM dpr_master1 dpr
                 """
                 base_query += " GROUP BY dpr.tm_no ORDER BY delivery_count DESC"
-                return base_query
+                return statement_registry.bind('dpr_transit_mixer_utilization', base_query)
             
         elif query_type == 'sales_person':
             base_query = """
@@ -2628,7 +2754,7 @@ class IntelligentReasoning:
             LEFT JOIN hosp_master hm ON dpr.plant_id = hm.id_no
             """
             base_query += " GROUP BY dpr.fse_name, hm.name ORDER BY order_count DESC"
-            return base_query
+            return statement_registry.bind('dpr_sales_person_summary', base_query)
             
         elif query_type == 'pump_analysis':
             if 'vs' in user_input_lower or 'comparison' in user_input_lower:
@@ -2642,7 +2768,7 @@ class IntelligentReasoning:
                 FROM dpr_master1 dpr
                 """
                 base_query += " GROUP BY dpr.smode ORDER BY delivery_count DESC"
-                return base_query
+                return statement_registry.bind('dpr_service_mode_comparison', base_query)
         
         elif query_type == 'concrete_grade':
             if 'analysis' in user_input_lower or 'summary' in user_input_lower:
@@ -2656,18 +2782,22 @@ class IntelligentReasoning:
                 FROM dpr_master1 dpr
                 """
                 base_query += " GROUP BY dpr.grade ORDER BY order_count DESC"
-                return base_query
+                return statement_registry.bind('dpr_grade_summary', base_query)
         
         # Add date filters if date entities are found
         for entity in entities:
             if entity.get('entity_type') == 'date':
                 # Assuming there's a date column (you may need to adjust this)
-                conditions.append(f"DATE(dpr.created_date) = '{entity['value']}'")
+                if entity.get('range'):
+                    lower, upper = entity['range'].sql_bounds()
+                    conditions.append(f"dpr.created_date >= {params.add(lower)} AND dpr.created_date < {params.add(upper)}")
+                else:
+                    conditions.append(f"DATE(dpr.created_date) = {params.add(entity['value'])}")
         
         # Add plant filter if plant entity is found
         for entity in entities:
             if entity.get('entity_type') == 'plant':
-                conditions.append(f"hm.name ILIKE '%{entity['value']}%'")
+                conditions.append(f"hm.name ILIKE {params.add('%' + str(entity['value']) + '%')}")
         
         # Add vehicle filter if vehicle entity is found
         for entity in entities:
@@ -2682,11 +2812,11 @@ class IntelligentReasoning:
                 
                 if classification['type'] == 'dpr_id':
                     # This is a DPR ID - use direct lookup
-                    conditions.append(f"dpr.id_no = {vehicle_value}")
+                    conditions.append(f"dpr.id_no = {params.add(vehicle_value)}")
                     print(f"🔧 [DPR FIX] Using DPR ID search: {classification['suggested_query']} (Reason: {classification['reasoning']})")
                 else:
                     # This is a vehicle registration - use tm_no field
-                    conditions.append(classification['suggested_query'])
+                    conditions.append(f"dpr.tm_no ILIKE {params.add('%' + str(vehicle_value) + '%')}")
                     print(f"🔧 [DPR FIX] Using vehicle registration search: {classification['suggested_query']} (Reason: {classification['reasoning']})")
         
         # Add WHERE clause if conditions exist
@@ -2696,7 +2826,8 @@ class IntelligentReasoning:
         # Add default ordering
         base_query += " ORDER BY dpr.id_no DESC LIMIT 50"
         
-        return base_query
+        # One statement per combination of conditions - the values are bound
+        return statement_registry.bind(f"dpr_{query_type or 'general'}", base_query, *params)
 
     def distinguish_dpr_id_from_vehicle_reg(self, value):
         """
@@ -2791,10 +2922,11 @@ class IntelligentReasoning:
         
         return None
 
-    def generate_driver_sql(self, query_type, user_input, entities=None):
-        """Generate SQL for driver-related queries"""
+    def generate_driver_sql(self, query_type, user_input, entities=None) -> BoundQuery:
+        """Generate SQL for driver-related queries (as a bound registered statement)"""
         if entities is None:
             entities = []
+        params = ParamList()
         
         base_query = """
         SELECT 
@@ -2902,7 +3034,7 @@ class IntelligentReasoning:
                 WHERE dm.dt_of_birth IS NOT NULL
                 GROUP BY dm.gender
                 """
-                return base_query  # Special case - already complete
+                return statement_registry.bind('driver_demographics_summary', base_query)  # Special case - already complete
         
         elif query_type == 'service_duration':
             # Focus on service duration
@@ -2952,7 +3084,7 @@ class IntelligentReasoning:
                 GROUP BY dm.tshirt_size
                 ORDER BY dm.tshirt_size
                 """
-                return base_query  # Special case - already complete
+                return statement_registry.bind('driver_uniform_distribution', base_query)  # Special case - already complete
         
         elif query_type == 'driver_assignments':
             # Focus on driver assignments and scheduling
@@ -3067,22 +3199,23 @@ class IntelligentReasoning:
             if entity.get('entity_type') == 'driver_name':
                 name_parts = entity['value'].split()
                 if len(name_parts) == 1:
-                    conditions.append(f"(dm.first_name ILIKE '%{name_parts[0]}%' OR dm.last_name ILIKE '%{name_parts[0]}%')")
+                    name_param = params.add(f"%{name_parts[0]}%")
+                    conditions.append(f"(dm.first_name ILIKE {name_param} OR dm.last_name ILIKE {name_param})")
                 else:
-                    conditions.append(f"dm.first_name ILIKE '%{name_parts[0]}%' AND dm.last_name ILIKE '%{name_parts[-1]}%'")
+                    conditions.append(f"dm.first_name ILIKE {params.add(f'%{name_parts[0]}%')} AND dm.last_name ILIKE {params.add(f'%{name_parts[-1]}%')}")
             
             elif entity.get('entity_type') == 'plant':
-                conditions.append(f"hm.name ILIKE '%{entity['value']}%'")
+                conditions.append(f"hm.name ILIKE {params.add('%' + str(entity['value']) + '%')}")
             
             elif entity.get('entity_type') == 'driver_code':
-                conditions.append(f"dm.d_code ILIKE '%{entity['value']}%'")
+                conditions.append(f"dm.d_code ILIKE {params.add('%' + str(entity['value']) + '%')}")
             
             elif entity.get('entity_type') == 'license_number':
-                conditions.append(f"dm.lic_no ILIKE '%{entity['value']}%'")
+                conditions.append(f"dm.lic_no ILIKE {params.add('%' + str(entity['value']) + '%')}")
             
             elif entity.get('entity_type') == 'vehicle_number':
                 if query_type == 'driver_assignments':
-                    conditions.append(f"da.vehicle_no ILIKE '%{entity['value']}%'")
+                    conditions.append(f"da.vehicle_no ILIKE {params.add('%' + str(entity['value']) + '%')}")
             
             elif entity.get('entity_type') == 'assignment_status':
                 if query_type == 'driver_assignments':
@@ -3094,7 +3227,10 @@ class IntelligentReasoning:
             
             elif entity.get('entity_type') == 'date':
                 if query_type == 'driver_assignments':
-                    conditions.append(f"da.date_from <= '{entity['value']}' AND (da.date_to IS NULL OR da.date_to >= '{entity['value']}')")
+                    # Assignments overlapping the requested period
+                    first_day = entity['value']
+                    last_day = (entity['range'].end - timedelta(days=1)).strftime('%Y-%m-%d') if entity.get('range') else first_day
+                    conditions.append(f"da.date_from <= {params.add(last_day)} AND (da.date_to IS NULL OR da.date_to >= {params.add(first_day)})")
         
         # Add WHERE clause if conditions exist
         if conditions:
@@ -3103,7 +3239,8 @@ class IntelligentReasoning:
         # Add default ordering
         base_query += " ORDER BY dm.first_name, dm.last_name LIMIT 50"
         
-        return base_query
+        # One statement per combination of conditions - the values are bound
+        return statement_registry.bind(f"driver_{query_type or 'general'}", base_query, *params)
 
     def is_driver_related_query(self, user_input):
         """Check if the query is related to driver management"""
@@ -3322,36 +3459,15 @@ class IntelligentReasoning:
                     'confidence': 0.7
                 })
         
-        # Extract dates for assignment queries
-        date_patterns = [
-            r'\b(\d{4}-\d{2}-\d{2})\b',  # YYYY-MM-DD
-            r'\b(\d{2}-\d{2}-\d{4})\b',  # DD-MM-YYYY
-            r'\b(\d{1,2}/\d{1,2}/\d{4})\b',  # M/D/YYYY or MM/DD/YYYY
-            r'\btoday\b',
-            r'\byesterday\b',
-            r'\btomorrow\b'
-        ]
-        
-        for pattern in date_patterns:
-            matches = re.finditer(pattern, user_input, re.IGNORECASE)
-            for match in matches:
-                date_value = match.group(0).strip()
-                # Convert relative dates to actual dates
-                if date_value.lower() == 'today':
-                    from datetime import date
-                    date_value = date.today().strftime('%Y-%m-%d')
-                elif date_value.lower() == 'yesterday':
-                    from datetime import date, timedelta
-                    date_value = (date.today() - timedelta(days=1)).strftime('%Y-%m-%d')
-                elif date_value.lower() == 'tomorrow':
-                    from datetime import date, timedelta
-                    date_value = (date.today() + timedelta(days=1)).strftime('%Y-%m-%d')
-                
-                entities.append({
-                    'entity_type': 'date',
-                    'value': date_value,
-                    'confidence': 0.8
-                })
+        # Extract dates for assignment queries (same resolution as the SQL generators)
+        date_range = parse_date_range(user_input)
+        if date_range:
+            entities.append({
+                'entity_type': 'date',
+                'value': date_range.start.strftime('%Y-%m-%d'),
+                'range': date_range,
+                'confidence': 0.8
+            })
         
         return entities
 
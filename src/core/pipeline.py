@@ -0,0 +1,249 @@
+"""
+Query Pipeline
+==============
+
+english_to_sql used to run its stages one after another: the referential check
+(which can itself call the LLM), conversational context building, entity
+extraction, embedding-based table retrieval and then SQL generation. Most of
+them do not depend on each other, so the request is now described as a small
+DAG of named stages and run on shared thread pools:
+
+    history ──> referential
+    context ──> llm_inputs ──┬──> retrieval ───────┐
+                             └──> semantic_cache ──┤
+    fast_path ─────────────────────────────────────┴──> sql_generation (speculative)
+
+- a stage is submitted as soon as all of its dependencies have finished, so no
+  pool thread ever blocks waiting on another stage
+- stages that may block on the LLM (referential, sql_generation) run on their
+  own executor, so a slow or discarded LLM call - which keeps its thread until
+  it returns - never makes the cheap stages of other requests queue behind it
+- every stage runs in a copy of the caller's contextvars context, so the
+  request Deadline (and anything else published that way) is visible to it
+- speculative stages start before the caller knows it needs them; if the
+  caller takes another path it discards them and the result is never used
+- per-stage timings are recorded for each run and aggregated in get_status()
+
+The codebase is synchronous (psycopg2, the Gemini client, Flask/Streamlit), so
+stages run on threads rather than an asyncio loop.
+
+QUERY_PIPELINE_MODE=sequential runs each stage inline, on the caller's thread,
+the first time its result is asked for - stages the caller never needs do not
+run, which is the previous behaviour (useful for debugging and comparison).
+"""
+
+import os
+import time
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Sequence
+
+from src.core.deadline import DeadlineExceeded, resolve_deadline
+
+
+class PipelineRun:
+    """The stages of one request and their futures"""
+
+    def __init__(self, pipeline: 'QueryPipeline'):
+        self._pipeline = pipeline
+        self._futures: Dict[str, Future] = {}
+        self._speculative = set()
+        self._settled = set()       # speculative stages already counted as used or discarded
+        self._deferred = {}         # sequential mode: stage -> (func, deps) not run yet
+        self._lock = threading.Lock()
+        self.timings: Dict[str, float] = {}    # stage -> seconds spent running it
+        self.started_at = time.perf_counter()
+
+    def add(self, name: str, func: Callable, deps: Sequence[str] = (), speculative: bool = False,
+            blocking: bool = False) -> Future:
+        """
+        Schedule func(*dependency_results) to run once every stage in deps has
+        finished. A failed dependency fails this stage with the same exception.
+        blocking stages (LLM calls) run on the pipeline's LLM executor.
+        """
+        future = Future()
+        self._futures[name] = future
+        if speculative:
+            self._speculative.add(name)
+
+        if not self._pipeline.parallel:
+            # Run on first result() - stages nobody asks for never run
+            self._deferred[name] = (func, tuple(deps))
+            return future
+
+        dep_futures = [self._futures[dep] for dep in deps]
+        executor = self._pipeline.llm_executor if blocking else self._pipeline.executor
+        # One context copy per stage - a Context can only be entered by one thread at a time
+        context = contextvars.copy_context()
+
+        def launch():
+            if future.cancelled():
+                return
+            try:
+                args = [dep.result() for dep in dep_futures]
+            except BaseException as e:
+                future.set_exception(e)
+                return
+            executor.submit(context.run, self._run_stage, name, func, args, future)
+
+        if not dep_futures:
+            launch()
+            return future
+
+        remaining = [len(dep_futures)]
+
+        def on_dep_done(_):
+            with self._lock:
+                remaining[0] -= 1
+                ready = remaining[0] == 0
+            if ready:
+                launch()
+
+        for dep in dep_futures:
+            dep.add_done_callback(on_dep_done)
+        return future
+
+    def _run_deferred(self, name):
+        func, deps = self._deferred.pop(name)
+        future = self._futures[name]
+        try:
+            args = [self._wait(dep, None) for dep in deps]
+        except BaseException as e:
+            future.set_exception(e)
+            return
+        self._run_stage(name, func, args, future)
+
+    def _run_stage(self, name, func, args, future):
+        if not future.set_running_or_notify_cancel():
+            return
+        if name in self._speculative:
+            self._pipeline._count('speculative_started')
+        started = time.perf_counter()
+        try:
+            result = func(*args)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.timings[name] = elapsed
+            self._pipeline._record_stage(name, elapsed)
+
+    def result(self, name: str, deadline=None):
+        """Wait for a stage (bounded by the request deadline) and return its result"""
+        value = self._wait(name, resolve_deadline(deadline))
+        if name in self._speculative and self._settle(name):
+            self._pipeline._count('speculative_used')
+        return value
+
+    def _wait(self, name, deadline):
+        if name in self._deferred:
+            self._run_deferred(name)
+        timeout = deadline.remaining() if deadline else None
+        try:
+            return self._futures[name].result(timeout=timeout)
+        except FutureTimeoutError:
+            raise DeadlineExceeded(f"Request timed out after {deadline.budget:.1f}s waiting for {name}")
+
+    def _settle(self, name) -> bool:
+        """True the first time a speculative stage is used or discarded"""
+        with self._lock:
+            if name in self._settled:
+                return False
+            self._settled.add(name)
+            return True
+
+    def seconds(self, name: str) -> float:
+        with self._lock:
+            return self.timings.get(name, 0.0)
+
+    def discard(self, *names: str):
+        """The caller took another path - cancel these stages if not started, ignore them otherwise"""
+        for name in names:
+            future = self._futures.get(name)
+            if future is None:
+                continue
+            self._deferred.pop(name, None)
+            future.cancel()
+            if name in self._speculative and self._settle(name):
+                self._pipeline._count('speculative_discarded')
+
+    def finish(self, outcome: str):
+        """Record end-to-end latency; stages still running finish in the background"""
+        self.discard(*self._speculative)
+        elapsed = time.perf_counter() - self.started_at
+        self._pipeline._record_run(outcome, elapsed)
+        with self._lock:
+            stages = ', '.join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.timings.items())
+        print(f"⏱️ [PIPELINE] {outcome} in {elapsed * 1000:.0f}ms ({stages})")
+
+
+class QueryPipeline:
+    """Shared executors for english_to_sql stages and their aggregated timings"""
+
+    def __init__(self):
+        self.mode = os.getenv('QUERY_PIPELINE_MODE', 'parallel').lower()
+        self.max_workers = int(os.getenv('QUERY_PIPELINE_WORKERS', 8))
+        self.llm_workers = int(os.getenv('QUERY_PIPELINE_LLM_WORKERS', 16))
+        self.parallel = self.mode != 'sequential'
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="query_pipeline")
+        self.llm_executor = ThreadPoolExecutor(max_workers=self.llm_workers, thread_name_prefix="query_pipeline_llm")
+
+        self._lock = threading.Lock()
+        self.stats = {
+            'runs': 0,
+            'speculative_started': 0,
+            'speculative_used': 0,
+            'speculative_discarded': 0,
+            'outcomes': {},         # outcome -> runs
+        }
+        self.stage_timings = {}     # stage -> {'count': n, 'total_seconds': s}
+        self.run_seconds = 0.0
+
+    def start(self) -> PipelineRun:
+        return PipelineRun(self)
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _record_stage(self, name: str, seconds: float):
+        with self._lock:
+            entry = self.stage_timings.setdefault(name, {'count': 0, 'total_seconds': 0.0})
+            entry['count'] += 1
+            entry['total_seconds'] += seconds
+
+    def _record_run(self, outcome: str, seconds: float):
+        with self._lock:
+            self.stats['runs'] += 1
+            self.stats['outcomes'][outcome] = self.stats['outcomes'].get(outcome, 0) + 1
+            self.run_seconds += seconds
+
+    def get_status(self) -> dict:
+        with self._lock:
+            runs = self.stats['runs']
+            return {
+                'mode': self.mode,
+                'max_workers': self.max_workers,
+                'llm_workers': self.llm_workers,
+                'runs': runs,
+                'avg_run_ms': round(self.run_seconds / runs * 1000, 1) if runs else 0.0,
+                'outcomes': dict(self.stats['outcomes']),
+                'speculative_started': self.stats['speculative_started'],
+                'speculative_used': self.stats['speculative_used'],
+                'speculative_discarded': self.stats['speculative_discarded'],
+                'stages': {
+                    name: {
+                        'count': entry['count'],
+                        'avg_ms': round(entry['total_seconds'] / entry['count'] * 1000, 1) if entry['count'] else 0.0
+                    }
+                    for name, entry in self.stage_timings.items()
+                },
+            }
+
+
+# Global pipeline used by english_to_sql
+query_pipeline = QueryPipeline()
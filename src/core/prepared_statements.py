@@ -0,0 +1,196 @@
+"""
+Prepared Statement Registry
+===========================
+
+The reasoning, DPR, driver and stoppage SQL templates used to interpolate user
+values with f-strings, so every vehicle number or complaint id was a brand new
+statement for the planner (and an unescaped string inside the SQL). Templates
+now register named, parameterized statements ($1..$n placeholders) here and
+hand back a BoundQuery - the statement text plus the values to bind.
+
+Execution (DatabaseConnectionManager.execute_query_with_retry with params=...):
+- psycopg2 has no protocol-level prepare, so the registry issues
+  PREPARE name AS <sql> once per pooled connection (tracked by backend pid) and
+  runs EXECUTE name (%s, ...) with the bound values after that
+- a connection that lost its statements (reconnect, pid reuse) answers
+  EXECUTE with invalid_sql_statement_name; the statement is prepared again and
+  the EXECUTE retried once
+- EXECUTE cannot be declared as a cursor, so bound queries are not streamed
+
+The statement text is stable for a template, so the result cache keys on
+(statement text, params) and performance stats aggregate per template.
+"""
+
+import hashlib
+import re
+import threading
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple
+
+# invalid_sql_statement_name - EXECUTE of a statement this session never prepared
+UNKNOWN_STATEMENT_PGCODE = '26000'
+
+_PLACEHOLDER = re.compile(r'\$(\d+)')
+
+
+@dataclass(frozen=True)
+class PreparedStatement:
+    """A named statement with $1..$n placeholders"""
+    name: str
+    sql: str
+
+    @property
+    def server_name(self) -> str:
+        # Composed templates register one statement per condition shape - the
+        # text hash keeps their server-side names distinct
+        digest = hashlib.md5(self.sql.encode('utf-8')).hexdigest()[:8]
+        return f"chatbot_{self.name}_{digest}"
+
+    @property
+    def param_count(self) -> int:
+        return max((int(n) for n in _PLACEHOLDER.findall(self.sql)), default=0)
+
+    def prepare_sql(self) -> str:
+        return f"PREPARE {self.server_name} AS {self.sql}"
+
+    def execute_sql(self) -> str:
+        if not self.param_count:
+            return f"EXECUTE {self.server_name}"
+        placeholders = ', '.join(['%s'] * self.param_count)
+        return f"EXECUTE {self.server_name} ({placeholders})"
+
+
+@dataclass(frozen=True)
+class BoundQuery:
+    """A registered statement plus the values for its placeholders"""
+    name: str
+    sql: str
+    params: Tuple
+
+    def render(self) -> str:
+        """
+        The statement with its values quoted in - for logs, the UI and conversation
+        history only. Never executed.
+        """
+        def _literal(match):
+            index = int(match.group(1)) - 1
+            if index >= len(self.params):
+                return match.group(0)
+            value = self.params[index]
+            if value is None:
+                return 'NULL'
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return str(value)
+            return "'" + str(value).replace("'", "''") + "'"
+        return _PLACEHOLDER.sub(_literal, self.sql)
+
+
+class ParamList(list):
+    """Collects bind values while a statement is composed from optional conditions"""
+
+    def add(self, value) -> str:
+        """Append a value and return its placeholder"""
+        self.append(value)
+        return f"${len(self)}"
+
+
+def _normalize(sql: str) -> str:
+    # Templates are triple-quoted blocks; the trailing ';' is not allowed inside PREPARE
+    return sql.strip().rstrip(';').strip()
+
+
+class StatementRegistry:
+    """Named statements, and which pooled connections have prepared them"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_sql = {}           # statement text -> PreparedStatement
+        self._prepared = {}         # backend pid -> set of server names
+        self.stats = {
+            'prepares': 0,
+            'executions': 0,
+            'reprepares': 0,
+            'by_statement': {},     # name -> executions
+        }
+
+    def register(self, name: str, sql: str) -> PreparedStatement:
+        """Register (or look up) the statement for a template's text"""
+        sql = _normalize(sql)
+        with self._lock:
+            statement = self._by_sql.get(sql)
+            if statement is None:
+                statement = PreparedStatement(name, sql)
+                self._by_sql[sql] = statement
+            return statement
+
+    def bind(self, name: str, sql: str, *params) -> BoundQuery:
+        """Register the template if needed and bind values to its placeholders"""
+        statement = self.register(name, sql)
+        if len(params) != statement.param_count:
+            raise ValueError(
+                f"Statement '{name}' takes {statement.param_count} parameters, got {len(params)}"
+            )
+        return BoundQuery(statement.name, statement.sql, tuple(params))
+
+    def lookup(self, sql: str) -> Optional[PreparedStatement]:
+        with self._lock:
+            return self._by_sql.get(_normalize(sql))
+
+    def execute(self, cursor, sql: str, params: Sequence, reset=None):
+        """
+        Run a bound query on cursor as EXECUTE of its prepared statement, preparing
+        it on this connection first if needed.
+
+        reset() is called after the transaction had to be rolled back (statement
+        missing on the server) so the caller can restore per-transaction settings.
+        """
+        statement = self.lookup(sql) or self.register('adhoc', sql)
+        conn = cursor.connection
+        pid = conn.get_backend_pid()
+
+        if not self._is_prepared(pid, statement):
+            self._prepare(cursor, pid, statement)
+        try:
+            cursor.execute(statement.execute_sql(), tuple(params))
+        except Exception as e:
+            if getattr(e, 'pgcode', None) != UNKNOWN_STATEMENT_PGCODE:
+                raise
+            # Connection was replaced behind the same pid - prepare again
+            conn.rollback()
+            with self._lock:
+                self._prepared.pop(pid, None)
+                self.stats['reprepares'] += 1
+            if reset:
+                reset()
+            self._prepare(cursor, pid, statement)
+            cursor.execute(statement.execute_sql(), tuple(params))
+
+        with self._lock:
+            self.stats['executions'] += 1
+            by_statement = self.stats['by_statement']
+            by_statement[statement.name] = by_statement.get(statement.name, 0) + 1
+
+    def _is_prepared(self, pid, statement) -> bool:
+        with self._lock:
+            return statement.server_name in self._prepared.get(pid, ())
+
+    def _prepare(self, cursor, pid, statement):
+        cursor.execute(statement.prepare_sql())
+        with self._lock:
+            self._prepared.setdefault(pid, set()).add(statement.server_name)
+            self.stats['prepares'] += 1
+
+    def get_status(self) -> dict:
+        with self._lock:
+            return {
+                'statements': len(self._by_sql),
+                'connections_with_statements': len(self._prepared),
+                'prepares': self.stats['prepares'],
+                'executions': self.stats['executions'],
+                'reprepares': self.stats['reprepares'],
+                'by_statement': dict(self.stats['by_statement']),
+            }
+
+
+# Global registry shared by the SQL templates and the execution layer
+statement_registry = StatementRegistry()
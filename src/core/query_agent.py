@@ -1,14 +1,22 @@
-import google.generativeai as genai
 import os
 import json
 import re
 import sys
+import time
 sys.path.append('/home/linux/Documents/chatbot-diya')
 
 from dotenv import load_dotenv
 import datetime
 from decimal import Decimal
 from src.core.sql import get_full_schema, get_column_types, get_numeric_columns, DecimalEncoder
+from src.core.schema_catalog import schema_catalog, TEXT_TYPES, NUMERIC_TYPES
+from src.core.deadline import accepts_deadline
+from src.core.sql_rewrite import make_sargable
+from src.utils.date_range_parser import parse_date_range
+from src.core.template_fast_path import template_fast_path, FAST_PATH, LLM_PATH, FALLBACK_PATH
+from src.core.pipeline import query_pipeline
+from src.core.semantic_cache import semantic_cache, SEMANTIC_CACHE_PATH
+from src.api.llm_service import llm_client
 
 # Import embeddings functionality
 try:
@@ -96,8 +104,13 @@ except ImportError as e:
 
 load_dotenv()
 
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-model = genai.GenerativeModel("gemini-2.5-flash")
+def _llm_generate(prompt, deadline=None):
+    """
+    Gemini call through the shared LLM client: bounded by the request deadline
+    (or LLM_TIMEOUT_SECONDS outside a request), retried on 429 and subject to
+    the client's concurrency limit. Returns an object with .text.
+    """
+    return llm_client.generate(prompt, deadline=deadline)
 
 def schema_dict_to_prompt(schema_dict):
     """
@@ -106,9 +119,9 @@ def schema_dict_to_prompt(schema_dict):
     """
     lines = []
     
-    # Get column types for validation hints
+    # Get column types for validation hints from the shared catalog
     try:
-        column_types = get_column_types()
+        column_types = schema_catalog.get_column_types()
     except:
         column_types = {}
     
@@ -124,9 +137,9 @@ def schema_dict_to_prompt(schema_dict):
                 col_type = column_types.get(col_path, "unknown")
                 
                 # Add type warnings for common mistakes
-                if col_type in ['character varying', 'text', 'character']:
+                if col_type in TEXT_TYPES:
                     column_details.append(f"{col} (TEXT - use COUNT/MAX/MIN only, NOT SUM/AVG)")
-                elif col_type in ['integer', 'bigint', 'smallint', 'decimal', 'numeric', 'real', 'double precision', 'money']:
+                elif col_type in NUMERIC_TYPES:
                     column_details.append(f"{col} (NUMERIC - can use SUM/AVG/COUNT/MAX/MIN)")
                 else:
                     column_details.append(col)
@@ -136,10 +149,18 @@ def schema_dict_to_prompt(schema_dict):
             lines.append(f"  ⚠️  Use SUM/AVG ONLY on NUMERIC columns, never on TEXT columns!")
     return '\n'.join(lines)
 
-# Dynamically fetch schema at import time
-SCHEMA_DICT = get_full_schema()
+# Schema comes from the shared catalog; prompt is rebuilt whenever the catalog detects DDL changes
+SCHEMA_DICT = schema_catalog.get_schema_dict()
 SCHEMA_PROMPT = schema_dict_to_prompt(SCHEMA_DICT)
 
+def _refresh_schema_prompt(catalog):
+    global SCHEMA_DICT, SCHEMA_PROMPT
+    SCHEMA_DICT = catalog.get_schema_dict()
+    SCHEMA_PROMPT = schema_dict_to_prompt(SCHEMA_DICT)
+    print(f"🔄 Schema prompt rebuilt for catalog version {(catalog.version or 'unknown')[:8]}")
+
+schema_catalog.add_listener(_refresh_schema_prompt)
+
 # Initialize embeddings if available
 if EMBEDDINGS_AVAILABLE:
     try:
@@ -153,6 +174,22 @@ if EMBEDDINGS_AVAILABLE:
         print(f"⚠️ Failed to initialize embeddings: {e}")
         EMBEDDINGS_AVAILABLE = False
 
+def _date_range_guidance(prompt):
+    """
+    Prompt block pinning the question's time phrase to bounds resolved locally,
+    so "last week" means the same range whichever generator handles it.
+    """
+    date_range = parse_date_range(prompt)
+    if not date_range:
+        return ""
+    print(f"📅 Resolved '{date_range.phrase}' to {date_range.describe()}")
+    return f"""
+📅 **RESOLVED DATE RANGE** - "{date_range.phrase}" means {date_range.describe()}:
+- Filter the table's timestamp column with exactly: {date_range.sql_predicate('<timestamp_column>')}
+- Use these literal bounds as given; do NOT use DATE(), EXTRACT(), DATE_TRUNC() or CURRENT_DATE for this period
+"""
+
+
 def extract_json(response):
     try:
         match = re.search(r"{[\s\S]+}", response)
@@ -184,15 +221,47 @@ def validate_and_fix_sql(result):
         
     return result
 
-def english_to_sql(prompt, chat_context=None, session_id=None):
+def _template_answer(prompt, session_id, reasoning_result, bound_query, answered_by):
     """
-    🧠 CONVERSATIONAL AI-FIRST APPROACH: Enhanced with conversation memory and context understanding
+    Response for a question answered from an IntelligentReasoning SQL template.
+    
+    'sql' is the statement with its values quoted in (display, history and callers
+    that run plain SQL); 'statement' carries the registered $n text and params so
+    the API can execute it as a prepared statement.
     """
+    display_sql = bound_query.render()
+    print(f"🎯 Generated intelligent SQL ({bound_query.name}): {display_sql.strip()}")
     
-    # 🚀 AI-FIRST: Check if this is a referential query to previous results
-    from src.nlp.sentence_embeddings import conversation_chain, detect_referential_query_ai
+    # Create intelligent response
+    intelligent_response = intelligent_reasoning.create_intelligent_response(
+        reasoning_result, {'sql': display_sql}
+    )
+    
+    # Update conversational context for successful queries
+    if session_id and sentence_embedding_manager:
+        entities = sentence_embedding_manager.extract_conversational_entities(prompt)
+        sentence_embedding_manager.update_conversation_context(session_id, prompt, entities)
     
-    # Build conversation history for AI analysis
+    return {
+        "sql": display_sql,
+        "statement": {"sql": bound_query.sql, "params": list(bound_query.params)},
+        "response": intelligent_response,
+        "follow_up": None,
+        "reasoning_applied": True,
+        "reasoning_type": reasoning_result['reasoning_type'],
+        "answered_by": answered_by
+    }
+
+
+# Format/display requests re-render the last result instead of querying
+FORMAT_REQUEST_PATTERN = re.compile(
+    r'\b(format|clean|style|tabular|bullets|rewrite|shorter|rephrase|reword|simplify|again|visual|text-based|in text|as table|re-display)\b',
+    re.IGNORECASE
+)
+
+
+def _conversation_history(session_id):
+    """Recent user messages of the session, for the referential check"""
     conversation_history = []
     if session_id and CONVERSATIONAL_AI_AVAILABLE and sentence_embedding_manager:
         try:
@@ -200,9 +269,173 @@ def english_to_sql(prompt, chat_context=None, session_id=None):
             conversation_history = [h['user_message'] for h in history if h.get('user_message')]
         except:
             pass
+    return conversation_history
+
+
+def _conversational_analysis(prompt, session_id):
+    """Conversation context prompt, extracted entities and whether this is a follow-up"""
+    conversation_context = ""
+    entities_extracted = {}
+    is_followup = False
     
-    # Use AI to detect referential intent (NO rigid patterns)
-    referential_analysis = detect_referential_query_ai(prompt, conversation_history)
+    if CONVERSATIONAL_AI_AVAILABLE and sentence_embedding_manager and session_id:
+        try:
+            # Get conversational context
+            conversation_context = sentence_embedding_manager.generate_conversational_context_prompt(session_id, prompt)
+            entities_extracted = sentence_embedding_manager.extract_conversational_entities(prompt, 
+                sentence_embedding_manager.get_or_create_conversation_session(session_id))
+            is_followup = entities_extracted.get('is_followup', False)
+            
+            print(f"🧠 [CONVERSATIONAL] Session: {session_id}")
+            print(f"🧠 [CONVERSATIONAL] Entities extracted: {entities_extracted}")
+            print(f"🧠 [CONVERSATIONAL] Is follow-up: {is_followup}")
+            
+        except Exception as e:
+            print(f"⚠️ [CONVERSATIONAL] Error in conversational analysis: {e}")
+    
+    return conversation_context, entities_extracted, is_followup
+
+
+def _llm_inputs(prompt, chat_context, analysis):
+    """The (enhanced_prompt, context_info) pair the LLM is asked with"""
+    conversation_context, entities_extracted, is_followup = analysis
+    print(f"🧠 [AI-FIRST] Analyzing user intent with conversational context: '{prompt}'")
+    
+    # Build enhanced context for LLM with conversation awareness
+    context_info = conversation_context if conversation_context else ""
+    enhanced_prompt = prompt
+    
+    # 🧠 CONVERSATIONAL ENHANCEMENT: Modify prompt based on entities and context
+    if is_followup and entities_extracted:
+        # Handle follow-up queries by inheriting context
+        inherited_context = []
+        
+        if entities_extracted.get('vehicle'):
+            inherited_context.append(f"Vehicle: {entities_extracted['vehicle']}")
+        elif entities_extracted.get('is_reference', False):
+            inherited_context.append("Vehicle: (reference to previous vehicle)")
+        
+        if entities_extracted.get('date'):
+            if entities_extracted['date'].get('type') == 'reference':
+                inherited_context.append("Date: (reference to previous date)")
+            else:
+                inherited_context.append(f"Date: {json.dumps(entities_extracted['date'])}")
+        
+        if entities_extracted.get('report_type'):
+            inherited_context.append(f"Report type: {entities_extracted['report_type']}")
+        
+        if inherited_context:
+            enhanced_prompt = f"{prompt} [CONTEXT: {'; '.join(inherited_context)}]"
+            print(f"🧠 [CONVERSATIONAL] Enhanced prompt: {enhanced_prompt}")
+    
+    if chat_context:
+        context_info = chat_context.get_context_for_llm(prompt)
+        
+        # Handle ordinal references like "1st", "2nd", etc.
+        ordinal_match = re.search(r'\b(\d+)(?:st|nd|rd|th)\b', prompt, re.IGNORECASE)
+        if ordinal_match and chat_context.last_displayed_items:
+            ordinal_num = int(ordinal_match.group(1))
+            if 1 <= ordinal_num <= len(chat_context.last_displayed_items):
+                target_item = chat_context.last_displayed_items[ordinal_num - 1]
+                entity = "item"
+                
+                # Find primary identifier
+                primary_id = None
+                for key in ['registration_number', 'reg_no', 'vehicle_id', 'id', 'name']:
+                    if key in target_item:
+                        primary_id = target_item[key]
+                        break
+                
+                if primary_id:
+                    enhanced_prompt = f"{prompt} (specifically for {entity} with identifier: {primary_id})"
+                    print(f"🎯 Enhanced prompt with ordinal reference: {enhanced_prompt}")
+    
+    return enhanced_prompt, context_info
+
+
+def _is_bare_question(prompt, llm_inputs, analysis):
+    """
+    True when the LLM is asked the question exactly as written - no inherited
+    follow-up context or ordinal lookup was added - so its SQL depends on the
+    question alone and may be shared through the semantic cache
+    """
+    enhanced_prompt, _ = llm_inputs
+    _, entities_extracted, is_followup = analysis
+    return enhanced_prompt == prompt and not is_followup and not entities_extracted.get('is_reference')
+
+
+def _pipeline_outcome(result):
+    """Short label for how english_to_sql answered, for the pipeline stats"""
+    if not isinstance(result, dict):
+        return 'none'
+    if result.get('answered_by'):
+        return result['answered_by']
+    if result.get('entities', {}).get('is_referential'):
+        return 'referential'
+    return 'sql' if result.get('sql') else 'no_sql'
+
+
+@accepts_deadline
+def english_to_sql(prompt, chat_context=None, session_id=None):
+    """
+    🧠 CONVERSATIONAL AI-FIRST APPROACH: Enhanced with conversation memory and context understanding
+
+    The stages run as a DAG on the query pipeline: the referential check runs
+    alongside context building, the fast path, the semantic cache lookup and
+    table retrieval. LLM SQL generation waits for the LLM inputs, retrieval, the
+    fast path and the cache lookup and only calls the LLM if neither the fast
+    path nor the cache answers; it does not wait for the referential decision,
+    so it runs speculatively and is discarded when a follow-up is answered from
+    the previous result.
+    """
+    run = query_pipeline.start()
+    result = None
+    try:
+        result = _english_to_sql(run, prompt, chat_context, session_id)
+        return result
+    finally:
+        run.finish(_pipeline_outcome(result) if result is not None else 'error')
+
+
+def _english_to_sql(run, prompt, chat_context, session_id):
+    # 🚀 AI-FIRST: Check if this is a referential query to previous results
+    from src.nlp.sentence_embeddings import conversation_chain, detect_referential_query_ai
+    
+    is_format_request = bool(FORMAT_REQUEST_PATTERN.search(prompt))
+    use_fast_path = bool(intelligent_reasoning and chat_context)
+    
+    def llm_sql(llm_inputs, relevant_schema_text):
+        enhanced_prompt, context_info = llm_inputs
+        return generate_sql_with_llm(enhanced_prompt, context_info, chat_context,
+                                     relevant_schema_text=relevant_schema_text)
+    
+    def speculative_sql(llm_inputs, relevant_schema_text, fast_path_decision, cache_hit):
+        # Only worth an LLM call if neither the format handler, the fast path nor the cache will answer
+        if is_format_request or template_fast_path.answers(fast_path_decision) or cache_hit:
+            return None
+        return llm_sql(llm_inputs, relevant_schema_text)
+    
+    def cache_lookup(llm_inputs, analysis):
+        # Stored SQL only answers questions that reach the LLM unchanged
+        if is_format_request or not _is_bare_question(prompt, llm_inputs, analysis):
+            return None
+        return semantic_cache.lookup(prompt)
+    
+    # Local classifier decides; the LLM is only consulted for uncertain scores
+    run.add('history', lambda: _conversation_history(session_id))
+    run.add('referential', lambda history: detect_referential_query_ai(prompt, history), deps=('history',),
+            blocking=True)
+    run.add('context', lambda: _conversational_analysis(prompt, session_id))
+    run.add('fast_path', lambda: template_fast_path.evaluate(prompt, chat_context, session_id, intelligent_reasoning)
+            if use_fast_path else None)
+    run.add('llm_inputs', lambda analysis: _llm_inputs(prompt, chat_context, analysis), deps=('context',))
+    run.add('semantic_cache', cache_lookup, deps=('llm_inputs', 'context'))
+    run.add('retrieval', lambda llm_inputs: retrieve_relevant_schema(llm_inputs[0]), deps=('llm_inputs',))
+    run.add('sql_generation', speculative_sql, deps=('llm_inputs', 'retrieval', 'fast_path', 'semantic_cache'),
+            speculative=True, blocking=True)
+    
+    conversation_history = run.result('history')
+    referential_analysis = run.result('referential')
     
     if referential_analysis.get('is_referential', False) and referential_analysis.get('confidence', 0) > 0.7:
         print(f"🧠 [AI-REFERENTIAL] Detected follow-up query with confidence {referential_analysis.get('confidence', 0):.2f}")
@@ -216,6 +449,7 @@ def english_to_sql(prompt, chat_context=None, session_id=None):
         
         if ai_result:
             print(f"✅ [AI-REFERENTIAL] Successfully processed follow-up query")
+            run.discard('sql_generation')
             
             # Store this follow-up interaction
             if CONVERSATIONAL_AI_AVAILABLE and sentence_embedding_manager and session_id:
@@ -251,28 +485,11 @@ def english_to_sql(prompt, chat_context=None, session_id=None):
             
             return formatted_result
     
-    # 🧠 CONVERSATIONAL AI: Initialize conversation context
-    conversation_context = ""
-    entities_extracted = {}
-    is_followup = False
-    
-    if CONVERSATIONAL_AI_AVAILABLE and sentence_embedding_manager and session_id:
-        try:
-            # Get conversational context
-            conversation_context = sentence_embedding_manager.generate_conversational_context_prompt(session_id, prompt)
-            entities_extracted = sentence_embedding_manager.extract_conversational_entities(prompt, 
-                sentence_embedding_manager.get_or_create_conversation_session(session_id))
-            is_followup = entities_extracted.get('is_followup', False)
-            
-            print(f"🧠 [CONVERSATIONAL] Session: {session_id}")
-            print(f"🧠 [CONVERSATIONAL] Entities extracted: {entities_extracted}")
-            print(f"🧠 [CONVERSATIONAL] Is follow-up: {is_followup}")
-            
-        except Exception as e:
-            print(f"⚠️ [CONVERSATIONAL] Error in conversational analysis: {e}")
+    # 🧠 CONVERSATIONAL AI: conversation context built by the pipeline's context stage
+    conversation_context, entities_extracted, is_followup = run.result('context')
     
     # 🔄 FORMAT/DISPLAY REQUESTS - Handle immediately 
-    if re.search(r'\b(format|clean|style|tabular|bullets|rewrite|shorter|rephrase|reword|simplify|again|visual|text-based|in text|as table|re-display)\b', prompt, re.IGNORECASE):
+    if is_format_request:
         last_data = chat_context.last_result if chat_context else None
         if not last_data:
             return {
@@ -298,66 +515,61 @@ def english_to_sql(prompt, chat_context=None, session_id=None):
                 "entities": entities_extracted
             }
     
+    # ⚡ TEMPLATE FAST PATH: confident intents with a hand-written SQL template skip the LLM
+    if use_fast_path:
+        fast_path_decision = run.result('fast_path')
+        fast_path_started = time.perf_counter()
+        fast_path = template_fast_path.record(fast_path_decision)
+        if fast_path:
+            result = _template_answer(prompt, session_id, fast_path['reasoning_result'], fast_path['sql'], FAST_PATH)
+            template_fast_path.record_answer(FAST_PATH, run.seconds('fast_path') + time.perf_counter() - fast_path_started)
+            return result
+    
+    # 🧩 SEMANTIC CACHE: a near-duplicate question already answered by the LLM reuses its SQL
+    cache_hit = run.result('semantic_cache')
+    is_referential = referential_analysis.get('is_referential', False)
+    cache_rejected = bool(cache_hit) and is_referential
+    if cache_rejected:
+        # A follow-up the referential handler could not answer - it needs the LLM with context
+        print(f"🧩 [SEMANTIC-CACHE] Ignoring hit for referential query")
+        cache_hit = None
+    if cache_hit:
+        template_fast_path.record_answer(SEMANTIC_CACHE_PATH, run.seconds('semantic_cache'))
+        if session_id and sentence_embedding_manager:
+            entities = sentence_embedding_manager.extract_conversational_entities(prompt)
+            sentence_embedding_manager.update_conversation_context(session_id, prompt, entities)
+        return {
+            "sql": cache_hit['sql'],
+            "response": "Sure, let me get that for you.",
+            "follow_up": None,
+            "answered_by": SEMANTIC_CACHE_PATH,
+            "semantic_cache": {
+                "matched_query": cache_hit['matched_query'],
+                "similarity": cache_hit['similarity'],
+                "rebound": cache_hit['rebound'],
+                "pattern_sql": cache_hit['pattern_sql']
+            }
+        }
+    
     # 🎯 CONVERSATIONAL AI-FIRST INTENT ANALYSIS
     # Let the LLM understand what the user wants with full conversation context
     try:
-        print(f"🧠 [AI-FIRST] Analyzing user intent with conversational context: '{prompt}'")
-        
-        # Build enhanced context for LLM with conversation awareness
-        context_info = conversation_context if conversation_context else ""
-        enhanced_prompt = prompt
-        
-        # 🧠 CONVERSATIONAL ENHANCEMENT: Modify prompt based on entities and context
-        if is_followup and entities_extracted:
-            # Handle follow-up queries by inheriting context
-            inherited_context = []
-            
-            if entities_extracted.get('vehicle'):
-                inherited_context.append(f"Vehicle: {entities_extracted['vehicle']}")
-            elif entities_extracted.get('is_reference', False):
-                inherited_context.append("Vehicle: (reference to previous vehicle)")
-            
-            if entities_extracted.get('date'):
-                if entities_extracted['date'].get('type') == 'reference':
-                    inherited_context.append("Date: (reference to previous date)")
-                else:
-                    inherited_context.append(f"Date: {json.dumps(entities_extracted['date'])}")
-            
-            if entities_extracted.get('report_type'):
-                inherited_context.append(f"Report type: {entities_extracted['report_type']}")
-            
-            if inherited_context:
-                enhanced_prompt = f"{prompt} [CONTEXT: {'; '.join(inherited_context)}]"
-                print(f"🧠 [CONVERSATIONAL] Enhanced prompt: {enhanced_prompt}")
-        
-        if chat_context:
-            context_info = chat_context.get_context_for_llm(prompt)
-            
-            # Handle ordinal references like "1st", "2nd", etc.
-            ordinal_match = re.search(r'\b(\d+)(?:st|nd|rd|th)\b', prompt, re.IGNORECASE)
-            if ordinal_match and chat_context.last_displayed_items:
-                ordinal_num = int(ordinal_match.group(1))
-                if 1 <= ordinal_num <= len(chat_context.last_displayed_items):
-                    target_item = chat_context.last_displayed_items[ordinal_num - 1]
-                    entity = "item"
-                    
-                    # Find primary identifier
-                    primary_id = None
-                    for key in ['registration_number', 'reg_no', 'vehicle_id', 'id', 'name']:
-                        if key in target_item:
-                            primary_id = target_item[key]
-                            break
-                    
-                    if primary_id:
-                        enhanced_prompt = f"{prompt} (specifically for {entity} with identifier: {primary_id})"
-                        print(f"🎯 Enhanced prompt with ordinal reference: {enhanced_prompt}")
-        
-        # Get the actual LLM analysis
-        llm_result = generate_sql_with_llm(enhanced_prompt, context_info, chat_context)
+        # Get the actual LLM analysis - started speculatively by the pipeline (which
+        # skipped it if the cache had a hit we then rejected)
+        if cache_rejected:
+            llm_result = llm_sql(run.result('llm_inputs'), run.result('retrieval'))
+        else:
+            llm_result = run.result('sql_generation')
         
         # ✅ If LLM successfully understands and generates SQL, use it
         if llm_result and llm_result.get('sql'):
             print(f"✅ [AI-FIRST] LLM successfully generated SQL")
+            template_fast_path.record_answer(LLM_PATH, run.seconds('retrieval') + run.seconds('sql_generation'))
+            llm_result['answered_by'] = LLM_PATH
+            # The API layer stores the SQL in the semantic cache only for self-contained questions
+            llm_result['semantic_cacheable'] = not is_referential and _is_bare_question(
+                prompt, run.result('llm_inputs'), run.result('context')
+            )
             
             # 🚀 STORE RESULTS IN CONVERSATION CHAIN for follow-up queries
             try:
@@ -392,27 +604,9 @@ def english_to_sql(prompt, chat_context=None, session_id=None):
             print(f"📊 Extracted data: {reasoning_result['extracted_data']}")
             
             # Generate intelligent SQL query
-            intelligent_sql = intelligent_reasoning.generate_intelligent_query(reasoning_result)
-            if intelligent_sql:
-                print(f"🎯 Generated intelligent SQL: {intelligent_sql.strip()}")
-                
-                # Create intelligent response
-                intelligent_response = intelligent_reasoning.create_intelligent_response(
-                    reasoning_result, {'sql': intelligent_sql}
-                )
-                
-                # Update conversational context for successful queries
-                if session_id and sentence_embedding_manager:
-                    entities = sentence_embedding_manager.extract_conversational_entities(prompt)
-                    sentence_embedding_manager.update_conversation_context(session_id, prompt, entities)
-                
-                return {
-                    "sql": intelligent_sql,
-                    "response": intelligent_response,
-                    "follow_up": None,
-                    "reasoning_applied": True,
-                    "reasoning_type": reasoning_result['reasoning_type']
-                }
+            bound_query = intelligent_reasoning.generate_intelligent_query(reasoning_result)
+            if bound_query:
+                return _template_answer(prompt, session_id, reasoning_result, bound_query, FALLBACK_PATH)
     
     # 🎯 ENHANCED PRONOUN RESOLUTION FALLBACK
     if pronoun_resolver and chat_context:
@@ -457,7 +651,73 @@ def english_to_sql(prompt, chat_context=None, session_id=None):
     }
 
 
-def generate_sql_with_llm(prompt, context_info, chat_context=None):
+def retrieve_relevant_schema(prompt):
+    """
+    Schema text for the LLM prompt: the tables the embeddings (re-ranked by the
+    enhanced table mapper) consider relevant, or the full schema as a fallback.
+    """
+    # 🚀 ENHANCED EMBEDDING PROCESSING with Advanced Table Mapping and Database Reference
+    relevant_schema_text = SCHEMA_PROMPT  # Default fallback
+    
+    if EMBEDDINGS_AVAILABLE and embedding_manager:
+        try:
+            print(f"🎯 Analyzing query with enhanced mapping: '{prompt[:50]}...'")
+            
+            # STEP 1: Get embedding results (existing system)
+            embedding_results = embedding_manager.find_relevant_tables(prompt, top_k=15)  # Get more candidates
+            
+            # STEP 2: Apply enhanced table mapping
+            if enhanced_table_mapper and embedding_results:
+                print(f"🔧 Applying enhanced table mapping...")
+                
+                # Extract available table names from schema
+                available_tables = []
+                if 'public' in SCHEMA_DICT:
+                    available_tables = [f"public.{table}" for table in SCHEMA_DICT['public'].keys()]
+                
+                # Use enhanced mapper to re-rank tables
+                enhanced_results = enhanced_table_mapper.rank_tables(prompt, embedding_results, available_tables)
+                
+                if enhanced_results:
+                    print(f"📊 Enhanced mapping: Found {len(enhanced_results)} optimized tables")
+                    relevant_tables = [(table, score, reason) for table, score, reason in enhanced_results]
+                else:
+                    print(f"📊 Fallback to embeddings: {len(embedding_results)} tables")
+                    relevant_tables = embedding_results
+            else:
+                print(f"📊 Using embeddings with database reference: {len(embedding_results)} tables")
+                relevant_tables = embedding_results
+            
+            if relevant_tables:
+                # Build focused schema text with only relevant tables
+                focused_schema = []
+                for i, table_info in enumerate(relevant_tables):
+                    try:
+                        if len(table_info) >= 3:
+                            table_key, similarity, reason = table_info
+                        else:
+                            table_key, similarity = table_info[:2]
+                            reason = "embedding/reference"
+                        
+                        schema_name, table_name = table_key.split('.', 1)
+                        if schema_name in SCHEMA_DICT and table_name in SCHEMA_DICT[schema_name]:
+                            columns = SCHEMA_DICT[schema_name][table_name]
+                            focused_schema.append(f"- {table_key}({', '.join(columns)})")
+                            print(f"  • {table_key} (relevance: {similarity:.3f}, {reason}) - Columns: {len(columns)}")
+                    except Exception as e:
+                        print(f"⚠️ Error processing table {table_key}: {e}")
+                
+                if focused_schema:
+                    relevant_schema_text = "Most relevant tables for your query:\n" + "\n".join(focused_schema)
+                    print(f"✅ Using enhanced schema with {len(focused_schema)} tables instead of all {len(SCHEMA_DICT.get('public', {}))} tables")
+                    
+        except Exception as e:
+            print(f"⚠️ Enhanced mapping error: {e}, falling back to full schema")
+
+    return relevant_schema_text
+
+
+def generate_sql_with_llm(prompt, context_info, chat_context=None, relevant_schema_text=None):
     """
     🚀 TWO-STAGE APPROACH: Generate simple SQL, then apply formatting in post-processing
     Stage 1: Simple, raw SQL generation (avoid complex formatting in SQL)
@@ -512,6 +772,8 @@ def generate_sql_with_llm(prompt, context_info, chat_context=None):
     else:
         history_text = ""
 
+    date_guidance = _date_range_guidance(prompt)
+
     # 🏭 STRICT HIERARCHICAL PLANT GUIDANCE 
     if re.search(r'\b(plant|site|facility|factory|location|mohali|ludhiana|derabassi|punjab|gujarat|maharashtra)\b', prompt, re.IGNORECASE):
         plant_guidance = """
@@ -998,7 +1260,7 @@ MANDATORY QUERY RULES:
 - CRITICAL: Format ALL datetime/timestamp columns using TO_CHAR() for user-friendly display (e.g., TO_CHAR(from_tm, 'DD Mon YYYY HH24:MI') as start_time)
 - NEVER return raw ISO datetime formats - always apply user-friendly formatting
 - Never exceed 50 rows in any single query result
-
+{date_guidance}
 Context:
 {history_text}
 
@@ -1012,7 +1274,7 @@ Generate a JSON response with this exact structure:
 """
 
     try:
-        response = model.generate_content(full_prompt).text
+        response = _llm_generate(full_prompt).text
         result = extract_json(response)
         
         # 🚨 CRITICAL: Validate and fix distance report queries
@@ -1110,6 +1372,9 @@ Generate a JSON response with this exact structure:
                 sql += ' LIMIT 50'
                 result['sql'] = sql
                 print("🔧 Added LIMIT 50 to query for performance")
+            
+            # Keep date filters index-friendly (DATE(from_tm) = ... -> from_tm range)
+            result['sql'] = make_sargable(result['sql'])
         
         return result
     except Exception as e:
@@ -1177,7 +1442,7 @@ LIMIT 50;
 3. **NO ROUND()** - Causes PostgreSQL errors
 4. **NO TO_CHAR()** - Raw timestamps are fine
 5. **ALWAYS LIMIT 50** - Performance requirement
-
+{_date_range_guidance(prompt)}
 User Request: {prompt}
 
 Generate a JSON response:
@@ -1189,7 +1454,7 @@ Generate a JSON response:
 """
     
     try:
-        response = model.generate_content(simple_prompt).text
+        response = _llm_generate(simple_prompt).text
         result = extract_json(response)
         
         # Ensure LIMIT is present
@@ -1197,7 +1462,7 @@ Generate a JSON response:
             sql = result['sql']
             if 'SELECT' in sql.upper() and 'LIMIT' not in sql.upper():
                 sql += ' LIMIT 50'
-                result['sql'] = sql
+            result['sql'] = make_sargable(sql)
         
         # Mark that this result needs post-processing formatting
         if result:
@@ -1939,63 +2204,9 @@ Current query context analysis:
 6. ALWAYS apply both conversion formulas in every distance query
 """
 
-    # 🚀 ENHANCED EMBEDDING PROCESSING with Advanced Table Mapping and Database Reference
-    relevant_schema_text = SCHEMA_PROMPT  # Default fallback
-    
-    if EMBEDDINGS_AVAILABLE and embedding_manager:
-        try:
-            print(f"🎯 Analyzing query with enhanced mapping: '{prompt[:50]}...'")
-            
-            # STEP 1: Get embedding results (existing system)
-            embedding_results = embedding_manager.find_relevant_tables(prompt, top_k=15)  # Get more candidates
-            
-            # STEP 2: Apply enhanced table mapping
-            if enhanced_table_mapper and embedding_results:
-                print(f"🔧 Applying enhanced table mapping...")
-                
-                # Extract available table names from schema
-                available_tables = []
-                if 'public' in SCHEMA_DICT:
-                    available_tables = [f"public.{table}" for table in SCHEMA_DICT['public'].keys()]
-                
-                # Use enhanced mapper to re-rank tables
-                enhanced_results = enhanced_table_mapper.rank_tables(prompt, embedding_results, available_tables)
-                
-                if enhanced_results:
-                    print(f"📊 Enhanced mapping: Found {len(enhanced_results)} optimized tables")
-                    relevant_tables = [(table, score, reason) for table, score, reason in enhanced_results]
-                else:
-                    print(f"📊 Fallback to embeddings: {len(embedding_results)} tables")
-                    relevant_tables = embedding_results
-            else:
-                print(f"📊 Using embeddings with database reference: {len(embedding_results)} tables")
-                relevant_tables = embedding_results
-            
-            if relevant_tables:
-                # Build focused schema text with only relevant tables
-                focused_schema = []
-                for i, table_info in enumerate(relevant_tables):
-                    try:
-                        if len(table_info) >= 3:
-                            table_key, similarity, reason = table_info
-                        else:
-                            table_key, similarity = table_info[:2]
-                            reason = "embedding/reference"
-                        
-                        schema_name, table_name = table_key.split('.', 1)
-                        if schema_name in SCHEMA_DICT and table_name in SCHEMA_DICT[schema_name]:
-                            columns = SCHEMA_DICT[schema_name][table_name]
-                            focused_schema.append(f"- {table_key}({', '.join(columns)})")
-                            print(f"  • {table_key} (relevance: {similarity:.3f}, {reason}) - Columns: {len(columns)}")
-                    except Exception as e:
-                        print(f"⚠️ Error processing table {table_key}: {e}")
-                
-                if focused_schema:
-                    relevant_schema_text = "Most relevant tables for your query:\n" + "\n".join(focused_schema)
-                    print(f"✅ Using enhanced schema with {len(focused_schema)} tables instead of all {len(SCHEMA_DICT.get('public', {}))} tables")
-                    
-        except Exception as e:
-            print(f"⚠️ Enhanced mapping error: {e}, falling back to full schema")
+    # 🚀 ENHANCED EMBEDDING PROCESSING - done by the pipeline's retrieval stage when it ran ahead
+    if relevant_schema_text is None:
+        relevant_schema_text = retrieve_relevant_schema(prompt)
 
     schema_text = relevant_schema_text
 
@@ -2479,7 +2690,7 @@ User: {enhanced_prompt}
 
 
     try:
-        response = model.generate_content(full_prompt).text
+        response = _llm_generate(full_prompt).text
         return extract_json(response)
     except Exception:
         return {
@@ -2489,6 +2700,7 @@ User: {enhanced_prompt}
             "follow_up": None
         }
 
+@accepts_deadline
 def generate_final_response(user_question, columns, rows, chat_context=None):
     # Map specific database column names to meaningful business-friendly display names
     # AI handles the rest automatically using smart snake_case to Title Case conversion
@@ -2682,7 +2894,7 @@ Return your answer in the most appropriate format as described above.
 """
 
     try:
-        response = model.generate_content(formatting_prompt)
+        response = _llm_generate(formatting_prompt)
         raw_response = response.text.strip()
 
         # Cleanup extra line breaks
@@ -2711,6 +2923,7 @@ Return your answer in the most appropriate format as described above.
         return f"Error formatting response: {e}"
 
 
+@accepts_deadline
 def gemini_direct_answer(prompt, chat_context=None):
     """Handle general questions with conversation context awareness"""
     
@@ -2740,7 +2953,7 @@ Provide a clear, helpful response:
 """
     
     try:
-        response = model.generate_content(full_prompt)
+        response = _llm_generate(full_prompt)
         answer = response.text.strip()
         
         # Add this interaction to context if available
@@ -3021,9 +3234,6 @@ def validate_sql_query(sql_query):
     hierarchical_changed = (sql_query != original_sql)
         
     try:
-        # Get all column types for validation
-        column_types = get_column_types()
-        
         # Extract column references from SQL (simplified regex approach)
         import re
         
@@ -3033,6 +3243,9 @@ def validate_sql_query(sql_query):
         suggested_sql = sql_query  # Start with the hierarchically-corrected SQL
         has_suggestions = hierarchical_changed  # Mark as changed if hierarchical fixes were applied
         
+        # Table/alias map for this query - resolved against the in-memory catalog, no DB round trip
+        table_aliases = schema_catalog.extract_table_aliases(sql_query) if aggregate_patterns else {}
+        
         # Check aggregate functions and suggest type casting
         for func, column_expr in aggregate_patterns:
             func = func.upper()
@@ -3044,29 +3257,13 @@ def validate_sql_query(sql_query):
                 
             # For SUM and AVG, check if we need type casting
             if func in ['SUM', 'AVG']:
-                # Try to find the column in our schema
-                found_column = None
-                for schema_table_col, data_type in column_types.items():
-                    # Check if the column expression matches this column
-                    parts = schema_table_col.split('.')
-                    if len(parts) >= 3:
-                        schema, table, column = parts[0], parts[1], parts[2]
-                        
-                        # Check various formats: column, table.column, schema.table.column
-                        if (column_expr == column or 
-                            column_expr == f"{table}.{column}" or
-                            column_expr == f"{schema}.{table}.{column}" or
-                            column_expr.endswith(f".{column}")):
-                            found_column = (schema_table_col, data_type, f"{schema}.{table}.{column}")
-                            break
+                # Hashed lookup: column, table.column, alias.column or schema.table.column
+                found_column = schema_catalog.resolve_column(column_expr, table_aliases)
                 
                 if found_column:
-                    col_path, data_type, full_col_name = found_column
+                    full_col_name, data_type = found_column
                     # Check if it's a text type that might contain numbers
-                    text_types = ['character varying', 'text', 'character']
-                    numeric_types = ['integer', 'bigint', 'smallint', 'decimal', 'numeric', 'real', 'double precision', 'money']
-                    
-                    if data_type in text_types:
+                    if data_type in TEXT_TYPES:
                         # Suggest type casting for text columns that might contain numbers
                         # Common patterns: total_price, total_value, amount, cost, etc.
                         numeric_keywords = ['total', 'price', 'value', 'amount', 'cost', 'sum', 'revenue', 'income', 'expense', 'balance', 'quantity', 'count', 'number', 'rate', 'percent']
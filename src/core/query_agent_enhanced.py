@@ -1,4 +1,3 @@
-import google.generativeai as genai
 import os
 import json
 import re
@@ -8,7 +7,9 @@ sys.path.append('/home/linux/Documents/chatbot-diya')
 from dotenv import load_dotenv
 import datetime
 from decimal import Decimal
-from src.core.sql import get_full_schema, DecimalEncoder
+from src.core.sql import DecimalEncoder
+from src.core.schema_catalog import schema_catalog
+from src.api.llm_service import llm_client
 
 # Import embeddings functionality
 try:
@@ -30,8 +31,6 @@ except ImportError as e:
 
 load_dotenv()
 
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-model = genai.GenerativeModel("gemini-2.5-flash")
 
 def schema_dict_to_prompt(schema_dict):
     """
@@ -45,7 +44,7 @@ def schema_dict_to_prompt(schema_dict):
     return '\n'.join(lines)
 
 # Dynamically fetch schema at import time
-SCHEMA_DICT = get_full_schema()
+SCHEMA_DICT = schema_catalog.get_schema_dict()
 SCHEMA_PROMPT = schema_dict_to_prompt(SCHEMA_DICT)
 
 # Initialize embeddings if available
@@ -381,7 +380,7 @@ User: {prompt}
 """
 
     try:
-        response = model.generate_content(full_prompt).text
+        response = llm_client.generate(full_prompt).text
         result = extract_json(response)
         
         # Store successful query patterns for future use with sentence transformers
@@ -448,7 +447,7 @@ Return your answer in the most appropriate format as described above.
 """
 
     try:
-        response = model.generate_content(formatting_prompt)
+        response = llm_client.generate(formatting_prompt)
         raw_response = response.text.strip()
 
         # Cleanup extra line breaks
@@ -510,7 +509,7 @@ Provide a clear, helpful response:
 """
     
     try:
-        response = model.generate_content(full_prompt)
+        response = llm_client.generate(full_prompt)
         answer = response.text.strip()
         return answer
     except Exception as e:
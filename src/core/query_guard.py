@@ -0,0 +1,397 @@
+"""
+Query Cost Guard
+================
+
+Pre-flight check for LLM-generated SQL. Before a query runs, the guard asks the
+planner for EXPLAIN (FORMAT JSON) - no execution - and looks for the shapes that
+hurt the database: sequential scans of large tables, cartesian joins, huge sorts
+and overall plan cost. What happens next is decided by a per-table policy:
+
+- allow:      run it as-is
+- rewrite:    add a recent date window on the table's date column, re-check, run
+- background: run it on the background executor into the result cache; the user
+              is asked to repeat the question in a moment. A result that could
+              not be cached (too many rows, or its tables changed mid-run) is
+              remembered for QUERY_GUARD_UNCACHEABLE_TTL_SECONDS and rejected
+              instead of being scanned again
+- reject:     do not run it; the user gets an explanation
+
+Plan summaries are cached by SQL fingerprint, so repeated query templates pay
+for EXPLAIN once per QUERY_GUARD_PLAN_TTL_SECONDS. The guard fails open: if
+EXPLAIN itself fails, the query runs and the normal error handling applies.
+
+Policies come from QUERY_GUARD_POLICIES (JSON) merged over DEFAULT_POLICIES:
+    {"public.util_report": {"action": "rewrite", "date_column": "from_tm",
+                            "days": 7, "fallback": "background"},
+     "*": {"action": "reject"}}
+"""
+
+import os
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from src.core.sql import db_manager, cache_manager, background_manager, result_optimizer, chatbot_logger
+from src.core.sql_fingerprint import fingerprint_sql
+from src.core.sql_rewrite import add_date_bound
+from src.core.deadline import resolve_deadline
+
+ALLOW = 'allow'
+REWRITE = 'rewrite'
+BACKGROUND = 'background'
+REJECT = 'reject'
+# Strictest action wins when several policies apply (unknown actions count as reject)
+_SEVERITY = {ALLOW: 0, REWRITE: 1, BACKGROUND: 2, REJECT: 3}
+
+
+def _severity(action):
+    return _SEVERITY.get(action, _SEVERITY[REJECT])
+
+
+DEFAULT_POLICIES = {
+    'public.util_report': {'action': REWRITE, 'date_column': 'from_tm', 'days': 7, 'fallback': BACKGROUND},
+    'public.distance_report': {'action': REWRITE, 'date_column': 'from_tm', 'days': 7, 'fallback': BACKGROUND},
+    '*': {'action': REJECT},
+}
+
+_JOIN_NODES = ('Nested Loop', 'Hash Join', 'Merge Join')
+
+
+@dataclass
+class PlanSummary:
+    """The parts of an EXPLAIN plan the guard decides on"""
+    total_cost: float = 0.0
+    plan_rows: int = 0
+    # 'schema.table' -> estimated cost of its largest sequential scan
+    seq_scans: Dict[str, float] = field(default_factory=dict)
+    max_sort_rows: int = 0
+    max_join_rows: int = 0
+    cross_join_rows: int = 0
+    explained_at: float = 0.0
+
+
+@dataclass
+class GuardDecision:
+    action: str
+    sql: str
+    reason: str = ''
+    violations: List[str] = field(default_factory=list)
+    user_message: Optional[str] = None
+    estimated_cost: Optional[float] = None
+
+    @property
+    def blocked(self) -> bool:
+        return self.action in (REJECT, BACKGROUND)
+
+
+class QueryCostGuard:
+    """EXPLAIN-based admission control for generated SELECT statements"""
+
+    TABLE_SIZE_QUERY = """
+        SELECT lower(n.nspname || '.' || c.relname), c.reltuples::bigint
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relkind IN ('r', 'p', 'm')
+          AND n.nspname NOT IN ('information_schema', 'pg_catalog')
+          AND n.nspname NOT LIKE 'pg_toast%'
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv('QUERY_GUARD_ENABLED', 'true').lower() == 'true'
+        self.max_cost = float(os.getenv('QUERY_GUARD_MAX_COST', 5_000_000))
+        # Plans this cheap are allowed even with a seq scan - the planner expects to stop early
+        self.cheap_cost = float(os.getenv('QUERY_GUARD_CHEAP_COST', 10_000))
+        self.large_table_rows = int(os.getenv('QUERY_GUARD_LARGE_TABLE_ROWS', 1_000_000))
+        self.max_sort_rows = int(os.getenv('QUERY_GUARD_MAX_SORT_ROWS', 1_000_000))
+        self.max_join_rows = int(os.getenv('QUERY_GUARD_MAX_JOIN_ROWS', 10_000_000))
+        self.explain_timeout_ms = int(os.getenv('QUERY_GUARD_EXPLAIN_TIMEOUT_MS', 1000))
+        self.plan_ttl = int(os.getenv('QUERY_GUARD_PLAN_TTL_SECONDS', 600))
+        self.plan_cache_size = int(os.getenv('QUERY_GUARD_PLAN_CACHE_SIZE', 512))
+        self.uncacheable_ttl = int(os.getenv('QUERY_GUARD_UNCACHEABLE_TTL_SECONDS', 600))
+        self.policies = self._load_policies()
+
+        self._plans = OrderedDict()     # fingerprint -> PlanSummary
+        self._plan_lock = threading.Lock()
+        # cache key -> expiry of background runs whose result could not be cached
+        self._uncacheable = OrderedDict()
+        self._table_rows: Dict[str, int] = {}
+        self._table_rows_loaded_at = 0.0
+        self.stats = {'checks': 0, 'plan_cache_hits': 0, 'explains': 0, 'explain_failures': 0,
+                      'result_cache_bypass': 0, 'allowed': 0, 'rewritten': 0, 'backgrounded': 0,
+                      'rejected': 0, 'background_uncacheable': 0}
+
+    @staticmethod
+    def _load_policies() -> Dict[str, dict]:
+        policies = {table: dict(policy) for table, policy in DEFAULT_POLICIES.items()}
+        raw = os.getenv('QUERY_GUARD_POLICIES')
+        if raw:
+            try:
+                for table, policy in json.loads(raw).items():
+                    key = table.lower() if table == '*' or '.' in table else f"public.{table.lower()}"
+                    policies[key] = policy
+            except (ValueError, AttributeError) as e:
+                chatbot_logger.logger.error(f"❌ Invalid QUERY_GUARD_POLICIES, using defaults: {e}")
+        return policies
+
+    def policy_for(self, table: Optional[str]) -> dict:
+        return self.policies.get(table) or self.policies.get('*') or {'action': ALLOW}
+
+    # ------------------------------------------------------------------
+    # Planner access
+    # ------------------------------------------------------------------
+    def _explain(self, sql: str, deadline=None):
+        timeout_ms = self.explain_timeout_ms
+        if deadline:
+            deadline.check("query cost check")
+            timeout_ms = min(timeout_ms, deadline.statement_timeout_ms())
+
+        acquire_timeout = deadline.timeout(cap=db_manager.pool_config['timeout']) if deadline else None
+        with db_manager.get_connection_context(acquire_timeout) as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SET LOCAL statement_timeout = %s", (timeout_ms,))
+                    if time.time() - self._table_rows_loaded_at > self.plan_ttl:
+                        cursor.execute(self.TABLE_SIZE_QUERY)
+                        self._table_rows = {name: max(int(rows), 0) for name, rows in cursor.fetchall()}
+                        self._table_rows_loaded_at = time.time()
+                    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+                    plan = cursor.fetchone()[0]
+            finally:
+                conn.rollback()
+
+        # psycopg2 parses the json column; older servers/drivers hand back text
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]['Plan']
+
+    def summarize_plan(self, plan: dict) -> PlanSummary:
+        """Walk the plan tree once, collecting the guarded metrics"""
+        summary = PlanSummary(
+            total_cost=float(plan.get('Total Cost', 0)),
+            plan_rows=int(plan.get('Plan Rows', 0)),
+            explained_at=time.time()
+        )
+        stack = [plan]
+        while stack:
+            node = stack.pop()
+            node_type = node.get('Node Type')
+            rows = int(node.get('Plan Rows', 0))
+
+            if node_type == 'Seq Scan' and node.get('Relation Name'):
+                table = f"{node.get('Schema', 'public')}.{node['Relation Name']}".lower()
+                if self._table_rows.get(table, 0) >= self.large_table_rows:
+                    summary.seq_scans[table] = max(summary.seq_scans.get(table, 0.0), float(node.get('Total Cost', 0)))
+            elif node_type == 'Sort':
+                summary.max_sort_rows = max(summary.max_sort_rows, rows)
+            elif node_type in _JOIN_NODES:
+                summary.max_join_rows = max(summary.max_join_rows, rows)
+                # A nested loop with nothing relating its two sides is a cartesian product
+                if node_type == 'Nested Loop' and 'Join Filter' not in node:
+                    children = node.get('Plans', [])
+                    inner = children[1] if len(children) > 1 else {}
+                    if inner.get('Node Type') in ('Seq Scan', 'Materialize') and 'Index Cond' not in inner:
+                        summary.cross_join_rows = max(summary.cross_join_rows, rows)
+
+            stack.extend(node.get('Plans', []))
+        return summary
+
+    def get_plan_summary(self, sql: str, deadline=None) -> PlanSummary:
+        """Plan summary for sql, from the fingerprint cache when fresh"""
+        fingerprint = fingerprint_sql(sql)
+        with self._plan_lock:
+            summary = self._plans.get(fingerprint)
+            if summary and time.time() - summary.explained_at < self.plan_ttl:
+                self._plans.move_to_end(fingerprint)
+                self.stats['plan_cache_hits'] += 1
+                return summary
+
+        summary = self.summarize_plan(self._explain(sql, deadline))
+        self.stats['explains'] += 1
+        with self._plan_lock:
+            self._plans[fingerprint] = summary
+            self._plans.move_to_end(fingerprint)
+            while len(self._plans) > self.plan_cache_size:
+                self._plans.popitem(last=False)
+        return summary
+
+    # ------------------------------------------------------------------
+    # Policy
+    # ------------------------------------------------------------------
+    def find_violations(self, summary: PlanSummary) -> Dict[Optional[str], List[str]]:
+        """Violations grouped by the table they are attributed to (None = whole query)"""
+        violations: Dict[Optional[str], List[str]] = {}
+        if summary.total_cost > self.cheap_cost:
+            for table, cost in summary.seq_scans.items():
+                violations.setdefault(table, []).append(
+                    f"sequential scan of {table} (~{self._table_rows.get(table, 0):,} rows, cost {cost:,.0f})")
+        if summary.total_cost > self.max_cost:
+            violations.setdefault(None, []).append(f"estimated cost {summary.total_cost:,.0f} exceeds {self.max_cost:,.0f}")
+        if summary.cross_join_rows > self.max_join_rows:
+            violations.setdefault(None, []).append(f"cartesian join producing ~{summary.cross_join_rows:,} rows")
+        elif summary.max_join_rows > self.max_join_rows:
+            violations.setdefault(None, []).append(f"join producing ~{summary.max_join_rows:,} rows")
+        if summary.max_sort_rows > self.max_sort_rows:
+            violations.setdefault(None, []).append(f"sort of ~{summary.max_sort_rows:,} rows")
+        return violations
+
+    def _try_rewrite(self, sql: str, tables, deadline=None) -> Optional[str]:
+        """Date-bound every table, then re-check; None unless the result is clean"""
+        rewritten = sql
+        for table in tables:
+            policy = self.policy_for(table)
+            if not policy.get('date_column'):
+                return None
+            rewritten = add_date_bound(rewritten, table, policy['date_column'], int(policy.get('days', 7)))
+            if rewritten is None:
+                return None
+        if self.find_violations(self.get_plan_summary(rewritten, deadline)):
+            return None
+        return rewritten
+
+    def check(self, sql: str, deadline=None) -> GuardDecision:
+        """Decide how (and whether) sql should run"""
+        deadline = resolve_deadline(deadline)
+        self.stats['checks'] += 1
+        if not self.enabled or not db_manager._is_streamable(sql):
+            return GuardDecision(ALLOW, sql, reason='not guarded')
+
+        # A cached result costs nothing to serve, whatever the plan looks like
+        if cache_manager and cache_manager.cache_available and cache_manager.get_cached_result(cache_manager.get_cache_key(sql)):
+            self.stats['result_cache_bypass'] += 1
+            return GuardDecision(ALLOW, sql, reason='cached result')
+
+        try:
+            summary = self.get_plan_summary(sql, deadline)
+        except Exception as e:
+            self.stats['explain_failures'] += 1
+            chatbot_logger.logger.warning(f"⚠️ Query cost check skipped, EXPLAIN failed: {e}")
+            return GuardDecision(ALLOW, sql, reason='explain failed')
+
+        violations = self.find_violations(summary)
+        if not violations:
+            self.stats['allowed'] += 1
+            return GuardDecision(ALLOW, sql, estimated_cost=summary.total_cost)
+
+        messages = [message for table_messages in violations.values() for message in table_messages]
+        # Query-wide problems usually stem from the large-table scans; their policies decide
+        # (a rewrite is re-checked in full). The '*' policy applies when no table is implicated.
+        policy_tables = [table for table in violations if table is not None] or [None]
+        action = max((self.policy_for(table).get('action', REJECT) for table in policy_tables), key=_severity)
+        reason = '; '.join(messages)
+        chatbot_logger.logger.warning(f"🛡️ QUERY GUARD: {reason} -> {action}")
+
+        if action == REWRITE:
+            rewrite_tables = [table for table in policy_tables if table is not None]
+            rewritten = None
+            try:
+                rewritten = self._try_rewrite(sql, rewrite_tables, deadline)
+            except Exception as e:
+                chatbot_logger.logger.warning(f"⚠️ Guarded rewrite could not be checked: {e}")
+            if rewritten:
+                self.stats['rewritten'] += 1
+                windows = ', '.join(f"{table.split('.')[-1]} to the last {self.policy_for(table).get('days', 7)} days"
+                                    for table in rewrite_tables)
+                return GuardDecision(REWRITE, rewritten, reason=reason, violations=messages,
+                                     user_message=f"ℹ️ To keep this fast I limited {windows}. Ask with a specific date range for other periods.",
+                                     estimated_cost=summary.total_cost)
+            action = max((self.policy_for(table).get('fallback', REJECT) for table in rewrite_tables),
+                         key=_severity, default=REJECT)
+
+        if action == BACKGROUND and self._recently_uncacheable(sql):
+            # The last background run left nothing in the cache - running it again would not either
+            self.stats['background_uncacheable'] += 1
+            messages.append("result too large to prepare in the background")
+            action = REJECT
+
+        if action == BACKGROUND and self._run_in_background(sql):
+            self.stats['backgrounded'] += 1
+            return GuardDecision(BACKGROUND, sql, reason=reason, violations=messages,
+                                 user_message="⏳ This question needs a large scan, so I'm running it in the background. "
+                                              "Ask again in a minute and the answer will be ready.",
+                                 estimated_cost=summary.total_cost)
+
+        if action == ALLOW:
+            self.stats['allowed'] += 1
+            return GuardDecision(ALLOW, sql, reason=reason, violations=messages, estimated_cost=summary.total_cost)
+
+        self.stats['rejected'] += 1
+        return GuardDecision(REJECT, sql, reason=reason, violations=messages,
+                             user_message="❌ **This query would be too expensive to run:** " + '; '.join(messages) +
+                                          "\n\n💡 **Suggestion:** Add a date range, a specific vehicle or plant, or ask for a summary instead.",
+                             estimated_cost=summary.total_cost)
+
+    def _run_in_background(self, sql: str) -> bool:
+        """Execute sql off the request path and leave the result in the cache"""
+        if not background_manager or not cache_manager or not cache_manager.cache_available:
+            return False
+        cache_key = cache_manager.get_cache_key(sql)
+
+        def _execute_and_cache():
+            dependencies = cache_manager.capture_dependencies(sql)
+            max_rows = result_optimizer.max_rows_in_memory if result_optimizer else None
+            columns, rows = [], []
+            stream = db_manager.stream_query_with_retry(sql)
+            try:
+                for columns, batch in stream:
+                    rows.extend(batch)
+                    if max_rows is not None and len(rows) > max_rows:
+                        # Too large to cache - stop fetching instead of reading the whole result
+                        chatbot_logger.logger.warning(f"⚠️ Background query result exceeds {max_rows} rows, not cached")
+                        self._mark_uncacheable(cache_key)
+                        return None
+            finally:
+                stream.close()
+            if not cache_manager.store_query_result(sql, cache_key, columns, rows, dependencies):
+                chatbot_logger.logger.warning(f"⚠️ Background query result was not cacheable ({len(rows)} rows)")
+                self._mark_uncacheable(cache_key)
+                return None
+            return columns, rows
+
+        def _run():
+            try:
+                cache_manager.single_flight.do(cache_key, _execute_and_cache)
+            except Exception as e:
+                chatbot_logger.logger.error(f"❌ Background query failed: {e}")
+
+        # Already running for an earlier ask counts as scheduled
+        background_manager.schedule_unique_task(f"guarded:{cache_key}", _run)
+        return True
+
+    def _mark_uncacheable(self, cache_key):
+        with self._plan_lock:
+            self._uncacheable[cache_key] = time.time() + self.uncacheable_ttl
+            self._uncacheable.move_to_end(cache_key)
+            while len(self._uncacheable) > self.plan_cache_size:
+                self._uncacheable.popitem(last=False)
+
+    def _recently_uncacheable(self, sql: str) -> bool:
+        """True if a background run of sql recently finished without a cached result"""
+        if not cache_manager:
+            return False
+        cache_key = cache_manager.get_cache_key(sql)
+        with self._plan_lock:
+            expires_at = self._uncacheable.get(cache_key)
+            if expires_at is None:
+                return False
+            if expires_at <= time.time():
+                del self._uncacheable[cache_key]
+                return False
+            return True
+
+    def get_status(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'max_cost': self.max_cost,
+            'large_table_rows': self.large_table_rows,
+            'cached_plans': len(self._plans),
+            'uncacheable_results': len(self._uncacheable),
+            'policies': self.policies,
+            **self.stats
+        }
+
+
+# Global guard instance used by the chat endpoints
+query_guard = QueryCostGuard()
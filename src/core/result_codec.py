@@ -0,0 +1,415 @@
+"""
+Binary Result Codec
+===================
+
+Compact, type-preserving serialization of query results (columns, rows) for the
+result cache. JSON round trips turned Decimal into float and datetimes into
+strings, so a cache hit returned different types than a miss.
+
+Layout:
+- 4-byte magic + flags byte (bit 0: body is zlib-compressed)
+- column names, row count, then one typed vector per column (columnar)
+- homogeneous columns are packed as fixed-width arrays (int64, float64, date
+  ordinals, datetime/time/timedelta microseconds) or length-prefixed UTF-8
+  (text, Decimal); mixed columns fall back to per-value tagged encoding
+
+Supported cell types: None, bool, int, float, str, bytes, Decimal, datetime,
+date, time, timedelta, UUID, and lists/tuples/dicts of these. Anything else is
+stored as its str().
+"""
+
+import os
+import struct
+import zlib
+from itertools import accumulate
+import uuid
+from datetime import datetime, date, time, timedelta, timezone
+from decimal import Decimal
+
+MAGIC = b'QRC\x01'
+FLAG_COMPRESSED = 0x01
+
+COMPRESS_MIN_BYTES = int(os.getenv('RESULT_CODEC_COMPRESS_MIN_BYTES', 4096))
+COMPRESS_LEVEL = int(os.getenv('RESULT_CODEC_COMPRESS_LEVEL', 1))
+
+_EPOCH = datetime(1970, 1, 1)
+_ONE_MICROSECOND = timedelta(microseconds=1)
+_NAIVE = -(2 ** 31)  # tz offset sentinel for naive datetimes/times
+_INT64_MIN, _INT64_MAX = -(2 ** 63), 2 ** 63 - 1
+
+# Column vector type codes
+_COL_INT = b'i'
+_COL_FLOAT = b'f'
+_COL_BOOL = b'b'
+_COL_TEXT = b's'
+_COL_BYTES = b'y'
+_COL_DECIMAL = b'n'
+_COL_DATE = b'D'
+_COL_DATETIME = b'T'
+_COL_TIME = b't'
+_COL_INTERVAL = b'd'
+_COL_OBJECT = b'o'
+
+# Per-value tags for mixed columns and metadata
+_TAG_NONE, _TAG_TRUE, _TAG_FALSE = b'N', b'1', b'0'
+_TAG_INT, _TAG_BIGINT, _TAG_FLOAT = b'i', b'I', b'f'
+_TAG_TEXT, _TAG_BYTES, _TAG_DECIMAL = b's', b'y', b'n'
+_TAG_DATE, _TAG_DATETIME, _TAG_TIME, _TAG_INTERVAL = b'D', b'T', b't', b'd'
+_TAG_UUID, _TAG_LIST, _TAG_TUPLE, _TAG_DICT = b'u', b'l', b'(', b'm'
+
+
+class ResultCodecError(ValueError):
+    """Raised for payloads that are not valid encoded results"""
+
+
+# ---------------------------------------------------------------- helpers
+
+def _timedelta_micros(value: timedelta) -> int:
+    return value // _ONE_MICROSECOND
+
+
+def _tz_offset_seconds(value) -> int:
+    offset = value.utcoffset()
+    return _NAIVE if offset is None else int(offset.total_seconds())
+
+
+def _tz_from_offset(seconds: int):
+    return None if seconds == _NAIVE else timezone(timedelta(seconds=seconds))
+
+
+def _datetime_micros(value: datetime) -> int:
+    # Wall-clock time; the offset is stored separately
+    if value.tzinfo is not None:
+        value = value.replace(tzinfo=None)
+    return (value - _EPOCH) // _ONE_MICROSECOND
+
+
+def _time_micros(value: time) -> int:
+    return ((value.hour * 60 + value.minute) * 60 + value.second) * 1000000 + value.microsecond
+
+
+def _micros_to_time(micros: int, tzinfo) -> time:
+    seconds, microsecond = divmod(micros, 1000000)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    return time(hour, minute, second, microsecond, tzinfo=tzinfo)
+
+
+def _column_kind(values):
+    """Pick the packed vector type for a column's non-null values"""
+    kind = None
+    for value in values:
+        if value is None:
+            continue
+        value_type = type(value)
+        if value_type is bool:
+            current = _COL_BOOL
+        elif value_type is int:
+            if not _INT64_MIN <= value <= _INT64_MAX:
+                return _COL_OBJECT
+            current = _COL_INT
+        elif value_type is float:
+            current = _COL_FLOAT
+        elif value_type is str:
+            current = _COL_TEXT
+        elif isinstance(value, Decimal):
+            current = _COL_DECIMAL
+        elif isinstance(value, datetime):
+            current = _COL_DATETIME
+        elif isinstance(value, date):
+            current = _COL_DATE
+        elif isinstance(value, time):
+            current = _COL_TIME
+        elif isinstance(value, timedelta):
+            current = _COL_INTERVAL
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            current = _COL_BYTES
+        else:
+            return _COL_OBJECT
+        if kind is None:
+            kind = current
+        elif kind != current:
+            return _COL_OBJECT
+    return kind or _COL_OBJECT
+
+
+# ---------------------------------------------------------------- writing
+
+def _write_blobs(out, blobs):
+    """Length-prefixed byte strings: n uint32 lengths followed by the concatenated data"""
+    out.append(struct.pack(f'<{len(blobs)}I', *map(len, blobs)))
+    out.append(b''.join(blobs))
+
+
+def _write_value(out, value):
+    """Self-describing tagged encoding of a single value"""
+    if value is None:
+        out.append(_TAG_NONE)
+    elif value is True:
+        out.append(_TAG_TRUE)
+    elif value is False:
+        out.append(_TAG_FALSE)
+    elif isinstance(value, int):
+        if _INT64_MIN <= value <= _INT64_MAX:
+            out.append(_TAG_INT + struct.pack('<q', value))
+        else:
+            text = str(value).encode()
+            out.append(_TAG_BIGINT + struct.pack('<I', len(text)) + text)
+    elif isinstance(value, float):
+        out.append(_TAG_FLOAT + struct.pack('<d', value))
+    elif isinstance(value, str):
+        text = value.encode('utf-8')
+        out.append(_TAG_TEXT + struct.pack('<I', len(text)) + text)
+    elif isinstance(value, Decimal):
+        text = str(value).encode()
+        out.append(_TAG_DECIMAL + struct.pack('<I', len(text)) + text)
+    elif isinstance(value, datetime):
+        out.append(_TAG_DATETIME + struct.pack('<qi', _datetime_micros(value), _tz_offset_seconds(value)))
+    elif isinstance(value, date):
+        out.append(_TAG_DATE + struct.pack('<i', value.toordinal()))
+    elif isinstance(value, time):
+        out.append(_TAG_TIME + struct.pack('<qi', _time_micros(value), _tz_offset_seconds(value)))
+    elif isinstance(value, timedelta):
+        out.append(_TAG_INTERVAL + struct.pack('<q', _timedelta_micros(value)))
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        data = bytes(value)
+        out.append(_TAG_BYTES + struct.pack('<I', len(data)) + data)
+    elif isinstance(value, uuid.UUID):
+        out.append(_TAG_UUID + value.bytes)
+    elif isinstance(value, (list, tuple)):
+        out.append((_TAG_LIST if isinstance(value, list) else _TAG_TUPLE) + struct.pack('<I', len(value)))
+        for item in value:
+            _write_value(out, item)
+    elif isinstance(value, dict):
+        out.append(_TAG_DICT + struct.pack('<I', len(value)))
+        for key, item in value.items():
+            _write_value(out, key)
+            _write_value(out, item)
+    else:
+        _write_value(out, str(value))
+
+
+def _write_column(out, values):
+    kind = _column_kind(values)
+    nulls = bytes(value is None for value in values)
+    has_nulls = any(nulls)
+    out.append(kind + (b'\x01' + nulls if has_nulls else b'\x00'))
+    count = len(values)
+
+    if kind == _COL_INT:
+        out.append(struct.pack(f'<{count}q', *(0 if v is None else v for v in values)))
+    elif kind == _COL_FLOAT:
+        out.append(struct.pack(f'<{count}d', *(0.0 if v is None else v for v in values)))
+    elif kind == _COL_BOOL:
+        out.append(bytes(bool(v) for v in values))
+    elif kind in (_COL_TEXT, _COL_DECIMAL):
+        _write_blobs(out, [b'' if v is None else str(v).encode('utf-8') for v in values])
+    elif kind == _COL_BYTES:
+        _write_blobs(out, [b'' if v is None else bytes(v) for v in values])
+    elif kind == _COL_DATE:
+        out.append(struct.pack(f'<{count}i', *(0 if v is None else v.toordinal() for v in values)))
+    elif kind in (_COL_DATETIME, _COL_TIME):
+        to_micros = _datetime_micros if kind == _COL_DATETIME else _time_micros
+        out.append(struct.pack(f'<{count}q', *(0 if v is None else to_micros(v) for v in values)))
+        offsets = [_NAIVE if v is None else _tz_offset_seconds(v) for v in values]
+        if all(offset == _NAIVE for offset in offsets):
+            out.append(b'\x00')
+        else:
+            out.append(b'\x01' + struct.pack(f'<{count}i', *offsets))
+    elif kind == _COL_INTERVAL:
+        out.append(struct.pack(f'<{count}q', *(0 if v is None else _timedelta_micros(v) for v in values)))
+    else:
+        for value in values:
+            _write_value(out, value)
+
+
+def encode_result(columns, rows, meta: dict = None, compress: bool = None) -> bytes:
+    """
+    Encode a query result to bytes.
+
+    Args:
+        columns: Column names
+        rows: Sequence of row tuples/lists
+        meta: Optional dict stored alongside (e.g. dependent tables)
+        compress: Force compression on/off (default: compress bodies >= RESULT_CODEC_COMPRESS_MIN_BYTES)
+    """
+    columns = list(columns or [])
+    rows = rows or []
+    out = [struct.pack('<II', len(columns), len(rows))]
+    for name in columns:
+        _write_value(out, name)
+    _write_value(out, meta or {})
+
+    if rows:
+        for values in zip(*rows):
+            _write_column(out, values)
+
+    body = b''.join(out)
+    flags = 0
+    if compress or (compress is None and len(body) >= COMPRESS_MIN_BYTES):
+        body = zlib.compress(body, COMPRESS_LEVEL)
+        flags |= FLAG_COMPRESSED
+    return MAGIC + bytes((flags,)) + body
+
+
+# ---------------------------------------------------------------- reading
+
+class _Reader:
+    __slots__ = ('data', 'pos')
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def take(self, size):
+        start = self.pos
+        self.pos += size
+        if self.pos > len(self.data):
+            raise ResultCodecError("Truncated result payload")
+        return self.data[start:self.pos]
+
+    def unpack(self, fmt, size):
+        start = self.pos
+        self.pos += size
+        if self.pos > len(self.data):
+            raise ResultCodecError("Truncated result payload")
+        return struct.unpack_from(fmt, self.data, start)
+
+    def blobs(self, count):
+        lengths = self.unpack(f'<{count}I', 4 * count)
+        data = self.take(sum(lengths))
+        ends = list(accumulate(lengths))
+        return [data[end - length:end] for end, length in zip(ends, lengths)]
+
+    def texts(self, count):
+        """Length-prefixed UTF-8 strings; pure-ASCII data is decoded once and sliced"""
+        lengths = self.unpack(f'<{count}I', 4 * count)
+        data = bytes(self.take(sum(lengths)))
+        ends = list(accumulate(lengths))
+        if data.isascii():
+            text = data.decode('ascii')
+            return [text[end - length:end] for end, length in zip(ends, lengths)]
+        return [data[end - length:end].decode('utf-8') for end, length in zip(ends, lengths)]
+
+
+def _read_value(reader):
+    tag = reader.take(1)
+    if tag == _TAG_NONE:
+        return None
+    if tag == _TAG_TRUE:
+        return True
+    if tag == _TAG_FALSE:
+        return False
+    if tag == _TAG_INT:
+        return reader.unpack('<q', 8)[0]
+    if tag == _TAG_FLOAT:
+        return reader.unpack('<d', 8)[0]
+    if tag in (_TAG_TEXT, _TAG_DECIMAL, _TAG_BIGINT, _TAG_BYTES):
+        data = reader.take(reader.unpack('<I', 4)[0])
+        if tag == _TAG_TEXT:
+            return str(data, 'utf-8')
+        if tag == _TAG_DECIMAL:
+            return Decimal(str(data, 'ascii'))
+        if tag == _TAG_BIGINT:
+            return int(str(data, 'ascii'))
+        return bytes(data)
+    if tag == _TAG_DATETIME:
+        micros, offset = reader.unpack('<qi', 12)
+        return (_EPOCH + timedelta(0, 0, micros)).replace(tzinfo=_tz_from_offset(offset))
+    if tag == _TAG_DATE:
+        return date.fromordinal(reader.unpack('<i', 4)[0])
+    if tag == _TAG_TIME:
+        micros, offset = reader.unpack('<qi', 12)
+        return _micros_to_time(micros, _tz_from_offset(offset))
+    if tag == _TAG_INTERVAL:
+        return timedelta(0, 0, reader.unpack('<q', 8)[0])
+    if tag == _TAG_UUID:
+        return uuid.UUID(bytes=bytes(reader.take(16)))
+    if tag in (_TAG_LIST, _TAG_TUPLE):
+        items = [_read_value(reader) for _ in range(reader.unpack('<I', 4)[0])]
+        return items if tag == _TAG_LIST else tuple(items)
+    if tag == _TAG_DICT:
+        result = {}
+        for _ in range(reader.unpack('<I', 4)[0]):
+            key = _read_value(reader)
+            result[key] = _read_value(reader)
+        return result
+    raise ResultCodecError(f"Unknown value tag {bytes(tag)!r}")
+
+
+def _read_column(reader, count):
+    kind = bytes(reader.take(1))
+    nulls = reader.take(count) if reader.take(1) == b'\x01' else None
+
+    if kind == _COL_INT:
+        values = list(reader.unpack(f'<{count}q', 8 * count))
+    elif kind == _COL_FLOAT:
+        values = list(reader.unpack(f'<{count}d', 8 * count))
+    elif kind == _COL_BOOL:
+        values = [flag == 1 for flag in reader.take(count)]
+    elif kind == _COL_TEXT:
+        values = reader.texts(count)
+    elif kind == _COL_DECIMAL:
+        values = [Decimal(text) if text else None for text in reader.texts(count)]
+    elif kind == _COL_BYTES:
+        values = [bytes(blob) for blob in reader.blobs(count)]
+    elif kind == _COL_DATE:
+        values = [date.fromordinal(ordinal) if ordinal else None
+                  for ordinal in reader.unpack(f'<{count}i', 4 * count)]
+    elif kind in (_COL_DATETIME, _COL_TIME):
+        micros = reader.unpack(f'<{count}q', 8 * count)
+        if reader.take(1) == b'\x01':
+            tzinfos = [_tz_from_offset(offset) for offset in reader.unpack(f'<{count}i', 4 * count)]
+        else:
+            tzinfos = None
+        if kind == _COL_DATETIME:
+            epoch = _EPOCH
+            values = [epoch + timedelta(0, 0, m) for m in micros]
+            if tzinfos:
+                values = [value.replace(tzinfo=tz) for value, tz in zip(values, tzinfos)]
+        else:
+            values = [_micros_to_time(m, tzinfos[i] if tzinfos else None) for i, m in enumerate(micros)]
+    elif kind == _COL_INTERVAL:
+        values = [timedelta(0, 0, m) for m in reader.unpack(f'<{count}q', 8 * count)]
+    elif kind == _COL_OBJECT:
+        values = [_read_value(reader) for _ in range(count)]
+    else:
+        raise ResultCodecError(f"Unknown column type {kind!r}")
+
+    if nulls is not None:
+        values = [None if is_null else value for value, is_null in zip(values, nulls)]
+    return values
+
+
+def decode_result(payload: bytes):
+    """
+    Decode bytes produced by encode_result().
+
+    Returns:
+        Tuple of (columns, rows, meta) - rows are tuples, as psycopg2 returns them
+    """
+    if not isinstance(payload, (bytes, bytearray, memoryview)) or bytes(payload[:4]) != MAGIC:
+        raise ResultCodecError("Not an encoded result payload")
+    flags = payload[4]
+    body = payload[5:]
+    if flags & FLAG_COMPRESSED:
+        try:
+            body = zlib.decompress(body)
+        except zlib.error as e:
+            raise ResultCodecError(f"Corrupt compressed result payload: {e}") from e
+
+    reader = _Reader(memoryview(body))
+    column_count, row_count = reader.unpack('<II', 8)
+    columns = [_read_value(reader) for _ in range(column_count)]
+    meta = _read_value(reader)
+
+    if not row_count:
+        return columns, [], meta
+    if not column_count:
+        return columns, [()] * row_count, meta
+    vectors = [_read_column(reader, row_count) for _ in range(column_count)]
+    return columns, list(zip(*vectors)), meta
+
+
+def is_encoded_result(payload) -> bool:
+    return isinstance(payload, (bytes, bytearray)) and payload[:4] == MAGIC
@@ -0,0 +1,323 @@
+"""
+Schema Catalog Service
+======================
+
+One in-process copy of the database catalog shared by the query agent,
+SQL validation, distance unit detection and the embedding managers.
+
+- Loaded once per process with a single information_schema query
+- Hashed lookups by schema.table.column, table.column, alias.column and column
+- Versioned by a checksum of pg_attribute; a background thread compares the
+  checksum periodically and only reloads when DDL actually changed
+- Readers never lock and never touch the database on the hot path: they read
+  an immutable snapshot that is swapped atomically on refresh
+"""
+
+import os
+import re
+import hashlib
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.core.sql import db_manager, chatbot_logger
+
+TEXT_TYPES = ('character varying', 'text', 'character')
+NUMERIC_TYPES = ('integer', 'bigint', 'smallint', 'decimal', 'numeric', 'real', 'double precision', 'money')
+
+# Words that can follow a table name in FROM/JOIN but are not aliases
+_NON_ALIAS_WORDS = {
+    'on', 'using', 'where', 'join', 'inner', 'left', 'right', 'full', 'outer', 'cross',
+    'natural', 'group', 'order', 'limit', 'offset', 'having', 'union', 'except',
+    'intersect', 'window', 'lateral', 'as', 'and', 'or', 'set', 'fetch', 'for'
+}
+
+_TABLE_REF_PATTERN = re.compile(
+    r'\b(?:from|join)\s+((?:"?\w+"?\.)?"?\w+"?)(?:\s+(?:as\s+)?("?\w+"?))?',
+    re.IGNORECASE
+)
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Immutable view of the catalog at one checksum version"""
+    version: Optional[str] = None
+    loaded_at: Optional[float] = None
+    schema_dict: Dict[str, Dict[str, List[str]]] = field(default_factory=dict)
+    # 'schema.table.column' -> data_type
+    column_types: Dict[str, str] = field(default_factory=dict)
+    # lower-cased 'schema.table.column' -> 'schema.table.column'
+    columns_lower: Dict[str, str] = field(default_factory=dict)
+    # 'table.column' -> 'schema.table.column' (first schema wins, public preferred)
+    table_columns: Dict[str, str] = field(default_factory=dict)
+    # 'column' -> ['schema.table.column', ...]
+    columns_by_name: Dict[str, List[str]] = field(default_factory=dict)
+    # 'table' -> 'schema.table'
+    tables: Dict[str, str] = field(default_factory=dict)
+
+
+class SchemaCatalog:
+    """Shared, versioned schema catalog with background DDL change detection"""
+
+    CATALOG_QUERY = """
+        SELECT table_schema, table_name, column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema NOT IN ('information_schema', 'pg_catalog')
+        ORDER BY table_schema, table_name, ordinal_position
+    """
+
+    # Cheap DDL fingerprint: pg_attribute changes on every CREATE/ALTER/DROP of a column
+    CHECKSUM_QUERY = """
+        SELECT md5(COALESCE(string_agg(
+                   c.oid::text || ':' || a.attnum || ':' || a.attname || ':' || a.atttypid::text,
+                   ',' ORDER BY c.oid, a.attnum), ''))
+        FROM pg_attribute a
+        JOIN pg_class c ON c.oid = a.attrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE a.attnum > 0
+          AND NOT a.attisdropped
+          AND c.relkind IN ('r', 'v', 'm', 'p', 'f')
+          AND n.nspname NOT IN ('information_schema', 'pg_catalog')
+          AND n.nspname NOT LIKE 'pg_toast%'
+    """
+
+    def __init__(self, refresh_interval: int = None):
+        self.refresh_interval = refresh_interval or int(os.getenv('SCHEMA_CATALOG_REFRESH_SECONDS', 300))
+        self._snapshot = CatalogSnapshot()
+        self._load_lock = threading.Lock()
+        self._load_attempted = False
+        self._listeners: List[Callable[['SchemaCatalog'], None]] = []
+        self._refresh_thread = None
+        self._stop_event = threading.Event()
+        self.stats = {'loads': 0, 'checksum_checks': 0, 'ddl_changes_detected': 0, 'load_failures': 0}
+
+    # ------------------------------------------------------------------
+    # Loading and refresh
+    # ------------------------------------------------------------------
+    def ensure_loaded(self) -> CatalogSnapshot:
+        """Load the catalog on first use; later calls return the current snapshot"""
+        if not self._load_attempted:
+            with self._load_lock:
+                if not self._load_attempted:
+                    self._load_attempted = True
+                    self.reload()
+                    self.start_background_refresh()
+        return self._snapshot
+
+    def _fetch_checksum(self) -> Optional[str]:
+        with db_manager.get_connection_context() as conn:
+            with conn.cursor() as cur:
+                cur.execute(self.CHECKSUM_QUERY)
+                row = cur.fetchone()
+            conn.rollback()
+        return row[0] if row else None
+
+    def reload(self) -> bool:
+        """Rebuild the snapshot from information_schema. Returns True on success."""
+        start_time = time.time()
+        try:
+            with db_manager.get_connection_context() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(self.CATALOG_QUERY)
+                    rows = cur.fetchall()
+                    cur.execute(self.CHECKSUM_QUERY)
+                    checksum_row = cur.fetchone()
+                conn.rollback()
+        except Exception as e:
+            self.stats['load_failures'] += 1
+            chatbot_logger.logger.error(f"❌ Failed to load schema catalog: {e}")
+            print("❌ Failed to fetch schema:", e)
+            return False
+
+        version = checksum_row[0] if checksum_row and checksum_row[0] else hashlib.md5(repr(rows).encode()).hexdigest()
+        self._snapshot = self._build_snapshot(rows, version)
+        self.stats['loads'] += 1
+
+        chatbot_logger.log_performance(
+            "schema_catalog_load", time.time() - start_time,
+            f"{len(self._snapshot.tables)} tables, {len(self._snapshot.column_types)} columns, version {version[:8]}"
+        )
+        self._notify_listeners()
+        return True
+
+    def _build_snapshot(self, rows, version) -> CatalogSnapshot:
+        schema_dict = {}
+        column_types = {}
+        columns_lower = {}
+        table_columns = {}
+        columns_by_name = {}
+        tables = {}
+
+        for table_schema, table_name, column_name, data_type in rows:
+            schema_dict.setdefault(table_schema, {}).setdefault(table_name, []).append(column_name)
+            full_name = f"{table_schema}.{table_name}.{column_name}"
+            column_types[full_name] = data_type
+            columns_lower[full_name.lower()] = full_name
+            columns_by_name.setdefault(column_name.lower(), []).append(full_name)
+
+            table_key = table_name.lower()
+            column_key = f"{table_key}.{column_name.lower()}"
+            # Unqualified table names resolve to public first, like the default search_path
+            if table_key not in tables or table_schema == 'public':
+                tables[table_key] = f"{table_schema}.{table_name}"
+            if column_key not in table_columns or table_schema == 'public':
+                table_columns[column_key] = full_name
+
+        return CatalogSnapshot(
+            version=version,
+            loaded_at=time.time(),
+            schema_dict=schema_dict,
+            column_types=column_types,
+            columns_lower=columns_lower,
+            table_columns=table_columns,
+            columns_by_name=columns_by_name,
+            tables=tables
+        )
+
+    def check_for_changes(self) -> bool:
+        """Compare the DDL checksum with the loaded version and reload if it moved"""
+        self.stats['checksum_checks'] += 1
+        try:
+            checksum = self._fetch_checksum()
+        except Exception as e:
+            chatbot_logger.logger.warning(f"⚠️ Schema catalog checksum check failed: {e}")
+            return False
+
+        if checksum and checksum != self._snapshot.version:
+            self.stats['ddl_changes_detected'] += 1
+            chatbot_logger.logger.info(
+                f"🔄 Schema change detected ({(self._snapshot.version or 'none')[:8]} → {checksum[:8]}), reloading catalog"
+            )
+            return self.reload()
+        return False
+
+    def start_background_refresh(self):
+        """Start the daemon thread that watches for DDL changes"""
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
+        if self.refresh_interval <= 0:
+            return
+
+        def _refresh_loop():
+            while not self._stop_event.wait(self.refresh_interval):
+                if self._snapshot.version is None:
+                    self.reload()  # Initial load failed - keep trying in the background
+                else:
+                    self.check_for_changes()
+
+        self._refresh_thread = threading.Thread(target=_refresh_loop, name="schema_catalog_refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def stop_background_refresh(self):
+        self._stop_event.set()
+
+    def add_listener(self, callback: Callable[['SchemaCatalog'], None]):
+        """Register a callback invoked after every successful (re)load"""
+        self._listeners.append(callback)
+
+    def _notify_listeners(self):
+        for callback in list(self._listeners):
+            try:
+                callback(self)
+            except Exception as e:
+                chatbot_logger.logger.warning(f"⚠️ Schema catalog listener failed: {e}")
+
+    # ------------------------------------------------------------------
+    # Read API (hot path - snapshot only, no database access)
+    # ------------------------------------------------------------------
+    @property
+    def version(self) -> Optional[str]:
+        return self.ensure_loaded().version
+
+    def get_schema_dict(self) -> Dict[str, Dict[str, List[str]]]:
+        """Same shape as sql.get_full_schema(): {schema: {table: [columns]}}"""
+        return self.ensure_loaded().schema_dict
+
+    def get_column_types(self) -> Dict[str, str]:
+        """Same shape as sql.get_column_types(): {schema.table.column: data_type}"""
+        return self.ensure_loaded().column_types
+
+    def get_column_type(self, full_name: str) -> Optional[str]:
+        return self.ensure_loaded().column_types.get(full_name)
+
+    def resolve_table(self, table_ref: str) -> Optional[str]:
+        """Resolve 'table' or 'schema.table' to the catalog's 'schema.table'"""
+        snapshot = self.ensure_loaded()
+        table_ref = table_ref.replace('"', '')
+        if '.' in table_ref:
+            schema_name, table_name = table_ref.split('.', 1)
+            if table_name in snapshot.schema_dict.get(schema_name, {}):
+                return f"{schema_name}.{table_name}"
+            return None
+        return snapshot.tables.get(table_ref.lower())
+
+    def extract_table_aliases(self, sql_query: str) -> Dict[str, str]:
+        """
+        Map every table name and alias in FROM/JOIN clauses to 'schema.table'.
+        Example: "FROM util_report ur" -> {'util_report': 'public.util_report', 'ur': 'public.util_report'}
+        """
+        aliases = {}
+        for table_ref, alias in _TABLE_REF_PATTERN.findall(sql_query):
+            resolved = self.resolve_table(table_ref)
+            if not resolved:
+                continue
+            bare_table = table_ref.replace('"', '').split('.')[-1].lower()
+            aliases[bare_table] = resolved
+            aliases[table_ref.replace('"', '').lower()] = resolved
+            alias = alias.replace('"', '').lower()
+            if alias and alias not in _NON_ALIAS_WORDS:
+                aliases[alias] = resolved
+        return aliases
+
+    def resolve_column(self, column_expr: str, aliases: Dict[str, str] = None) -> Optional[Tuple[str, str]]:
+        """
+        Resolve a column reference to (schema.table.column, data_type).
+        Accepts column, table.column, alias.column and schema.table.column.
+        Unqualified columns prefer tables referenced by the query (aliases).
+        """
+        snapshot = self.ensure_loaded()
+        expr = column_expr.strip().replace('"', '')
+        if not re.fullmatch(r'[\w.]+', expr):
+            return None
+
+        parts = expr.lower().split('.')
+        full_name = None
+
+        if len(parts) >= 3:
+            full_name = snapshot.columns_lower.get(f"{parts[-3]}.{parts[-2]}.{parts[-1]}")
+        elif len(parts) == 2:
+            qualifier, column = parts
+            table = (aliases or {}).get(qualifier)
+            if table:
+                full_name = snapshot.columns_lower.get(f"{table.lower()}.{column}")
+            if not full_name:
+                full_name = snapshot.table_columns.get(f"{qualifier}.{column}")
+        else:
+            column = parts[0]
+            candidates = snapshot.columns_by_name.get(column, [])
+            if aliases:
+                referenced = set(aliases.values())
+                in_query = [c for c in candidates if c.rsplit('.', 1)[0] in referenced]
+                if in_query:
+                    candidates = in_query
+            full_name = candidates[0] if candidates else None
+
+        if not full_name:
+            return None
+        return full_name, snapshot.column_types[full_name]
+
+    def get_status(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            'version': snapshot.version,
+            'loaded_at': snapshot.loaded_at,
+            'tables': len(snapshot.tables),
+            'columns': len(snapshot.column_types),
+            'refresh_interval': self.refresh_interval,
+            **self.stats
+        }
+
+
+# Global catalog instance shared by every module in the process
+schema_catalog = SchemaCatalog()
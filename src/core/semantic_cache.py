@@ -0,0 +1,395 @@
+"""
+Semantic NL->SQL Cache
+======================
+
+SentenceEmbeddingManager stores question embeddings with the SQL that answered
+them (query_patterns), but english_to_sql never looked there before asking
+Gemini. This cache runs as a pipeline stage ahead of generate_sql_with_llm and
+reuses stored SQL for near-duplicate questions.
+
+A stored pattern answers a new question only when:
+- cosine similarity is at least SEMANTIC_CACHE_THRESHOLD
+- it was stored against the current schema catalog version (patterns from
+  other versions are ignored, and purged when the catalog changes)
+- both questions mention the same kinds of entities - vehicles, plants, other
+  numbers (ids, limits) and a time phrase - in the same amounts, and the same
+  qualifiers that flip meaning (open/closed, top/bottom, not, how many, ...)
+- every entity value that differs can be re-bound: the old value appears
+  exactly once in the stored SQL - vehicles and plants inside a quoted string
+  literal (never in identifiers such as hosp_master), numbers as a number - and
+  is replaced by the new one. Date ranges re-bind through the bounds the LLM
+  was told to use (DateRange.sql_bounds). If a value cannot be found the
+  pattern is skipped
+- every string literal of the stored SQL is either such an entity value or a
+  word of the new question - a value the LLM took from the old question that
+  is not tracked ("zone_name ILIKE '%north%'") would otherwise be reused as is
+
+Only self-contained questions are cached: the SQL of a follow-up ("show its
+stoppages today") depends on the previous turn, so a question with a pronoun or
+back-reference is neither looked up nor stored, and english_to_sql only offers
+questions that reached the LLM unchanged (no inherited context or ordinal
+lookups). Patterns are only stored after LLM-generated SQL executed
+successfully (remember(), called by the API layer), and a cached SQL the
+database rejects is forgotten (forget_if_rejected()). Stats per miss reason and
+the similarity of hits are kept to tune the threshold.
+
+SEMANTIC_CACHE=off disables lookups and storage.
+"""
+
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+from src.core.schema_catalog import schema_catalog
+from src.core.sql import QueryExecutionError
+from src.core.sql_fingerprint import iter_token_spans
+from src.utils.date_range_parser import parse_date_range
+
+SEMANTIC_CACHE_PATH = 'semantic_cache'
+
+_VEHICLE = re.compile(r'\b[A-Z]{2}[\s-]?\d{1,2}[\s-]?[A-Z]{0,3}[\s-]?\d{3,4}\b', re.IGNORECASE)
+_PLANT_AFTER = re.compile(
+    r'\b(?:plant|site|depot|facility)\s+(?:named\s+|called\s+)?[\'"]?([A-Za-z]{3,}(?:\s*-\s*[A-Za-z]+)?)',
+    re.IGNORECASE
+)
+_PLANT_BEFORE = re.compile(r'\b([A-Za-z]{3,}(?:\s*-\s*[A-Za-z]+)?)\s+(?:plant|site|depot|facility)\b', re.IGNORECASE)
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+# Words caught by the plant patterns that are not names ("show all plants", "plant has ...")
+_NOT_NAMES = {
+    'all', 'the', 'each', 'every', 'any', 'this', 'that', 'these', 'those', 'which', 'what', 'whose',
+    'for', 'with', 'from', 'and', 'has', 'have', 'had', 'are', 'was', 'were', 'list', 'show', 'give',
+    'name', 'names', 'details', 'wise', 'per', 'total', 'many', 'much', 'our', 'their', 'its',
+    'location', 'locations', 'address', 'id', 'ids', 'count', 'number', 'data', 'info', 'information',
+}
+
+# Words that point back at an earlier turn - the question alone does not say what they mean
+_REFERENCES = re.compile(
+    r"\b(?:it|its|it's|they|them|their|theirs|these|those|he|she|him|his|her|same|previous|above"
+    r"|aforementioned|former|latter|(?:this|that)\s+(?:one|ones|vehicle|truck|plant|site|depot|driver|trip"
+    r"|route|customer|list|data|report|result|results))\b",
+    re.IGNORECASE
+)
+
+# Qualifiers two otherwise similar questions must share
+_QUALIFIERS = re.compile(
+    r'\b(not|no|without|except|excluding|open|closed|active|inactive|pending|approved|rejected|done'
+    r'|top|bottom|highest|lowest|max(?:imum)?|min(?:imum)?|most|least|asc(?:ending)?|desc(?:ending)?'
+    r'|count|total|sum|average|avg|how\s+many|first|last|latest|oldest)\b',
+    re.IGNORECASE
+)
+
+
+def extract_entities(question: str) -> Dict:
+    """Entity values of a question, in the JSON-friendly form stored with its pattern"""
+    text = question
+    date_range = parse_date_range(text)
+    dates = None
+    if date_range:
+        start, end = date_range.sql_bounds()
+        dates = {'phrase': date_range.phrase.lower(), 'start': start, 'end': end}
+        text = re.sub(re.escape(date_range.phrase), ' ', text, flags=re.IGNORECASE)
+
+    vehicles = [re.sub(r'[\s-]', '', v).upper() for v in _VEHICLE.findall(text)]
+    text = _VEHICLE.sub(' ', text)
+
+    plants = []
+    for pattern in (_PLANT_AFTER, _PLANT_BEFORE):
+        for name in pattern.findall(text):
+            name = name.strip()
+            if name.lower() not in _NOT_NAMES and name.lower() not in (p.lower() for p in plants):
+                plants.append(name)
+
+    return {
+        'vehicles': vehicles,
+        'plants': plants,
+        'numbers': _NUMBER.findall(text),
+        'dates': dates,
+        'qualifiers': sorted({re.sub(r'\s+', ' ', q.lower()) for q in _QUALIFIERS.findall(text)}),
+    }
+
+
+def is_self_contained(question: str) -> bool:
+    """False if the question refers back to an earlier turn (pronouns, "same", "that vehicle", ...)"""
+    date_range = parse_date_range(question)
+    if date_range:
+        # "previous week" is a time phrase, not a reference
+        question = re.sub(re.escape(date_range.phrase), ' ', question, flags=re.IGNORECASE)
+    return not _REFERENCES.search(question)
+
+
+def _sql_quote(value: str) -> str:
+    return value.replace("'", "''")
+
+
+def _string_literals(sql: str) -> List[tuple]:
+    """(start, end) of every quoted string literal in sql"""
+    return [(start, end) for kind, _, start, end in iter_token_spans(sql) if kind == 'string']
+
+
+def _literal_value(text: str) -> str:
+    """A string literal's value without quotes, escapes and LIKE wildcards at either end"""
+    value = text[text.index("'") + 1:-1].replace("''", "'")
+    return value.strip('%').strip()
+
+
+def _marker(index: int) -> str:
+    # No digits or word characters, so a later number pattern cannot match inside it
+    return f"\x00{chr(0xE000 + index)}\x00"
+
+
+def _substitute(sql: str, pairs: List[tuple], literal_pairs: List[tuple] = ()) -> str:
+    """
+    Apply (pattern, replacement) pairs - literal_pairs only inside quoted string
+    literals - without one replacement feeding the next
+    """
+    if literal_pairs:
+        pieces, position = [], 0
+        for start, end in _string_literals(sql):
+            literal = sql[start:end]
+            for index, (pattern, _) in enumerate(literal_pairs):
+                literal = pattern.sub(_marker(index), literal)
+            pieces += [sql[position:start], literal]
+            position = end
+        sql = ''.join(pieces) + sql[position:]
+    for index, (pattern, _) in enumerate(pairs, start=len(literal_pairs)):
+        sql = pattern.sub(_marker(index), sql)
+    for index, (_, replacement) in enumerate([*literal_pairs, *pairs]):
+        sql = sql.replace(_marker(index), replacement)
+    return sql
+
+
+def _date_forms(bound: str) -> List[str]:
+    """'2025-08-01 00:00:00+05:30' as the LLM may have written it - full, without offset, date only"""
+    forms = [bound]
+    without_offset = re.sub(r'[+-]\d{2}:\d{2}$', '', bound)
+    if without_offset != bound:
+        forms.append(without_offset)
+    forms.append(bound[:10])
+    return forms
+
+
+def rebind(sql: str, stored: Dict, current: Dict, question: str) -> Optional[str]:
+    """
+    stored's SQL rewritten for current's entity values (current being
+    extract_entities(question)), or None if the two questions are not
+    compatible, a differing value is not a literal in sql, or sql has a string
+    literal that is neither a stored entity value nor part of question.
+    """
+    if stored.get('qualifiers') != current.get('qualifiers'):
+        return None
+    for kind in ('vehicles', 'plants', 'numbers'):
+        if len(stored.get(kind, [])) != len(current.get(kind, [])):
+            return None
+    if bool(stored.get('dates')) != bool(current.get('dates')):
+        return None
+
+    literals = [sql[start:end] for start, end in _string_literals(sql)]
+    pairs, literal_pairs = [], []
+    for kind in ('vehicles', 'plants', 'numbers'):
+        for old, new in zip(stored[kind], current[kind]):
+            if old.lower() == new.lower():
+                continue
+            if kind == 'numbers':
+                pattern = re.compile(rf'(?<![\w.]){re.escape(old)}(?![\w.])')
+                if len(pattern.findall(sql)) != 1:
+                    return None
+                pairs.append((pattern, new))
+            else:
+                pattern = re.compile(re.escape(old), re.IGNORECASE)
+                if sum(len(pattern.findall(literal)) for literal in literals) != 1:
+                    return None
+                literal_pairs.append((pattern, _sql_quote(new)))
+
+    old_dates, new_dates = stored.get('dates'), current.get('dates')
+    tracked = [value.lower() for kind in ('vehicles', 'plants') for value in stored[kind]]
+    if old_dates:
+        tracked += [form.lower() for bound in ('start', 'end') for form in _date_forms(old_dates[bound])]
+    for literal in literals:
+        value = _literal_value(literal)
+        if not value or any(entity in value.lower() for entity in tracked):
+            continue
+        if not re.search(rf'(?<!\w){re.escape(value)}(?!\w)', question, re.IGNORECASE):
+            # Taken from the old question but not tracked - it would be reused unchanged
+            return None
+
+    if old_dates and (old_dates['start'], old_dates['end']) != (new_dates['start'], new_dates['end']):
+        found = 0
+        for bound in ('start', 'end'):
+            for old_form, new_form in zip(_date_forms(old_dates[bound]), _date_forms(new_dates[bound])):
+                if old_form in sql:
+                    pairs.append((re.compile(re.escape(old_form)), new_form))
+                    found += 1
+                    break
+        if found == 1:
+            # Only one end of the range is a literal - the other is written some other way
+            return None
+        if found == 0 and old_dates['phrase'] != new_dates['phrase']:
+            # No literal bounds (relative SQL such as CURRENT_DATE) only fits the same phrase
+            return None
+
+    return _substitute(sql, pairs, literal_pairs)
+
+
+class SemanticQueryCache:
+    """Reuses stored SQL of near-duplicate questions instead of asking the LLM"""
+
+    def __init__(self):
+        self.enabled = os.getenv('SEMANTIC_CACHE', 'on').lower() != 'off'
+        self.threshold = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.93))
+        self.candidates = int(os.getenv('SEMANTIC_CACHE_CANDIDATES', 5))
+
+        self._lock = threading.Lock()
+        self.stats = {
+            'lookups': 0,
+            'hits': 0,
+            'rebound_hits': 0,
+            'misses': {},           # reason -> count
+            'stored': 0,
+            'forgotten': 0,
+            'invalidations': 0,
+            'hit_similarity_total': 0.0,
+        }
+        schema_catalog.add_listener(self._on_schema_change)
+
+    def _manager(self):
+        # Looked up on use - sentence embeddings initialise after this module is imported
+        try:
+            import src.nlp.sentence_embeddings as sentence_embeddings
+        except ImportError:
+            return None
+        return sentence_embeddings.sentence_embedding_manager
+
+    def lookup(self, question: str) -> Optional[Dict]:
+        """
+        {'sql', 'pattern_sql', 'matched_query', 'similarity', 'rebound'} for the
+        best compatible stored pattern, or None.
+        """
+        manager = self._manager() if self.enabled else None
+        if manager is None:
+            return None
+        self._count('lookups')
+        if not is_self_contained(question):
+            self._miss('context_dependent')
+            return None
+
+        version = schema_catalog.version
+        if not version:
+            self._miss('no_schema_version')
+            return None
+
+        try:
+            candidates = manager.find_similar_queries(
+                question, threshold=self.threshold, limit=self.candidates, schema_version=version
+            )
+            if not candidates:
+                self._miss('below_threshold')
+                return None
+
+            current = extract_entities(question)
+            for candidate in candidates:
+                stored = candidate.get('entities') or extract_entities(candidate['query'])
+                sql = rebind(candidate['sql'], stored, current, question)
+                # Another worker may have disabled, replaced or compacted the pattern since it was indexed
+                if sql is not None and manager.is_pattern_current(candidate.get('id'), candidate['sql']):
+                    return self._hit(question, candidate, sql)
+        except Exception as e:
+            # A cache problem must never stop the LLM path
+            print(f"⚠️ [SEMANTIC-CACHE] Lookup failed: {e}")
+            self._miss('error')
+            return None
+
+        self._miss('entity_mismatch')
+        return None
+
+    def _hit(self, question, candidate, sql) -> Dict:
+        rebound = sql != candidate['sql']
+        manager = self._manager()
+        if manager is not None:
+            manager.record_pattern_hit(candidate.get('id'))
+        with self._lock:
+            self.stats['hits'] += 1
+            self.stats['rebound_hits'] += int(rebound)
+            self.stats['hit_similarity_total'] += candidate['similarity']
+        print(f"🧩 [SEMANTIC-CACHE] '{question}' matched '{candidate['query']}' "
+              f"(similarity {candidate['similarity']:.3f}{', re-bound' if rebound else ''})")
+        return {
+            'sql': sql,
+            'pattern_sql': candidate['sql'],
+            'matched_query': candidate['query'],
+            'similarity': round(candidate['similarity'], 4),
+            'rebound': rebound,
+        }
+
+    def remember(self, question: str, sql: str):
+        """
+        Store SQL that the LLM wrote for question and that executed successfully.
+        Only call it when the LLM was asked exactly question (english_to_sql
+        marks those results semantic_cacheable).
+        """
+        manager = self._manager() if self.enabled else None
+        if manager is None or not sql or not schema_catalog.version or not is_self_contained(question):
+            return
+        manager.add_query_pattern(
+            question, sql, success=True,
+            schema_version=schema_catalog.version, entities=extract_entities(question)
+        )
+        self._count('stored')
+
+    def forget(self, pattern_sql: str):
+        """A cached pattern's SQL failed to execute - stop serving it"""
+        manager = self._manager() if self.enabled else None
+        if manager is None or not pattern_sql:
+            return
+        if manager.disable_query_pattern(pattern_sql):
+            self._count('forgotten')
+
+    def forget_if_rejected(self, parsed: Dict, error: Exception):
+        """
+        An english_to_sql result failed to execute. If this cache served it and
+        the database rejected the SQL itself (a syntax error or an unknown table
+        or column - not a timeout or a lost connection), forget the pattern.
+        """
+        if parsed.get('answered_by') != SEMANTIC_CACHE_PATH:
+            return
+        if isinstance(error, QueryExecutionError) and error.sql_rejected:
+            self.forget(parsed['semantic_cache']['pattern_sql'])
+
+    def _on_schema_change(self, catalog):
+        manager = self._manager() if self.enabled else None
+        if manager is None or not catalog.version:
+            return
+        deleted = manager.delete_query_patterns_except(catalog.version)
+        self._count('invalidations')
+        print(f"🧩 [SEMANTIC-CACHE] Schema version {catalog.version[:8]} - dropped {deleted} stale patterns")
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _miss(self, reason: str):
+        with self._lock:
+            self.stats['misses'][reason] = self.stats['misses'].get(reason, 0) + 1
+
+    def get_status(self) -> dict:
+        with self._lock:
+            hits = self.stats['hits']
+            lookups = self.stats['lookups']
+            return {
+                'enabled': self.enabled,
+                'threshold': self.threshold,
+                'lookups': lookups,
+                'hits': hits,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+                'rebound_hits': self.stats['rebound_hits'],
+                'avg_hit_similarity': round(self.stats['hit_similarity_total'] / hits, 4) if hits else None,
+                'misses': dict(self.stats['misses']),
+                'stored': self.stats['stored'],
+                'forgotten': self.stats['forgotten'],
+                'invalidations': self.stats['invalidations'],
+            }
+
+
+# Global cache consulted by english_to_sql before the LLM
+semantic_cache = SemanticQueryCache()
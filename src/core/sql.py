@@ -7,6 +7,7 @@ import time
 import threading
 import logging
 import logging.handlers
+import traceback
 from contextlib import contextmanager
 from typing import Optional, Any, Dict, List, Tuple
 from enum import Enum
@@ -23,13 +24,21 @@ except ImportError:
 
 import hashlib
 import json
+import re
+import select
+import uuid
 from decimal import Decimal
+from collections import OrderedDict, deque
 from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 sys.path.append('/home/linux/Documents/chatbot-diya')
 
 from dotenv import load_dotenv
 import streamlit as st
+from src.core.sql_fingerprint import normalize_sql, sql_shape, fingerprint_sql, extract_tables, is_time_relative
+from src.core.result_codec import encode_result, decode_result, is_encoded_result, ResultCodecError
+from src.core.deadline import DeadlineExceeded, resolve_deadline
+from src.core.prepared_statements import statement_registry
 
 load_dotenv()
 
@@ -61,12 +70,39 @@ class DatabaseError:
     suggestion: Optional[str] = None
     can_retry: bool = False
 
+class QueryExecutionError(Exception):
+    """
+    A query failed in the database. str() is the user-facing message; error_type
+    and pgcode (the SQLSTATE of the original psycopg2 error, if any) say why.
+    """
+    def __init__(self, db_error: DatabaseError, pgcode: Optional[str] = None):
+        super().__init__(db_error.user_message)
+        self.error_type = db_error.error_type
+        self.pgcode = pgcode
+    
+    @property
+    def sql_rejected(self) -> bool:
+        """The statement itself is wrong (bad syntax, unknown table/column, no access) - running it again will not help"""
+        if self.pgcode:
+            return self.pgcode.startswith('42')
+        return self.error_type in (ErrorType.SQL_SYNTAX, ErrorType.TABLE_NOT_FOUND, ErrorType.PERMISSION_DENIED)
+
 class ErrorClassifier:
     @staticmethod
     def classify_error(exception: Exception, query: str = None) -> DatabaseError:
         error_str = str(exception).lower()
         
-        if "connection" in error_str or "connect" in error_str or "could not connect" in error_str:
+        # Checked first: psycopg2's "connection pool exhausted" would otherwise look like a connection failure
+        if "pool" in error_str and "exhausted" in error_str:
+            return DatabaseError(
+                error_type=ErrorType.POOL_EXHAUSTED,
+                message=str(exception),
+                user_message="System is busy. Please try again in a moment.",
+                query=query,
+                suggestion="Connection pool is exhausted, consider increasing pool size",
+                can_retry=True
+            )
+        elif "connection" in error_str or "connect" in error_str or "could not connect" in error_str:
             return DatabaseError(
                 error_type=ErrorType.DATABASE_CONNECTION,
                 message=str(exception),
@@ -108,15 +144,6 @@ class ErrorClassifier:
                 suggestion="Optimize query or add more filters",
                 can_retry=True
             )
-        elif "pool" in error_str and "exhausted" in error_str:
-            return DatabaseError(
-                error_type=ErrorType.POOL_EXHAUSTED,
-                message=str(exception),
-                user_message="System is busy. Please try again in a moment.",
-                query=query,
-                suggestion="Connection pool is exhausted, consider increasing pool size",
-                can_retry=True
-            )
         else:
             return DatabaseError(
                 error_type=ErrorType.UNKNOWN,
@@ -330,12 +357,29 @@ chatbot_logger = ChatbotLogger()
 system_monitor = SystemMonitor()
 recovery_manager = DatabaseRecoveryManager()
 
+class PoolTimeoutError(pool.PoolError):
+    """Raised when no pooled connection frees up before the acquisition deadline"""
+
+
+class _PoolWaiter:
+    """One queued get_connection() call, granted a slot in FIFO order"""
+    
+    __slots__ = ('event', 'granted')
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+
 class DatabaseConnectionManager:
     """Enhanced database connection manager with connection pooling and error handling"""
     
     _instance = None
     _lock = threading.Lock()
     
+    # Upper bounds (seconds) of the acquisition wait-time histogram buckets
+    WAIT_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    
     def __new__(cls):
         if cls._instance is None:
             with cls._lock:
@@ -359,9 +403,45 @@ class DatabaseConnectionManager:
         self.pool_config = {
             'minconn': int(os.getenv('DB_MIN_CONNECTIONS', 5)),
             'maxconn': int(os.getenv('DB_MAX_CONNECTIONS', 50)),  # Increased from 20 to 50
-            'timeout': int(os.getenv('DB_CONNECTION_TIMEOUT', 10))  # Reduced from 30 to 10
+            'timeout': float(os.getenv('DB_CONNECTION_TIMEOUT', 10))  # Reduced from 30 to 10
+        }
+        self.stream_config = {
+            'batch_size': int(os.getenv('DB_STREAM_BATCH_SIZE', 500)),  # Rows per fetchmany() round trip
         }
+        
+        # Acquisition layer: at most maxconn slots, callers beyond that queue FIFO
+        self._slot_lock = threading.Lock()
+        self._cleanup_lock = threading.Lock()
+        self._waiters = deque()
+        self._in_use = 0
+        self.pool_telemetry = {
+            'peak_in_use': 0,
+            'peak_waiters': 0,
+            'queued_acquisitions': 0,
+            'acquisition_timeouts': 0,
+            'total_wait_time': 0.0,
+            'wait_histogram': {self._bucket_label(bound): 0 for bound in self.WAIT_BUCKETS + (None,)}
+        }
+        
+        # Checked-out connections: id(conn) -> checkout record (see _register_checkout)
+        self._checkouts = {}
+        self._checkout_lock = threading.Lock()
+        
+        # Opt-in leak detection: flag (and reclaim) connections held longer than a threshold
+        self.leak_config = {
+            'enabled': os.getenv('DB_LEAK_DETECTION', 'false').lower() in ('1', 'true', 'yes'),
+            'threshold': float(os.getenv('DB_LEAK_THRESHOLD_SECONDS', 120)),
+            'reclaim': os.getenv('DB_LEAK_RECLAIM', 'true').lower() in ('1', 'true', 'yes'),
+            'check_interval': float(os.getenv('DB_LEAK_CHECK_SECONDS', 30)),
+            'stack_depth': int(os.getenv('DB_LEAK_STACK_DEPTH', 12))
+        }
+        self.leak_stats = {'leaks_detected': 0, 'reclaimed': 0, 'unknown_returns': 0}
+        self._leak_offenders = deque(maxlen=50)
+        self._leak_thread = None
+        
         self._initialize_pool()
+        if self.leak_config['enabled']:
+            self.start_leak_detection()
         self._initialized = True
     
     def _initialize_pool(self):
@@ -386,7 +466,7 @@ class DatabaseConnectionManager:
             raise
     
     @contextmanager
-    def get_connection_context(self):
+    def get_connection_context(self, timeout: float = None):
         """
         Context manager for safe connection handling - ALWAYS use this for new code
         
@@ -398,57 +478,123 @@ class DatabaseConnectionManager:
         """
         conn = None
         try:
-            conn = self.get_connection()
+            conn = self.get_connection(timeout)
             yield conn
         finally:
             if conn:
                 self.return_connection(conn)
     
-    def get_connection(self):
-        """Get a connection from the pool with comprehensive monitoring"""
+    @staticmethod
+    def _bucket_label(bound):
+        return f"<={bound}s" if bound is not None else f">{DatabaseConnectionManager.WAIT_BUCKETS[-1]}s"
+    
+    def _record_wait(self, wait_time: float):
+        self.pool_telemetry['total_wait_time'] += wait_time
+        for bound in self.WAIT_BUCKETS:
+            if wait_time <= bound:
+                self.pool_telemetry['wait_histogram'][self._bucket_label(bound)] += 1
+                return
+        self.pool_telemetry['wait_histogram'][self._bucket_label(None)] += 1
+    
+    def _acquire_slot(self, timeout: float):
+        """
+        Reserve one of maxconn slots, queueing FIFO behind earlier callers.
+        Raises PoolTimeoutError if no slot is handed over within timeout seconds.
+        """
+        with self._slot_lock:
+            if self._in_use < self.pool_config['maxconn'] and not self._waiters:
+                self._in_use += 1
+                self.pool_telemetry['peak_in_use'] = max(self.pool_telemetry['peak_in_use'], self._in_use)
+                return
+            waiter = _PoolWaiter()
+            self._waiters.append(waiter)
+            self.pool_telemetry['queued_acquisitions'] += 1
+            self.pool_telemetry['peak_waiters'] = max(self.pool_telemetry['peak_waiters'], len(self._waiters))
+        
+        waiter.event.wait(max(timeout, 0))
+        
+        with self._slot_lock:
+            if waiter.granted:
+                return
+            self._waiters.remove(waiter)
+            self.pool_telemetry['acquisition_timeouts'] += 1
+            waiting = len(self._waiters)
+        raise PoolTimeoutError(f"Pool exhausted: no free slot within {timeout:.1f}s ({waiting} still waiting)")
+    
+    def _release_slot(self):
+        """Hand the slot to the longest-waiting caller, or free it"""
+        with self._slot_lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                waiter.event.set()
+            elif self._in_use > 0:
+                self._in_use -= 1
+    
+    def get_connection(self, timeout: float = None):
+        """
+        Get a connection from the pool with comprehensive monitoring.
+        When all maxconn connections are checked out, waits in FIFO order for up to
+        timeout seconds (default DB_CONNECTION_TIMEOUT) before raising PoolTimeoutError.
+        """
         if not self._pool:
             self._initialize_pool()
         
+        timeout = self.pool_config['timeout'] if timeout is None else timeout
         start_time = time.time()
         try:
-            with self._pool_lock:
-                conn = self._pool.getconn()
+            self._acquire_slot(timeout)
+        except PoolTimeoutError as e:
             wait_time = time.time() - start_time
-            
-            # Monitor connection acquisition performance
-            system_monitor.connection_stats['total_acquired'] += 1
-            if wait_time > 1:  # Log slow connection acquisition
-                chatbot_logger.logger.warning(f"Slow connection acquisition: {wait_time:.2f}s")
-                print(f"⚠️ Connection acquired in {wait_time:.2f}s (slower than expected)")
-            
-            return conn
-            
+            self._record_wait(wait_time)
+            system_monitor.connection_stats['failed_acquisitions'] += 1
+            chatbot_logger.logger.error(f"Connection acquisition timed out after {wait_time:.2f}s: {e}")
+            print(f"❌ {e}")
+            raise
+        
+        wait_time = time.time() - start_time
+        self._record_wait(wait_time)
+        try:
+            # ThreadedConnectionPool has its own lock; holding ours here would serialize new connects
+            conn = self._pool.getconn()
         except Exception as e:
-            wait_time = time.time() - start_time
+            self._release_slot()
             system_monitor.connection_stats['failed_acquisitions'] += 1
             
-            # Auto-cleanup if too many failures
+            # Broken idle connections are the likely cause of repeated connect failures
             if system_monitor.connection_stats['failed_acquisitions'] >= 10:
                 chatbot_logger.logger.warning("🚨 High connection failure rate detected, triggering cleanup")
                 print("🚨 Auto-triggering connection cleanup due to failures")
                 try:
                     self.cleanup_stale_connections()
-                    # Reset failure counter after cleanup
                     system_monitor.connection_stats['failed_acquisitions'] = 0
                 except Exception as cleanup_error:
                     chatbot_logger.logger.error(f"Auto-cleanup failed: {cleanup_error}")
             
-            error_msg = f"Failed to get connection after {wait_time:.2f}s: {e}"
+            error_msg = f"Failed to get connection after {time.time() - start_time:.2f}s: {e}"
             chatbot_logger.logger.error(error_msg)
             print(f"❌ {error_msg}")
             raise
+        
+        self._register_checkout(conn)
+        system_monitor.connection_stats['total_acquired'] += 1
+        if wait_time > 1:  # Log slow connection acquisition
+            chatbot_logger.logger.warning(f"Slow connection acquisition: {wait_time:.2f}s")
+            print(f"⚠️ Connection acquired in {wait_time:.2f}s (slower than expected)")
+        return conn
     
-    def return_connection(self, conn):
-        """Return a connection to the pool with error handling"""
+    def return_connection(self, conn, close: bool = False):
+        """Return a connection to the pool with error handling (close=True discards it)"""
         if self._pool and conn:
+            with self._checkout_lock:
+                checkout = self._checkouts.pop(id(conn), None)
+            if checkout is None:
+                # Already reclaimed by the leak detector (or never ours) - its slot is gone too
+                self.leak_stats['unknown_returns'] += 1
+                chatbot_logger.logger.warning("Ignoring return of a connection that is not checked out (reclaimed as a leak?)")
+                return
             try:
-                with self._pool_lock:
-                    self._pool.putconn(conn)
+                self._pool.putconn(conn, close=close)
                 system_monitor.connection_stats['total_returned'] += 1
             except Exception as e:
                 chatbot_logger.logger.error(f"Failed to return connection to pool: {e}")
@@ -457,8 +603,125 @@ class DatabaseConnectionManager:
                     conn.close()
                 except:
                     pass
+            finally:
+                self._release_slot()
+    
+    def _register_checkout(self, conn):
+        checkout = {
+            'conn': conn,
+            'checked_out_at': time.time(),
+            'thread': threading.current_thread().name,
+            'stack': None
+        }
+        if self.leak_config['enabled']:
+            # Where the connection was taken - the frames of get_connection itself are dropped
+            frames = traceback.extract_stack(limit=self.leak_config['stack_depth'] + 2)[:-2]
+            checkout['stack'] = [f"{frame.filename}:{frame.lineno} in {frame.name}" for frame in frames]
+        with self._checkout_lock:
+            self._checkouts[id(conn)] = checkout
     
-    def execute_query_with_retry(self, query, max_retries=3):
+    def check_for_leaks(self) -> list:
+        """
+        Flag connections held longer than the leak threshold; with reclaim enabled
+        they are closed and their pool slot is released.
+        
+        Returns:
+            List of offender reports (thread, held_seconds, checkout stack)
+        """
+        now = time.time()
+        threshold = self.leak_config['threshold']
+        with self._checkout_lock:
+            leaked = [(key, checkout) for key, checkout in self._checkouts.items()
+                      if now - checkout['checked_out_at'] > threshold]
+            if self.leak_config['reclaim']:
+                for key, _ in leaked:
+                    del self._checkouts[key]
+        
+        offenders = []
+        for _, checkout in leaked:
+            held = now - checkout['checked_out_at']
+            offender = {
+                'thread': checkout['thread'],
+                'held_seconds': round(held, 1),
+                'checked_out_at': datetime.fromtimestamp(checkout['checked_out_at']).isoformat(),
+                'stack': checkout['stack'] or [],
+                'reclaimed': self.leak_config['reclaim']
+            }
+            offenders.append(offender)
+            self._leak_offenders.append(offender)
+            self.leak_stats['leaks_detected'] += 1
+            
+            where = offender['stack'][-1] if offender['stack'] else 'unknown caller'
+            chatbot_logger.logger.warning(f"🚰 Connection leak: held {held:.0f}s by {checkout['thread']} at {where}")
+            
+            if self.leak_config['reclaim']:
+                try:
+                    self._pool.putconn(checkout['conn'], close=True)
+                except Exception as e:
+                    chatbot_logger.logger.error(f"Failed to reclaim leaked connection: {e}")
+                    try:
+                        checkout['conn'].close()
+                    except Exception:
+                        pass
+                finally:
+                    self._release_slot()
+                self.leak_stats['reclaimed'] += 1
+        return offenders
+    
+    def start_leak_detection(self):
+        """Start the daemon thread that periodically runs check_for_leaks"""
+        if self._leak_thread and self._leak_thread.is_alive():
+            return
+        self.leak_config['enabled'] = True
+        
+        def _leak_loop():
+            while self.leak_config['enabled']:
+                time.sleep(self.leak_config['check_interval'])
+                try:
+                    self.check_for_leaks()
+                except Exception as e:
+                    chatbot_logger.logger.error(f"Leak check failed: {e}")
+        
+        self._leak_thread = threading.Thread(target=_leak_loop, name="db_leak_detector", daemon=True)
+        self._leak_thread.start()
+        chatbot_logger.logger.info(f"🔍 Connection leak detection enabled (threshold {self.leak_config['threshold']}s)")
+    
+    def get_leak_report(self) -> dict:
+        """Leak detector status, currently long-held connections and recent offenders"""
+        now = time.time()
+        with self._checkout_lock:
+            held = sorted((now - checkout['checked_out_at'], checkout['thread']) for checkout in self._checkouts.values())
+        return {
+            'enabled': self.leak_config['enabled'],
+            'threshold': self.leak_config['threshold'],
+            'reclaim': self.leak_config['reclaim'],
+            'checked_out': len(held),
+            'oldest_checkout_seconds': round(held[-1][0], 1) if held else 0.0,
+            'recent_offenders': list(self._leak_offenders)[-10:],
+            **self.leak_stats
+        }
+    
+    def _acquire_timeout(self, deadline):
+        """Pool wait bounded by the request deadline as well as the pool's own timeout"""
+        return deadline.timeout(cap=self.pool_config['timeout']) if deadline else None
+    
+    @staticmethod
+    def _apply_statement_timeout(cursor, deadline):
+        """Limit the current transaction's statements to the request's remaining time"""
+        if deadline:
+            cursor.execute("SET LOCAL statement_timeout = %s", (deadline.statement_timeout_ms(),))
+    
+    def _should_retry(self, db_error, attempt, max_retries, deadline) -> Optional[float]:
+        """Retry delay for a failed attempt, or None when out of attempts, non-retryable or out of time"""
+        if attempt >= max_retries or not recovery_manager.is_retryable_error(db_error.error_type):
+            return None
+        wait_time = recovery_manager.get_retry_delay(attempt)
+        if deadline and not deadline.allows_retry(wait_time):
+            chatbot_logger.logger.info(f"Not retrying: {deadline.remaining():.2f}s left in request deadline")
+            return None
+        return wait_time
+    
+    def execute_query_with_retry(self, query, max_retries=3, deadline=None, params=None):
         """
         Execute query with intelligent retry mechanism and comprehensive monitoring
         Uses context manager to ensure connections are properly returned
@@ -466,10 +729,15 @@ class DatabaseConnectionManager:
         Args:
             query: SQL query to execute
             max_retries: Maximum number of retry attempts
+            deadline: Request Deadline (defaults to the current one) - bounds the pool wait,
+                      statement_timeout and retries
+            params: Values for a registered statement's $1..$n placeholders - the query
+                    then runs as EXECUTE of a statement prepared on the connection
             
         Returns:
             Tuple of (column_names, rows)
         """
+        deadline = resolve_deadline(deadline)
         last_exception = None
         query_start = time.time()
         
@@ -477,12 +745,22 @@ class DatabaseConnectionManager:
             attempt_start = time.time()
             
             try:
+                if deadline:
+                    deadline.check("executing query")
                 # Use context manager to ensure connection is always returned
-                with self.get_connection_context() as conn:
+                with self.get_connection_context(self._acquire_timeout(deadline)) as conn:
                     with conn.cursor() as cursor:
+                        self._apply_statement_timeout(cursor, deadline)
+                        
                         # Execute query with timing
                         exec_start = time.time()
-                        cursor.execute(query)
+                        if params is not None:
+                            statement_registry.execute(
+                                cursor, query, params,
+                                reset=lambda: self._apply_statement_timeout(cursor, deadline)
+                            )
+                        else:
+                            cursor.execute(query)
                         execution_time = time.time() - exec_start
                         
                         # Fetch results
@@ -515,9 +793,9 @@ class DatabaseConnectionManager:
                 
                 chatbot_logger.logger.error(f"Query execution failed (attempt {attempt + 1}/{max_retries + 1}) after {attempt_time:.3f}s: {db_error.error_type.value}")
                 
-                # Check if this error type should be retried
-                if attempt < max_retries and recovery_manager.is_retryable_error(db_error.error_type):
-                    wait_time = recovery_manager.get_retry_delay(attempt)
+                # Check if this error type should be retried (and there is time left to do so)
+                wait_time = self._should_retry(db_error, attempt, max_retries, deadline)
+                if wait_time is not None:
                     chatbot_logger.logger.info(f"Retrying after {wait_time}s (error type: {db_error.error_type.value})")
                     time.sleep(wait_time)
                     
@@ -529,20 +807,150 @@ class DatabaseConnectionManager:
         
         # All retries exhausted or non-retryable error
         total_query_time = time.time() - query_start
-        chatbot_logger.logger.error(f"Query failed after {total_query_time:.3f}s and {max_retries + 1} attempts")
+        chatbot_logger.logger.error(f"Query failed after {total_query_time:.3f}s and {attempt + 1} attempts")
+        raise last_exception
+    
+    def _is_streamable(self, query):
+        """Named cursors (DECLARE ... CURSOR FOR) only accept SELECT/WITH statements"""
+        return bool(re.match(r'^\s*\(*\s*(select|with)\b', query, re.IGNORECASE))
+    
+    def stream_query_with_retry(self, query, batch_size=None, max_retries=3, deadline=None, params=None):
+        """
+        Stream query results in batches through a named server-side cursor.
+        Only one batch is held in memory at a time, so peak memory is bounded by
+        batch_size instead of the size of the result set.
+        
+        Retries follow the same rules as execute_query_with_retry, but only until
+        the first batch has been handed to the caller - after that errors propagate.
+        
+        Args:
+            query: SQL query to execute
+            batch_size: Rows fetched per round trip (defaults to DB_STREAM_BATCH_SIZE)
+            max_retries: Maximum number of retry attempts
+            deadline: Request Deadline (defaults to the current one)
+            params: Values for a registered statement (see execute_query_with_retry)
+            
+        Yields:
+            Tuples of (column_names, rows) - one per fetchmany() batch
+        """
+        batch_size = batch_size or self.stream_config['batch_size']
+        deadline = resolve_deadline(deadline)
+        
+        # Statements that cannot be declared as a cursor (including EXECUTE of a
+        # prepared statement) are executed normally
+        if params is not None or not self._is_streamable(query):
+            yield self.execute_query_with_retry(query, max_retries, deadline=deadline, params=params)
+            return
+        
+        cursor_query = query.strip().rstrip(';')
+        last_exception = None
+        query_start = time.time()
+        
+        for attempt in range(max_retries + 1):
+            attempt_start = time.time()
+            conn = None
+            cursor = None
+            batches_sent = 0
+            
+            try:
+                if deadline:
+                    deadline.check("executing query")
+                conn = self.get_connection(self._acquire_timeout(deadline))
+                if deadline:
+                    with conn.cursor() as setup_cursor:
+                        self._apply_statement_timeout(setup_cursor, deadline)
+                
+                # Named cursor => DECLARE CURSOR on the server, rows stay there until fetched
+                cursor = conn.cursor(name=f"chatbot_stream_{uuid.uuid4().hex[:12]}")
+                cursor.itersize = batch_size
+                
+                exec_start = time.time()
+                cursor.execute(cursor_query)
+                rows = cursor.fetchmany(batch_size)
+                execution_time = time.time() - exec_start
+                
+                # Named cursors only expose a description after the first fetch
+                column_names = [desc[0] for desc in cursor.description] if cursor.description else []
+                total_rows = 0
+                
+                while True:
+                    total_rows += len(rows)
+                    batches_sent += 1
+                    yield column_names, rows
+                    if len(rows) < batch_size:
+                        break
+                    rows = cursor.fetchmany(batch_size)
+                
+                system_monitor.update_performance_metrics(time.time() - exec_start, total_rows)
+                
+                if execution_time > 5.0:
+                    chatbot_logger.logger.warning(f"Very slow query detected: {execution_time:.3f}s to first batch - Query: {query[:100]}...")
+                elif execution_time > 1.0:
+                    chatbot_logger.logger.info(f"Slow query detected: {execution_time:.3f}s to first batch")
+                
+                return
+                
+            except Exception as e:
+                if batches_sent:
+                    # Part of the result was already consumed - retrying would duplicate rows
+                    raise
+                
+                last_exception = e
+                attempt_time = time.time() - attempt_start
+                db_error = ErrorClassifier.classify_error(e, query)
+                
+                chatbot_logger.logger.error(f"Streaming query failed (attempt {attempt + 1}/{max_retries + 1}) after {attempt_time:.3f}s: {db_error.error_type.value}")
+                
+                wait_time = self._should_retry(db_error, attempt, max_retries, deadline)
+                if wait_time is not None:
+                    chatbot_logger.logger.info(f"Retrying after {wait_time}s (error type: {db_error.error_type.value})")
+                    time.sleep(wait_time)
+                    continue
+                else:
+                    break
+                
+            finally:
+                # Runs on normal exit, on error and when the consumer closes the generator early
+                if cursor is not None:
+                    try:
+                        cursor.close()
+                    except Exception:
+                        pass
+                if conn is not None:
+                    try:
+                        # End the read transaction that holds the server-side cursor
+                        conn.rollback()
+                    except Exception:
+                        pass
+                    self.return_connection(conn)
+        
+        total_query_time = time.time() - query_start
+        chatbot_logger.logger.error(f"Streaming query failed after {total_query_time:.3f}s and {attempt + 1} attempts")
         raise last_exception
     
     def get_pool_status(self):
-        """Get current connection pool status for monitoring"""
+        """Live connection pool telemetry for monitoring"""
         if not self._pool:
             return {"status": "not_initialized"}
         
         try:
-            # This is a simplified status - actual implementation may vary based on psycopg2 version
+            with self._slot_lock:
+                in_use = self._in_use
+                waiting = len(self._waiters)
+            telemetry = dict(self.pool_telemetry, wait_histogram=dict(self.pool_telemetry['wait_histogram']))
+            acquisitions = sum(telemetry['wait_histogram'].values())
             return {
                 "status": "active",
                 "min_connections": self.pool_config['minconn'],
                 "max_connections": self.pool_config['maxconn'],
+                "acquire_timeout": self.pool_config['timeout'],
+                "in_use": in_use,
+                # Idle connections already opened and parked in the pool
+                "idle": len(getattr(self._pool, '_pool', [])),
+                "waiting": waiting,
+                "utilization": f"{in_use / self.pool_config['maxconn'] * 100:.1f}%",
+                "avg_wait_ms": round(telemetry['total_wait_time'] / acquisitions * 1000, 2) if acquisitions else 0.0,
+                **telemetry,
                 "stats": system_monitor.connection_stats
             }
         except Exception as e:
@@ -550,38 +958,51 @@ class DatabaseConnectionManager:
             return {"status": "error", "error": str(e)}
     
     def cleanup_stale_connections(self):
-        """Emergency cleanup of stale connections to prevent pool exhaustion"""
+        """
+        Close broken idle connections so the pool reopens them on demand.
+        Checked-out connections are left alone - the pool is never rebuilt underneath them.
+        """
         if not self._pool:
-            return
-        
+            return 0
+        if not self._cleanup_lock.acquire(blocking=False):
+            return 0  # Already running (its own failed acquisitions must not re-trigger it)
+        
+        chatbot_logger.logger.info("🧹 Starting stale connection cleanup")
+        idle_count = len(getattr(self._pool, '_pool', []))
+        checked = []
+        closed = 0
         try:
-            with self._pool_lock:
-                # Force close any potentially stale connections
-                chatbot_logger.logger.info("🧹 Starting emergency connection cleanup")
-                
-                # Get current stats before cleanup
-                stats_before = system_monitor.connection_stats.copy()
-                
-                # This will force cleanup of idle/stale connections
-                # Note: psycopg2's pool doesn't have direct cleanup, but we can reset
-                old_pool = self._pool
-                self._pool = None
-                
-                # Close old pool
+            # Borrow the idle connections (without queueing) and probe each one
+            for _ in range(idle_count):
                 try:
-                    old_pool.closeall()
-                except Exception as e:
-                    chatbot_logger.logger.warning(f"Error closing old pool: {e}")
-                
-                # Reinitialize with same config
-                self._pool = psycopg2.pool.ThreadedConnectionPool(**self.pool_config)
-                
-                chatbot_logger.logger.info("✅ Emergency connection cleanup completed")
-                print("🧹 Connection pool cleanup completed")
-                
-        except Exception as e:
-            chatbot_logger.logger.error(f"❌ Emergency cleanup failed: {e}")
-            print(f"❌ Connection cleanup failed: {e}")
+                    checked.append(self.get_connection(timeout=0))
+                except Exception:
+                    break
+            
+            for index, conn in enumerate(checked):
+                healthy = False
+                try:
+                    if not conn.closed:
+                        cursor = conn.cursor()
+                        cursor.execute("SELECT 1")
+                        cursor.close()
+                        conn.rollback()
+                        healthy = True
+                except Exception:
+                    healthy = False
+                self.return_connection(conn, close=not healthy)
+                checked[index] = None
+                if not healthy:
+                    closed += 1
+        finally:
+            for conn in checked:
+                if conn is not None:
+                    self.return_connection(conn)
+            self._cleanup_lock.release()
+        
+        chatbot_logger.logger.info(f"✅ Connection cleanup completed: {closed} of {len(checked)} idle connections closed")
+        print(f"🧹 Connection pool cleanup completed ({closed} stale connections closed)")
+        return closed
 
     def close_pool(self):
         """Close all connections in the pool with logging"""
@@ -598,37 +1019,458 @@ class DatabaseConnectionManager:
 
 
 # Performance Optimization Classes
+class InProcessResultCache:
+    """
+    Bounded in-process LRU cache (L1) for query results.
+    Entries are kept as Python objects, so a hit costs no network round trip and
+    no deserialization. Memory is bounded by an estimated byte budget; entries
+    also expire after their TTL.
+    """
+    
+    def __init__(self, max_bytes=None, max_entry_bytes=None):
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv('L1_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else int(
+            os.getenv('L1_CACHE_MAX_ENTRY_BYTES', max(self.max_bytes // 8, 1))
+        )
+        self._entries = OrderedDict()  # key -> (expires_at, size_bytes, value, tags)
+        self._tag_index = {}           # tag (table name) -> keys of entries that depend on it
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'sets': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+            'rejected_too_large': 0
+        }
+    
+    @staticmethod
+    def estimate_size(value) -> int:
+        """Cheap, shallow size estimate of a cached result (dict of columns/rows)"""
+        size = sys.getsizeof(value)
+        if isinstance(value, dict):
+            for key, item in value.items():
+                size += sys.getsizeof(key)
+                if isinstance(item, (list, tuple)):
+                    size += sys.getsizeof(item)
+                    for row in item:
+                        size += sys.getsizeof(row)
+                        if isinstance(row, (list, tuple)):
+                            size += sum(sys.getsizeof(cell) for cell in row)
+                else:
+                    size += sys.getsizeof(item)
+        return size
+    
+    def _drop(self, key):
+        """Remove an entry and its tag index references (caller holds the lock)"""
+        _, size, _, tags = self._entries.pop(key)
+        self.current_bytes -= size
+        for tag in tags:
+            keys = self._tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_index[tag]
+    
+    def get(self, key):
+        """Return the cached value or None; refreshes LRU position on hit"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            
+            expires_at, _, value, _ = entry
+            if expires_at <= time.time():
+                self._drop(key)
+                self.stats['expirations'] += 1
+                self.stats['misses'] += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return value
+    
+    def set(self, key, value, ttl: int, tags=()) -> bool:
+        """Store value for ttl seconds, evicting least recently used entries to fit"""
+        if ttl <= 0:
+            return False
+        size = self.estimate_size(value)
+        if size > self.max_entry_bytes:
+            self.stats['rejected_too_large'] += 1
+            return False
+        
+        tags = frozenset(tags or ())
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            
+            self._entries[key] = (time.time() + ttl, size, value, tags)
+            self.current_bytes += size
+            for tag in tags:
+                self._tag_index.setdefault(tag, set()).add(key)
+            self.stats['sets'] += 1
+            
+            while self.current_bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+        return True
+    
+    def peek(self, key):
+        """Return a live cached value without touching LRU order or hit/miss stats"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                return None
+            return entry[2]
+    
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+    
+    def invalidate_tag(self, tag) -> int:
+        """Drop every entry tagged with tag; returns the number of entries removed"""
+        with self._lock:
+            keys = list(self._tag_index.get(tag, ()))
+            for key in keys:
+                if key in self._entries:
+                    self._drop(key)
+            self._tag_index.pop(tag, None)
+            self.stats['invalidations'] += len(keys)
+            return len(keys)
+    
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'entries': len(self._entries),
+                'tracked_tables': len(self._tag_index),
+                'bytes_used': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hit_rate': f"{(self.stats['hits'] / lookups * 100):.1f}%" if lookups else "0.0%"
+            }
+
+
+class _Flight:
+    """One in-progress computation that concurrent callers can wait on"""
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.leader = threading.get_ident()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical work: the first caller for a key (the leader)
+    runs it, everyone else arriving meanwhile waits for and shares that result.
+    """
+    
+    def __init__(self, wait_timeout=None):
+        self.wait_timeout = wait_timeout if wait_timeout is not None else int(os.getenv('CACHE_SINGLE_FLIGHT_TIMEOUT', 30))
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.stats = {'leaders': 0, 'coalesced': 0, 'wait_timeouts': 0}
+    
+    def begin(self, key):
+        """
+        Register interest in key.
+        Returns (is_leader, flight). A leader must call finish(); a follower may wait().
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.stats['leaders'] += 1
+                return True, flight
+            if flight.leader == threading.get_ident():
+                # Re-entrant call from the leader itself (e.g. a nested run_query of the same SQL) - never wait on ourselves
+                return False, None
+            flight.waiters += 1
+            self.stats['coalesced'] += 1
+            return False, flight
+    
+    def finish(self, key, flight, result=None, error=None):
+        flight.result = result
+        flight.error = error
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.event.set()
+    
+    def wait(self, flight, deadline=None) -> bool:
+        """Block until the leader finishes (at most until the request deadline). Returns False on timeout."""
+        deadline = resolve_deadline(deadline)
+        finished = flight.event.wait(deadline.timeout(cap=self.wait_timeout) if deadline else self.wait_timeout)
+        if not finished:
+            self.stats['wait_timeouts'] += 1
+        return finished
+    
+    def do(self, key, fn):
+        """Run fn once per key across concurrent callers and share its result"""
+        is_leader, flight = self.begin(key)
+        
+        if flight is None:
+            return fn()
+        
+        if not is_leader:
+            if self.wait(flight):
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result
+            if flight.result is not None:
+                return flight.result
+            # Leader is taking too long, or had nothing to share - do the work ourselves
+            return fn()
+        
+        try:
+            result = fn()
+        except Exception as e:
+            self.finish(key, flight, error=e)
+            raise
+        self.finish(key, flight, result=result)
+        return result
+    
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, 'in_flight': len(self._flights)}
+
+
+class TableChangeTracker:
+    """
+    Per-table change signals used to invalidate cached results.
+    A result is dropped when - and only when - a table it read from changes:
+    - Polling: cumulative n_tup_ins/n_tup_upd/n_tup_del counters from pg_stat_user_tables
+    - LISTEN/NOTIFY (optional): immediate signal from the statement-level trigger
+      installed by scripts/database/setup_cache_invalidation.py
+    """
+    
+    COUNTERS_QUERY = """
+        SELECT schemaname, relname, n_tup_ins + n_tup_upd + n_tup_del
+        FROM pg_stat_user_tables
+    """
+    
+    def __init__(self, connection_manager, poll_interval=None, channel=None):
+        self.connection_manager = connection_manager
+        self.poll_interval = poll_interval if poll_interval is not None else int(os.getenv('CACHE_CHANGE_POLL_SECONDS', 15))
+        self.channel = channel if channel is not None else os.getenv('CACHE_CHANGE_CHANNEL', 'chatbot_table_changes')
+        if self.channel and not re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', self.channel):
+            raise ValueError(f"Invalid CACHE_CHANGE_CHANNEL: {self.channel!r}")
+        self._counters = {}       # 'schema.table' -> last seen modification counter
+        self._generations = {}    # 'schema.table' -> local change generation
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._listen_conn = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self.last_poll = None
+        self.stats = {'polls': 0, 'poll_errors': 0, 'notifications': 0, 'tables_changed': 0}
+    
+    def add_listener(self, callback):
+        """Register callback(changed_tables) to run whenever tables change"""
+        self._listeners.append(callback)
+    
+    def tracks_all(self, tables) -> bool:
+        """True if every table has a change signal, so results over them can be cached until it fires"""
+        with self._lock:
+            return bool(tables) and bool(self._counters) and all(table in self._counters for table in tables)
+    
+    def get_generations(self, tables) -> dict:
+        """Snapshot of the change generation of each table (taken before a query runs)"""
+        with self._lock:
+            return {table: self._generations.get(table, 0) for table in tables}
+    
+    def changed_since(self, generations: dict) -> bool:
+        """True if any table in a get_generations() snapshot has changed since"""
+        with self._lock:
+            return any(self._generations.get(table, 0) != generation for table, generation in generations.items())
+    
+    def poll(self) -> set:
+        """Read modification counters and signal every table whose counter moved"""
+        try:
+            with self.connection_manager.get_connection_context() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(self.COUNTERS_QUERY)
+                    rows = cursor.fetchall()
+                finally:
+                    cursor.close()
+                    conn.rollback()
+        except Exception as e:
+            self.stats['poll_errors'] += 1
+            chatbot_logger.logger.warning(f"Table change poll failed: {e}")
+            return set()
+        
+        counters = {f"{schema}.{table}".lower(): int(count or 0) for schema, table, count in rows}
+        with self._lock:
+            if self._counters:
+                # Any movement counts - a counter that went backwards means stats were reset
+                changed = {table for table in set(counters) | set(self._counters)
+                           if counters.get(table) != self._counters.get(table)}
+            else:
+                changed = set()  # First poll only establishes the baseline
+            self._counters = counters
+        
+        self.stats['polls'] += 1
+        self.last_poll = time.time()
+        if changed:
+            self._mark_changed(changed)
+        return changed
+    
+    def _mark_changed(self, tables):
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+        self.stats['tables_changed'] += len(tables)
+        chatbot_logger.logger.info(f"🔄 Tables changed: {', '.join(sorted(tables))}")
+        
+        for callback in list(self._listeners):
+            try:
+                callback(set(tables))
+            except Exception as e:
+                chatbot_logger.logger.error(f"Table change listener failed: {e}")
+    
+    def _open_listen_connection(self):
+        """Dedicated autocommit connection for LISTEN - never taken from the pool"""
+        try:
+            conn = psycopg2.connect(**self.connection_manager.db_config)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            cursor = conn.cursor()
+            cursor.execute(f"LISTEN {self.channel}")
+            cursor.close()
+            chatbot_logger.logger.info(f"👂 Listening for table changes on channel '{self.channel}'")
+            return conn
+        except Exception as e:
+            chatbot_logger.logger.warning(f"LISTEN on '{self.channel}' unavailable, relying on polling: {e}")
+            return None
+    
+    def _close_listen_connection(self):
+        if self._listen_conn is not None:
+            try:
+                self._listen_conn.close()
+            except Exception:
+                pass
+            self._listen_conn = None
+    
+    def _wait_for_notifications(self, timeout) -> set:
+        """Block up to timeout seconds for NOTIFY payloads ('schema.table'); returns the notified tables"""
+        if self._listen_conn is None:
+            self._stop_event.wait(timeout)
+            return set()
+        
+        try:
+            if select.select([self._listen_conn], [], [], timeout) == ([], [], []):
+                return set()
+            self._listen_conn.poll()
+            tables = set()
+            while self._listen_conn.notifies:
+                payload = self._listen_conn.notifies.pop(0).payload.lower()
+                tables.add(payload if '.' in payload else f"public.{payload}")
+            self.stats['notifications'] += len(tables)
+            return tables
+        except Exception as e:
+            chatbot_logger.logger.warning(f"Table change listener connection lost: {e}")
+            self._close_listen_connection()
+            return set()
+    
+    def start(self):
+        """Start the daemon thread that polls counters and listens for notifications"""
+        if self._thread and self._thread.is_alive():
+            return
+        if self.poll_interval <= 0:
+            return
+        
+        def _watch_loop():
+            self.poll()
+            next_poll = time.time() + self.poll_interval
+            while not self._stop_event.is_set():
+                if self._listen_conn is None and self.channel:
+                    self._listen_conn = self._open_listen_connection()
+                
+                notified = self._wait_for_notifications(max(next_poll - time.time(), 0.1))
+                if notified:
+                    self._mark_changed(notified)
+                if time.time() >= next_poll and not self._stop_event.is_set():
+                    self.poll()
+                    next_poll = time.time() + self.poll_interval
+            self._close_listen_connection()
+        
+        self._thread = threading.Thread(target=_watch_loop, name="table_change_tracker", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop_event.set()
+    
+    def get_status(self) -> dict:
+        with self._lock:
+            tables_tracked = len(self._counters)
+        return {
+            'active': self.last_poll is not None,
+            'listening': self._listen_conn is not None,
+            'channel': self.channel,
+            'poll_interval': self.poll_interval,
+            'tables_tracked': tables_tracked,
+            'last_poll': datetime.fromtimestamp(self.last_poll).isoformat() if self.last_poll else None,
+            **self.stats
+        }
+
+
 class IntelligentQueryCache:
-    """Redis-based intelligent caching system for database queries"""
+    """
+    Two-tier caching system for database queries:
+    L1 - bounded in-process LRU (no network, no deserialization)
+    L2 - Redis, shared across workers (optional)
+    """
     
     def __init__(self):
+        # L1 is always available, even without Redis
+        self.l1_cache = InProcessResultCache()
+        self.single_flight = SingleFlight()
+        self.cache_available = True
+        self.l2_stats = {'hits': 0, 'misses': 0, 'sets': 0, 'errors': 0, 'invalidations': 0}
+        self.dependency_stats = {'tracked_results': 0, 'untracked_results': 0, 'skipped_stale': 0}
+        
+        # Attached once the database manager exists (see attach_change_tracker)
+        self.change_tracker = None
+        self.tracked_ttl = int(os.getenv('CACHE_TRACKED_TTL', 86400))
+        
+        # Stale-while-revalidate: past its soft TTL an entry is still served (and
+        # refreshed in the background) for up to stale_window more seconds
+        self.stale_window = int(os.getenv('CACHE_STALE_WHILE_REVALIDATE_SECONDS', 300))
+        self.freshness_stats = {'fresh_hits': 0, 'stale_hits': 0, 'revalidations': 0, 'revalidation_errors': 0}
+        
         if not REDIS_AVAILABLE:
-            chatbot_logger.logger.warning("⚠️ Redis not available - cache disabled")
-            self.cache_available = False
+            chatbot_logger.logger.warning("⚠️ Redis not available - using in-process cache only")
+            self.redis_available = False
             self.redis_client = None
         else:
             try:
                 self.redis_client = redis.Redis(
                     host=os.getenv('REDIS_HOST', 'localhost'),
                     port=int(os.getenv('REDIS_PORT', 6379)),
-                    decode_responses=True,
+                    decode_responses=False,  # Cached results are binary (result_codec)
                     socket_timeout=5,
                     socket_connect_timeout=5,
                     db=0
                 )
                 # Test connection
                 self.redis_client.ping()
-                self.cache_available = True
+                self.redis_available = True
                 chatbot_logger.logger.info("✅ Redis cache connected successfully")
             except Exception as e:
-                if REDIS_AVAILABLE and redis and hasattr(e, '__class__') and 'redis' in str(type(e)).lower():
-                    chatbot_logger.logger.warning(f"⚠️ Redis cache unavailable: {e}")
-                else:
-                    chatbot_logger.logger.warning(f"⚠️ Redis cache unavailable: {e}")
-                self.cache_available = False
+                chatbot_logger.logger.warning(f"⚠️ Redis cache unavailable, using in-process cache only: {e}")
+                self.redis_available = False
                 self.redis_client = None
         
-        # Cache TTL strategies by query type (in seconds)
+        # Fallback TTL strategies by query type (in seconds), used when a query's
+        # tables have no change signal or its result depends on the clock
         self.cache_strategies = {
             'stoppage_report': 300,    # 5 minutes - moderate updates
             'vehicle_master': 3600,    # 1 hour - rarely changes
@@ -639,12 +1481,26 @@ class IntelligentQueryCache:
         }
     
     def get_cache_key(self, query: str, params: dict = None) -> str:
-        """Generate unique cache key for query"""
-        combined = f"{query}:{json.dumps(params, sort_keys=True, cls=DecimalEncoder) if params else ''}"
+        """Generate unique cache key for query (formatting-insensitive, literal-sensitive)"""
+        combined = f"{normalize_sql(query)}:{json.dumps(params, sort_keys=True, cls=DecimalEncoder) if params else ''}"
         return f"chatbot_query:{hashlib.md5(combined.encode()).hexdigest()}"
     
-    def determine_cache_strategy(self, query: str) -> int:
-        """Determine appropriate cache TTL based on query type"""
+    def attach_change_tracker(self, tracker):
+        """Invalidate cached results whenever a table they read from changes"""
+        self.change_tracker = tracker
+        tracker.add_listener(self.invalidate_tables)
+    
+    def determine_cache_strategy(self, query: str, tables=None) -> int:
+        """
+        Determine cache TTL for a query.
+        Results over tables with a change signal are kept until those tables change
+        (bounded by tracked_ttl); everything else falls back to TTLs by query type.
+        """
+        if tables is None:
+            tables = extract_tables(query)
+        if self.change_tracker and self.change_tracker.tracks_all(tables) and not is_time_relative(query):
+            return self.tracked_ttl
+        
         query_lower = query.lower()
         
         if 'util_report' in query_lower and any(x in query_lower for x in ['stoppage', 'trip']):
@@ -661,30 +1517,151 @@ class IntelligentQueryCache:
             return self.cache_strategies['default']
     
     def get_cached_result(self, cache_key: str):
-        """Retrieve cached result if available"""
-        if not self.cache_available:
+        """Retrieve cached result from L1, falling back to Redis (L2)"""
+        result = self.l1_cache.get(cache_key)
+        if result is not None:
+            return result
+        
+        if not self.redis_available:
             return None
             
         try:
-            cached_result = self.redis_client.get(cache_key)
+            pipe = self.redis_client.pipeline()
+            pipe.get(cache_key)
+            pipe.ttl(cache_key)
+            cached_result, remaining_ttl = pipe.execute()
             if cached_result:
-                return json.loads(cached_result)
-        except (json.JSONDecodeError, Exception) as e:
+                if not is_encoded_result(cached_result):
+                    # Entry written in an older format - treat as a miss, it gets overwritten
+                    self.l2_stats['misses'] += 1
+                    return None
+                self.l2_stats['hits'] += 1
+                columns, rows, meta = decode_result(cached_result)
+                result = {**meta, 'columns': columns, 'rows': rows}
+                # Promote to L1 for the rest of the entry's lifetime
+                if remaining_ttl and remaining_ttl > 0:
+                    self.l1_cache.set(cache_key, result, remaining_ttl, tags=result.get('tables', ()))
+                return result
+            self.l2_stats['misses'] += 1
+        except (ResultCodecError, Exception) as e:
+            self.l2_stats['errors'] += 1
             chatbot_logger.logger.warning(f"Cache retrieval error: {e}")
         return None
     
     def cache_result(self, cache_key: str, result_data: dict, ttl: int):
-        """Cache query result with specified TTL"""
-        if not self.cache_available:
-            return False
+        """Cache query result with specified TTL in both tiers, indexed by the tables it read"""
+        tables = result_data.get('tables', ())
+        stored = self.l1_cache.set(cache_key, result_data, ttl, tags=tables)
+        
+        if not self.redis_available:
+            return stored
             
         try:
-            # Use custom encoder to handle Decimal objects
-            self.redis_client.setex(cache_key, ttl, json.dumps(result_data, cls=DecimalEncoder))
+            # Binary codec keeps Decimal/datetime/timedelta types intact across the round trip
+            meta = {key: value for key, value in result_data.items() if key not in ('columns', 'rows')}
+            payload = encode_result(result_data['columns'], result_data['rows'], meta)
+            
+            pipe = self.redis_client.pipeline()
+            pipe.setex(cache_key, ttl, payload)
+            for table in tables:
+                pipe.sadd(self._table_index_key(table), cache_key)
+                pipe.expire(self._table_index_key(table), max(ttl, self.tracked_ttl))
+            pipe.execute()
+            self.l2_stats['sets'] += 1
             return True
         except Exception as e:
+            self.l2_stats['errors'] += 1
             chatbot_logger.logger.warning(f"Cache storage error: {e}")
-            return False
+            return stored
+    
+    @staticmethod
+    def _table_index_key(table: str) -> str:
+        return f"chatbot_table_keys:{table}"
+    
+    def capture_dependencies(self, query: str):
+        """
+        Tables a query reads and their change generations.
+        Must be taken before the query runs so a change racing the execution is detected.
+        """
+        tables = extract_tables(query)
+        generations = self.change_tracker.get_generations(tables) if self.change_tracker else {}
+        return tables, generations
+    
+    def store_query_result(self, query: str, cache_key: str, columns, rows, dependencies):
+        """
+        Cache a freshly executed result along with the tables it depends on.
+        Returns the TTL used, or None if the result was not cached.
+        """
+        tables, generations = dependencies
+        if self.change_tracker and self.change_tracker.changed_since(generations):
+            # A table changed while the query ran - the result may already be stale
+            self.dependency_stats['skipped_stale'] += 1
+            return None
+        
+        cache_ttl = self.determine_cache_strategy(query, tables)
+        if cache_ttl == self.tracked_ttl:
+            self.dependency_stats['tracked_results'] += 1
+        else:
+            self.dependency_stats['untracked_results'] += 1
+        
+        result_data = {
+            'columns': columns,
+            'rows': rows,
+            'tables': sorted(tables),
+            'cached_at': time.time(),
+            'soft_ttl': cache_ttl
+        }
+        # The entry outlives its soft TTL by the stale window (the hard TTL)
+        hard_ttl = cache_ttl + max(self.stale_window, 0)
+        return cache_ttl if self.cache_result(cache_key, result_data, hard_ttl) else None
+    
+    @staticmethod
+    def entry_age(result_data: dict) -> float:
+        """Seconds since the cached result was computed (0 for entries without a timestamp)"""
+        cached_at = result_data.get('cached_at')
+        return max(time.time() - cached_at, 0.0) if cached_at else 0.0
+    
+    def is_stale(self, result_data: dict) -> bool:
+        """True once an entry is past its soft TTL but still within its hard TTL"""
+        soft_ttl = result_data.get('soft_ttl')
+        return soft_ttl is not None and self.entry_age(result_data) > soft_ttl
+    
+    def invalidate_tables(self, tables):
+        """Drop every cached result that read from any of the given tables, in both tiers"""
+        dropped = sum(self.l1_cache.invalidate_tag(table) for table in tables)
+        
+        if self.redis_available:
+            try:
+                for table in tables:
+                    index_key = self._table_index_key(table)
+                    cache_keys = self.redis_client.smembers(index_key)
+                    pipe = self.redis_client.pipeline()
+                    if cache_keys:
+                        pipe.delete(*cache_keys)
+                    pipe.delete(index_key)
+                    pipe.execute()
+                    self.l2_stats['invalidations'] += len(cache_keys)
+            except Exception as e:
+                self.l2_stats['errors'] += 1
+                chatbot_logger.logger.warning(f"Cache invalidation error: {e}")
+        
+        if dropped:
+            chatbot_logger.logger.info(f"🧹 Invalidated {dropped} cached result(s) for {', '.join(sorted(tables))}")
+        return dropped
+    
+    def get_tier_stats(self) -> dict:
+        """Hit/miss/eviction counters per cache tier"""
+        return {
+            'l1_in_process': self.l1_cache.get_stats(),
+            'l2_redis': {**self.l2_stats, 'available': self.redis_available},
+            'single_flight': self.single_flight.get_stats(),
+            'freshness': {**self.freshness_stats, 'stale_window': self.stale_window},
+            'dependencies': {
+                **self.dependency_stats,
+                'tracked_ttl': self.tracked_ttl,
+                'change_tracker': self.change_tracker.get_status() if self.change_tracker else None
+            }
+        }
 
 
 class QueryPerformanceOptimizer:
@@ -693,22 +1670,11 @@ class QueryPerformanceOptimizer:
     def __init__(self):
         self.slow_query_threshold = 2.0  # 2 seconds
         self.query_stats = {}
+        self.sample_queries = {}  # fingerprint -> most recent literal SQL (used by the cache warmer)
         
-    def analyze_query_performance(self, query: str, execution_time: float):
+    def analyze_query_performance(self, query: str, execution_time: float, params=None):
         """Analyze query performance and suggest optimizations"""
-        query_hash = hashlib.md5(query.encode()).hexdigest()[:8]
-        
-        if query_hash not in self.query_stats:
-            self.query_stats[query_hash] = {
-                'query': query[:100] + '...' if len(query) > 100 else query,
-                'executions': 0,
-                'total_time': 0,
-                'avg_time': 0,
-                'max_time': 0,
-                'optimizations_suggested': []
-            }
-        
-        stats = self.query_stats[query_hash]
+        stats = self._stats_for(query, params)
         stats['executions'] += 1
         stats['total_time'] += execution_time
         stats['avg_time'] = stats['total_time'] / stats['executions']
@@ -726,6 +1692,32 @@ class QueryPerformanceOptimizer:
                 f"Suggestions: {', '.join(optimizations[:2])}"
             )
     
+    def record_cache_hit(self, query: str, params=None):
+        """Count an execution served from the result cache - it is workload the warmer should keep warm"""
+        self._stats_for(query, params)['cache_hits'] += 1
+    
+    def _stats_for(self, query: str, params=None) -> dict:
+        # Aggregate by literal-stripped shape so variants of the same template share stats
+        query_hash = fingerprint_sql(query)[:16]
+        
+        if query_hash not in self.query_stats:
+            shape = sql_shape(query)
+            self.query_stats[query_hash] = {
+                'query': shape[:100] + '...' if len(shape) > 100 else shape,
+                'fingerprint': query_hash,
+                'executions': 0,
+                'cache_hits': 0,
+                'total_time': 0,
+                'avg_time': 0,
+                'max_time': 0,
+                'optimizations_suggested': []
+            }
+        
+        # The warmer re-runs samples as plain SQL - a $n statement needs its params
+        if params is None:
+            self.sample_queries[query_hash] = query
+        return self.query_stats[query_hash]
+    
     def _suggest_optimizations(self, query: str, execution_time: float) -> list:
         """Suggest query optimizations based on query pattern"""
         suggestions = []
@@ -748,6 +1740,22 @@ class QueryPerformanceOptimizer:
             
         return suggestions
     
+    def get_top_workload(self, limit: int, min_executions: int = 1) -> list:
+        """
+        Most expensive recurring query fingerprints, by requests (database
+        executions plus cache hits) x average database latency.
+        
+        Returns:
+            List of (fingerprint, sample_sql, cost) tuples
+        """
+        candidates = []
+        for fingerprint, stats in list(self.query_stats.items()):
+            requests = stats['executions'] + stats['cache_hits']
+            if requests >= min_executions and fingerprint in self.sample_queries:
+                candidates.append((fingerprint, self.sample_queries[fingerprint], requests * stats['avg_time']))
+        candidates.sort(key=lambda candidate: candidate[2], reverse=True)
+        return candidates[:limit]
+    
     def get_performance_report(self) -> dict:
         """Generate performance analysis report"""
         if not self.query_stats:
@@ -776,6 +1784,7 @@ class MemoryOptimizedResultHandler:
     def __init__(self):
         self.max_rows_in_memory = 1000
         self.compression_threshold = 100  # rows
+        self.max_rows_scanned = int(os.getenv('DB_STREAM_MAX_ROWS', 100000))  # Stop counting streamed rows after this
         
     def optimize_large_result(self, columns, rows):
         """Optimize memory usage for large result sets"""
@@ -817,6 +1826,47 @@ class MemoryOptimizedResultHandler:
         chatbot_logger.logger.info(f"💾 Memory optimized: ~{memory_saved/1024:.1f}KB saved")
         
         return columns, optimized_rows
+    
+    def collect_stream(self, stream, max_rows=None, max_rows_scanned=None, row_transform=None):
+        """
+        Consume a run_query_iter() stream incrementally, keeping at most max_rows rows.
+        Remaining rows are only counted (up to max_rows_scanned) and then discarded,
+        so memory stays bounded no matter how large the result set is.
+        
+        Returns:
+            Tuple of (columns, rows, total_rows, scan_truncated)
+        """
+        max_rows = self.max_rows_in_memory if max_rows is None else max_rows
+        max_rows_scanned = self.max_rows_scanned if max_rows_scanned is None else max_rows_scanned
+        
+        columns = []
+        kept_rows = []
+        total_rows = 0
+        scan_truncated = False
+        
+        try:
+            for batch_columns, batch in stream:
+                columns = batch_columns
+                if len(kept_rows) < max_rows:
+                    for row in batch[:max_rows - len(kept_rows)]:
+                        kept_rows.append(row_transform(row) if row_transform else row)
+                total_rows += len(batch)
+                
+                if total_rows >= max_rows_scanned:
+                    scan_truncated = True
+                    break
+        finally:
+            # Releases the server-side cursor if we stopped early
+            close = getattr(stream, 'close', None)
+            if close:
+                close()
+        
+        if total_rows > len(kept_rows):
+            chatbot_logger.logger.info(
+                f"📄 Streamed result capped: kept {len(kept_rows)} of {total_rows}{'+' if scan_truncated else ''} rows"
+            )
+        
+        return columns, kept_rows, total_rows, scan_truncated
 
 
 class BackgroundProcessingManager:
@@ -824,6 +1874,8 @@ class BackgroundProcessingManager:
     
     def __init__(self):
         self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bg_processor")
+        self._unique_keys = set()
+        self._unique_lock = threading.Lock()
         
     def schedule_background_task(self, task_func, *args, **kwargs):
         """Schedule a task to run in the background"""
@@ -834,30 +1886,162 @@ class BackgroundProcessingManager:
             chatbot_logger.logger.error(f"Background task scheduling failed: {e}")
             return None
     
-    def precompute_common_queries(self):
-        """Pre-compute and cache common queries in background"""
-        common_queries = [
-            "SELECT COUNT(*) FROM util_report WHERE from_tm >= CURRENT_DATE - INTERVAL '7 days'",
-            "SELECT DISTINCT reg_no FROM util_report ORDER BY reg_no LIMIT 100",
-            "SELECT COUNT(*) FROM hosp_master",
-            "SELECT COUNT(*) FROM util_report WHERE from_tm >= CURRENT_DATE - INTERVAL '1 day'"
-        ]
-        
-        for query in common_queries:
-            self.schedule_background_task(self._precompute_query, query)
+    def schedule_unique_task(self, key, task_func, *args, **kwargs):
+        """Schedule a task unless one with the same key is already queued or running"""
+        with self._unique_lock:
+            if key in self._unique_keys:
+                return None
+            self._unique_keys.add(key)
+        
+        future = self.schedule_background_task(task_func, *args, **kwargs)
+        if future is None:
+            self._release_unique_key(key)
+            return None
+        future.add_done_callback(lambda _: self._release_unique_key(key))
+        return future
+    
+    def _release_unique_key(self, key):
+        with self._unique_lock:
+            self._unique_keys.discard(key)
+
+
+class CacheWarmer:
+    """
+    Keeps the most expensive recurring queries warm in the result cache.
+    Candidates are the top-N fingerprints by requests (database executions plus
+    cache hits) x average latency from QueryPerformanceOptimizer's workload stats.
+    Each is re-run from its most recent SQL on a schedule, and right after one of
+    its tables changes, and written under the same cache key run_query/run_query_iter
+    read. Rows are streamed, and a result that outgrows the cacheable size is
+    abandoned without fetching the rest.
+    
+    Warming runs on its own small executor sized to a share of the connection pool,
+    so it can never hold more than that many connections at once.
+    """
+    
+    def __init__(self, connection_manager, cache, optimizer, result_handler=None):
+        self.connection_manager = connection_manager
+        self.cache = cache
+        self.optimizer = optimizer
+        self.result_handler = result_handler
+        self.top_n = int(os.getenv('CACHE_WARM_TOP_N', 20))
+        self.interval = int(os.getenv('CACHE_WARM_INTERVAL_SECONDS', 300))
+        self.min_executions = int(os.getenv('CACHE_WARM_MIN_EXECUTIONS', 2))
+        self.pool_share = float(os.getenv('CACHE_WARM_POOL_SHARE', 0.1))
+        self.max_concurrent = max(1, int(connection_manager.pool_config['maxconn'] * self.pool_share))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="cache_warmer")
+        self._in_progress = set()
+        self._too_large = set()   # fingerprints whose results exceed the cacheable size
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+        self.last_cycle = None
+        self.stats = {'cycles': 0, 'warmed': 0, 'skipped_fresh': 0, 'skipped_too_large': 0,
+                      'change_triggered': 0, 'errors': 0}
+    
+    def _candidates(self):
+        return [(fingerprint, sql) for fingerprint, sql, _ in
+                self.optimizer.get_top_workload(self.top_n, self.min_executions)
+                if fingerprint not in self._too_large]
+    
+    def _submit(self, fingerprint, sql, force=False):
+        with self._lock:
+            if fingerprint in self._in_progress:
+                return None
+            self._in_progress.add(fingerprint)
+        try:
+            return self.executor.submit(self._warm_query, fingerprint, sql, force)
+        except Exception as e:
+            with self._lock:
+                self._in_progress.discard(fingerprint)
+            chatbot_logger.logger.error(f"Cache warm scheduling failed: {e}")
+            return None
     
-    def _precompute_query(self, query):
-        """Execute query and cache result"""
+    def _warm_query(self, fingerprint, sql, force):
         try:
-            columns, rows = db_manager.execute_query_with_retry(query)
-            # Cache the result using the cache manager
-            if hasattr(cache_manager, 'cache_available') and cache_manager.cache_available:
-                cache_key = f"precomputed:{hashlib.md5(query.encode()).hexdigest()}"
-                result_data = {'columns': columns, 'rows': rows}
-                cache_manager.cache_result(cache_key, result_data, 3600)  # 1 hour TTL
-                chatbot_logger.logger.info(f"✅ Precomputed query cached: {query[:50]}...")
+            cache_key = self.cache.get_cache_key(sql)
+            cached_result = self.cache.l1_cache.peek(cache_key)
+            if not force and cached_result and not self.cache.is_stale(cached_result):
+                self.stats['skipped_fresh'] += 1
+                return
+            
+            def _execute_and_cache():
+                dependencies = self.cache.capture_dependencies(sql)
+                max_rows = self.result_handler.max_rows_in_memory if self.result_handler else None
+                columns, rows = [], []
+                stream = self.connection_manager.stream_query_with_retry(sql)
+                try:
+                    for columns, batch in stream:
+                        rows.extend(batch)
+                        if max_rows is not None and len(rows) > max_rows:
+                            # Too large to cache - stop fetching instead of reading the whole result
+                            self._too_large.add(fingerprint)
+                            self.stats['skipped_too_large'] += 1
+                            return None
+                finally:
+                    stream.close()
+                if self.cache.store_query_result(sql, cache_key, columns, rows, dependencies):
+                    self.stats['warmed'] += 1
+                return columns, rows
+            
+            # Coalesces with a foreground request for the same query (which runs
+            # it itself when the warmer gave up on a too-large result)
+            self.cache.single_flight.do(cache_key, _execute_and_cache)
         except Exception as e:
-            chatbot_logger.logger.error(f"❌ Precomputation failed: {e}")
+            self.stats['errors'] += 1
+            chatbot_logger.logger.warning(f"Cache warm failed for {fingerprint}: {e}")
+        finally:
+            with self._lock:
+                self._in_progress.discard(fingerprint)
+    
+    def warm_once(self):
+        """Warm every current candidate that is missing or stale in the cache"""
+        candidates = self._candidates()
+        for fingerprint, sql in candidates:
+            self._submit(fingerprint, sql)
+        self.stats['cycles'] += 1
+        self.last_cycle = time.time()
+        return len(candidates)
+    
+    def on_tables_changed(self, tables):
+        """Table change listener: re-warm candidates that read from a changed table"""
+        for fingerprint, sql in self._candidates():
+            if extract_tables(sql) & tables:
+                if self._submit(fingerprint, sql, force=True):
+                    self.stats['change_triggered'] += 1
+    
+    def start(self):
+        """Start the daemon thread that warms candidates every interval"""
+        if self._thread and self._thread.is_alive():
+            return
+        if self.interval <= 0 or self.top_n <= 0:
+            return
+        
+        def _warm_loop():
+            # The first cycle waits for a full interval - there is no workload to learn from at startup
+            while not self._stop_event.wait(self.interval):
+                try:
+                    self.warm_once()
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    chatbot_logger.logger.error(f"Cache warm cycle failed: {e}")
+        
+        self._thread = threading.Thread(target=_warm_loop, name="cache_warmer", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop_event.set()
+    
+    def get_status(self) -> dict:
+        return {
+            'top_n': self.top_n,
+            'interval': self.interval,
+            'max_concurrent': self.max_concurrent,
+            'pool_share': self.pool_share,
+            'in_progress': len(self._in_progress),
+            'last_cycle': datetime.fromtimestamp(self.last_cycle).isoformat() if self.last_cycle else None,
+            **self.stats
+        }
 
 
 # Initialize performance optimization components
@@ -869,9 +2053,6 @@ try:
     
     chatbot_logger.logger.info("🚀 Performance optimization suite initialized")
     
-    # Start background precomputation
-    background_manager.precompute_common_queries()
-    
 except Exception as e:
     chatbot_logger.logger.warning(f"⚠️ Performance optimization partially unavailable: {e}")
     # Create dummy objects for fallback
@@ -888,70 +2069,164 @@ def cached_query(func):
         if not cache_manager or not cache_manager.cache_available:
             return func(query, *args, **kwargs)
         
-        # Generate cache key
+        # The request deadline is not part of the query's identity
+        deadline = kwargs.pop('deadline', None)
         cache_key = cache_manager.get_cache_key(query, kwargs)
         
-        # Try to get from cache first
-        cached_result = cache_manager.get_cached_result(cache_key)
+        def _execute_and_cache(deadline=None):
+            dependencies = cache_manager.capture_dependencies(query)
+            
+            # Execute original query
+            columns, rows = func(query, *args, deadline=deadline, **kwargs)
+            
+            # Cache the result until one of its tables changes
+            cache_ttl = cache_manager.store_query_result(query, cache_key, columns, rows, dependencies)
+            if cache_ttl:
+                chatbot_logger.logger.info(f"💾 CACHED: Query result cached for {cache_ttl}s")
+            return columns, rows
+        
+        # Try to get from cache first (stale entries are served while a refresh runs;
+        # the background refresh is not bound by this request's deadline)
+        cached_result = _serve_cached_result(query, cache_key, _execute_and_cache, params=kwargs.get('params'))
         if cached_result:
-            chatbot_logger.logger.info(f"🚀 CACHE HIT: Query served from cache in 0.001s")
             return cached_result['columns'], cached_result['rows']
         
-        # Execute original query
-        start_time = time.time()
-        columns, rows = func(query, *args, **kwargs)
-        execution_time = time.time() - start_time
-        
-        # Cache the result
-        cache_ttl = cache_manager.determine_cache_strategy(query)
-        result_data = {'columns': columns, 'rows': rows}
-        if cache_manager.cache_result(cache_key, result_data, cache_ttl):
-            chatbot_logger.logger.info(f"💾 CACHED: Query result cached for {cache_ttl}s")
-        
+        # Concurrent identical queries share one execution
+        columns, rows = cache_manager.single_flight.do(cache_key, lambda: _execute_and_cache(deadline))
+        _record_cache_info('database')
         return columns, rows
     return wrapper
 
 
+# Freshness of the most recent result served on this thread
+_cache_info = threading.local()
+
+
+def _record_cache_info(source, cached_result=None, revalidating=False):
+    age = cache_manager.entry_age(cached_result) if cache_manager and cached_result else 0.0
+    cached_at = cached_result.get('cached_at') if cached_result else None
+    _cache_info.value = {
+        'source': source,
+        'age_seconds': round(age, 1),
+        'cached_at': datetime.fromtimestamp(cached_at).isoformat() if cached_at else None,
+        'revalidating': revalidating
+    }
+
+
+def get_last_cache_info() -> dict:
+    """
+    How fresh the last run_query()/run_query_iter() result on this thread was.
+    
+    Returns:
+        Dict with source ('database', 'cache' or 'stale_cache'), age_seconds,
+        cached_at (ISO timestamp or None) and revalidating
+    """
+    return getattr(_cache_info, 'value', None) or {
+        'source': 'database', 'age_seconds': 0.0, 'cached_at': None, 'revalidating': False
+    }
+
+
+def _serve_cached_result(query, cache_key, refresh, params=None):
+    """
+    Look up a cached result. A stale one (past its soft TTL) is returned as-is and
+    refresh() - which must re-execute the query and re-cache it - is scheduled once
+    per key on the background executor.
+    """
+    cached_result = cache_manager.get_cached_result(cache_key)
+    if not cached_result:
+        return None
+    
+    # Hits are workload too - otherwise a hot query drops out of the warmer's top-N once cached
+    if performance_optimizer:
+        performance_optimizer.record_cache_hit(query, params=params)
+    
+    if not cache_manager.is_stale(cached_result):
+        cache_manager.freshness_stats['fresh_hits'] += 1
+        chatbot_logger.logger.info(f"🚀 CACHE HIT: Query served from cache in 0.001s")
+        _record_cache_info('cache', cached_result)
+        return cached_result
+    
+    cache_manager.freshness_stats['stale_hits'] += 1
+    age = cache_manager.entry_age(cached_result)
+    revalidating = False
+    if background_manager:
+        def _revalidate():
+            try:
+                cache_manager.single_flight.do(cache_key, refresh)
+                cache_manager.freshness_stats['revalidations'] += 1
+            except Exception as e:
+                cache_manager.freshness_stats['revalidation_errors'] += 1
+                chatbot_logger.logger.warning(f"Background revalidation failed: {e}")
+        
+        revalidating = background_manager.schedule_unique_task(f"revalidate:{cache_key}", _revalidate) is not None
+    
+    chatbot_logger.logger.info(f"♻️ STALE HIT: Served {age:.0f}s old result, revalidating in background")
+    _record_cache_info('stale_cache', cached_result, revalidating=revalidating)
+    return cached_result
+
+
 # Global instance of the database manager
 db_manager = DatabaseConnectionManager()
 
+# Table change signals drive cache invalidation
+table_change_tracker = TableChangeTracker(db_manager)
+cache_warmer = None
+if cache_manager:
+    cache_manager.attach_change_tracker(table_change_tracker)
+    
+    # Re-warm the hottest queries on a schedule and after their tables change
+    if performance_optimizer:
+        cache_warmer = CacheWarmer(db_manager, cache_manager, performance_optimizer, result_optimizer)
+        table_change_tracker.add_listener(cache_warmer.on_tables_changed)
+        cache_warmer.start()
+    
+    table_change_tracker.start()
+
 # Add persistent debug log to Streamlit sidebar
 if 'debug_log' not in st.session_state:
     st.session_state['debug_log'] = []
 
 @cached_query
-def run_query(query, user_id="anonymous"):
+def run_query(query, user_id="anonymous", deadline=None, params=None):
     """
     Performance-optimized query execution with caching, monitoring, and optimization
     
     Args:
         query: SQL query to execute
         user_id: User identifier for logging (optional)
+        deadline: Request Deadline bounding pool wait, statement_timeout and retries (optional)
+        params: Values for a registered statement's placeholders (optional) - part of the cache key
         
     Returns:
         Tuple of (column_names, rows)
+    
+    Raises:
+        QueryExecutionError if the query failed, including SQL the database rejected
     """
     start_time = time.time()
-    query_hash = str(hash(query))
+    deadline = resolve_deadline(deadline)
     
     try:
         # Log query start
-        debug_msg = f"[DEBUG] SQL Query: {query}"
+        debug_msg = f"[DEBUG] SQL Query: {query}" + (f" | params: {list(params)}" if params is not None else "")
         print(f"\n{debug_msg}\n", flush=True)
         
         # Add to Streamlit debug log if available
         if 'debug_log' in st.session_state:
             st.session_state['debug_log'].append(debug_msg)
         
-        # Use the enhanced connection manager with retry mechanism
-        columns, rows = db_manager.execute_query_with_retry(query)
+        # The connection manager's retry loop is the only one - its attempts and
+        # backoff are the whole retry budget for this query (and stop at the deadline)
+        columns, rows = db_manager.execute_query_with_retry(
+            query, max_retries=recovery_manager.max_retries, deadline=deadline, params=params
+        )
         
         # Calculate execution time
         execution_time = time.time() - start_time
         
         # Performance analysis
         if performance_optimizer:
-            performance_optimizer.analyze_query_performance(query, execution_time)
+            performance_optimizer.analyze_query_performance(query, execution_time, params=params)
         
         # Memory optimization for large results
         if result_optimizer and len(rows) > 50:
@@ -960,7 +2235,6 @@ def run_query(query, user_id="anonymous"):
         # Enhanced logging with performance metrics
         chatbot_logger.log_query(query, execution_time, len(rows))
         system_monitor.record_query(True, execution_time)
-        recovery_manager.clear_retry_count(query_hash)  # Clear retry count on success
         
         # Add performance info to debug log
         cache_status = "CACHE MISS" if execution_time > 0.01 else "CACHE HIT"
@@ -982,17 +2256,6 @@ def run_query(query, user_id="anonymous"):
         chatbot_logger.log_error(db_error, user_id)
         system_monitor.record_query(False, execution_time, db_error.error_type.value)
         
-        # Check if we should retry this error
-        if recovery_manager.should_retry(db_error.error_type, query_hash):
-            recovery_manager.increment_retry_count(query_hash)
-            retry_count = recovery_manager.retry_counts[query_hash]
-            retry_delay = recovery_manager.get_retry_delay(retry_count - 1)
-            
-            chatbot_logger.logger.info(f"Retrying query (attempt {retry_count}/{recovery_manager.max_retries}) after {retry_delay}s delay")
-            time.sleep(retry_delay)
-            
-            return run_query(query, user_id)  # Recursive retry
-        
         # Add user-friendly error to debug log
         error_msg = f"[ERROR] {db_error.user_message}"
         print(error_msg, flush=True)
@@ -1002,28 +2265,212 @@ def run_query(query, user_id="anonymous"):
             if db_error.suggestion:
                 st.session_state['debug_log'].append(f"[SUGGESTION] {db_error.suggestion}")
         
-        # For non-retryable errors or exhausted retries, provide graceful response
-        if db_error.error_type in [ErrorType.SQL_SYNTAX, ErrorType.TABLE_NOT_FOUND, ErrorType.PERMISSION_DENIED]:
-            # Return empty result instead of crashing the application
-            chatbot_logger.logger.info(f"Returning empty result for non-retryable error: {db_error.error_type.value}")
-            return [], []
+        # Raised rather than returned as an empty result: callers must not mistake
+        # SQL the database rejected for a query that found nothing (and it must
+        # not be cached as one). execute_query_with_retry already retried.
+        if db_error.error_type not in [ErrorType.SQL_SYNTAX, ErrorType.TABLE_NOT_FOUND, ErrorType.PERMISSION_DENIED]:
+            chatbot_logger.logger.error(f"All retry attempts exhausted for query: {query[:100]}...")
+        raise QueryExecutionError(db_error, getattr(e, 'pgcode', None)) from e
+
+
+def run_query_iter(query, user_id="anonymous", batch_size=None, deadline=None, params=None):
+    """
+    Streaming counterpart of run_query for potentially large result sets.
+    Rows come from a named server-side cursor in fetchmany() batches, so callers
+    can cap, format and serialize results without materializing them.
+    
+    Args:
+        query: SQL query to execute
+        user_id: User identifier for logging (optional)
+        batch_size: Rows per batch (defaults to DB_STREAM_BATCH_SIZE)
+        deadline: Request Deadline bounding pool wait, statement_timeout and retries (optional)
+        params: Values for a registered statement's placeholders (optional) - such
+                queries are executed in one round trip instead of streamed
+        
+    Yields:
+        Tuples of (column_names, rows) - at least one, even for empty results
+    
+    Raises:
+        QueryExecutionError if the query failed, including SQL the database rejected
+    """
+    batch_size = batch_size or db_manager.stream_config['batch_size']
+    start_time = time.time()
+    # Resolved once here: the generator body may later run outside the caller's context
+    deadline = resolve_deadline(deadline)
+    
+    # Serve from the same cache entries run_query uses
+    cache_key = None
+    flight = None
+    if cache_manager and cache_manager.cache_available:
+        # Same key run_query(query, params=...) uses
+        cache_key = cache_manager.get_cache_key(query, {'params': list(params)} if params is not None else {})
+        
+        def _execute_and_cache():
+            # Background revalidation - deliberately not bound by this request's deadline
+            dependencies = cache_manager.capture_dependencies(query)
+            columns, rows = db_manager.execute_query_with_retry(query, params=params)
+            cache_manager.store_query_result(query, cache_key, columns, rows, dependencies)
+            return columns, rows
+        
+        cached_result = _serve_cached_result(query, cache_key, _execute_and_cache, params=params)
+        if cached_result:
+            yield from _iter_cached_batches(cached_result, batch_size)
+            return
+        
+        # Coalesce with an identical query already running; its result lands in the cache
+        is_leader, flight = cache_manager.single_flight.begin(cache_key)
+        if not is_leader:
+            if flight is not None and cache_manager.single_flight.wait(flight, deadline=deadline):
+                cached_result = cache_manager.get_cached_result(cache_key)
+                if cached_result:
+                    chatbot_logger.logger.info(f"🚀 COALESCED: Streaming query served from concurrent execution")
+                    _record_cache_info('cache', cached_result)
+                    yield from _iter_cached_batches(cached_result, batch_size)
+                    return
+            # Leader's result was too large to cache (or timed out) - stream independently
+            flight = None
+    
+    _record_cache_info('database')
+    debug_msg = f"[DEBUG] SQL Query (streaming): {query}" + (f" | params: {list(params)}" if params is not None else "")
+    print(f"\n{debug_msg}\n", flush=True)
+    if 'debug_log' in st.session_state:
+        st.session_state['debug_log'].append(debug_msg)
+    
+    # Small results are collected on the side so they can still be cached
+    cache_limit = result_optimizer.max_rows_in_memory if result_optimizer else 0
+    cacheable_rows = [] if cache_key else None
+    dependencies = cache_manager.capture_dependencies(query) if cache_key else None
+    columns = []
+    total_rows = 0
+    
+    try:
+        try:
+            for columns, batch in db_manager.stream_query_with_retry(query, batch_size=batch_size, deadline=deadline, params=params):
+                total_rows += len(batch)
+                if cacheable_rows is not None:
+                    if total_rows <= cache_limit:
+                        cacheable_rows.extend(batch)
+                    else:
+                        cacheable_rows = None
+                yield columns, batch
+            
+            if cacheable_rows is not None:
+                cache_ttl = cache_manager.store_query_result(query, cache_key, columns, cacheable_rows, dependencies)
+                if cache_ttl:
+                    chatbot_logger.logger.info(f"💾 CACHED: Streamed result cached for {cache_ttl}s")
+        finally:
+            # Wake up coalesced callers whether we finished, failed or were closed early
+            if flight is not None:
+                cache_manager.single_flight.finish(cache_key, flight)
+    except Exception as e:
+        execution_time = time.time() - start_time
+        db_error = ErrorClassifier.classify_error(e, query)
+        chatbot_logger.log_error(db_error, user_id)
+        system_monitor.record_query(False, execution_time, db_error.error_type.value)
+        
+        error_msg = f"[ERROR] {db_error.user_message}"
+        print(error_msg, flush=True)
+        if 'debug_log' in st.session_state:
+            st.session_state['debug_log'].append(error_msg)
         
-        # For critical errors that should still raise exceptions (after retries)
-        chatbot_logger.logger.error(f"All retry attempts exhausted for query: {query[:100]}...")
-        raise Exception(db_error.user_message) from e
+        # Same as run_query: a rejected statement is an error, not an empty result
+        raise QueryExecutionError(db_error, getattr(e, 'pgcode', None)) from e
+    
+    execution_time = time.time() - start_time
+    if performance_optimizer:
+        performance_optimizer.analyze_query_performance(query, execution_time, params=params)
+    chatbot_logger.log_query(query, execution_time, total_rows)
+    system_monitor.record_query(True, execution_time)
+
+
+def _iter_cached_batches(cached_result, batch_size):
+    """Replay a cached result as run_query_iter() batches"""
+    cached_rows = cached_result['rows']
+    for offset in range(0, max(len(cached_rows), 1), batch_size):
+        yield cached_result['columns'], cached_rows[offset:offset + batch_size]
+
+
+def collect_query_stream(stream, max_rows=None, row_transform=None):
+    """
+    Consume a run_query_iter() stream with bounded memory.
+    
+    Returns:
+        Tuple of (columns, rows, total_rows, scan_truncated)
+    """
+    handler = result_optimizer or MemoryOptimizedResultHandler()
+    return handler.collect_stream(stream, max_rows=max_rows, row_transform=row_transform)
 
 
 def get_performance_metrics():
     """Get current performance metrics for monitoring"""
     metrics = {
         'cache_status': 'available' if cache_manager and cache_manager.cache_available else 'unavailable',
+        'cache_tiers': cache_manager.get_tier_stats() if cache_manager else {},
+        'cache_warmer': cache_warmer.get_status() if cache_warmer else {},
         'connection_pool_health': db_manager.get_pool_status() if db_manager else {},
+        'connection_leaks': db_manager.get_leak_report() if db_manager else {},
         'system_monitor_stats': system_monitor.get_health_report() if system_monitor else {},
     }
     
     if performance_optimizer:
         metrics['query_performance'] = performance_optimizer.get_performance_report()
     
+    # Imported lazily - schema_catalog depends on this module
+    try:
+        from src.core.schema_catalog import schema_catalog
+        metrics['schema_catalog'] = schema_catalog.get_status()
+    except Exception as e:
+        chatbot_logger.logger.debug(f"Schema catalog status unavailable: {e}")
+    
+    # Imported lazily - query_guard depends on this module
+    try:
+        from src.core.query_guard import query_guard
+        metrics['query_guard'] = query_guard.get_status()
+    except Exception as e:
+        chatbot_logger.logger.debug(f"Query guard status unavailable: {e}")
+
+    try:
+        from src.core.template_fast_path import template_fast_path
+        metrics['template_fast_path'] = template_fast_path.get_status()
+    except Exception as e:
+        chatbot_logger.logger.debug(f"Template fast path status unavailable: {e}")
+    
+    metrics['prepared_statements'] = statement_registry.get_status()
+    
+    try:
+        from src.nlp.referential_classifier import referential_classifier
+        metrics['referential_classifier'] = referential_classifier.get_status()
+    except Exception as e:
+        chatbot_logger.logger.debug(f"Referential classifier status unavailable: {e}")
+    
+    try:
+        from src.core.pipeline import query_pipeline
+        metrics['query_pipeline'] = query_pipeline.get_status()
+    except Exception as e:
+        chatbot_logger.logger.debug(f"Query pipeline status unavailable: {e}")
+    
+    try:
+        from src.core.semantic_cache import semantic_cache
+        metrics['semantic_cache'] = semantic_cache.get_status()
+    except Exception as e:
+        chatbot_logger.logger.debug(f"Semantic cache status unavailable: {e}")
+    
+    try:
+        from src.nlp.sentence_embeddings import sentence_embedding_manager
+        if sentence_embedding_manager is not None:
+            metrics['vector_index'] = sentence_embedding_manager.get_vector_index_status()
+            metrics['query_patterns'] = sentence_embedding_manager.get_pattern_store_status()
+            metrics['embedding_encoder'] = sentence_embedding_manager.encoder.get_status()
+            metrics['embedding_service'] = sentence_embedding_manager.get_embedding_service_status()
+    except Exception as e:
+        chatbot_logger.logger.debug(f"Vector index status unavailable: {e}")
+    
+    try:
+        from src.api.llm_service import get_llm_status
+        metrics['llm'] = get_llm_status()
+    except Exception as e:
+        chatbot_logger.logger.debug(f"LLM client status unavailable: {e}")
+    
     return metrics
 
 
@@ -0,0 +1,247 @@
+"""
+SQL Normalization and Fingerprinting
+====================================
+
+LLM-generated SQL for the same question varies in whitespace, keyword case,
+identifier/alias case, comments and trailing semicolons. Hashing the raw text
+therefore fragments both the result cache and the workload statistics.
+
+Two views of a statement are provided:
+- normalize_sql(): canonical text that keeps every literal - safe as an exact-result cache key
+- fingerprint_sql(): literal-stripped "shape" - groups workload stats for the same query template
+"""
+
+import re
+import hashlib
+from functools import lru_cache
+
+_TOKEN_PATTERN = re.compile(r"""
+     (?P<comment>--[^\n]*|/\*.*?\*/)
+    |(?P<string>[EeBbXxNn]?'(?:[^']|'')*')
+    |(?P<dollar>\$(?P<tag>[A-Za-z_]*)\$.*?\$(?P=tag)\$)
+    |(?P<qident>"(?:[^"]|"")*")
+    |(?P<param>%\(\w+\)s|%s|\$\d+)
+    |(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    |(?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    |(?P<op>::|<=|>=|<>|!=|\|\||->>|->|!~~\*|~~\*|!~\*|~\*|!~~|~~|[^\sA-Za-z0-9_])
+    |(?P<ws>\s+)
+""", re.DOTALL | re.VERBOSE)
+
+SQL_KEYWORDS = frozenset("""
+    all and any array as asc between by case cast collate cross current_date current_time
+    current_timestamp date day default delete desc distinct else end except exists extract
+    false fetch filter first for from full group having hour ilike in inner insert intersect
+    interval into is join last lateral left like limit minute month natural not null nulls
+    offset on or order outer over partition recursive right row rows second select set similar
+    some table then time timestamp to true union update using values week when where window
+    with without year zone
+""".split())
+
+_VALUE_KINDS = ('string', 'dollar', 'number', 'param')
+
+
+def iter_token_spans(sql):
+    """Yield (kind, text, start, end) tokens, dropping whitespace and comments"""
+    position = 0
+    length = len(sql)
+    while position < length:
+        match = _TOKEN_PATTERN.match(sql, position)
+        if not match:
+            # Unknown character - keep it verbatim as an operator token
+            yield 'op', sql[position], position, position + 1
+            position += 1
+            continue
+        start, position = position, match.end()
+        kind = match.lastgroup
+        if kind == 'tag':
+            kind = 'dollar'
+        if kind in ('ws', 'comment'):
+            continue
+        yield kind, match.group(kind), start, position
+
+
+def _tokenize(sql):
+    """Yield (kind, text) tokens, dropping whitespace and comments"""
+    for kind, text, _, _ in iter_token_spans(sql):
+        yield kind, text
+
+
+def _canonical_tokens(sql):
+    """Tokens with keyword/identifier case and statement terminators normalized"""
+    tokens = []
+    for kind, text in _tokenize(sql):
+        if kind == 'word':
+            lowered = text.lower()
+            # Unquoted identifiers fold to lower case in PostgreSQL, keywords are case-insensitive
+            tokens.append((kind, lowered.upper() if lowered in SQL_KEYWORDS else lowered))
+        elif kind == 'number':
+            # 50, 50.0 and 050 are different literals only in text
+            tokens.append((kind, text.lstrip('0') or '0') if text.isdigit() else (kind, text))
+        else:
+            tokens.append((kind, text))
+
+    while tokens and tokens[-1] == ('op', ';'):
+        tokens.pop()
+    return tokens
+
+
+def _render(tokens):
+    """Join tokens with single spaces, without spaces around . and :: or inside parentheses"""
+    parts = []
+    previous_kind = previous_text = None
+    for kind, text in tokens:
+        if previous_text is not None:
+            glued = (
+                text in ('.', ',', ')', '::')
+                or previous_text in ('.', '(', '::')
+                # Function call: identifier immediately followed by "("
+                or (text == '(' and previous_kind == 'word' and previous_text.lower() not in SQL_KEYWORDS)
+            )
+            if not glued:
+                parts.append(' ')
+        parts.append(text)
+        previous_kind, previous_text = kind, text
+    return ''.join(parts)
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql: str) -> str:
+    """
+    Canonical SQL text for exact-result caching.
+    Literals are preserved; only formatting that cannot change the result is normalized.
+    """
+    if not sql:
+        return ''
+    return _render(_canonical_tokens(sql))
+
+
+@lru_cache(maxsize=2048)
+def sql_shape(sql: str) -> str:
+    """Canonical SQL with every literal replaced by '?' and IN/VALUES lists collapsed"""
+    if not sql:
+        return ''
+    shaped = []
+    for kind, text in _canonical_tokens(sql):
+        shaped.append(('value', '?') if kind in _VALUE_KINDS else (kind, text))
+
+    # Collapse "( ?, ?, ? )" lists so IN lists of different lengths share a shape
+    collapsed = []
+    index = 0
+    while index < len(shaped):
+        if shaped[index][1] == '(':
+            end = index + 1
+            while end + 1 < len(shaped) and shaped[end][1] == '?' and shaped[end + 1][1] == ',':
+                end += 2
+            if end < len(shaped) and shaped[end][1] == '?' and end + 1 < len(shaped) and shaped[end + 1][1] == ')' and end > index + 1:
+                collapsed.extend([shaped[index], ('value', '?'), shaped[end + 1]])
+                index = end + 2
+                continue
+        collapsed.append(shaped[index])
+        index += 1
+
+    return _render(collapsed)
+
+
+def sql_cache_hash(sql: str) -> str:
+    """Stable hash of the canonical text (exact-result cache identity)"""
+    return hashlib.md5(normalize_sql(sql).encode()).hexdigest()
+
+
+def fingerprint_sql(sql: str) -> str:
+    """Stable hash of the literal-stripped shape (workload statistics identity)"""
+    return hashlib.md5(sql_shape(sql).encode()).hexdigest()
+
+
+# Functions whose arguments may contain a FROM keyword that is not a table reference
+_FROM_ARGUMENT_FUNCTIONS = frozenset(('extract', 'substring', 'trim', 'overlay', 'position'))
+_FROM_CLAUSE_TERMINATORS = frozenset((
+    'WHERE', 'GROUP', 'ORDER', 'LIMIT', 'OFFSET', 'HAVING', 'UNION', 'EXCEPT', 'INTERSECT',
+    'WINDOW', 'FETCH', 'FOR', 'ON', 'USING', 'SELECT', 'RETURNING'
+))
+
+
+def _identifier_text(kind, text):
+    return text[1:-1].replace('""', '"') if kind == 'qident' else text
+
+
+@lru_cache(maxsize=2048)
+def extract_tables(sql: str, default_schema: str = 'public') -> frozenset:
+    """
+    Return the set of 'schema.table' names a statement reads from (FROM/JOIN targets).
+    CTE names, subqueries, set-returning functions and FROM inside EXTRACT()/SUBSTRING()
+    are ignored. Unqualified names are attributed to default_schema.
+    """
+    if not sql:
+        return frozenset()
+
+    tokens = _canonical_tokens(sql)
+    tables = set()
+    cte_names = set()
+    paren_stack = []        # 'func' or 'group' per open parenthesis
+    from_depths = set()     # paren depths currently inside a FROM clause
+    expect_table = False
+
+    index = 0
+    while index < len(tokens):
+        kind, text = tokens[index]
+        previous = tokens[index - 1] if index else (None, None)
+
+        if text == '(' and kind == 'op':
+            opener = previous[1].lower() if previous[0] == 'word' else None
+            is_function = opener is not None and (opener in _FROM_ARGUMENT_FUNCTIONS or opener not in SQL_KEYWORDS)
+            paren_stack.append('func' if is_function else 'group')
+            expect_table = False
+        elif text == ')' and kind == 'op':
+            from_depths.discard(len(paren_stack))
+            if paren_stack:
+                paren_stack.pop()
+        elif kind == 'word' and text == 'AS' and previous[0] in ('word', 'qident'):
+            # "name AS (" directly after WITH / RECURSIVE / "," declares a CTE
+            before = tokens[index - 2][1] if index >= 2 else None
+            following = tokens[index + 1][1] if index + 1 < len(tokens) else None
+            if following == '(' and before in ('WITH', 'RECURSIVE', ','):
+                cte_names.add(_identifier_text(*previous).lower())
+        elif kind == 'word' and text in ('FROM', 'JOIN'):
+            if not (paren_stack and paren_stack[-1] == 'func'):
+                from_depths.add(len(paren_stack))
+                expect_table = True
+                index += 1
+                continue
+        elif kind == 'word' and text in _FROM_CLAUSE_TERMINATORS:
+            from_depths.discard(len(paren_stack))
+        elif text == ',' and len(paren_stack) in from_depths:
+            expect_table = True
+            index += 1
+            continue
+
+        if expect_table and kind in ('word', 'qident') and text not in ('LATERAL', 'ONLY'):
+            name = _identifier_text(kind, text)
+            schema_name = None
+            if index + 2 < len(tokens) and tokens[index + 1][1] == '.' and tokens[index + 2][0] in ('word', 'qident'):
+                schema_name = name
+                name = _identifier_text(*tokens[index + 2])
+                index += 2
+            following = tokens[index + 1][1] if index + 1 < len(tokens) else None
+            # "FROM generate_series(...)" is a function, not a table
+            if following != '(':
+                if schema_name or name.lower() not in cte_names:
+                    tables.add(f"{schema_name or default_schema}.{name}".lower())
+            expect_table = False
+        elif expect_table and not (kind == 'word' and text in ('LATERAL', 'ONLY')):
+            expect_table = False
+
+        index += 1
+
+    return frozenset(tables)
+
+
+_TIME_RELATIVE_WORDS = frozenset((
+    'now', 'current_date', 'current_time', 'current_timestamp', 'localtime', 'localtimestamp',
+    'clock_timestamp', 'statement_timestamp', 'transaction_timestamp', 'timeofday', 'random'
+))
+
+
+@lru_cache(maxsize=2048)
+def is_time_relative(sql: str) -> bool:
+    """True if the result can change without any table changing (now(), CURRENT_DATE, random() ...)"""
+    return any(kind == 'word' and text.lower() in _TIME_RELATIVE_WORDS for kind, text in _canonical_tokens(sql or ''))
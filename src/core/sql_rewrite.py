@@ -0,0 +1,386 @@
+"""
+SQL Rewriting
+=============
+
+Token-level rewrites applied to generated SQL before it runs. Rewrites only
+touch the outermost SELECT and return None whenever the statement has a shape
+they do not understand, so a caller can always fall back to the original SQL.
+
+- add_date_bound(): restrict a large table to a recent date window (cost guard)
+- make_sargable(): turn function-wrapped date predicates into index-friendly ranges
+"""
+
+import re
+from datetime import date, timedelta
+from functools import lru_cache
+
+from src.core.sql_fingerprint import iter_token_spans, SQL_KEYWORDS
+
+# Keywords that end a WHERE clause / FROM clause at the same nesting level
+_CLAUSE_TERMINATORS = frozenset(('GROUP', 'ORDER', 'LIMIT', 'OFFSET', 'HAVING', 'WINDOW', 'FETCH', 'FOR'))
+_SET_OPERATORS = frozenset(('UNION', 'INTERSECT', 'EXCEPT'))
+# Words that may follow a table reference without being its alias
+_NOT_AN_ALIAS = frozenset((
+    'WHERE', 'JOIN', 'INNER', 'LEFT', 'RIGHT', 'FULL', 'CROSS', 'NATURAL', 'ON', 'USING',
+    'TABLESAMPLE'
+)) | _CLAUSE_TERMINATORS | _SET_OPERATORS
+
+
+def _top_level_tokens(sql):
+    """[(word_or_text, kind, start, end, depth)] with keywords upper-cased"""
+    tokens = []
+    depth = 0
+    for kind, text, start, end in iter_token_spans(sql):
+        if kind == 'op' and text == ')':
+            depth -= 1
+        value = text.upper() if kind == 'word' and text.lower() in SQL_KEYWORDS else text
+        tokens.append((value, kind, start, end, depth))
+        if kind == 'op' and text == '(':
+            depth += 1
+    return tokens
+
+
+def _unquote(kind, text):
+    return text[1:-1].replace('""', '"') if kind == 'qident' else text.lower()
+
+
+def _find_table_reference(tokens, table):
+    """
+    Qualifier to use for table's columns in the outermost FROM clause
+    (its alias, or the name as written), or None if it is not referenced there.
+    """
+    schema_name, _, table_name = table.lower().rpartition('.')
+    in_from = False
+    for index, (value, kind, _, _, depth) in enumerate(tokens):
+        if depth != 0:
+            continue
+        if value in ('FROM', 'JOIN'):
+            in_from = True
+            continue
+        if value in ('WHERE', 'ON', 'USING') or value in _CLAUSE_TERMINATORS:
+            in_from = False
+            continue
+        if not in_from or kind not in ('word', 'qident'):
+            continue
+
+        # Candidate: [schema .] table [AS] [alias]
+        written_schema = None
+        name_index = index
+        if index + 2 < len(tokens) and tokens[index + 1][0] == '.' and tokens[index + 2][1] in ('word', 'qident'):
+            written_schema = _unquote(kind, value)
+            name_index = index + 2
+        name_kind, name_value = tokens[name_index][1], tokens[name_index][0]
+        if index > 0 and tokens[index - 1][0] == '.':
+            continue
+        if _unquote(name_kind, name_value) != table_name:
+            continue
+        if written_schema is not None and schema_name and written_schema != schema_name:
+            continue
+
+        following = name_index + 1
+        if following < len(tokens) and tokens[following][0] == 'AS':
+            following += 1
+        if following < len(tokens) and tokens[following][1] in ('word', 'qident') \
+                and tokens[following][0] not in _NOT_AN_ALIAS:
+            return tokens[following][0]
+        return ''.join(token[0] for token in tokens[index:name_index + 1])
+    return None
+
+
+def _references_column(tokens, column, start, end):
+    """True if column is mentioned anywhere between token indexes [start, end)"""
+    column = column.lower()
+    return any(kind in ('word', 'qident') and _unquote(kind, value) == column
+               for value, kind, _, _, _ in tokens[start:end])
+
+
+def add_date_bound(sql: str, table: str, column: str, days: int):
+    """
+    Restrict table (schema.table) in the outermost SELECT to rows whose column is
+    within the last `days` days, by adding to (or creating) the top-level WHERE.
+
+    Returns the rewritten SQL, or None when the statement cannot be rewritten safely:
+    CTEs, set operations, the table not being in the outer FROM clause, or the WHERE
+    clause already filtering on the column (it is bounded, just not cheaply).
+    """
+    if not sql or days <= 0:
+        return None
+    tokens = _top_level_tokens(sql)
+    if not tokens or tokens[0][0] != 'SELECT':
+        return None
+    if any(depth == 0 and value in _SET_OPERATORS for value, _, _, _, depth in tokens):
+        return None
+
+    qualifier = _find_table_reference(tokens, table)
+    if qualifier is None:
+        return None
+    predicate = f"{qualifier}.{column} >= CURRENT_DATE - INTERVAL '{int(days)} days'"
+
+    where_index = next((i for i, token in enumerate(tokens) if token[4] == 0 and token[0] == 'WHERE'), None)
+    from_index = next((i for i, token in enumerate(tokens) if token[4] == 0 and token[0] == 'FROM'), None)
+    if from_index is None:
+        return None
+    search_from = where_index if where_index is not None else from_index
+    end_index = next((i for i in range(search_from + 1, len(tokens))
+                      if tokens[i][4] == 0 and (tokens[i][0] in _CLAUSE_TERMINATORS or tokens[i][0] == ';')),
+                     len(tokens))
+    # Text position where the WHERE clause (or the FROM clause) ends
+    clause_end = tokens[end_index - 1][3]
+
+    if where_index is not None:
+        if _references_column(tokens, column, where_index + 1, end_index):
+            return None
+        condition_start = tokens[where_index][3]
+        return (f"{sql[:condition_start]} {predicate} AND ({sql[condition_start:clause_end].strip()})"
+                f"{sql[clause_end:]}")
+
+    return f"{sql[:clause_end]} WHERE {predicate}{sql[clause_end:]}"
+
+
+# ----------------------------------------------------------------------
+# Sargable date predicates
+# ----------------------------------------------------------------------
+_KEYWORDS_UPPER = frozenset(keyword.upper() for keyword in SQL_KEYWORDS)
+# A predicate may only be rewritten where it is a whole boolean operand
+_PREDICATE_STARTS = frozenset(('WHERE', 'AND', 'OR', 'NOT', '(', 'ON', 'HAVING', 'WHEN'))
+_PREDICATE_ENDS = frozenset(('AND', 'OR', ')', 'THEN', 'ELSE', 'END', ';', ',')) | _CLAUSE_TERMINATORS | _SET_OPERATORS
+_COMPARISONS = ('=', '<', '<=', '>', '>=')
+# Operators that would make "DATE(col) = <rhs>" part of a larger comparison
+_RHS_STOP_WORDS = frozenset(('IS', 'LIKE', 'ILIKE', 'IN', 'BETWEEN', 'SIMILAR'))
+
+_DATE_LITERAL = re.compile(r"^(?:date\s*)?'(\d{4})-(\d{2})-(\d{2})'(?:::date)?$", re.IGNORECASE)
+# Expressions that always evaluate to a midnight (date-valued) point in time
+_DATE_VALUED = re.compile(r"""^(?:
+      current_date
+    | date_trunc\(\s*'(?:day|week|month|quarter|year)'\s*,\s*(?:current_date|now\(\)|current_timestamp)\s*\)
+    )(?:\s*[-+]\s*(?:interval\s*'\s*\d+\s*(?:days?|weeks?|months?|years?)\s*'|\d+))*$""", re.IGNORECASE | re.VERBOSE)
+
+
+def _column_chain(tokens, index):
+    """End index of a (schema.)(table.)column reference starting at index, or None"""
+    if index >= len(tokens) or tokens[index][1] not in ('word', 'qident') or tokens[index][0] in _KEYWORDS_UPPER:
+        return None
+    end = index + 1
+    while end + 1 < len(tokens) and tokens[end][0] == '.' and tokens[end + 1][1] in ('word', 'qident'):
+        end += 2
+    return end
+
+
+def _date_call(tokens, index):
+    """
+    Match a date-truncated column at index: DATE(col), col::date or CAST(col AS DATE).
+    Returns (column_text, end_index) or None.
+    """
+    value = tokens[index][0]
+    if value == 'DATE' and index + 1 < len(tokens) and tokens[index + 1][0] == '(':
+        end = _column_chain(tokens, index + 2)
+        if end is not None and end < len(tokens) and tokens[end][0] == ')':
+            return (index + 2, end), end + 1
+    elif value == 'CAST' and index + 1 < len(tokens) and tokens[index + 1][0] == '(':
+        end = _column_chain(tokens, index + 2)
+        if end is not None and end + 2 < len(tokens) and tokens[end][0] == 'AS' \
+                and tokens[end + 1][0] == 'DATE' and tokens[end + 2][0] == ')':
+            return (index + 2, end), end + 3
+    else:
+        end = _column_chain(tokens, index)
+        if end is not None and end + 1 < len(tokens) and tokens[end][0] == '::' and tokens[end + 1][0] == 'DATE':
+            return (index, end), end + 2
+    return None
+
+
+def _extract_call(tokens, index):
+    """
+    Match EXTRACT(YEAR|MONTH FROM col) or DATE_PART('year'|'month', col) at index.
+    Returns (field, (column start, column end), end_index) or None.
+    """
+    value = tokens[index][0]
+    if value == 'EXTRACT' and index + 4 < len(tokens) and tokens[index + 1][0] == '(' \
+            and tokens[index + 2][0] in ('YEAR', 'MONTH') and tokens[index + 3][0] == 'FROM':
+        end = _column_chain(tokens, index + 4)
+        if end is not None and end < len(tokens) and tokens[end][0] == ')':
+            return tokens[index + 2][0], (index + 4, end), end + 1
+    elif value.lower() == 'date_part' and index + 4 < len(tokens) and tokens[index + 1][0] == '(' \
+            and tokens[index + 2][0].lower() in ("'year'", "'month'") and tokens[index + 3][0] == ',':
+        end = _column_chain(tokens, index + 4)
+        if end is not None and end < len(tokens) and tokens[end][0] == ')':
+            return tokens[index + 2][0].strip("'").upper(), (index + 4, end), end + 1
+    return None
+
+
+def _operand_end(tokens, index):
+    """End index of a comparison operand starting at index (stops at AND/OR/THEN/... at its own depth)"""
+    depth = 0
+    end = index
+    while end < len(tokens):
+        value = tokens[end][0]
+        if value == '(':
+            depth += 1
+        elif value == ')':
+            if depth == 0:
+                break
+            depth -= 1
+        elif depth == 0 and (value in _PREDICATE_ENDS or value in _COMPARISONS or value in _RHS_STOP_WORDS):
+            break
+        end += 1
+    return end
+
+
+def _date_value(text):
+    """('literal', date) for 'YYYY-MM-DD', ('expression', text) for date-valued SQL, else None"""
+    literal = _DATE_LITERAL.match(text)
+    if literal:
+        try:
+            return 'literal', date(int(literal.group(1)), int(literal.group(2)), int(literal.group(3)))
+        except ValueError:
+            return None
+    if _DATE_VALUED.match(text):
+        return 'expression', text
+    return None
+
+
+def _day_start(value):
+    kind, payload = value
+    return f"'{payload.isoformat()}'" if kind == 'literal' else payload
+
+
+def _next_day(value):
+    kind, payload = value
+    if kind == 'literal':
+        return f"'{(payload + timedelta(days=1)).isoformat()}'"
+    return f"{payload} + INTERVAL '1 day'" if re.fullmatch(r'\w+', payload) else f"({payload}) + INTERVAL '1 day'"
+
+
+def _range_predicate(column, lower=None, upper=None):
+    parts = []
+    if lower is not None:
+        parts.append(f"{column} >= {lower}")
+    if upper is not None:
+        parts.append(f"{column} < {upper}")
+    return parts[0] if len(parts) == 1 else f"({' AND '.join(parts)})"
+
+
+def _sargable_date_comparison(sql, tokens, index):
+    """Rewrite "DATE(col) <op> <date>" starting at index. Returns (end_index, replacement) or None."""
+    matched = _date_call(tokens, index)
+    if not matched:
+        return None
+    (column_start, column_end), position = matched
+    if position >= len(tokens):
+        return None
+    operator = tokens[position][0]
+    column = sql[tokens[column_start][2]:tokens[column_end - 1][3]]
+    text_of = lambda start, end: sql[tokens[start][2]:tokens[end - 1][3]].strip() if end > start else ''
+
+    if operator == 'BETWEEN':
+        low_end = _operand_end(tokens, position + 1)
+        if low_end >= len(tokens) or tokens[low_end][0] != 'AND':
+            return None
+        high_end = _operand_end(tokens, low_end + 1)
+        low, high = _date_value(text_of(position + 1, low_end)), _date_value(text_of(low_end + 1, high_end))
+        if not low or not high:
+            return None
+        return high_end, _range_predicate(column, _day_start(low), _next_day(high))
+
+    if operator not in _COMPARISONS:
+        return None
+    end = _operand_end(tokens, position + 1)
+    if end < len(tokens) and tokens[end][0] not in _PREDICATE_ENDS:
+        return None
+    value = _date_value(text_of(position + 1, end))
+    if not value:
+        return None
+    bounds = {
+        '=': (_day_start(value), _next_day(value)),
+        '>=': (_day_start(value), None),
+        '>': (_next_day(value), None),
+        '<': (None, _day_start(value)),
+        '<=': (None, _next_day(value)),
+    }[operator]
+    return end, _range_predicate(column, *bounds)
+
+
+def _extract_predicate(sql, tokens, index):
+    """Match "EXTRACT(YEAR|MONTH FROM col) = <int>". Returns (end_index, field, column, number) or None."""
+    matched = _extract_call(tokens, index)
+    if not matched:
+        return None
+    field, (column_start, column_end), position = matched
+    if position + 1 >= len(tokens) or tokens[position][0] != '=' or tokens[position + 1][1] != 'number' \
+            or not tokens[position + 1][0].isdigit():
+        return None
+    end = position + 2
+    if end < len(tokens) and tokens[end][0] not in _PREDICATE_ENDS:
+        return None
+    column = sql[tokens[column_start][2]:tokens[column_end - 1][3]]
+    return end, field, column, int(tokens[position + 1][0])
+
+
+def _period_predicate(column, year, month=None):
+    if month is None:
+        return _range_predicate(column, f"'{year:04d}-01-01'", f"'{year + 1:04d}-01-01'")
+    if not 1 <= month <= 12:
+        return None
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return _range_predicate(column, f"'{year:04d}-{month:02d}-01'", f"'{next_year:04d}-{next_month:02d}-01'")
+
+
+@lru_cache(maxsize=2048)
+def make_sargable(sql: str) -> str:
+    """
+    Rewrite date predicates that wrap the column in a function - which no index on
+    the column can serve - into equivalent half-open ranges on the bare column:
+
+        DATE(from_tm) = CURRENT_DATE           -> (from_tm >= CURRENT_DATE AND from_tm < CURRENT_DATE + INTERVAL '1 day')
+        from_tm::date BETWEEN '2025-08-01' AND '2025-08-05'
+                                               -> (from_tm >= '2025-08-01' AND from_tm < '2025-08-06')
+        EXTRACT(MONTH FROM from_tm) = 7 AND EXTRACT(YEAR FROM from_tm) = 2025
+                                               -> (from_tm >= '2025-07-01' AND from_tm < '2025-08-01')
+
+    Only comparisons against values known to be whole days (date literals,
+    CURRENT_DATE arithmetic, DATE_TRUNC of the current time) are rewritten, and only
+    where the predicate is a complete boolean operand, so results are unchanged.
+    A month without a year cannot become a range and is left alone, and
+    "NOT EXTRACT(MONTH ...) = m AND EXTRACT(YEAR ...) = y" is not paired.
+    """
+    if not sql:
+        return sql
+    tokens = _top_level_tokens(sql)
+    replacements = []   # (start char, end char, text)
+    index = 0
+    while index < len(tokens):
+        previous = tokens[index - 1][0] if index else None
+        if previous not in _PREDICATE_STARTS:
+            index += 1
+            continue
+
+        rewritten = _sargable_date_comparison(sql, tokens, index)
+        if rewritten:
+            end, text = rewritten
+            replacements.append((tokens[index][2], tokens[end - 1][3], text))
+            index = end
+            continue
+
+        extracted = _extract_predicate(sql, tokens, index)
+        if extracted:
+            end, field, column, number = extracted
+            # "MONTH = m AND YEAR = y" (either order) on the same column is one month -
+            # unless the first is negated: NOT binds tighter than AND, so it only covers that one
+            pairable = previous != 'NOT' and end < len(tokens) and tokens[end][0] == 'AND'
+            partner = _extract_predicate(sql, tokens, end + 1) if pairable else None
+            if partner and partner[2] == column and {field, partner[1]} == {'YEAR', 'MONTH'}:
+                year, month = (number, partner[3]) if field == 'YEAR' else (partner[3], number)
+                text = _period_predicate(column, year, month)
+                if text:
+                    replacements.append((tokens[index][2], tokens[partner[0] - 1][3], text))
+                    index = partner[0]
+                    continue
+            if field == 'YEAR':
+                replacements.append((tokens[index][2], tokens[end - 1][3], _period_predicate(column, number)))
+            index = end
+            continue
+
+        index += 1
+
+    for start, end, text in reversed(replacements):
+        sql = f"{sql[:start]}{text}{sql[end:]}"
+    return sql
@@ -21,6 +21,10 @@ from typing import Dict, List, Optional, Tuple, Any
 from datetime import datetime, timedelta
 import logging
 
+from src.core.sql_rewrite import make_sargable
+from src.core.prepared_statements import BoundQuery, ParamList, statement_registry
+from src.utils.date_range_parser import DateRange, parse_date_range
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -196,6 +200,16 @@ class StoppageReportAIOptimizer:
                 'business_context': 'Vehicle Stoppage Report'
             })
         
+        # Resolve the time phrase once, with the same parser every SQL generator uses
+        if analysis['intent'] and not any(f['column'] == 'from_tm' for f in analysis['filters']):
+            date_range = parse_date_range(query)
+            if date_range:
+                analysis['filters'].append({
+                    'column': 'from_tm',
+                    'value': date_range,
+                    'operator': 'range'
+                })
+        
         # Add optimization suggestions
         analysis['optimizations'] = self._suggest_optimizations(analysis, query)
         
@@ -228,7 +242,7 @@ class StoppageReportAIOptimizer:
         
         return optimizations
 
-    def generate_enhanced_sql(self, analysis: Dict[str, Any]) -> str:
+    def generate_enhanced_sql(self, analysis: Dict[str, Any]) -> BoundQuery:
         """
         Generate optimized SQL based on AI analysis
         
@@ -236,7 +250,7 @@ class StoppageReportAIOptimizer:
             analysis: Query analysis result from analyze_stoppage_query
             
         Returns:
-            Enhanced SQL query string
+            BoundQuery - registered statement text with the filter values bound
         """
         
         # Build SELECT clause with business-friendly aliases
@@ -264,10 +278,11 @@ class StoppageReportAIOptimizer:
         
         # Build WHERE clause
         where_conditions = []
+        params = ParamList()
         
         # Always filter for stoppage report type if not already specified
         if not any(f['column'] == 'report_type' for f in analysis['filters']):
-            where_conditions.append("public.util_report.report_type = 'stoppage' OR public.util_report.report_type IS NULL")
+            where_conditions.append("(public.util_report.report_type = 'stoppage' OR public.util_report.report_type IS NULL)")
         
         # Add specific filters
         for filter_item in analysis['filters']:
@@ -276,12 +291,12 @@ class StoppageReportAIOptimizer:
             operator = filter_item.get('operator', '=')
             
             if column == 'reg_no':
-                where_conditions.append(f"public.util_report.reg_no = '{value}'")
+                where_conditions.append(f"public.util_report.reg_no = {params.add(value)}")
             elif column == 'location':
-                where_conditions.append(f"public.util_report.location ILIKE '%{value}%'")
+                where_conditions.append(f"public.util_report.location ILIKE {params.add(f'%{value}%')}")
             elif column == 'from_tm':
                 # Handle time-based filters
-                where_conditions.append(self._build_time_filter(value))
+                where_conditions.append(self._build_time_filter(value, params))
         
         where_clause = f"WHERE {' AND '.join(where_conditions)}" if where_conditions else ""
         
@@ -311,29 +326,16 @@ class StoppageReportAIOptimizer:
         # Add LIMIT for performance
         sql_parts.append("LIMIT 50")
         
-        return " ".join(sql_parts)
+        # Time filters are already ranges; make_sargable covers any DATE()/EXTRACT() left over
+        return statement_registry.bind(f"stoppage_{analysis['intent']}", make_sargable(" ".join(sql_parts)), *params)
 
-    def _build_time_filter(self, time_value: str) -> str:
-        """Build time-based WHERE conditions"""
-        
-        if time_value.lower() == 'today':
-            return "DATE(public.util_report.from_tm) = CURRENT_DATE"
-        elif time_value.lower() == 'yesterday':
-            return "DATE(public.util_report.from_tm) = CURRENT_DATE - INTERVAL '1 day'"
-        elif re.match(r'\d{4}-\d{2}-\d{2}', time_value):
-            return f"DATE(public.util_report.from_tm) = '{time_value}'"
-        else:
-            # Month/year pattern
-            month_match = re.search(r'(january|february|march|april|may|june|july|august|september|october|november|december)\s+(\d{4})', time_value.lower())
-            if month_match:
-                month_name = month_match.group(1)
-                year = month_match.group(2)
-                month_number = {
-                    'january': 1, 'february': 2, 'march': 3, 'april': 4,
-                    'may': 5, 'june': 6, 'july': 7, 'august': 8,
-                    'september': 9, 'october': 10, 'november': 11, 'december': 12
-                }[month_name]
-                return f"EXTRACT(MONTH FROM public.util_report.from_tm) = {month_number} AND EXTRACT(YEAR FROM public.util_report.from_tm) = {year}"
+    def _build_time_filter(self, time_value, params: ParamList) -> str:
+        """Build time-based WHERE conditions as a from_tm range with bound bounds"""
+        
+        date_range = time_value if isinstance(time_value, DateRange) else parse_date_range(str(time_value))
+        if date_range:
+            lower, upper = date_range.sql_bounds()
+            return f"public.util_report.from_tm >= {params.add(lower)} AND public.util_report.from_tm < {params.add(upper)}"
         
         return "1=1"  # Default fallback
 
@@ -485,7 +487,7 @@ if __name__ == "__main__":
         
         if analysis['intent']:
             sql = optimizer.generate_enhanced_sql(analysis)
-            print(f"Generated SQL:")
-            print(f"   {sql}")
+            print(f"Generated SQL ({sql.name}):")
+            print(f"   {sql.render()}")
         
         print(f"Optimizations: {', '.join(analysis['optimizations'])}")
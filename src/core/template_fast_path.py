@@ -0,0 +1,193 @@
+"""
+Template Fast Path
+==================
+
+IntelligentReasoning has hand-written SQL templates for complaint status, plant
+lookups, hierarchy, drivers, DPR and distance questions, but english_to_sql only
+used them after Gemini failed. The fast path answers from a template *before*
+the LLM when the intent match is confident, saving a paid LLM round trip.
+
+A match is answered from its template only when:
+- the intent's confidence (IntelligentReasoning._intent_confidence) minus the
+  penalties below is at least TEMPLATE_FAST_PATH_MIN_CONFIDENCE
+- the question has no time phrase and no ranking/aggregation qualifier - the
+  templates do not apply those, so the LLM has to
+- the template actually produces SQL
+
+TEMPLATE_FAST_PATH selects the mode:
+- on:   confident matches are answered from the template
+- off:  always ask the LLM first (previous behaviour)
+- ab:   sessions are split deterministically; TEMPLATE_FAST_PATH_AB_PERCENT of
+        them get the fast path and the rest are the control arm. Control
+        requests still record whether the fast path would have answered.
+
+Every answer is tagged with the path that produced it ('template_fast_path',
+'semantic_cache', 'llm' or 'template_fallback'), and per-path counts and
+latencies are exposed through get_status() / the performance endpoint.
+"""
+
+import os
+import re
+import hashlib
+import threading
+from typing import Dict, Optional
+
+from src.utils.date_range_parser import parse_date_range
+
+FAST_PATH = 'template_fast_path'
+LLM_PATH = 'llm'
+FALLBACK_PATH = 'template_fallback'
+
+# Parts of a question no template applies - if present the LLM has to answer
+_UNMODELLED_QUALIFIERS = re.compile(
+    r'\b(?:top|bottom|highest|lowest|most|least|average|avg|per|each|compare|compared|versus|vs'
+    r'|trend|sorted|order\s+by|group\s+by|excluding|except|more\s+than|less\s+than)\b',
+    re.IGNORECASE
+)
+
+
+class TemplateFastPath:
+    """Decides when a recognised intent is answered from its SQL template"""
+
+    def __init__(self):
+        self.mode = os.getenv('TEMPLATE_FAST_PATH', 'on').lower()
+        self.ab_percent = int(os.getenv('TEMPLATE_FAST_PATH_AB_PERCENT', 50))
+        self.min_confidence = float(os.getenv('TEMPLATE_FAST_PATH_MIN_CONFIDENCE', 0.85))
+
+        self._lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'fast_path_answers': 0,
+            'control_would_answer': 0,
+            'declined': {},         # reason -> count
+            'by_intent': {},        # intent -> fast path answers
+            'arms': {'fast_path': 0, 'control': 0},
+        }
+        self.latency = {}           # path -> {'count': n, 'total_seconds': s}
+
+    def arm(self, session_id: Optional[str], prompt: str) -> str:
+        """A/B arm for this request - sticky per session"""
+        if self.mode == 'off':
+            return 'control'
+        if self.mode != 'ab':
+            return 'fast_path'
+        bucket = int(hashlib.md5((session_id or prompt).encode('utf-8')).hexdigest(), 16) % 100
+        return 'fast_path' if bucket < self.ab_percent else 'control'
+
+    def score(self, prompt: str, reasoning_result: Dict) -> float:
+        """Intent confidence, lowered for question parts the template would ignore"""
+        confidence = reasoning_result.get('confidence', 0.0)
+        if parse_date_range(prompt):
+            confidence -= 0.3
+        if _UNMODELLED_QUALIFIERS.search(prompt):
+            confidence -= 0.3
+        return round(max(confidence, 0.0), 2)
+
+    def select(self, prompt: str, chat_context, session_id: Optional[str], reasoning) -> Optional[Dict]:
+        """
+        Returns {'reasoning_result': ..., 'sql': BoundQuery} when the template
+        should answer this request, otherwise None and the caller goes to the LLM.
+        """
+        return self.record(self.evaluate(prompt, chat_context, session_id, reasoning))
+
+    def evaluate(self, prompt: str, chat_context, session_id: Optional[str], reasoning) -> Optional[Dict]:
+        """
+        The fast path decision without touching the stats, so the query pipeline
+        can decide early and only record() it if the request gets that far.
+        """
+        if self.mode == 'off' or not reasoning:
+            return None
+
+        decision = {'arm': self.arm(session_id, prompt), 'outcome': 'declined', 'reason': None,
+                    'reasoning_result': None, 'sql': None}
+
+        reasoning_result = reasoning.analyze_query_intent(prompt, chat_context)
+        if not reasoning_result:
+            decision['reason'] = 'no_intent'
+            return decision
+        decision['reasoning_result'] = reasoning_result
+
+        confidence = self.score(prompt, reasoning_result)
+        reasoning_result['fast_path_confidence'] = confidence
+        if confidence < self.min_confidence:
+            decision['reason'] = 'low_confidence'
+            print(f"⚡ Fast path declined for {reasoning_result['intent']}: confidence {confidence:.2f} < {self.min_confidence}")
+            return decision
+
+        sql = reasoning.generate_intelligent_query(reasoning_result)
+        if not sql:
+            decision['reason'] = 'no_template'
+            return decision
+
+        decision['sql'] = sql
+        decision['outcome'] = 'control' if decision['arm'] == 'control' else 'answer'
+        return decision
+
+    @staticmethod
+    def answers(decision: Optional[Dict]) -> bool:
+        return bool(decision) and decision['outcome'] == 'answer'
+
+    def record(self, decision: Optional[Dict]) -> Optional[Dict]:
+        """Count an evaluate() decision; returns the select() result"""
+        if not decision:
+            return None
+
+        self._count('requests')
+        with self._lock:
+            self.stats['arms'][decision['arm']] += 1
+
+        if decision['outcome'] == 'declined':
+            self._decline(decision['reason'])
+            return None
+        if decision['outcome'] == 'control':
+            self._count('control_would_answer')
+            return None
+
+        reasoning_result = decision['reasoning_result']
+        self._count('fast_path_answers')
+        with self._lock:
+            by_intent = self.stats['by_intent']
+            by_intent[reasoning_result['intent']] = by_intent.get(reasoning_result['intent'], 0) + 1
+        print(f"⚡ Fast path: answering {reasoning_result['intent']} from template (confidence {reasoning_result['fast_path_confidence']:.2f})")
+        return {'reasoning_result': reasoning_result, 'sql': decision['sql']}
+
+    def record_answer(self, path: str, seconds: float):
+        """Time spent producing the SQL/answer on a given path"""
+        with self._lock:
+            entry = self.latency.setdefault(path, {'count': 0, 'total_seconds': 0.0})
+            entry['count'] += 1
+            entry['total_seconds'] += seconds
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _decline(self, reason: str):
+        with self._lock:
+            self.stats['declined'][reason] = self.stats['declined'].get(reason, 0) + 1
+
+    def get_status(self) -> dict:
+        with self._lock:
+            latency = {
+                path: {
+                    'count': entry['count'],
+                    'avg_ms': round(entry['total_seconds'] / entry['count'] * 1000, 1) if entry['count'] else 0.0
+                }
+                for path, entry in self.latency.items()
+            }
+            return {
+                'mode': self.mode,
+                'ab_percent': self.ab_percent if self.mode == 'ab' else None,
+                'min_confidence': self.min_confidence,
+                'latency': latency,
+                'requests': self.stats['requests'],
+                'fast_path_answers': self.stats['fast_path_answers'],
+                'control_would_answer': self.stats['control_would_answer'],
+                'declined': dict(self.stats['declined']),
+                'by_intent': dict(self.stats['by_intent']),
+                'arms': dict(self.stats['arms']),
+            }
+
+
+# Global fast path instance used by english_to_sql
+template_fast_path = TemplateFastPath()
@@ -85,34 +85,34 @@ class ChatHistoryManager:
         pass
     
     def get_connection(self):
-        """Get database connection using the new manager"""
-        return db_manager.get_connection()
+        """Get database connection using the new context manager"""
+        return db_manager.get_connection_context()
     
     def create_chat_session(self, user_id, title=None):
         """Create a new chat session"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            session_id = str(uuid.uuid4())
-            if not title:
-                title = f"Chat {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-            
-            cursor.execute(
-                """INSERT INTO chat_sessions (user_id, session_id, title) 
-                   VALUES (%s, %s, %s) RETURNING id""",
-                (user_id, session_id, title)
-            )
-            
-            chat_session_id = cursor.fetchone()[0]
-            conn.commit()
-            
-            return {
-                'session_db_id': chat_session_id,
-                'session_id': session_id,
-                'title': title,
-                'created': True
-            }
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                session_id = str(uuid.uuid4())
+                if not title:
+                    title = f"Chat {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+                
+                cursor.execute(
+                    """INSERT INTO chat_sessions (user_id, session_id, title) 
+                       VALUES (%s, %s, %s) RETURNING id""",
+                    (user_id, session_id, title)
+                )
+                
+                chat_session_id = cursor.fetchone()[0]
+                conn.commit()
+                
+                return {
+                    'session_db_id': chat_session_id,
+                    'session_id': session_id,
+                    'title': title,
+                    'created': True
+                }
             
         except Exception as e:
             print(f"Chat session creation error: {e}")
@@ -121,52 +121,52 @@ class ChatHistoryManager:
     def save_message(self, session_id, message_type, content, sql_query=None):
         """Save a message to chat history"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Get session database ID
-            cursor.execute(
-                "SELECT id, title FROM chat_sessions WHERE session_id = %s",
-                (session_id,)
-            )
-            session_data = cursor.fetchone()
-            
-            if not session_data:
-                print(f"Session not found: {session_id}")
-                return {'saved': False, 'error': 'Session not found'}
-            
-            session_db_id, current_title = session_data
-            
-            # Determine if this is a user message
-            is_user_message = (message_type == 'user')
-            
-            cursor.execute(
-                """INSERT INTO chat_messages (session_id, message_type, content, sql_query, is_user_message) 
-                   VALUES (%s, %s, %s, %s, %s)""",
-                (session_db_id, message_type, content, sql_query, is_user_message)
-            )
-            
-            # Auto-update session title if it's the first user message and title is generic
-            if message_type == 'user' and current_title == 'New Chat':
-                # Create a meaningful title from the user's first message
-                title_words = content.strip().split()[:4]  # First 4 words
-                new_title = ' '.join(title_words)
-                if len(content) > 30:
-                    new_title += '...'
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
                 
+                # Get session database ID
                 cursor.execute(
-                    "UPDATE chat_sessions SET title = %s WHERE id = %s",
-                    (new_title, session_db_id)
+                    "SELECT id, title FROM chat_sessions WHERE session_id = %s",
+                    (session_id,)
                 )
-            
-            # Update session timestamp
-            cursor.execute(
-                "UPDATE chat_sessions SET updated_at = CURRENT_TIMESTAMP WHERE id = %s",
-                (session_db_id,)
-            )
-            
-            conn.commit()
-            return {'saved': True}
+                session_data = cursor.fetchone()
+                
+                if not session_data:
+                    print(f"Session not found: {session_id}")
+                    return {'saved': False, 'error': 'Session not found'}
+                
+                session_db_id, current_title = session_data
+                
+                # Determine if this is a user message
+                is_user_message = (message_type == 'user')
+                
+                cursor.execute(
+                    """INSERT INTO chat_messages (session_id, message_type, content, sql_query, is_user_message) 
+                       VALUES (%s, %s, %s, %s, %s)""",
+                    (session_db_id, message_type, content, sql_query, is_user_message)
+                )
+                
+                # Auto-update session title if it's the first user message and title is generic
+                if message_type == 'user' and current_title == 'New Chat':
+                    # Create a meaningful title from the user's first message
+                    title_words = content.strip().split()[:4]  # First 4 words
+                    new_title = ' '.join(title_words)
+                    if len(content) > 30:
+                        new_title += '...'
+                
+                    cursor.execute(
+                        "UPDATE chat_sessions SET title = %s WHERE id = %s",
+                        (new_title, session_db_id)
+                    )
+                
+                # Update session timestamp
+                cursor.execute(
+                    "UPDATE chat_sessions SET updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+                    (session_db_id,)
+                )
+                
+                conn.commit()
+                return {'saved': True}
             
         except Exception as e:
             print(f"Message save error: {e}")
@@ -175,28 +175,28 @@ class ChatHistoryManager:
     def get_user_chat_sessions(self, user_id, limit=20):
         """Get recent chat sessions for a user"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                """SELECT session_id, title, created_at, updated_at 
-                   FROM chat_sessions 
-                   WHERE user_id = %s 
-                   ORDER BY updated_at DESC 
-                   LIMIT %s""",
-                (user_id, limit)
-            )
-            
-            sessions = []
-            for row in cursor.fetchall():
-                sessions.append({
-                    'session_id': row[0],
-                    'title': row[1],
-                    'created_at': row[2].isoformat() if row[2] else None,
-                    'updated_at': row[3].isoformat() if row[3] else None
-                })
-            
-            return {'sessions': sessions}
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute(
+                    """SELECT session_id, title, created_at, updated_at 
+                       FROM chat_sessions 
+                       WHERE user_id = %s 
+                       ORDER BY updated_at DESC 
+                       LIMIT %s""",
+                    (user_id, limit)
+                )
+                
+                sessions = []
+                for row in cursor.fetchall():
+                    sessions.append({
+                        'session_id': row[0],
+                        'title': row[1],
+                        'created_at': row[2].isoformat() if row[2] else None,
+                        'updated_at': row[3].isoformat() if row[3] else None
+                    })
+                
+                return {'sessions': sessions}
             
         except Exception as e:
             print(f"Get sessions error: {e}")
@@ -205,28 +205,28 @@ class ChatHistoryManager:
     def get_chat_history(self, session_id):
         """Get chat history for a specific session"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                """SELECT cm.message_type, cm.content, cm.sql_query, cm.created_at 
-                   FROM chat_messages cm
-                   JOIN chat_sessions cs ON cm.session_id = cs.id
-                   WHERE cs.session_id = %s 
-                   ORDER BY cm.created_at ASC""",
-                (session_id,)
-            )
-            
-            messages = []
-            for row in cursor.fetchall():
-                messages.append({
-                    'type': row[0],
-                    'content': row[1],
-                    'sql_query': row[2],
-                    'timestamp': row[3].isoformat() if row[3] else None
-                })
-            
-            return {'messages': messages}
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute(
+                    """SELECT cm.message_type, cm.content, cm.sql_query, cm.created_at 
+                       FROM chat_messages cm
+                       JOIN chat_sessions cs ON cm.session_id = cs.id
+                       WHERE cs.session_id = %s 
+                       ORDER BY cm.created_at ASC""",
+                    (session_id,)
+                )
+                
+                messages = []
+                for row in cursor.fetchall():
+                    messages.append({
+                        'type': row[0],
+                        'content': row[1],
+                        'sql_query': row[2],
+                        'timestamp': row[3].isoformat() if row[3] else None
+                    })
+                
+                return {'messages': messages}
             
         except Exception as e:
             print(f"Get chat history error: {e}")
@@ -235,16 +235,16 @@ class ChatHistoryManager:
     def update_session_title(self, session_id, title):
         """Update chat session title"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "UPDATE chat_sessions SET title = %s WHERE session_id = %s",
-                (title, session_id)
-            )
-            
-            conn.commit()
-            return {'updated': True}
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute(
+                    "UPDATE chat_sessions SET title = %s WHERE session_id = %s",
+                    (title, session_id)
+                )
+                
+                conn.commit()
+                return {'updated': True}
             
         except Exception as e:
             print(f"Update session title error: {e}")
@@ -253,16 +253,16 @@ class ChatHistoryManager:
     def delete_chat_session(self, session_id, user_id):
         """Delete a chat session (with user verification)"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "DELETE FROM chat_sessions WHERE session_id = %s AND user_id = %s",
-                (session_id, user_id)
-            )
-            
-            conn.commit()
-            return {'deleted': True}
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute(
+                    "DELETE FROM chat_sessions WHERE session_id = %s AND user_id = %s",
+                    (session_id, user_id)
+                )
+                
+                conn.commit()
+                return {'deleted': True}
             
         except Exception as e:
             print(f"Delete session error: {e}")
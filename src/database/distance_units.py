@@ -9,7 +9,8 @@ and provides conversion functions for the chatbot system.
 """
 
 import re
-from src.core.sql import db_manager, get_full_schema
+from src.core.sql import db_manager
+from src.core.schema_catalog import schema_catalog
 import psycopg2
 
 class DistanceUnitManager:
@@ -22,7 +23,7 @@ class DistanceUnitManager:
         """Analyze all distance-related columns in the database to detect units."""
         print("🔍 Analyzing distance columns for unit detection...")
         
-        schema_dict = get_full_schema()
+        schema_dict = schema_catalog.get_schema_dict()
         distance_keywords = ['distance', 'km', 'mile', 'meter', 'metre', 'mileage', 'odometer']
         
         # First pass: collect all distance columns and analyze names only
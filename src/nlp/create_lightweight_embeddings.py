@@ -14,7 +14,7 @@ import numpy as np
 import pickle
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-from src.core.sql import get_full_schema
+from src.core.schema_catalog import schema_catalog
 
 # Import database reference integration
 try:
@@ -179,7 +179,7 @@ class LightweightEmbeddingManager:
         """Create TF-IDF based embeddings for all tables."""
         print("🔄 Creating lightweight schema embeddings...")
         
-        schema_dict = get_full_schema()
+        schema_dict = schema_catalog.get_schema_dict()
         descriptions = []
         table_keys = []
         
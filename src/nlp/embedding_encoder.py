@@ -0,0 +1,107 @@
+"""
+Embedding Encoder
+=================
+
+One request used to run the SentenceTransformer on the same question several
+times: the referential check (current and previous question), table retrieval,
+the semantic cache lookup and, after execution, storing the pattern - each
+called model.encode(text) on its own. Schema indexing encoded table
+descriptions one call per table.
+
+EmbeddingEncoder sits in front of the model:
+- encode(text) is memoized in a bounded LRU keyed by the normalized text
+  (whitespace collapsed, lowercased - the bundled models lowercase their input,
+  so this does not change the embedding)
+- encode_many(texts) answers what it can from the memo and sends the rest to
+  the model as one batched encode(list, batch_size=EMBEDDING_BATCH_SIZE) call;
+  bulk jobs such as schema indexing pass memoize=False so they do not evict
+  question embeddings
+
+EMBEDDING_CACHE_SIZE=0 disables the memo.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Sequence
+
+
+def embedding_key(text: str) -> str:
+    """Memo key: texts that only differ in case or whitespace embed the same"""
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+class EmbeddingEncoder:
+    """Memoized, batched front of a SentenceTransformer model"""
+
+    def __init__(self, model):
+        self.model = model
+        self.cache_size = int(os.getenv('EMBEDDING_CACHE_SIZE', 1024))
+        self.batch_size = int(os.getenv('EMBEDDING_BATCH_SIZE', 64))
+
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()     # embedding_key -> float32 vector
+        self.stats = {
+            'encode_calls': 0,          # model.encode invocations
+            'texts_encoded': 0,
+            'cache_hits': 0,
+            'cache_misses': 0,
+        }
+
+    def encode(self, text: str) -> List[float]:
+        return self.encode_many([text])[0]
+
+    def encode_many(self, texts: Sequence[str], memoize: bool = True) -> List[List[float]]:
+        """Embeddings for texts (in order); model misses are encoded in one batched call"""
+        results = [None] * len(texts)
+        missing = OrderedDict()         # key -> positions in texts
+
+        with self._lock:
+            for position, text in enumerate(texts):
+                key = embedding_key(text)
+                vector = self._cache.get(key) if memoize and self.cache_size > 0 else None
+                if vector is not None:
+                    self._cache.move_to_end(key)
+                    results[position] = vector.tolist()
+                    self.stats['cache_hits'] += 1
+                else:
+                    missing.setdefault(key, []).append(position)
+            if memoize:
+                self.stats['cache_misses'] += len(missing)
+
+        if missing:
+            vectors = self._encode([texts[positions[0]] for positions in missing.values()])
+            with self._lock:
+                for (key, positions), vector in zip(missing.items(), vectors):
+                    for position in positions:
+                        results[position] = vector.tolist()
+                    if memoize and self.cache_size > 0:
+                        self._cache[key] = vector
+                        self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return results
+
+    def _encode(self, texts: List[str]):
+        with self._lock:
+            self.stats['encode_calls'] += 1
+            self.stats['texts_encoded'] += len(texts)
+        return self.model.encode(
+            texts, batch_size=self.batch_size, convert_to_numpy=True, show_progress_bar=False
+        )
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def get_status(self) -> dict:
+        with self._lock:
+            lookups = self.stats['cache_hits'] + self.stats['cache_misses']
+            return {
+                'cache_size': self.cache_size,
+                'cached': len(self._cache),
+                'batch_size': self.batch_size,
+                'hit_rate': round(self.stats['cache_hits'] / lookups, 3) if lookups else 0.0,
+                **self.stats,
+            }
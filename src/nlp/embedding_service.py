@@ -0,0 +1,322 @@
+"""
+Shared Embedding Service
+========================
+
+Every gunicorn worker that imports src.nlp.sentence_embeddings loaded its own
+SentenceTransformer - a few hundred MB per worker and seconds of startup each.
+This module runs the model once, in a separate local process, and lets every
+worker encode through it:
+
+    python -m src.nlp.embedding_service [--model all-MiniLM-L6-v2] [--socket PATH]
+
+- the server listens on a Unix socket (multiprocessing.connection). Messages
+  are pickles, so both ends authenticate each other with
+  EMBEDDING_SERVICE_AUTHKEY before anything is exchanged - it has no default,
+  and without it the server does not start and workers do not connect
+- the socket lives in a directory only its owner can use: EMBEDDING_SERVICE_SOCKET,
+  by default $XDG_RUNTIME_DIR/chatbot-embeddings.sock or
+  ~/.chatbot/embeddings.sock - never a shared path such as /tmp, where another
+  user could bind it first
+- requests from all workers and their threads are queued; the batcher takes
+  the first one, waits up to EMBEDDING_SERVICE_BATCH_WINDOW_MS for more (or
+  until EMBEDDING_SERVICE_MAX_BATCH texts), encodes the distinct texts in one
+  model call and hands each caller its rows
+- RemoteEmbeddingModel is the client. It has the encode() /
+  get_sentence_embedding_dimension() surface SentenceEmbeddingManager and
+  EmbeddingEncoder use, so the manager swaps it in for the local model when
+  EMBEDDING_SERVICE=on and the socket answers
+
+If the service goes away the client loads the model locally (once) and keeps
+working; EMBEDDING_SERVICE_FALLBACK=none makes it raise instead.
+"""
+
+import argparse
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+from typing import List, Sequence
+
+import numpy as np
+
+EMBEDDING_SERVICE_SOCKET = os.getenv('EMBEDDING_SERVICE_SOCKET') or (
+    os.path.join(os.environ['XDG_RUNTIME_DIR'], 'chatbot-embeddings.sock') if os.getenv('XDG_RUNTIME_DIR')
+    else os.path.join(os.path.expanduser('~'), '.chatbot', 'embeddings.sock')
+)
+
+
+def _authkey() -> bytes:
+    """EMBEDDING_SERVICE_AUTHKEY - deliberately without a default, a known key lets anyone feed workers pickles"""
+    authkey = os.getenv('EMBEDDING_SERVICE_AUTHKEY')
+    if not authkey:
+        raise RuntimeError("EMBEDDING_SERVICE_AUTHKEY is not set - generate a random key and set it "
+                           "for the embedding service and every app worker")
+    return authkey.encode()
+
+
+def _check_private_dir(path: str, create: bool = False):
+    """The socket's directory must belong to this user and be closed to everyone else"""
+    directory = os.path.dirname(os.path.abspath(path))
+    if create:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(f"{directory} must be owned by this user and not accessible to others "
+                           f"(chmod 700) to hold the embedding service socket")
+
+
+class EmbeddingServer:
+    """Owns the model; batches encode requests arriving from every client connection"""
+
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', socket_path: str = None):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.socket_path = socket_path or EMBEDDING_SERVICE_SOCKET
+        # Refuse to start before loading the model
+        self.authkey = _authkey()
+        _check_private_dir(self.socket_path, create=True)
+        self.batch_window = float(os.getenv('EMBEDDING_SERVICE_BATCH_WINDOW_MS', 5)) / 1000
+        self.max_batch = int(os.getenv('EMBEDDING_SERVICE_MAX_BATCH', 128))
+
+        print(f"🤖 [EMBEDDING-SERVICE] Loading SentenceTransformer model: {model_name}")
+        self.model = SentenceTransformer(model_name)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+        self._requests = queue.Queue()  # (texts, Future)
+        self._lock = threading.Lock()
+        self.stats = {
+            'connections': 0,
+            'requests': 0,
+            'batches': 0,
+            'texts_encoded': 0,
+            'duplicate_texts': 0,
+            'errors': 0,
+        }
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)     # stale socket from a previous run
+        listener = Listener(self.socket_path, family='AF_UNIX', authkey=self.authkey)
+        os.chmod(self.socket_path, 0o600)
+        threading.Thread(target=self._batch_loop, name="embedding_batcher", daemon=True).start()
+        print(f"✅ [EMBEDDING-SERVICE] {self.model_name} ({self.dimension} dims) listening on {self.socket_path}")
+
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    # Failed handshake (wrong authkey, client gone) - keep serving the others
+                    print(f"⚠️ [EMBEDDING-SERVICE] Rejected connection: {e}")
+                    continue
+                self._count('connections')
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+
+    def _serve_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                if message.get('op') == 'info':
+                    conn.send({'model': self.model_name, 'dimension': self.dimension, 'stats': self.get_status()})
+                    continue
+
+                future = Future()
+                self._requests.put((list(message['texts']), future))
+                try:
+                    conn.send({'embeddings': future.result()})
+                except Exception as e:
+                    self._count('errors')
+                    conn.send({'error': str(e)})
+
+    def _batch_loop(self):
+        while True:
+            batch = [self._requests.get()]
+            size = len(batch[0][0])
+            closes_at = time.monotonic() + self.batch_window
+            while size < self.max_batch:
+                remaining = closes_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+            self._encode_batch(batch)
+
+    def _encode_batch(self, batch):
+        positions = {}                  # text -> row in the encoded matrix
+        for texts, _ in batch:
+            for text in texts:
+                positions.setdefault(text, len(positions))
+        total = sum(len(texts) for texts, _ in batch)
+        try:
+            matrix = self.model.encode(
+                list(positions), batch_size=self.max_batch, convert_to_numpy=True, show_progress_bar=False
+            ).astype(np.float32)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            self.stats['requests'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['texts_encoded'] += len(positions)
+            self.stats['duplicate_texts'] += total - len(positions)
+        for texts, future in batch:
+            future.set_result(matrix[[positions[text] for text in texts]])
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def get_status(self) -> dict:
+        with self._lock:
+            batches = self.stats['batches']
+            return {
+                'batch_window_ms': self.batch_window * 1000,
+                'max_batch': self.max_batch,
+                'avg_requests_per_batch': round(self.stats['requests'] / batches, 2) if batches else 0.0,
+                **self.stats,
+            }
+
+
+class RemoteEmbeddingModel:
+    """
+    Client of EmbeddingServer with the SentenceTransformer surface the manager
+    uses. Connections are pooled so concurrent threads of one worker do not
+    queue behind each other (their requests meet again in the server's batch).
+    """
+
+    def __init__(self, socket_path: str = None, model_name: str = 'all-MiniLM-L6-v2'):
+        self.socket_path = socket_path or EMBEDDING_SERVICE_SOCKET
+        self.model_name = model_name
+        # Raise here (the manager then loads the model itself) without a key or a private socket directory
+        self.authkey = _authkey()
+        _check_private_dir(self.socket_path)
+        self.fallback = os.getenv('EMBEDDING_SERVICE_FALLBACK', 'local').lower()
+        self._pool = queue.LifoQueue()
+        self._local_model = None
+        self._lock = threading.Lock()
+        self.stats = {'remote_calls': 0, 'reconnects': 0, 'fallback_calls': 0}
+
+        # Fails here (and the manager loads the model itself) if nobody is listening
+        info = self._request({'op': 'info'})
+        self.dimension = info['dimension']
+        self.remote_model = info['model']
+
+    def __repr__(self):
+        return f"RemoteEmbeddingModel({self.remote_model} via {self.socket_path})"
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences, batch_size: int = None, convert_to_numpy: bool = True,
+               convert_to_tensor: bool = False, show_progress_bar: bool = False):
+        """Same shapes as SentenceTransformer.encode: one text -> 1-D, a list -> 2-D float32"""
+        single = isinstance(sentences, str)
+        texts: List[str] = [sentences] if single else list(sentences)
+        if self._local_model is not None:
+            matrix = self._encode_locally(texts)
+        else:
+            try:
+                matrix = self._request({'op': 'encode', 'texts': texts})['embeddings']
+                self._count('remote_calls')
+            except (OSError, EOFError) as e:
+                if self.fallback == 'none':
+                    raise
+                print(f"⚠️ [EMBEDDING-SERVICE] Unreachable ({e}) - loading {self.model_name} in this worker")
+                matrix = self._encode_locally(texts)
+        return matrix[0] if single else matrix
+
+    def _request(self, message: dict) -> dict:
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.send(message)
+                reply = conn.recv()
+            except (OSError, EOFError):
+                conn.close()
+                if attempt:
+                    raise
+                # Service restarted - pooled connections are all dead; retry once on a fresh one
+                self._count('reconnects')
+                self._close_pooled()
+                continue
+            self._pool.put(conn)
+            if 'error' in reply:
+                raise RuntimeError(f"Embedding service error: {reply['error']}")
+            return reply
+
+    def _close_pooled(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _connection(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return Client(self.socket_path, family='AF_UNIX', authkey=self.authkey)
+
+    def _encode_locally(self, texts: Sequence[str]) -> np.ndarray:
+        with self._lock:
+            if self._local_model is None:
+                from sentence_transformers import SentenceTransformer
+                self._local_model = SentenceTransformer(self.model_name)
+            self.stats['fallback_calls'] += 1
+        return self._local_model.encode(list(texts), convert_to_numpy=True, show_progress_bar=False)
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def get_status(self) -> dict:
+        with self._lock:
+            return {
+                'socket': self.socket_path,
+                'model': self.remote_model,
+                'pooled_connections': self._pool.qsize(),
+                'using_local_fallback': self._local_model is not None,
+                **self.stats,
+            }
+
+
+def connect_embedding_service(model_name: str):
+    """RemoteEmbeddingModel when EMBEDDING_SERVICE=on and the service answers, else None"""
+    if os.getenv('EMBEDDING_SERVICE', 'off').lower() != 'on':
+        return None
+    try:
+        client = RemoteEmbeddingModel(model_name=model_name)
+    except Exception as e:
+        print(f"⚠️ [EMBEDDING-SERVICE] Not available at {EMBEDDING_SERVICE_SOCKET} ({e}) - loading the model locally")
+        return None
+    if client.remote_model != model_name:
+        print(f"⚠️ [EMBEDDING-SERVICE] Serves {client.remote_model}, not {model_name} - loading the model locally")
+        return None
+    print(f"✅ [EMBEDDING-SERVICE] Using shared {model_name} at {client.socket_path}")
+    return client
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Shared SentenceTransformer process for all app workers")
+    parser.add_argument('--model', default=os.getenv('EMBEDDING_SERVICE_MODEL', 'all-MiniLM-L6-v2'))
+    parser.add_argument('--socket', default=EMBEDDING_SERVICE_SOCKET)
+    args = parser.parse_args()
+    try:
+        server = EmbeddingServer(args.model, args.socket)
+    except RuntimeError as e:
+        raise SystemExit(f"❌ [EMBEDDING-SERVICE] {e}")
+    server.serve_forever()
@@ -1,4 +1,3 @@
-import google.generativeai as genai
 import os
 import json
 import numpy as np
@@ -8,14 +7,14 @@ sys.path.append('/home/linux/Documents/chatbot-diya')
 from dotenv import load_dotenv
 from sklearn.metrics.pairwise import cosine_similarity
 import pickle
-from src.core.sql import get_full_schema
+from src.core.schema_catalog import schema_catalog
+from src.api.llm_service import get_llm_client
 
 load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
 class EmbeddingManager:
     def __init__(self):
-        self.model = genai.GenerativeModel("gemini-2.5-pro")
+        self.llm = get_llm_client("gemini-2.5-pro")
         self.schema_embeddings = {}
         self.table_descriptions = {}
         self.query_patterns = {}
@@ -26,7 +25,7 @@ class EmbeddingManager:
             # Use Gemini to generate text embedding
             # Note: We'll simulate embeddings using text similarity for now
             # In production, you'd use Google's dedicated embedding API
-            response = self.model.generate_content(
+            response = self.llm.generate(
                 f"Generate a numerical representation for: {text}. "
                 f"Return only a simple hash-like number that represents the semantic meaning."
             )
@@ -48,7 +47,7 @@ class EmbeddingManager:
         """Create embeddings for all tables and columns in the database."""
         print("🔄 Creating schema embeddings...")
         
-        schema_dict = get_full_schema()
+        schema_dict = schema_catalog.get_schema_dict()
         
         for schema_name, tables in schema_dict.items():
             for table_name, columns in tables.items():
@@ -0,0 +1,389 @@
+"""
+Referential Query Classifier
+============================
+
+Every chat message first decides whether the user is talking about the previous
+results ("which of these are idle?", "more details about the Toyota") or asking
+something new. That used to be a full Gemini call on every request. The decision
+is now made locally from cheap signals and the LLM is only asked when the local
+score is uncertain.
+
+Signals (weights in FEATURE_WEIGHTS, combined logistically):
+- demonstratives / pronouns pointing back ("these", "those", "them", "the above")
+- subset operations on a list ("which ones", "only", "how many of", "sort")
+- detail requests ("more detail", "tell me about") about an entity, with history
+- continuation openers ("and", "what about", "same for") and very short queries
+- a value from the last result set mentioned in the query (entity continuation)
+- embedding similarity to the previous query
+- self-contained signals push the other way: explicit identifiers
+  (vehicle numbers, "complaint 123") and "show/list all ..." requests
+
+Decisions:
+- no previous result set          -> not referential, nothing to refer to
+- probability >= REFERENTIAL_HIGH -> referential, decided locally
+- probability <= REFERENTIAL_LOW  -> not referential, decided locally
+- in between                      -> LLM (REFERENTIAL_LLM_FALLBACK=on), else local
+
+Each decision (features, probability, path, LLM verdict when asked) is appended
+as a JSON line to REFERENTIAL_DECISION_LOG so the weights and band can be tuned
+offline - LLM verdicts in the uncertain band double as labels.
+"""
+
+import os
+import re
+import json
+import math
+import time
+import logging
+import logging.handlers
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from src.api.llm_service import llm_client
+
+# Logistic weights - a feature that is present adds its weight to the score
+FEATURE_WEIGHTS = {
+    'bias': -2.0,
+    'demonstrative': 3.0,
+    'subset_operation': 1.5,
+    'detail_request': 1.0,
+    'detail_about_entity': 1.0,
+    'continuation_opener': 1.5,
+    'short_query': 0.5,
+    'mentions_result_value': 2.5,
+    'explicit_identifier': -1.5,
+    'fresh_listing': -1.5,
+}
+# Embedding similarity to the previous query contributes (similarity - center) * scale
+SIMILARITY_CENTER = 0.5
+SIMILARITY_SCALE = 3.0
+
+_DEMONSTRATIVE = re.compile(
+    r'\b(?:these|those|them|they|their|theirs|the above|above ones|that list|that data|'
+    r'same ones|from the results?|in the results?|the previous)\b'
+)
+_SUBSET = re.compile(
+    r'\b(?:which ones|which of|among|out of|only|filter|sort|sorted|how many of|count them|'
+    r'the first|the last|the rest|of them|any of)\b'
+)
+_DETAIL = re.compile(r'\b(?:more detail|more info|tell me about|explain|show details|give details|expand on)')
+_ENTITY_WORDS = re.compile(r'\b(?:complaint|issue|leakage|vehicle|report|record|driver|plant|trip)s?\b')
+_CONTINUATION = re.compile(r'^(?:and|also|what about|how about|now|then|same for|just|but)\b')
+_EXPLICIT_IDENTIFIER = re.compile(
+    r'\b(?:[a-z]{2}\d{1,2}[a-z]{0,3}\d{3,4}|(?:complaint|plant|customer|dpr|id)\s*(?:id\s*)?#?\d+)\b'
+)
+_FRESH_LISTING = re.compile(r'^(?:show|list|get|give me|display)\s+(?:me\s+)?(?:all|every|the list of)\b')
+_TARGET_ENTITY_PATTERNS = [
+    re.compile(r'(?:detail|info).*?about\s+(?:the\s+)?([a-z\s]+?)(?:\s+complaint|\s+issue|$)'),
+    re.compile(r'(?:tell me about|explain)\s+(?:the\s+)?([a-z\s]+?)(?:\s+complaint|\s+issue|$)'),
+    re.compile(r'more.*?([a-z]+\s+issue)'),
+    re.compile(r'details.*?([a-z]+\s+complaint)'),
+]
+MAX_RESULT_VALUES = 500
+
+
+def _sigmoid(x: float) -> float:
+    return 1.0 / (1.0 + math.exp(-x))
+
+
+class ReferentialClassifier:
+    """Decides whether a query refers to the previous result set"""
+
+    def __init__(self):
+        self.high = float(os.getenv('REFERENTIAL_HIGH', 0.8))
+        self.low = float(os.getenv('REFERENTIAL_LOW', 0.3))
+        self.llm_fallback = os.getenv('REFERENTIAL_LLM_FALLBACK', 'on').lower() != 'off'
+        self.log_path = os.getenv(
+            'REFERENTIAL_DECISION_LOG', '/home/linux/Documents/chatbot-diya/logs/referential_decisions.jsonl'
+        )
+
+        self._lock = threading.Lock()
+        self._embedding_cache = {}      # text -> vector (previous queries get re-embedded otherwise)
+        self.stats = {
+            'decisions': 0,
+            'by_path': {},              # decided_by -> count
+            'referential': 0,
+            'llm_calls': 0,
+            'llm_failures': 0,
+            'total_seconds': 0.0,
+        }
+        self.decision_logger = self._build_decision_logger()
+
+    def _build_decision_logger(self):
+        logger = logging.getLogger('chatbot_referential_decisions')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        if not logger.handlers:
+            try:
+                os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+                handler = logging.handlers.RotatingFileHandler(
+                    self.log_path, maxBytes=5 * 1024 * 1024, backupCount=5
+                )
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                logger.addHandler(handler)
+            except OSError as e:
+                print(f"⚠️ Referential decision log unavailable ({self.log_path}): {e}")
+        return logger
+
+    def extract_features(self, query: str, conversation_history: List[str], last_result: Optional[Dict],
+                         embed: Optional[Callable[[str], Optional[list]]] = None) -> Dict:
+        """Feature values for the query (1/0 flags plus embedding similarity)"""
+        query_lower = query.lower().strip()
+        has_history = bool(conversation_history)
+        detail_request = bool(_DETAIL.search(query_lower))
+
+        features = {
+            'demonstrative': bool(_DEMONSTRATIVE.search(query_lower)),
+            'subset_operation': bool(_SUBSET.search(query_lower)),
+            'detail_request': detail_request,
+            'detail_about_entity': detail_request and has_history and bool(_ENTITY_WORDS.search(query_lower)),
+            'continuation_opener': bool(_CONTINUATION.search(query_lower)),
+            'short_query': len(query_lower.split()) <= 4,
+            'mentions_result_value': self._matching_result_value(query_lower, last_result) is not None,
+            'explicit_identifier': bool(_EXPLICIT_IDENTIFIER.search(query_lower)),
+            'fresh_listing': bool(_FRESH_LISTING.search(query_lower)),
+            'similarity': None,
+        }
+
+        previous_query = conversation_history[-1] if has_history else (last_result or {}).get('original_query')
+        if embed and previous_query:
+            features['similarity'] = self._similarity(query, previous_query, embed)
+        return features
+
+    def score(self, features: Dict) -> float:
+        """Probability that the query refers to the previous results"""
+        total = FEATURE_WEIGHTS['bias']
+        for name, weight in FEATURE_WEIGHTS.items():
+            if name != 'bias' and features.get(name):
+                total += weight
+        if features.get('similarity') is not None:
+            total += (features['similarity'] - SIMILARITY_CENTER) * SIMILARITY_SCALE
+        return _sigmoid(total)
+
+    def classify(self, query: str, conversation_history: List[str], last_result: Optional[Dict] = None,
+                 embed: Optional[Callable[[str], Optional[list]]] = None) -> Dict:
+        """
+        Returns the same shape the Gemini-based detector did (is_referential,
+        confidence, reference_type, reasoning, target_entity) plus decided_by and
+        probability.
+        """
+        started = time.perf_counter()
+        conversation_history = conversation_history or []
+
+        if not last_result:
+            result = self._result(False, 0.95, 'none', None, 'No previous result set to refer to',
+                                  'no_previous_results', None)
+            self._record(query, conversation_history, {}, None, result, None, started)
+            return result
+
+        features = self.extract_features(query, conversation_history, last_result, embed)
+        probability = self.score(features)
+        target_entity = self._target_entity(query.lower(), last_result)
+        reference_type = self._reference_type(features)
+        llm_verdict = None
+
+        if probability >= self.high:
+            result = self._result(True, probability, reference_type, target_entity,
+                                  self._explain(features), 'local', probability)
+        elif probability <= self.low:
+            result = self._result(False, 1.0 - probability, 'none', None,
+                                  self._explain(features), 'local', probability)
+        else:
+            llm_verdict = self._ask_llm(query, conversation_history) if self.llm_fallback else None
+            if llm_verdict is not None:
+                try:
+                    llm_confidence = float(llm_verdict.get('confidence', probability))
+                except (TypeError, ValueError):
+                    llm_confidence = probability
+                result = self._result(
+                    bool(llm_verdict.get('is_referential')),
+                    llm_confidence,
+                    llm_verdict.get('reference_type', reference_type),
+                    llm_verdict.get('target_entity') or target_entity,
+                    llm_verdict.get('reasoning', 'LLM decision in the uncertain band'),
+                    'llm', probability
+                )
+            else:
+                # Uncertain and no LLM answer - lean on the score; its confidence stays below the band
+                is_referential = probability >= 0.5
+                result = self._result(is_referential, probability if is_referential else 1.0 - probability,
+                                      reference_type if is_referential else 'none',
+                                      target_entity if is_referential else None,
+                                      self._explain(features), 'local_uncertain', probability)
+
+        self._record(query, conversation_history, features, probability, result, llm_verdict, started)
+        return result
+
+    @staticmethod
+    def _result(is_referential, confidence, reference_type, target_entity, reasoning, decided_by, probability):
+        return {
+            'is_referential': is_referential,
+            'confidence': round(confidence, 3),
+            'reference_type': reference_type,
+            'target_entity': target_entity,
+            'reasoning': reasoning,
+            'decided_by': decided_by,
+            'probability': round(probability, 3) if probability is not None else None,
+        }
+
+    @staticmethod
+    def _reference_type(features: Dict) -> str:
+        if features.get('demonstrative'):
+            return 'demonstrative'
+        if features.get('mentions_result_value') or features.get('detail_about_entity'):
+            return 'entity_continuation'
+        if features.get('subset_operation'):
+            return 'direct'
+        return 'contextual'
+
+    @staticmethod
+    def _explain(features: Dict) -> str:
+        present = [name for name, value in features.items() if value is True]
+        similarity = features.get('similarity')
+        text = f"Local classifier: {', '.join(present) if present else 'no referential signals'}"
+        if similarity is not None:
+            text += f", similarity to previous query {similarity:.2f}"
+        return text
+
+    @staticmethod
+    def _result_values(last_result: Optional[Dict]) -> List[str]:
+        values = []
+        for row in (last_result or {}).get('displayed_results') or []:
+            if not isinstance(row, dict):
+                continue
+            for value in row.values():
+                if isinstance(value, str) and len(value.strip()) >= 3:
+                    values.append(value.strip().lower())
+                    if len(values) >= MAX_RESULT_VALUES:
+                        return values
+        return values
+
+    def _matching_result_value(self, query_lower: str, last_result: Optional[Dict]) -> Optional[str]:
+        for value in self._result_values(last_result):
+            if re.search(r'(?<!\w)' + re.escape(value) + r'(?!\w)', query_lower):
+                return value
+        return None
+
+    def _target_entity(self, query_lower: str, last_result: Optional[Dict]) -> Optional[str]:
+        value = self._matching_result_value(query_lower, last_result)
+        if value:
+            return value
+        if _DETAIL.search(query_lower) and _ENTITY_WORDS.search(query_lower):
+            for pattern in _TARGET_ENTITY_PATTERNS:
+                match = pattern.search(query_lower)
+                if match:
+                    return match.group(1).strip()
+        return None
+
+    def _similarity(self, query: str, previous_query: str, embed) -> Optional[float]:
+        try:
+            current = self._embedding(query, embed)
+            previous = self._embedding(previous_query, embed)
+            if current is None or previous is None:
+                return None
+            dot = sum(a * b for a, b in zip(current, previous))
+            denominator = math.sqrt(sum(a * a for a in current)) * math.sqrt(sum(b * b for b in previous))
+            return dot / denominator if denominator else None
+        except Exception as e:
+            print(f"⚠️ Referential similarity unavailable: {e}")
+            return None
+
+    def _embedding(self, text: str, embed):
+        with self._lock:
+            if text in self._embedding_cache:
+                return self._embedding_cache[text]
+        vector = embed(text)
+        if vector is not None:
+            with self._lock:
+                if len(self._embedding_cache) >= 64:
+                    self._embedding_cache.pop(next(iter(self._embedding_cache)))
+                self._embedding_cache[text] = vector
+        return vector
+
+    def _ask_llm(self, query: str, conversation_history: List[str]) -> Optional[Dict]:
+        """The previous Gemini prompt - only for queries the local score cannot call"""
+        with self._lock:
+            self.stats['llm_calls'] += 1
+        prompt = f"""
+Analyze if this query refers to previous conversation results.
+
+CONVERSATION HISTORY:
+{chr(10).join(conversation_history[-3:]) if conversation_history else "No previous queries"}
+
+CURRENT QUERY: "{query}"
+
+Key patterns that indicate referential queries:
+1. Direct references: "these", "those", "them", "the above", "from those"
+2. Contextual continuations: "more details about X", "show info for Y", "expand on Z"
+3. Subset operations: "which ones are X", "filter by Y", "only show Z"
+4. Entity continuation: If previous results contained specific entities, and current query asks about those same entities
+
+Respond only with JSON:
+{{
+    "is_referential": boolean,
+    "confidence": 0.0-1.0,
+    "reference_type": "direct|demonstrative|contextual|entity_continuation",
+    "reasoning": "brief explanation of decision",
+    "target_entity": "what specific entity/item is being referenced"
+}}
+"""
+        try:
+            response = llm_client.generate(prompt)
+            match = re.search(r'{[\s\S]+}', response.text)
+            if match:
+                return json.loads(match.group())
+        except Exception as e:
+            print(f"⚠️ Referential LLM check failed: {e}")
+        with self._lock:
+            self.stats['llm_failures'] += 1
+        return None
+
+    def _record(self, query, conversation_history, features, probability, result, llm_verdict, started):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.stats['decisions'] += 1
+            self.stats['total_seconds'] += elapsed
+            by_path = self.stats['by_path']
+            by_path[result['decided_by']] = by_path.get(result['decided_by'], 0) + 1
+            if result['is_referential']:
+                self.stats['referential'] += 1
+
+        shown_probability = f"{probability:.2f}" if probability is not None else '-'
+        print(f"🔗 Referential check ({result['decided_by']}): {result['is_referential']} "
+              f"p={shown_probability} in {elapsed * 1000:.1f}ms")
+        try:
+            self.decision_logger.info(json.dumps({
+                'timestamp': datetime.now().isoformat(),
+                'query': query,
+                'previous_query': conversation_history[-1] if conversation_history else None,
+                'features': features,
+                'probability': result['probability'],
+                'decided_by': result['decided_by'],
+                'is_referential': result['is_referential'],
+                'confidence': result['confidence'],
+                'llm_verdict': llm_verdict,
+                'thresholds': {'low': self.low, 'high': self.high},
+                'elapsed_ms': round(elapsed * 1000, 2),
+            }, default=str))
+        except Exception as e:
+            print(f"⚠️ Failed to log referential decision: {e}")
+
+    def get_status(self) -> dict:
+        with self._lock:
+            decisions = self.stats['decisions']
+            return {
+                'thresholds': {'low': self.low, 'high': self.high},
+                'llm_fallback': self.llm_fallback,
+                'decisions': decisions,
+                'referential': self.stats['referential'],
+                'by_path': dict(self.stats['by_path']),
+                'llm_calls': self.stats['llm_calls'],
+                'llm_failures': self.stats['llm_failures'],
+                'llm_call_rate': round(self.stats['llm_calls'] / decisions, 3) if decisions else 0.0,
+                'avg_ms': round(self.stats['total_seconds'] / decisions * 1000, 2) if decisions else 0.0,
+            }
+
+
+# Global classifier used by detect_referential_query_ai
+referential_classifier = ReferentialClassifier()
@@ -11,12 +11,17 @@ import os
 import json
 import numpy as np
 import psycopg2
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 from dotenv import load_dotenv
-from src.core.sql import get_full_schema, db_manager
+from src.core.sql import db_manager
+from src.core.schema_catalog import schema_catalog
+from src.nlp.referential_classifier import referential_classifier
+from src.nlp.vector_index import VectorIndex
+from src.nlp.embedding_encoder import EmbeddingEncoder
+from src.nlp.embedding_service import RemoteEmbeddingModel, connect_embedding_service
 import warnings
 import uuid
+import time
+import threading
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 import re
@@ -27,6 +32,22 @@ warnings.filterwarnings("ignore", category=FutureWarning)
 
 load_dotenv()
 
+# Same normalization in SQL, to backfill and dedup rows stored before normalized_query existed
+NORMALIZED_QUERY_SQL = r"rtrim(lower(btrim(regexp_replace(user_query, '\s+', ' ', 'g'))), '?.! ')"
+
+def normalize_question(text: str) -> str:
+    """Questions that only differ in case, spacing or trailing punctuation share one pattern"""
+    return re.sub(r'\s+', ' ', text).strip(' ').lower().rstrip('?.! ')
+
+# IVFFlat needs rows to train its lists on; below this an exact scan is used
+IVFFLAT_MIN_ROWS = int(os.getenv('PGVECTOR_IVFFLAT_MIN_ROWS', 10000))
+
+def ivfflat_lists(rows: int) -> int:
+    """pgvector's guidance: rows / 1000 lists up to 1M rows, sqrt(rows) beyond"""
+    if rows <= 1000000:
+        return max(10, rows // 1000)
+    return int(rows ** 0.5)
+
 class ConversationalResultChain:
     """Pure AI-powered result chaining - handles ANY follow-up query type"""
     
@@ -346,120 +367,23 @@ Make sure to identify specific entities when the user asks for "more details" or
 conversation_chain = ConversationalResultChain()
 
 def detect_referential_query_ai(current_query: str, conversation_history: List[str]) -> Dict:
-    """Enhanced AI detection with better context understanding and improved fallback"""
+    """
+    Decide whether the query refers to the previous results.
     
-    try:
-        from src.core.query_agent import gemini_direct_answer as call_llm
-        
-        prompt = f"""
-Analyze if this query refers to previous conversation results.
-
-CONVERSATION HISTORY:
-{chr(10).join(conversation_history[-3:]) if conversation_history else "No previous queries"}
-
-CURRENT QUERY: "{current_query}"
-
-Key patterns that indicate referential queries:
-1. Direct references: "these", "those", "them", "the above", "from those"
-2. Contextual continuations: "more details about X", "show info for Y", "expand on Z"
-3. Subset operations: "which ones are X", "filter by Y", "only show Z"
-4. Entity continuation: If previous results contained specific entities, and current query asks about those same entities
-
-IMPORTANT: If the current query asks for "more details" or "more info" about something that was mentioned in previous results, it should be considered referential.
-
-Examples:
-- Previous: "show 3 vehicles" → Current: "more details about the Toyota" → REFERENTIAL (if Toyota was in the 3)
-- Previous: "show complaints under 10k" → Current: "more detail about leakage issue complaint" → REFERENTIAL (if leakage was in those complaints)
-- Previous: "show plants" → Current: "show vehicles" → NOT REFERENTIAL (different topic)
-
-Respond in JSON:
-{{
-    "is_referential": boolean,
-    "confidence": 0.0-1.0,
-    "reference_type": "direct|demonstrative|contextual|entity_continuation",
-    "reasoning": "brief explanation of decision",
-    "target_entity": "what specific entity/item is being referenced"
-}}
-"""
-
-        try:
-            response = call_llm(prompt)
-            result = json.loads(response)
-            return result
-        except Exception as llm_error:
-            print(f"⚠️ LLM call failed: {llm_error}")
-            # Fall through to enhanced fallback
-            
-    except ImportError:
-        print("⚠️ LLM not available, using enhanced fallback detection")
-    
-    # Enhanced fallback with smart pattern detection
-    current_lower = current_query.lower()
-    
-    # Advanced referential patterns
-    referential_patterns = [
-        "these", "those", "them", "the above", "from those", "of these",
-        "which ones", "which of", "from the", "in those", "that data",
-        "more detail", "more info", "expand on", "show details",
-        "give details", "tell me about", "explain the"
-    ]
-    
-    # Entity-specific patterns
-    detail_patterns = ["more detail", "more info", "tell me about", "explain", "show details"]
-    entity_indicators = ["complaint", "issue", "leakage", "vehicle", "report", "record"]
-    
-    # Check for basic referential patterns
-    has_referential_pattern = any(pattern in current_lower for pattern in referential_patterns)
-    
-    # Enhanced detection for entity-specific requests
-    has_detail_request = any(pattern in current_lower for pattern in detail_patterns)
-    mentions_entity = any(entity in current_lower for entity in entity_indicators)
+    Decided locally by ReferentialClassifier (heuristics, similarity to the previous
+    query, values from the last result set); the LLM is only asked when that score
+    falls in the uncertain band. See src/nlp/referential_classifier.py.
+    """
+    def _embed(text):
+        # Read at call time - the manager is created after this module's globals
+        return sentence_embedding_manager.get_embedding(text) if sentence_embedding_manager else None
     
-    # Context-aware detection
-    has_conversation_context = len(conversation_history) > 0
-    
-    # Extract target entity if asking for details
-    target_entity = None
-    if has_detail_request and mentions_entity:
-        # Try to extract the entity being asked about
-        import re
-        entity_patterns = [
-            r'(?:detail|info).*?about\s+(?:the\s+)?([a-zA-Z\s]+?)(?:\s+complaint|\s+issue|$)',
-            r'(?:tell me about|explain)\s+(?:the\s+)?([a-zA-Z\s]+?)(?:\s+complaint|\s+issue|$)',
-            r'more.*?([a-zA-Z]+\s+issue)',
-            r'details.*?([a-zA-Z]+\s+complaint)'
-        ]
-        for pattern in entity_patterns:
-            entity_match = re.search(pattern, current_lower)
-            if entity_match:
-                target_entity = entity_match.group(1).strip()
-                break
-    
-    # Determine if this is referential
-    is_referential = False
-    confidence = 0.0
-    reference_type = "none"
-    
-    if has_referential_pattern:
-        is_referential = True
-        confidence = 0.8
-        reference_type = "demonstrative"
-    elif has_detail_request and mentions_entity and has_conversation_context:
-        is_referential = True
-        confidence = 0.9
-        reference_type = "entity_continuation"
-    elif has_conversation_context and any(term in current_lower for term in ["detail", "info", "about", "explain"]):
-        is_referential = True
-        confidence = 0.7
-        reference_type = "contextual"
-    
-    return {
-        "is_referential": is_referential,
-        "confidence": confidence,
-        "reference_type": reference_type,
-        "target_entity": target_entity,
-        "reasoning": f"Enhanced fallback detection: patterns={has_referential_pattern}, detail_request={has_detail_request}, entity={mentions_entity}"
-    }
+    return referential_classifier.classify(
+        current_query,
+        conversation_history,
+        last_result=conversation_chain.get_last_result(),
+        embed=_embed
+    )
 
 class SentenceEmbeddingManager:
     def __init__(self, model_name='all-MiniLM-L6-v2'):
@@ -471,14 +395,57 @@ class SentenceEmbeddingManager:
                        'all-MiniLM-L6-v2' is fast and efficient (384 dimensions)
                        'all-mpnet-base-v2' is more accurate but slower (768 dimensions)
         """
-        print(f"🤖 Loading SentenceTransformer model: {model_name}")
-        self.model = SentenceTransformer(model_name)
+        # Multi-worker deployments share one model process (EMBEDDING_SERVICE=on, see embedding_service.py)
+        self.model = connect_embedding_service(model_name)
+        if self.model is None:
+            # Imported here - workers using the shared service never load torch
+            from sentence_transformers import SentenceTransformer
+            print(f"🤖 Loading SentenceTransformer model: {model_name}")
+            self.model = SentenceTransformer(model_name)
         self.embedding_dim = self.model.get_sentence_embedding_dimension()
         print(f"✅ Model loaded. Embedding dimension: {self.embedding_dim}")
+        # One request embeds the same question several times - memoize, and batch bulk encodes
+        self.encoder = EmbeddingEncoder(self.model)
         
         self.table_descriptions = {}
         self.query_patterns = {}
         
+        # Fallback mode: in-memory vector indexes, loaded from the JSON columns on first use
+        self._index_lock = threading.Lock()
+        self._schema_index = None
+        self._pattern_index = None
+        self._pattern_max_id = 0
+        self._pattern_synced_at = 0.0
+        # Other workers insert patterns too - pick up rows added since the last sync
+        self.index_sync_seconds = float(os.getenv('VECTOR_INDEX_SYNC_SECONDS', 30))
+        
+        # pgvector mode: ANN index on query_patterns (hnsw | ivfflat) and its search-time knobs
+        self.pgvector_index_type = os.getenv('PGVECTOR_INDEX_TYPE', 'hnsw').lower()
+        self.pgvector_hnsw_m = int(os.getenv('PGVECTOR_HNSW_M', 16))
+        self.pgvector_hnsw_ef_construction = int(os.getenv('PGVECTOR_HNSW_EF_CONSTRUCTION', 64))
+        self.pgvector_ef_search = int(os.getenv('PGVECTOR_HNSW_EF_SEARCH', 40))
+        self.pgvector_probes = int(os.getenv('PGVECTOR_IVFFLAT_PROBES', 10))
+        
+        # Bounded pattern store: hit counters (flushed in batches) and a periodic compaction job
+        self.pattern_max_rows = int(os.getenv('QUERY_PATTERNS_MAX_ROWS', 5000))
+        self.pattern_retention_days = int(os.getenv('QUERY_PATTERNS_RETENTION_DAYS', 90))
+        self.pattern_compact_interval = int(os.getenv('QUERY_PATTERNS_COMPACT_INTERVAL', 3600))
+        self.hit_flush_seconds = float(os.getenv('QUERY_PATTERNS_HIT_FLUSH_SECONDS', 60))
+        self._hits_lock = threading.Lock()
+        self._pending_hits = {}         # pattern id -> hits not yet written
+        self._hits_flushed_at = time.monotonic()
+        self._compact_stop = threading.Event()
+        self._compact_thread = None
+        self.pattern_stats = {
+            'inserted': 0,
+            'deduplicated': 0,
+            'hits_recorded': 0,
+            'compactions': 0,
+            'compacted_rows': 0,
+            'last_compaction': None,
+            'stale_index_entries': 0,
+        }
+        
         # Initialize pgvector extension and create tables
         self._setup_pgvector_database()
         
@@ -496,7 +463,7 @@ class SentenceEmbeddingManager:
             print("✅ pgvector extension enabled - using native vector operations")
         except psycopg2.Error as e:
             print(f"⚠️ pgvector extension not available: {e}")
-            print("🔄 Using fallback mode with JSON storage and scikit-learn similarity")
+            print("🔄 Using fallback mode with JSON storage and an in-memory vector index")
             self.use_pgvector = False
             try:
                 if 'conn' in locals():
@@ -559,6 +526,32 @@ class SentenceEmbeddingManager:
                         );
                     """)
                 
+                # Semantic NL->SQL cache: catalog version the SQL was written against,
+                # and the entities its question mentioned (for literal re-binding)
+                cur.execute("ALTER TABLE query_patterns ADD COLUMN IF NOT EXISTS schema_version VARCHAR(64);")
+                cur.execute("ALTER TABLE query_patterns ADD COLUMN IF NOT EXISTS entities_json TEXT;")
+                
+                # Bounded pattern store: one row per normalized question and catalog version,
+                # with usage counters for retention
+                cur.execute("ALTER TABLE query_patterns ADD COLUMN IF NOT EXISTS normalized_query TEXT;")
+                cur.execute("ALTER TABLE query_patterns ADD COLUMN IF NOT EXISTS hit_count INTEGER NOT NULL DEFAULT 0;")
+                cur.execute("ALTER TABLE query_patterns ADD COLUMN IF NOT EXISTS last_hit_at TIMESTAMP;")
+                cur.execute("SELECT to_regclass('query_patterns_normalized_idx') IS NOT NULL;")
+                if not cur.fetchone()[0]:
+                    cur.execute(f"UPDATE query_patterns SET normalized_query = {NORMALIZED_QUERY_SQL} WHERE normalized_query IS NULL;")
+                    cur.execute("""
+                        DELETE FROM query_patterns older USING query_patterns newer
+                        WHERE older.normalized_query = newer.normalized_query
+                          AND COALESCE(older.schema_version, '') = COALESCE(newer.schema_version, '')
+                          AND older.id < newer.id;
+                    """)
+                    if cur.rowcount:
+                        print(f"🧹 Removed {cur.rowcount} duplicate query patterns")
+                    cur.execute("""
+                        CREATE UNIQUE INDEX query_patterns_normalized_idx
+                        ON query_patterns (normalized_query, (COALESCE(schema_version, '')));
+                    """)
+                
                 # 🧠 CONVERSATIONAL AI: Create conversation context table
                 cur.execute("""
                     CREATE TABLE IF NOT EXISTS conversation_context (
@@ -589,50 +582,41 @@ class SentenceEmbeddingManager:
                         timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     );
                 """)
-            
-            # Create indexes for efficient search
-            if self.use_pgvector:
+                
+                # Create regular indexes for fallback mode
+                # (pgvector mode: ANN indexes are managed by _ensure_vector_indexes)
+                if not self.use_pgvector:
+                    cur.execute("CREATE INDEX IF NOT EXISTS schema_embeddings_table_key_idx ON schema_embeddings (table_key);")
+                    cur.execute("CREATE INDEX IF NOT EXISTS query_patterns_created_idx ON query_patterns (created_at);")
+                    print("✅ Regular indexes created for fallback mode")
+                
+                # 🧠 CONVERSATIONAL AI: Create indexes for conversation tables
+                cur.execute("CREATE INDEX IF NOT EXISTS conversation_history_session_idx ON conversation_history (session_id, timestamp);")
+                cur.execute("CREATE INDEX IF NOT EXISTS conversation_context_updated_idx ON conversation_context (updated_at);")
+                
+                # Add foreign key constraint after both tables exist - in a savepoint, so that
+                # "already exists" does not abort (and roll back) the rest of the setup
+                cur.execute("SAVEPOINT fk_conversation_history_session;")
                 try:
                     cur.execute("""
-                        CREATE INDEX IF NOT EXISTS schema_embeddings_vector_idx 
-                        ON schema_embeddings USING ivfflat (embedding vector_cosine_ops) 
-                        WITH (lists = 100);
+                        ALTER TABLE conversation_history 
+                        ADD CONSTRAINT fk_conversation_history_session 
+                        FOREIGN KEY (session_id) 
+                        REFERENCES conversation_context(session_id) 
+                        ON DELETE CASCADE;
                     """)
-                    cur.execute("""
-                        CREATE INDEX IF NOT EXISTS query_patterns_vector_idx 
-                        ON query_patterns USING ivfflat (embedding vector_cosine_ops) 
-                        WITH (lists = 100);
-                    """)
-                    print("✅ Vector indexes created for efficient similarity search")
                 except psycopg2.Error as e:
-                    print(f"⚠️ Could not create vector indexes: {e}")
-            else:
-                # Create regular indexes for fallback mode
-                cur.execute("CREATE INDEX IF NOT EXISTS schema_embeddings_table_key_idx ON schema_embeddings (table_key);")
-                cur.execute("CREATE INDEX IF NOT EXISTS query_patterns_created_idx ON query_patterns (created_at);")
-                print("✅ Regular indexes created for fallback mode")
-            
-            # 🧠 CONVERSATIONAL AI: Create indexes for conversation tables
-            cur.execute("CREATE INDEX IF NOT EXISTS conversation_history_session_idx ON conversation_history (session_id, timestamp);")
-            cur.execute("CREATE INDEX IF NOT EXISTS conversation_context_updated_idx ON conversation_context (updated_at);")
-            
-            # Add foreign key constraint after both tables exist
-            try:
-                cur.execute("""
-                    ALTER TABLE conversation_history 
-                    ADD CONSTRAINT fk_conversation_history_session 
-                    FOREIGN KEY (session_id) 
-                    REFERENCES conversation_context(session_id) 
-                    ON DELETE CASCADE;
-                """)
-            except psycopg2.Error as e:
-                # Constraint might already exist, ignore the error
-                if "already exists" not in str(e).lower():
-                    print(f"⚠️ Could not add foreign key constraint: {e}")
-            
-            conn.commit()
+                    cur.execute("ROLLBACK TO SAVEPOINT fk_conversation_history_session;")
+                    # Constraint might already exist, ignore the error
+                    if "already exists" not in str(e).lower():
+                        print(f"⚠️ Could not add foreign key constraint: {e}")
+                
+                conn.commit()
             print("✅ Database tables created successfully (including conversational AI tables)")
             
+            if self.use_pgvector:
+                self._ensure_vector_indexes()
+            
         except Exception as e:
             print(f"❌ Error setting up database: {e}")
             # Don't raise the exception - allow the system to continue with limited functionality
@@ -729,8 +713,24 @@ class SentenceEmbeddingManager:
     def create_schema_embeddings(self):
         """Generate and store embeddings for all database tables."""
         print("🔄 Creating sentence transformer embeddings for database schema...")
+        started = time.perf_counter()
         
-        schema_dict = get_full_schema()
+        schema_dict = schema_catalog.get_schema_dict()
+        
+        # Describe every table first, then encode all descriptions in batched model calls
+        table_keys, descriptions = [], []
+        for schema_name, tables in schema_dict.items():
+            for table_name, columns in tables.items():
+                table_key = f"{schema_name}.{table_name}"
+                
+                # Create descriptive text for the table
+                description = self._create_table_description(table_name, columns)
+                self.table_descriptions[table_key] = description
+                table_keys.append(table_key)
+                descriptions.append(description)
+        
+        # Generate embeddings using sentence transformer (not memoized - these are not questions)
+        embeddings = self.encoder.encode_many(descriptions, memoize=False)
         
         # Clear existing embeddings
         with db_manager.get_connection_context() as conn:
@@ -739,18 +739,7 @@ class SentenceEmbeddingManager:
             
             embeddings_created = 0
             
-            for schema_name, tables in schema_dict.items():
-                for table_name, columns in tables.items():
-                    table_key = f"{schema_name}.{table_name}"
-                    
-                    # Create descriptive text for the table
-                    description = self._create_table_description(table_name, columns)
-                    self.table_descriptions[table_key] = description
-                    
-                    # Generate embedding using sentence transformer
-                embedding = self.model.encode(description, convert_to_tensor=False)
-                embedding_list = embedding.tolist()
-                
+            for table_key, description, embedding_list in zip(table_keys, descriptions, embeddings):
                 # Store in database (pgvector or fallback mode)
                 if self.use_pgvector:
                     cur.execute("""
@@ -777,18 +766,93 @@ class SentenceEmbeddingManager:
                 
             conn.commit()
         
+        # Reloaded from the new rows on next search
+        self._schema_index = None
+        
         mode = "pgvector" if self.use_pgvector else "fallback JSON"
-        print(f"✅ Created {embeddings_created} sentence transformer embeddings and stored in PostgreSQL ({mode} mode)")
+        print(f"✅ Created {embeddings_created} sentence transformer embeddings and stored in PostgreSQL "
+              f"({mode} mode) in {time.perf_counter() - started:.1f}s")
     
     def get_embedding(self, text):
-        """Generate embedding for given text using sentence transformer."""
+        """Generate embedding for given text using sentence transformer (memoized per normalized text)."""
         try:
-            embedding = self.model.encode(text, convert_to_tensor=False)
-            return embedding.tolist()
+            return self.encoder.encode(text)
         except Exception as e:
             print(f"Error generating embedding: {e}")
             return None
+    
+    def get_embeddings(self, texts, memoize=True):
+        """Embeddings for several texts in batched model calls."""
+        try:
+            return self.encoder.encode_many(texts, memoize=memoize)
+        except Exception as e:
+            print(f"Error generating embeddings: {e}")
+            return None
         
+    def _schema_vectors(self) -> VectorIndex:
+        """Fallback mode: schema_embeddings as an in-memory index (loaded once)"""
+        with self._index_lock:
+            if self._schema_index is None:
+                index = VectorIndex(self.embedding_dim, name='schema_embeddings')
+                with db_manager.get_connection_context() as conn:
+                    cur = conn.cursor()
+                    cur.execute("SELECT table_key, description, embedding_json FROM schema_embeddings;")
+                    for table_key, description, embedding_json in cur.fetchall():
+                        try:
+                            index.add(table_key, json.loads(embedding_json), description)
+                        except (json.JSONDecodeError, ValueError) as e:
+                            print(f"⚠️ Error parsing embedding for {table_key}: {e}")
+                self._schema_index = index
+                print(f"✅ Loaded {len(index)} schema embeddings into the vector index")
+            return self._schema_index
+    
+    def _pattern_vectors(self) -> VectorIndex:
+        """
+        Fallback mode: successful query_patterns as an in-memory index. Loaded
+        once, then only rows with a higher id than seen are fetched, at most
+        every index_sync_seconds. Changes to existing rows are caught per match
+        by is_pattern_current.
+        """
+        with self._index_lock:
+            if self._pattern_index is None:
+                self._pattern_index = VectorIndex(self.embedding_dim, name='query_patterns')
+                self._pattern_max_id = 0
+            elif time.monotonic() - self._pattern_synced_at < self.index_sync_seconds:
+                return self._pattern_index
+            
+            index = self._pattern_index
+            with db_manager.get_connection_context() as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    SELECT id, user_query, sql_query, entities_json, schema_version, embedding_json
+                    FROM query_patterns
+                    WHERE success = TRUE AND id > %s
+                    ORDER BY id;
+                """, (self._pattern_max_id,))
+                keys, vectors, payloads = [], [], []
+                for pattern_id, user_q, sql_q, entities_json, version, embedding_json in cur.fetchall():
+                    self._pattern_max_id = max(self._pattern_max_id, pattern_id)
+                    if pattern_id in index:
+                        continue    # added by this worker's add_query_pattern
+                    try:
+                        vectors.append(json.loads(embedding_json))
+                    except (json.JSONDecodeError, ValueError, TypeError):
+                        continue
+                    keys.append(pattern_id)
+                    payloads.append(self._pattern_payload(user_q, sql_q, entities_json, version))
+                index.add_batch(keys, vectors, payloads)
+            self._pattern_synced_at = time.monotonic()
+            return index
+    
+    @staticmethod
+    def _pattern_payload(user_query, sql_query, entities_json, schema_version) -> dict:
+        return {
+            'user_query': user_query,
+            'sql_query': sql_query,
+            'entities_json': entities_json,
+            'schema_version': schema_version,
+        }
+    
     def find_relevant_tables(self, user_query, top_k=5):
         """Find the most relevant tables using vector similarity search."""
         # Generate embedding for user query
@@ -797,139 +861,444 @@ class SentenceEmbeddingManager:
             return []
         
         try:
+            if not self.use_pgvector:
+                # Fallback: one matrix product over the in-memory index
+                return self._schema_vectors().search(query_embedding, k=top_k)
+            
             with db_manager.get_connection_context() as conn:
                 cur = conn.cursor()
                 
-                if self.use_pgvector:
-                    # Use pgvector's cosine similarity for efficient search
-                    cur.execute("""
-                        SELECT 
-                            table_key, 
-                            description,
-                            1 - (embedding <=> %s::vector) as similarity
-                        FROM schema_embeddings
-                        ORDER BY similarity DESC
-                        LIMIT %s;
-                    """, (query_embedding, top_k))
-                    
-                    results = cur.fetchall()
-                    
-                    # Return in the same format as the old system
-                    return [(table_key, similarity, description) for table_key, description, similarity in results]
-                else:
-                    # Fallback: manual cosine similarity calculation
-                    cur.execute("SELECT table_key, description, embedding_json FROM schema_embeddings;")
-                    results = cur.fetchall()
-                    
-                    similarities = []
-                    for table_key, description, embedding_json in results:
-                        try:
-                            embedding = json.loads(embedding_json)
-                            similarity = cosine_similarity([query_embedding], [embedding])[0][0]
-                            similarities.append((table_key, similarity, description))
-                        except (json.JSONDecodeError, ValueError) as e:
-                            print(f"⚠️ Error parsing embedding for {table_key}: {e}")
-                            continue
-                    
-                    # Sort by similarity and return top matches
-                    similarities.sort(key=lambda x: x[1], reverse=True)
-                    return similarities[:top_k]
+                # Use pgvector's cosine similarity for efficient search
+                # (ordering by the <=> operator itself, not the derived similarity)
+                cur.execute("""
+                    SELECT 
+                        table_key, 
+                        description,
+                        1 - (embedding <=> %s::vector) as similarity
+                    FROM schema_embeddings
+                    ORDER BY embedding <=> %s::vector
+                    LIMIT %s;
+                """, (query_embedding, query_embedding, top_k))
+                
+                results = cur.fetchall()
+                
+                # Return in the same format as the old system
+                return [(table_key, similarity, description) for table_key, description, similarity in results]
                 
         except Exception as e:
             print(f"❌ Error in similarity search: {e}")
             return []
     
-    def add_query_pattern(self, user_query, sql_query, success=True):
+    def add_query_pattern(self, user_query, sql_query, success=True, schema_version=None, entities=None,
+                          query_embedding=None):
         """Store successful query patterns for future matching."""
         if not success:
             return
             
-        query_embedding = self.get_embedding(user_query)
+        query_embedding = query_embedding or self.get_embedding(user_query)
         if not query_embedding:
             return
         
+        entities_json = json.dumps(entities) if entities is not None else None
+        
+        # pgvector: native vector column; fallback: the embedding as JSON
+        embedding_column = "embedding" if self.use_pgvector else "embedding_json"
+        embedding_value = query_embedding if self.use_pgvector else json.dumps(query_embedding)
+        
         try:
             with db_manager.get_connection_context() as conn:
                 cur = conn.cursor()
-                
-                if self.use_pgvector:
-                    cur.execute("""
-                        INSERT INTO query_patterns (user_query, sql_query, embedding, success)
-                        VALUES (%s, %s, %s, %s);
-                    """, (user_query, sql_query, query_embedding, success))
-                else:
-                    # Fallback: store as JSON
-                    embedding_json = json.dumps(query_embedding)
-                    cur.execute("""
-                        INSERT INTO query_patterns (user_query, sql_query, embedding_json, success)
-                        VALUES (%s, %s, %s, %s);
-                    """, (user_query, sql_query, embedding_json, success))
-                
+                # The same question (after normalize_question) for the same catalog version
+                # replaces the stored SQL instead of adding a row; hit counters are kept
+                cur.execute(f"""
+                    INSERT INTO query_patterns
+                        (user_query, normalized_query, sql_query, {embedding_column}, success, schema_version, entities_json)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (normalized_query, (COALESCE(schema_version, ''))) DO UPDATE SET
+                        user_query = EXCLUDED.user_query,
+                        sql_query = EXCLUDED.sql_query,
+                        {embedding_column} = EXCLUDED.{embedding_column},
+                        success = TRUE,
+                        entities_json = EXCLUDED.entities_json,
+                        created_at = CURRENT_TIMESTAMP
+                    RETURNING id, (xmax = 0) AS inserted;
+                """, (user_query, normalize_question(user_query), sql_query, embedding_value,
+                      success, schema_version, entities_json))
+                pattern_id, inserted = cur.fetchone()
                 conn.commit()
             
+            with self._hits_lock:
+                self.pattern_stats['inserted' if inserted else 'deduplicated'] += 1
+            
+            if not self.use_pgvector and self._pattern_index is not None:
+                # Searchable immediately, without waiting for the next sync
+                self._pattern_index.add(
+                    pattern_id, query_embedding,
+                    self._pattern_payload(user_query, sql_query, entities_json, schema_version)
+                )
+            
         except Exception as e:
             print(f"❌ Error storing query pattern: {e}")
     
     def find_similar_query(self, user_query, threshold=0.8):
         """Find similar previous queries using vector similarity."""
-        query_embedding = self.get_embedding(user_query)
+        matches = self.find_similar_queries(user_query, threshold=threshold, limit=1)
+        return matches[0] if matches else None
+    
+    def find_similar_queries(self, user_query, threshold=0.8, limit=5, schema_version=None, query_embedding=None):
+        """
+        Successful queries above threshold, most similar first. With schema_version,
+        only patterns stored against that catalog version are considered.
+        """
+        query_embedding = query_embedding or self.get_embedding(user_query)
         if not query_embedding:
-            return None
+            return []
+        
+        version_filter = "AND schema_version = %s" if schema_version else ""
+        version_params = (schema_version,) if schema_version else ()
         
         try:
-            with db_manager.get_connection_context() as conn:
-                cur = conn.cursor()
-                
-                if self.use_pgvector:
-                    # Find most similar successful query using pgvector
-                    cur.execute("""
+            if not self.use_pgvector:
+                # Fallback: top-k from the in-memory index, filtered by catalog version
+                accept = (lambda payload: payload['schema_version'] == schema_version) if schema_version else None
+                rows = [
+                    (pattern_id, payload['user_query'], payload['sql_query'], payload['entities_json'], similarity)
+                    for pattern_id, similarity, payload
+                    in self._pattern_vectors().search(query_embedding, k=limit, accept=accept)
+                ]
+            else:
+                with db_manager.get_connection_context() as conn:
+                    cur = conn.cursor()
+                    self._tune_vector_search(cur)
+                    
+                    # Most similar successful queries using pgvector
+                    cur.execute(f"""
                         SELECT 
+                            id,
                             user_query,
                             sql_query,
+                            entities_json,
                             1 - (embedding <=> %s::vector) as similarity
                         FROM query_patterns
-                        WHERE success = TRUE
-                        ORDER BY similarity DESC
-                        LIMIT 1;
-                    """, (query_embedding,))
-                    
-                    result = cur.fetchone()
-                    
-                    if result and result[2] > threshold:
-                        return {
-                            'query': result[0],
-                            'sql': result[1],
-                            'similarity': result[2]
-                        }
-                else:
-                    # Fallback: manual similarity calculation
-                    cur.execute("SELECT user_query, sql_query, embedding_json FROM query_patterns WHERE success = TRUE;")
-                    results = cur.fetchall()
-                    best_match = None
-                    best_similarity = 0
-                    
-                    for user_q, sql_q, embedding_json in results:
-                        try:
-                            embedding = json.loads(embedding_json)
-                            similarity = cosine_similarity([query_embedding], [embedding])[0][0]
-                            if similarity > best_similarity and similarity > threshold:
-                                best_similarity = similarity
-                                best_match = {
-                                    'query': user_q,
-                                    'sql': sql_q,
-                                    'similarity': similarity
-                                }
-                        except (json.JSONDecodeError, ValueError):
-                            continue
-                    
-                    return best_match
+                        WHERE success = TRUE {version_filter}
+                        ORDER BY embedding <=> %s::vector
+                        LIMIT %s;
+                    """, (query_embedding, *version_params, query_embedding, limit))
+                    rows = cur.fetchall()
             
-            return None
+            return [
+                {
+                    'id': pattern_id,
+                    'query': user_q,
+                    'sql': sql_q,
+                    'similarity': float(similarity),
+                    'entities': json.loads(entities_json) if entities_json else None
+                }
+                for pattern_id, user_q, sql_q, entities_json, similarity in rows
+                if similarity > threshold
+            ]
             
         except Exception as e:
             print(f"❌ Error finding similar query: {e}")
+            return []
+    
+    def delete_query_patterns_except(self, schema_version):
+        """Drop patterns written against any other catalog version; returns how many"""
+        try:
+            with db_manager.get_connection_context() as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    "DELETE FROM query_patterns WHERE schema_version IS DISTINCT FROM %s;",
+                    (schema_version,)
+                )
+                deleted = cur.rowcount
+                conn.commit()
+            if deleted:
+                # Reloaded with the surviving rows on next search
+                self._pattern_index = None
+            return deleted
+        except Exception as e:
+            print(f"❌ Error deleting stale query patterns: {e}")
+            return 0
+    
+    def disable_query_pattern(self, sql_query):
+        """Mark patterns with this SQL unsuccessful so they are no longer matched; returns how many"""
+        try:
+            with db_manager.get_connection_context() as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    "UPDATE query_patterns SET success = FALSE WHERE sql_query = %s AND success = TRUE RETURNING id;",
+                    (sql_query,)
+                )
+                pattern_ids = [row[0] for row in cur.fetchall()]
+                conn.commit()
+            if self._pattern_index is not None:
+                for pattern_id in pattern_ids:
+                    self._pattern_index.remove(pattern_id)
+            return len(pattern_ids)
+        except Exception as e:
+            print(f"❌ Error disabling query pattern: {e}")
+            return 0
+    
+    def is_pattern_current(self, pattern_id, sql_query) -> bool:
+        """
+        True if the pattern is still stored, successful and has this SQL. In
+        fallback mode the in-memory index only picks up rows other workers add,
+        not ones they disable, re-write (the upsert keeps the id) or compact
+        away - so a match is checked against its row before it is served, and
+        a stale entry is dropped from the index or refreshed from the row.
+        pgvector searches the table itself, so its matches are always current.
+        """
+        if self.use_pgvector or pattern_id is None:
+            return True
+        
+        try:
+            with db_manager.get_connection_context() as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    SELECT user_query, sql_query, entities_json, schema_version, embedding_json
+                    FROM query_patterns
+                    WHERE id = %s AND success = TRUE;
+                """, (pattern_id,))
+                row = cur.fetchone()
+        except Exception as e:
+            print(f"❌ Error checking query pattern: {e}")
+            return False
+        
+        if row and row[1] == sql_query:
+            return True
+        
+        with self._hits_lock:
+            self.pattern_stats['stale_index_entries'] += 1
+        if self._pattern_index is not None:
+            self._pattern_index.remove(pattern_id)
+            if row:
+                user_q, sql_q, entities_json, version, embedding_json = row
+                try:
+                    self._pattern_index.add(pattern_id, json.loads(embedding_json),
+                                            self._pattern_payload(user_q, sql_q, entities_json, version))
+                except (json.JSONDecodeError, ValueError, TypeError):
+                    pass
+        return False
+    
+    # ------------------------------------------------------------------
+    # pgvector ANN indexes
+    # ------------------------------------------------------------------
+    def _ensure_vector_indexes(self):
+        """
+        pgvector mode: keep one ANN index on successful query_patterns, of type
+        PGVECTOR_INDEX_TYPE. HNSW needs no training data and is created right
+        away (pgvector >= 0.5.0, otherwise IVFFlat is used). IVFFlat is only
+        built once there are IVFFLAT_MIN_ROWS rows, with lists sized from the
+        row count, and rebuilt when the count drifts too far from it.
+        """
+        index_type = self.pgvector_index_type
+        try:
+            with db_manager.get_connection_context() as conn:
+                cur = conn.cursor()
+                # Unpartial IVFFlat indexes with lists = 100 created before any row existed -
+                # on schema_embeddings (a few hundred rows) they only cost recall
+                cur.execute("DROP INDEX IF EXISTS schema_embeddings_vector_idx;")
+                cur.execute("DROP INDEX IF EXISTS query_patterns_vector_idx;")
+                conn.commit()
+    
+                if index_type == 'hnsw':
+                    try:
+                        cur.execute(f"""
+                            CREATE INDEX IF NOT EXISTS query_patterns_embedding_hnsw_idx
+                            ON query_patterns USING hnsw (embedding vector_cosine_ops)
+                            WITH (m = {self.pgvector_hnsw_m}, ef_construction = {self.pgvector_hnsw_ef_construction})
+                            WHERE success = TRUE;
+                        """)
+                        cur.execute("DROP INDEX IF EXISTS query_patterns_embedding_ivfflat_idx;")
+                        conn.commit()
+                        return 'hnsw'
+                    except psycopg2.Error as e:
+                        conn.rollback()
+                        print(f"⚠️ HNSW index not available ({e}) - using IVFFlat")
+                        index_type = 'ivfflat'
+    
+                cur.execute("SELECT COUNT(*) FROM query_patterns WHERE success = TRUE;")
+                rows = cur.fetchone()[0]
+                if rows < IVFFLAT_MIN_ROWS:
+                    # Too few rows to train lists on - an exact scan is fast at this size anyway
+                    return None
+                lists = ivfflat_lists(rows)
+    
+                cur.execute("""
+                    SELECT c.reloptions FROM pg_class c
+                    WHERE c.relname = 'query_patterns_embedding_ivfflat_idx';
+                """)
+                existing = cur.fetchone()
+                if existing:
+                    options = dict(option.split('=', 1) for option in (existing[0] or []))
+                    current = int(options.get('lists', 0))
+                    if lists / 2 <= current <= lists * 2:
+                        return 'ivfflat'
+                    print(f"🔄 Rebuilding IVFFlat index on query_patterns: lists {current} -> {lists} ({rows} rows)")
+                    cur.execute("DROP INDEX query_patterns_embedding_ivfflat_idx;")
+    
+                cur.execute(f"""
+                    CREATE INDEX query_patterns_embedding_ivfflat_idx
+                    ON query_patterns USING ivfflat (embedding vector_cosine_ops)
+                    WITH (lists = {lists})
+                    WHERE success = TRUE;
+                """)
+                cur.execute("DROP INDEX IF EXISTS query_patterns_embedding_hnsw_idx;")
+                conn.commit()
+                print(f"✅ IVFFlat index on query_patterns with {lists} lists")
+                return 'ivfflat'
+        except Exception as e:
+            print(f"⚠️ Could not manage vector indexes: {e}")
             return None
     
+    def _tune_vector_search(self, cur):
+        """Search-time recall/speed knobs for this transaction (ignored when no index is used)"""
+        cur.execute(f"SET LOCAL hnsw.ef_search = {self.pgvector_ef_search};")
+        cur.execute(f"SET LOCAL ivfflat.probes = {self.pgvector_probes};")
+    
+    # ------------------------------------------------------------------
+    # Bounded pattern store: hit counters and compaction
+    # ------------------------------------------------------------------
+    def record_pattern_hit(self, pattern_id):
+        """Count a pattern that answered a question; written in batches every hit_flush_seconds"""
+        if pattern_id is None:
+            return
+        with self._hits_lock:
+            self._pending_hits[pattern_id] = self._pending_hits.get(pattern_id, 0) + 1
+            due = time.monotonic() - self._hits_flushed_at >= self.hit_flush_seconds
+        if due:
+            self.flush_pattern_hits()
+    
+    def flush_pattern_hits(self):
+        """Write pending hit counts; returns how many patterns were updated"""
+        with self._hits_lock:
+            pending, self._pending_hits = self._pending_hits, {}
+            self._hits_flushed_at = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            with db_manager.get_connection_context() as conn:
+                cur = conn.cursor()
+                cur.executemany("""
+                    UPDATE query_patterns
+                    SET hit_count = hit_count + %s, last_hit_at = CURRENT_TIMESTAMP
+                    WHERE id = %s;
+                """, [(hits, pattern_id) for pattern_id, hits in pending.items()])
+                conn.commit()
+            with self._hits_lock:
+                self.pattern_stats['hits_recorded'] += sum(pending.values())
+            return len(pending)
+        except Exception as e:
+            print(f"❌ Error recording query pattern hits: {e}")
+            return 0
+    
+    def compact_query_patterns(self):
+        """
+        Retention job keeping query_patterns bounded. Deletes, in order:
+        - patterns marked unsuccessful (their SQL failed - never matched again)
+        - patterns neither hit nor stored within QUERY_PATTERNS_RETENTION_DAYS
+        - beyond QUERY_PATTERNS_MAX_ROWS, the least hit (then least recent) ones
+        Only one worker compacts at a time (advisory lock). Returns counts per reason.
+        """
+        self.flush_pattern_hits()
+        removed = {'failed': [], 'expired': [], 'over_limit': []}
+        try:
+            with db_manager.get_connection_context() as conn:
+                cur = conn.cursor()
+                cur.execute("SELECT pg_try_advisory_xact_lock(hashtext('query_patterns_compaction'));")
+                if not cur.fetchone()[0]:
+                    conn.rollback()
+                    return None     # another worker is compacting
+    
+                cur.execute("DELETE FROM query_patterns WHERE success = FALSE RETURNING id;")
+                removed['failed'] = [row[0] for row in cur.fetchall()]
+    
+                if self.pattern_retention_days > 0:
+                    cur.execute("""
+                        DELETE FROM query_patterns
+                        WHERE COALESCE(last_hit_at, created_at) < CURRENT_TIMESTAMP - make_interval(days => %s)
+                        RETURNING id;
+                    """, (self.pattern_retention_days,))
+                    removed['expired'] = [row[0] for row in cur.fetchall()]
+    
+                if self.pattern_max_rows > 0:
+                    cur.execute("""
+                        DELETE FROM query_patterns WHERE id IN (
+                            SELECT id FROM query_patterns
+                            ORDER BY hit_count DESC, COALESCE(last_hit_at, created_at) DESC
+                            OFFSET %s
+                        )
+                        RETURNING id;
+                    """, (self.pattern_max_rows,))
+                    removed['over_limit'] = [row[0] for row in cur.fetchall()]
+    
+                conn.commit()
+        except Exception as e:
+            print(f"❌ Error compacting query patterns: {e}")
+            return None
+    
+        deleted = sum(len(ids) for ids in removed.values())
+        if self._pattern_index is not None:
+            for ids in removed.values():
+                for pattern_id in ids:
+                    self._pattern_index.remove(pattern_id)
+        if deleted and self.use_pgvector and self.pgvector_index_type == 'ivfflat':
+            self._ensure_vector_indexes()   # lists follow the new row count
+    
+        with self._hits_lock:
+            self.pattern_stats['compactions'] += 1
+            self.pattern_stats['compacted_rows'] += deleted
+            self.pattern_stats['last_compaction'] = datetime.now().isoformat()
+        counts = {reason: len(ids) for reason, ids in removed.items()}
+        print(f"🧹 Query pattern compaction removed {deleted} rows {counts}")
+        return counts
+    
+    def start_pattern_compaction(self):
+        """Start the daemon thread that compacts query_patterns every interval"""
+        if self._compact_thread and self._compact_thread.is_alive():
+            return
+        if self.pattern_compact_interval <= 0:
+            return
+    
+        def _compact_loop():
+            while not self._compact_stop.wait(self.pattern_compact_interval):
+                try:
+                    self.compact_query_patterns()
+                except Exception as e:
+                    print(f"❌ Query pattern compaction failed: {e}")
+    
+        self._compact_thread = threading.Thread(target=_compact_loop, name="query_pattern_compaction", daemon=True)
+        self._compact_thread.start()
+    
+    def stop_pattern_compaction(self):
+        self._compact_stop.set()
+    
+    def get_pattern_store_status(self):
+        with self._hits_lock:
+            return {
+                'index_type': self.pgvector_index_type if self.use_pgvector else 'in-memory',
+                'max_rows': self.pattern_max_rows,
+                'retention_days': self.pattern_retention_days,
+                'compact_interval': self.pattern_compact_interval,
+                'pending_hits': sum(self._pending_hits.values()),
+                **self.pattern_stats,
+            }
+    
+    def get_embedding_service_status(self):
+        """Shared embedding process client state, or None when the model is loaded in this worker"""
+        return self.model.get_status() if isinstance(self.model, RemoteEmbeddingModel) else None
+    
+    def get_vector_index_status(self):
+        """In-memory index state (fallback mode only - pgvector searches in the database)"""
+        if self.use_pgvector:
+            return {'mode': 'pgvector'}
+        return {
+            'schema_embeddings': self._schema_index.get_status() if self._schema_index is not None else None,
+            'query_patterns': self._pattern_index.get_status() if self._pattern_index is not None else None,
+            'sync_seconds': self.index_sync_seconds,
+        }
+    
     def get_embedding_stats(self):
         """Get statistics about stored embeddings."""
         try:
@@ -951,6 +1320,9 @@ class SentenceEmbeddingManager:
                     'active_conversations': active_sessions,
                     'embedding_dimension': self.embedding_dim,
                     'pgvector_enabled': self.use_pgvector,
+                    'vector_index': self.get_vector_index_status(),
+                    'encoder': self.encoder.get_status(),
+                    'embedding_service': self.get_embedding_service_status(),
                     'model_info': str(self.model)
                 }
             
@@ -1182,6 +1554,7 @@ def initialize_sentence_embeddings():
         except Exception as e:
             print(f"❌ Failed to initialize sentence embedding system: {e}")
             return None
+        sentence_embedding_manager.start_pattern_compaction()
     
     return sentence_embedding_manager
 
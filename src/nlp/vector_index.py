@@ -0,0 +1,211 @@
+"""
+In-memory Vector Index
+======================
+
+Without pgvector, SentenceEmbeddingManager answered find_relevant_tables and
+find_similar_query by fetching every row, json.loads-ing each embedding and
+scoring rows one at a time - a cost that grows with query_patterns on every
+request. VectorIndex keeps the vectors in process instead:
+
+- vectors are L2-normalized float32 rows of one matrix, so cosine similarity
+  for every stored vector is a single matrix-vector product (exact top-k)
+- past VECTOR_INDEX_HNSW_THRESHOLD vectors an HNSW graph (hnswlib, optional
+  dependency) answers approximate top-k in sub-linear time; without hnswlib
+  the exact matrix is used at any size
+- add()/remove() update the matrix (capacity doubles, so appends are
+  amortized O(1)) and the graph incrementally - no rebuild per insert
+- search() takes an optional accept(payload) filter; candidates are fetched
+  in growing batches until k accepted results are found
+
+Keys are caller ids (table_key, query_patterns.id); payloads are whatever the
+caller wants back with a hit.
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import hnswlib
+    HNSW_AVAILABLE = True
+except ImportError:
+    HNSW_AVAILABLE = False
+
+# Vector count from which the HNSW graph answers searches
+VECTOR_INDEX_HNSW_THRESHOLD = int(os.getenv('VECTOR_INDEX_HNSW_THRESHOLD', 50000))
+HNSW_M = int(os.getenv('VECTOR_INDEX_HNSW_M', 16))
+HNSW_EF_CONSTRUCTION = int(os.getenv('VECTOR_INDEX_HNSW_EF_CONSTRUCTION', 200))
+HNSW_EF_SEARCH = int(os.getenv('VECTOR_INDEX_HNSW_EF_SEARCH', 64))
+
+
+def normalize(vectors) -> np.ndarray:
+    """Rows scaled to unit length as float32 (all-zero rows stay zero)"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorIndex:
+    """Cosine top-k over normalized vectors: exact matmul, HNSW graph for large N"""
+
+    def __init__(self, dim: int, name: str = 'vectors', hnsw_threshold: int = None):
+        self.dim = dim
+        self.name = name
+        self.hnsw_threshold = VECTOR_INDEX_HNSW_THRESHOLD if hnsw_threshold is None else hnsw_threshold
+
+        self._lock = threading.RLock()
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._size = 0                  # rows used in _matrix (alive or removed)
+        self._keys: List[Hashable] = []
+        self._payloads: List[Any] = []
+        self._positions: Dict[Hashable, int] = {}
+        self._hnsw = None
+        self.searches = 0
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, key) -> bool:
+        return key in self._positions
+
+    # ------------------------------------------------------------------ updates
+
+    def add(self, key: Hashable, vector, payload: Any = None):
+        self.add_batch([key], [vector], [payload])
+
+    def add_batch(self, keys: Sequence[Hashable], vectors, payloads: Sequence[Any] = None):
+        """Insert (or replace) vectors; keys already present are updated"""
+        if not len(keys):
+            return
+        rows = normalize(vectors)
+        if rows.shape != (len(keys), self.dim):
+            raise ValueError(f"Expected {len(keys)} vectors of dimension {self.dim}, got {rows.shape}")
+        payloads = list(payloads) if payloads is not None else [None] * len(keys)
+
+        with self._lock:
+            for key in keys:
+                if key in self._positions:
+                    self._remove_locked(key)
+
+            start = self._size
+            self._reserve(start + len(keys))
+            self._matrix[start:start + len(keys)] = rows
+            self._alive[start:start + len(keys)] = True
+            for offset, (key, payload) in enumerate(zip(keys, payloads)):
+                self._keys.append(key)
+                self._payloads.append(payload)
+                self._positions[key] = start + offset
+            self._size += len(keys)
+
+            if self._hnsw is not None:
+                self._hnsw_reserve(self._size)
+                self._hnsw.add_items(rows, np.arange(start, self._size))
+            elif HNSW_AVAILABLE and len(self._positions) >= self.hnsw_threshold:
+                self._build_hnsw()
+
+    def remove(self, key: Hashable) -> bool:
+        with self._lock:
+            if key not in self._positions:
+                return False
+            self._remove_locked(key)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self.__init__(self.dim, self.name, self.hnsw_threshold)
+
+    def _remove_locked(self, key):
+        position = self._positions.pop(key)
+        self._alive[position] = False
+        self._payloads[position] = None
+        if self._hnsw is not None:
+            self._hnsw.mark_deleted(position)
+
+    def _reserve(self, needed: int):
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 64)
+        matrix = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        alive = np.zeros(new_capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._matrix, self._alive = matrix, alive
+
+    def _build_hnsw(self):
+        print(f"🕸️ [{self.name}] Building HNSW graph over {len(self._positions)} vectors")
+        graph = hnswlib.Index(space='ip', dim=self.dim)
+        graph.init_index(max_elements=self._matrix.shape[0], ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+        graph.set_ef(HNSW_EF_SEARCH)
+        positions = np.flatnonzero(self._alive[:self._size])
+        graph.add_items(self._matrix[positions], positions)
+        self._hnsw = graph
+
+    def _hnsw_reserve(self, needed: int):
+        if needed > self._hnsw.get_max_elements():
+            self._hnsw.resize_index(max(needed, self._matrix.shape[0]))
+
+    # ------------------------------------------------------------------ search
+
+    def search(self, vector, k: int = 5,
+               accept: Optional[Callable[[Any], bool]] = None) -> List[Tuple[Hashable, float, Any]]:
+        """Top-k (key, cosine similarity, payload), most similar first"""
+        query = normalize(vector)[0]
+        with self._lock:
+            self.searches += 1
+            live = len(self._positions)
+            if not live or k <= 0:
+                return []
+
+            fetch = k if accept is None else min(k * 4, live)
+            while True:
+                positions, similarities = self._top(query, min(fetch, live))
+                results = []
+                for position, similarity in zip(positions, similarities):
+                    payload = self._payloads[position]
+                    if accept is None or accept(payload):
+                        results.append((self._keys[position], float(similarity), payload))
+                        if len(results) == k:
+                            return results
+                if fetch >= live:
+                    return results
+                fetch = min(fetch * 4, live)
+
+    def _top(self, query: np.ndarray, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self._hnsw is not None:
+            self._hnsw.set_ef(max(HNSW_EF_SEARCH, count))
+            try:
+                labels, distances = self._hnsw.knn_query(query, k=count)
+                # 'ip' space distance is 1 - inner product
+                return labels[0], 1.0 - distances[0]
+            except RuntimeError:
+                # The graph could not reach count live elements - scan the matrix instead
+                pass
+
+        similarities = self._matrix[:self._size] @ query
+        similarities[~self._alive[:self._size]] = -np.inf
+        if count < self._size:
+            candidates = np.argpartition(-similarities, count - 1)[:count]
+        else:
+            candidates = np.arange(self._size)
+        order = candidates[np.argsort(-similarities[candidates])]
+        order = order[np.isfinite(similarities[order])]
+        return order, similarities[order]
+
+    def get_status(self) -> dict:
+        with self._lock:
+            return {
+                'vectors': len(self._positions),
+                'dimension': self.dim,
+                'mode': 'hnsw' if self._hnsw is not None else 'exact',
+                'hnsw_available': HNSW_AVAILABLE,
+                'hnsw_threshold': self.hnsw_threshold,
+                'memory_mb': round(self._matrix.nbytes / (1024 * 1024), 1),
+                'searches': self.searches,
+            }
@@ -0,0 +1,274 @@
+"""
+Date Range Parser
+Resolves time phrases in user questions ("yesterday", "last week", "July 2025",
+"between 1st and 5th Aug") to a concrete half-open [start, end) range of
+timezone-aware datetimes in the plant's timezone, without calling the LLM.
+
+Every SQL generator uses this one parser so the same phrase always yields the
+same bounds, and the resulting predicate (col >= start AND col < end) can use
+an index on the timestamp column.
+"""
+
+import os
+import re
+import calendar
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Optional, Tuple
+from zoneinfo import ZoneInfo
+
+# Timezone the plants operate in - "today" starts at midnight here
+PLANT_TIMEZONE = os.getenv('PLANT_TIMEZONE', 'Asia/Kolkata')
+
+MONTHS = {
+    'jan': 1, 'january': 1, 'feb': 2, 'february': 2, 'mar': 3, 'march': 3,
+    'apr': 4, 'april': 4, 'may': 5, 'jun': 6, 'june': 6, 'jul': 7, 'july': 7,
+    'aug': 8, 'august': 8, 'sep': 9, 'sept': 9, 'september': 9, 'oct': 10, 'october': 10,
+    'nov': 11, 'november': 11, 'dec': 12, 'december': 12,
+}
+
+_MONTH = r'(?:' + '|'.join(sorted(MONTHS, key=len, reverse=True)) + r')\.?'
+_DAY = r'\d{1,2}(?:st|nd|rd|th)?'
+_YEAR = r"(?:\d{4}|'\d{2})"
+_UNIT = r'(?:day|week|month|year)s?'
+
+# One calendar day, written any of the ways users do. Month and year may be
+# missing (taken from the other end of a range, or the current year).
+_DAY_EXPR = (
+    r'(?:\d{4}-\d{1,2}-\d{1,2}'                                     # 2025-08-01
+    r'|\d{1,2}[/.-]\d{1,2}[/.-]\d{4}'                               # 01/08/2025 (day first)
+    rf'|{_DAY}(?:\s+(?:of\s+)?{_MONTH}(?:,?\s+{_YEAR})?)?'          # 1st, 1 Aug, 1st of August 2025
+    rf'|{_MONTH}\s+{_DAY}(?:,?\s+{_YEAR})?'                         # Aug 1, August 1st, 2025
+    r'|today|yesterday|tomorrow)'
+)
+
+
+@dataclass(frozen=True)
+class DateRange:
+    """Half-open interval [start, end) of timezone-aware datetimes"""
+    start: datetime
+    end: datetime
+    phrase: str
+    granularity: str    # 'day', 'week', 'month', 'quarter', 'year' or 'span'
+
+    @property
+    def days(self) -> int:
+        return (self.end.date() - self.start.date()).days
+
+    def sql_predicate(self, column: str) -> str:
+        """
+        Index-friendly filter on column. Bounds are rendered from the datetimes
+        themselves (never from user text), with the plant's UTC offset, so the
+        same phrase on the same day always produces the same SQL.
+        """
+        lower, upper = self.sql_bounds()
+        return f"{column} >= '{lower}' AND {column} < '{upper}'"
+
+    def sql_bounds(self) -> Tuple[str, str]:
+        """[start, end) as the timestamp strings sql_predicate renders - for bound parameters"""
+        return self.start.isoformat(sep=' '), self.end.isoformat(sep=' ')
+
+    def describe(self) -> str:
+        last_day = (self.end - timedelta(days=1)).date()
+        if self.days == 1:
+            return self.start.strftime('%d %b %Y')
+        return f"{self.start.strftime('%d %b %Y')} to {last_day.strftime('%d %b %Y')}"
+
+
+def _midnight(day: date, tz) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=tz)
+
+
+def _add_months(day: date, months: int) -> date:
+    month_index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(month_index, 12)
+    return date(year, month + 1, min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def _year(text: Optional[str], default: int) -> int:
+    if not text:
+        return default
+    return 2000 + int(text[1:]) if text.startswith("'") else int(text)
+
+
+def _parse_day(text: str, today: date, month: int = None, year: int = None) -> Optional[date]:
+    """A single day; missing month/year default to the given ones (then the current)"""
+    text = text.strip().lower()
+    relative = {'today': 0, 'yesterday': -1, 'tomorrow': 1}
+    if text in relative:
+        return today + timedelta(days=relative[text])
+
+    try:
+        match = re.fullmatch(r'(\d{4})-(\d{1,2})-(\d{1,2})', text)
+        if match:
+            return date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        match = re.fullmatch(r'(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})', text)
+        if match:
+            return date(int(match.group(3)), int(match.group(2)), int(match.group(1)))
+        match = re.fullmatch(rf"(\d{{1,2}})(?:st|nd|rd|th)?(?:\s+(?:of\s+)?({_MONTH})(?:,?\s+({_YEAR}))?)?", text)
+        if match:
+            month_number = MONTHS[match.group(2).rstrip('.')] if match.group(2) else month or today.month
+            return date(_year(match.group(3), year or today.year), month_number, int(match.group(1)))
+        match = re.fullmatch(rf"({_MONTH})\s+(\d{{1,2}})(?:st|nd|rd|th)?(?:,?\s+({_YEAR}))?", text)
+        if match:
+            return date(_year(match.group(3), year or today.year), MONTHS[match.group(1).rstrip('.')], int(match.group(2)))
+    except ValueError:
+        # 31st of a 30-day month and the like
+        return None
+    return None
+
+
+def _month_and_year(text: str):
+    """(month, year) mentioned in a day expression, if any"""
+    match = re.search(rf"({_MONTH})(?:,?\s+({_YEAR}))?", text)
+    if not match:
+        return None, None
+    return MONTHS[match.group(1).rstrip('.')], _year(match.group(2), None) if match.group(2) else None
+
+
+# ----------------------------------------------------------------------
+# Phrase handlers: (match, today) -> (start_day, end_day_exclusive, granularity),
+# None (not a time phrase - keep looking) or AMBIGUOUS (a time phrase that does
+# not resolve to one range - parse nothing rather than a part of it)
+# ----------------------------------------------------------------------
+AMBIGUOUS = object()
+
+
+def _is_anchored(text):
+    """True if a range end names a month, a full date or a relative day - not just a number"""
+    return bool(re.search(rf"{_MONTH}|\d{{4}}|today|yesterday|tomorrow", text, re.IGNORECASE))
+
+
+def _explicit_range(match, today):
+    first, second = match.group('a'), match.group('b')
+    # "5 to 10" alone is a count, not a date range; "1st and 5th" is fine
+    ordinal = re.compile(r'\d(?:st|nd|rd|th)$', re.IGNORECASE)
+    if not (_is_anchored(first) or _is_anchored(second)
+            or (ordinal.search(first.strip()) and ordinal.search(second.strip()))):
+        return None
+    # "between 1st and 5th Aug 2025": the second end supplies month/year for the first
+    month, _ = _month_and_year(second.lower())
+    end_day = _parse_day(second, today)
+    if not end_day:
+        return AMBIGUOUS
+    start_day = _parse_day(first, today, month=month, year=end_day.year)
+    first_month, first_year = _month_and_year(first.lower())
+    if start_day and month and first_month and first_month > month and first_year is None:
+        # "28th Dec to 3rd Jan 2026" wraps a year end - the start is in the year before
+        start_day = _parse_day(first, today, year=end_day.year - 1)
+    if not start_day or end_day < start_day:
+        return AMBIGUOUS
+    return start_day, end_day + timedelta(days=1), 'span'
+
+
+def _since(match, today):
+    start_day = _parse_day(match.group('a'), today)
+    if not start_day or start_day > today:
+        return None
+    return start_day, today + timedelta(days=1), 'span'
+
+
+def _single_day(match, today):
+    day = _parse_day(match.group('a'), today)
+    return (day, day + timedelta(days=1), 'day') if day else None
+
+
+def _day_before_yesterday(match, today):
+    day = today - timedelta(days=2)
+    return day, day + timedelta(days=1), 'day'
+
+
+def _last_n(match, today):
+    count = int(match.group('n')) if match.group('n') else 1
+    unit = match.group('unit').rstrip('s')
+    if unit == 'day':
+        start_day = today - timedelta(days=count)
+    elif unit == 'week':
+        start_day = today - timedelta(weeks=count)
+    elif unit == 'month':
+        start_day = _add_months(today, -count)
+    else:
+        start_day = _add_months(today, -12 * count)
+    # Rolling window up to and including today
+    return start_day, today + timedelta(days=1), 'span'
+
+
+def _calendar_period(match, today):
+    offset = {'this': 0, 'current': 0, 'last': -1, 'previous': -1, 'next': 1}[match.group('which')]
+    unit = match.group('unit')
+    if unit == 'week':
+        start_day = today - timedelta(days=today.weekday()) + timedelta(weeks=offset)
+        return start_day, start_day + timedelta(weeks=1), 'week'
+    if unit == 'month':
+        start_day = _add_months(today.replace(day=1), offset)
+        return start_day, _add_months(start_day, 1), 'month'
+    if unit == 'quarter':
+        start_day = _add_months(date(today.year, 3 * ((today.month - 1) // 3) + 1, 1), 3 * offset)
+        return start_day, _add_months(start_day, 3), 'quarter'
+    start_day = date(today.year + offset, 1, 1)
+    return start_day, date(start_day.year + 1, 1, 1), 'year'
+
+
+def _month_of_year(match, today):
+    month = MONTHS[match.group('month').rstrip('.')]
+    if match.group('year'):
+        year = _year(match.group('year'), today.year)
+    else:
+        # A bare month name means its most recent occurrence
+        year = today.year if month <= today.month else today.year - 1
+    start_day = date(year, month, 1)
+    return start_day, _add_months(start_day, 1), 'month'
+
+
+def _whole_year(match, today):
+    year = int(match.group('year'))
+    return date(year, 1, 1), date(year + 1, 1, 1), 'year'
+
+
+# Most specific first - the first pattern that matches wins
+_PATTERNS = [
+    (re.compile(rf"\b(?:between|from)\s+(?P<a>{_DAY_EXPR})\s+(?:and|to|till|until|through|-)\s+(?P<b>{_DAY_EXPR})\b", re.IGNORECASE), _explicit_range),
+    (re.compile(rf"\b(?P<a>{_DAY_EXPR})\s+(?:to|till|until|-)\s+(?P<b>{_DAY_EXPR})\b", re.IGNORECASE), _explicit_range),
+    (re.compile(rf"\b(?:since|after|starting(?:\s+from)?)\s+(?P<a>{_DAY_EXPR})\b", re.IGNORECASE), _since),
+    (re.compile(r"\bday\s+before\s+yesterday\b", re.IGNORECASE), _day_before_yesterday),
+    (re.compile(r"\b(?P<which>this|current|last|previous|next)\s+(?P<unit>week|month|quarter|year)\b", re.IGNORECASE), _calendar_period),
+    (re.compile(rf"\b(?:last|past)\s+(?:(?P<n>\d{{1,3}})\s+)?(?P<unit>{_UNIT})\b", re.IGNORECASE), _last_n),
+    (re.compile(rf"\b(?P<a>\d{{4}}-\d{{1,2}}-\d{{1,2}}|\d{{1,2}}[/.-]\d{{1,2}}[/.-]\d{{4}}|{_DAY}\s+(?:of\s+)?{_MONTH}(?:,?\s+{_YEAR})?|{_MONTH}\s+{_DAY}(?:,?\s+{_YEAR})?|today|yesterday|tomorrow)\b", re.IGNORECASE), _single_day),
+    (re.compile(rf"\b(?P<month>{_MONTH}),?\s+(?:of\s+)?(?P<year>{_YEAR})\b", re.IGNORECASE), _month_of_year),
+    # A month name alone only counts after a preposition ("may I ..." is not May)
+    (re.compile(rf"\b(?:in|for|during|of|month\s+of)\s+(?P<month>{_MONTH})(?P<year>)\b", re.IGNORECASE), _month_of_year),
+    (re.compile(r"\b(?:in|during|for|year|of)\s+(?P<year>(?:19|20)\d{2})\b", re.IGNORECASE), _whole_year),
+]
+
+
+@lru_cache(maxsize=1024)
+def _parse_cached(text: str, today: date, tz_name: str) -> Optional[DateRange]:
+    tz = ZoneInfo(tz_name)
+    for pattern, handler in _PATTERNS:
+        for match in pattern.finditer(text):
+            resolved = handler(match, today)
+            if resolved is AMBIGUOUS:
+                return None
+            if resolved:
+                start_day, end_day, granularity = resolved
+                return DateRange(_midnight(start_day, tz), _midnight(end_day, tz), match.group(0), granularity)
+    return None
+
+
+def parse_date_range(text: str, now: datetime = None, tz: str = None) -> Optional[DateRange]:
+    """
+    Resolve the first time phrase in text to a DateRange, or None if there is none.
+
+    Args:
+        text: User question (or just the time phrase)
+        now: Reference time (defaults to the current time in the plant timezone)
+        tz: IANA timezone name (defaults to PLANT_TIMEZONE)
+    """
+    if not text:
+        return None
+    tz_name = tz or PLANT_TIMEZONE
+    now = now or datetime.now(ZoneInfo(tz_name))
+    if now.tzinfo is not None:
+        now = now.astimezone(ZoneInfo(tz_name))
+    return _parse_cached(text.lower(), now.date(), tz_name)
@@ -0,0 +1,129 @@
+"""
+Regression test: chat history must hand every pooled connection back.
+
+ChatHistoryManager used to call db_manager.get_connection() without ever
+returning the connection, so each chat message drained the pool by one.
+The pool is replaced by an in-memory fake so no database is needed.
+"""
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+pytest.importorskip("psycopg2.pool")
+pytest.importorskip("streamlit")
+pytest.importorskip("dotenv")
+
+N_MESSAGES = 50
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, query, params=None):
+        if self.connection.fail_queries:
+            raise psycopg2.OperationalError("simulated query failure")
+
+    def fetchone(self):
+        return (1, 'Existing chat')
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    closed = 0
+
+    def __init__(self, fail_queries=False):
+        self.fail_queries = fail_queries
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class FakePool:
+    """Stand-in for ThreadedConnectionPool that counts outstanding connections"""
+
+    fail_queries = False
+
+    def __init__(self, *args, **kwargs):
+        self._pool = []
+        self.outstanding = 0
+
+    def getconn(self):
+        self.outstanding += 1
+        return FakeConnection(self.fail_queries)
+
+    def putconn(self, conn, close=False):
+        self.outstanding -= 1
+        if not close:
+            self._pool.append(conn)
+
+    def closeall(self):
+        self._pool = []
+
+
+@pytest.fixture(scope="module")
+def managers():
+    with pytest.MonkeyPatch.context() as mp:
+        # Keep background pollers from borrowing connections during the assertions
+        mp.setenv("CACHE_CHANGE_POLL_SECONDS", "0")
+        mp.setenv("CACHE_WARM_INTERVAL_SECONDS", "0")
+        mp.setattr(psycopg2.pool, "ThreadedConnectionPool", FakePool)
+
+        from src.core import sql
+        from src.core.user_manager import chat_history_manager
+
+        fake_pool = FakePool()
+        sql.db_manager._pool = fake_pool
+        # A leak then shows up as a quick pool-exhausted failure instead of a long wait
+        mp.setitem(sql.db_manager.pool_config, 'timeout', 0.5)
+        yield sql.db_manager, chat_history_manager, fake_pool
+
+
+def assert_pool_balanced(db_manager, fake_pool):
+    assert fake_pool.outstanding == 0
+    assert db_manager.get_pool_status()['in_use'] == 0
+    assert db_manager.get_leak_report()['checked_out'] == 0
+
+
+def test_pool_balanced_after_chat_messages(managers):
+    db_manager, chat_history, fake_pool = managers
+
+    session = chat_history.create_chat_session(user_id=1, title="Pool balance")
+    assert session['created']
+
+    for index in range(N_MESSAGES):
+        assert chat_history.save_message(session['session_id'], 'user', f"message {index}")['saved']
+        assert 'error' not in chat_history.get_chat_history(session['session_id'])
+
+    chat_history.get_user_chat_sessions(user_id=1)
+    chat_history.update_session_title(session['session_id'], "Renamed")
+    chat_history.delete_chat_session(session['session_id'], user_id=1)
+
+    assert_pool_balanced(db_manager, fake_pool)
+
+
+def test_pool_balanced_when_queries_fail(managers):
+    db_manager, chat_history, fake_pool = managers
+
+    FakePool.fail_queries = True
+    try:
+        for index in range(N_MESSAGES):
+            assert not chat_history.save_message('missing-session', 'user', f"message {index}")['saved']
+    finally:
+        FakePool.fail_queries = False
+
+    assert_pool_balanced(db_manager, fake_pool)
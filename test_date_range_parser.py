@@ -0,0 +1,93 @@
+"""
+Unit tests for src/utils/date_range_parser.py. Every phrase is resolved against
+a fixed reference time so the expected [start, end) bounds are stable.
+"""
+
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from src.utils.date_range_parser import parse_date_range
+
+TZ = 'Asia/Kolkata'
+# A Saturday, early in the year so month and year boundaries are close by
+NOW = datetime(2026, 1, 10, 15, 30, tzinfo=ZoneInfo(TZ))
+
+
+def resolve(text, now=NOW):
+    parsed = parse_date_range(text, now=now, tz=TZ)
+    return (parsed.start.date(), parsed.end.date(), parsed.granularity) if parsed else None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("trips today", (date(2026, 1, 10), date(2026, 1, 11), 'day')),
+    ("stoppages yesterday", (date(2026, 1, 9), date(2026, 1, 10), 'day')),
+    ("day before yesterday", (date(2026, 1, 8), date(2026, 1, 9), 'day')),
+    ("distance last week", (date(2025, 12, 29), date(2026, 1, 5), 'week')),
+    ("this week", (date(2026, 1, 5), date(2026, 1, 12), 'week')),
+    ("this month", (date(2026, 1, 1), date(2026, 2, 1), 'month')),
+    ("last month", (date(2025, 12, 1), date(2026, 1, 1), 'month')),
+    ("last quarter", (date(2025, 10, 1), date(2026, 1, 1), 'quarter')),
+    ("last year", (date(2025, 1, 1), date(2026, 1, 1), 'year')),
+    ("last 7 days", (date(2026, 1, 3), date(2026, 1, 11), 'span')),
+    ("past 2 months", (date(2025, 11, 10), date(2026, 1, 11), 'span')),
+    ("since 1st jan", (date(2026, 1, 1), date(2026, 1, 11), 'span')),
+])
+def test_relative_phrases(text, expected):
+    assert resolve(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("between 1st and 5th aug 2025", (date(2025, 8, 1), date(2025, 8, 6), 'span')),
+    ("from 2025-08-01 to 2025-08-31", (date(2025, 8, 1), date(2025, 9, 1), 'span')),
+    ("from 30th to 31st", (date(2026, 1, 30), date(2026, 2, 1), 'span')),
+    ("28th feb 2025 to 1st mar 2025", (date(2025, 2, 28), date(2025, 3, 2), 'span')),
+    ("on 31st dec 2025", (date(2025, 12, 31), date(2026, 1, 1), 'day')),
+    ("july 2025", (date(2025, 7, 1), date(2025, 8, 1), 'month')),
+    ("in december", (date(2025, 12, 1), date(2026, 1, 1), 'month')),
+    ("trips in 2025", (date(2025, 1, 1), date(2026, 1, 1), 'year')),
+])
+def test_month_boundaries(text, expected):
+    assert resolve(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "from 28th dec to 3rd jan 2026",
+    "from 28th dec to 3rd jan",
+    "dec 28 to jan 3",
+    "between 28 dec and 3 jan 2026",
+])
+def test_cross_year_range_starts_in_previous_year(text):
+    assert resolve(text) == (date(2025, 12, 28), date(2026, 1, 4), 'span')
+
+
+def test_cross_year_range_with_explicit_years():
+    assert resolve("from 28th dec 2024 to 3rd jan 2026") == (date(2024, 12, 28), date(2026, 1, 4), 'span')
+
+
+@pytest.mark.parametrize("text", [
+    "from 28th aug to 3rd aug",     # ends before it starts
+    "1st feb to 31st feb",          # no such day
+    "from 28th dec to 3rd",         # end month unknown
+])
+def test_unresolvable_range_is_not_parsed_as_a_single_day(text):
+    assert resolve(text) is None
+
+
+def test_bare_numbers_are_not_a_range():
+    assert resolve("top 5 to 10 vehicles") is None
+    # ... and do not hide a real time phrase later in the question
+    assert resolve("top 5 to 10 vehicles yesterday") == (date(2026, 1, 9), date(2026, 1, 10), 'day')
+
+
+def test_may_as_a_verb_is_not_a_month():
+    assert resolve("may I see the trips of MH12AB1234") is None
+    assert resolve("trips in may") == (date(2025, 5, 1), date(2025, 6, 1), 'month')
+
+
+def test_sql_predicate_uses_plant_offset():
+    parsed = parse_date_range("yesterday", now=NOW, tz=TZ)
+    assert parsed.sql_predicate('from_tm') == (
+        "from_tm >= '2026-01-09 00:00:00+05:30' AND from_tm < '2026-01-10 00:00:00+05:30'"
+    )
@@ -0,0 +1,193 @@
+"""
+Unit tests for the semantic NL->SQL cache helpers in src/core/semantic_cache.py.
+Importing the module loads the schema catalog (and with it the database
+manager), so the connection pool is replaced by a fake; nothing here queries it.
+"""
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+pytest.importorskip("psycopg2.pool")
+pytest.importorskip("streamlit")
+pytest.importorskip("dotenv")
+
+
+class FakePool:
+    def __init__(self, *args, **kwargs):
+        self._pool = []
+
+    def getconn(self):
+        raise psycopg2.OperationalError("no database in unit tests")
+
+    def putconn(self, conn, close=False):
+        pass
+
+    def closeall(self):
+        pass
+
+
+@pytest.fixture(scope="module")
+def cache_module():
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("CACHE_CHANGE_POLL_SECONDS", "0")
+        mp.setenv("CACHE_WARM_INTERVAL_SECONDS", "0")
+        mp.setattr(psycopg2.pool, "ThreadedConnectionPool", FakePool)
+
+        from src.core import semantic_cache
+        yield semantic_cache
+
+
+@pytest.mark.parametrize("question", [
+    "show its stoppages today",
+    "how many trips did they make",
+    "trips of that vehicle last week",
+    "show the same for Pune plant",
+    "and the previous ones?",
+])
+def test_back_references_are_not_self_contained(cache_module, question):
+    assert not cache_module.is_self_contained(question)
+
+
+@pytest.mark.parametrize("question", [
+    "stoppages of MH12AB1234 today",
+    "trips of vehicle MH12AB1234 previous week",     # "previous" belongs to the time phrase
+    "vehicles that stopped at Hosp plant yesterday",
+    "list open complaints this month",
+])
+def test_plain_questions_are_self_contained(cache_module, question):
+    assert cache_module.is_self_contained(question)
+
+
+def test_extract_entities(cache_module):
+    entities = cache_module.extract_entities("top 5 trips of MH 12 AB 1234 at Hosp plant yesterday")
+
+    assert entities['vehicles'] == ['MH12AB1234']
+    assert entities['plants'] == ['Hosp']
+    assert entities['numbers'] == ['5']        # the vehicle's digits are not numbers
+    assert entities['dates']['phrase'] == 'yesterday'
+    assert entities['qualifiers'] == ['top']
+
+
+def test_extract_entities_ignores_words_that_are_not_plant_names(cache_module):
+    entities = cache_module.extract_entities("show all plants with open complaints")
+
+    assert entities['plants'] == []
+    assert entities['qualifiers'] == ['open']
+
+
+def rebind(cache_module, old_question, sql, new_question):
+    return cache_module.rebind(
+        sql, cache_module.extract_entities(old_question), cache_module.extract_entities(new_question), new_question
+    )
+
+
+def test_rebind_replaces_plant_only_inside_string_literals(cache_module):
+    sql = "SELECT * FROM hosp_master h WHERE h.name ILIKE '%Hosp%'"
+
+    assert rebind(cache_module, "vehicles at Hosp plant", sql, "vehicles at Derabassi plant") == (
+        "SELECT * FROM hosp_master h WHERE h.name ILIKE '%Derabassi%'"
+    )
+
+
+def test_rebind_replaces_vehicle_dates_and_numbers(cache_module):
+    sql = ("SELECT * FROM trips WHERE reg_no = 'MH12AB1234' AND from_tm >= '2025-08-01 00:00:00+05:30' "
+           "AND from_tm < '2025-08-02 00:00:00+05:30' LIMIT 5")
+
+    assert rebind(cache_module, "first 5 trips of MH12AB1234 on 1st aug 2025", sql,
+                  "first 10 trips of MH14XY9999 on 3rd aug 2025") == (
+        "SELECT * FROM trips WHERE reg_no = 'MH14XY9999' AND from_tm >= '2025-08-03 00:00:00+05:30' "
+        "AND from_tm < '2025-08-04 00:00:00+05:30' LIMIT 10"
+    )
+
+
+def test_rebind_refuses_untracked_literal_not_in_new_question(cache_module):
+    sql = "SELECT * FROM vehicles WHERE zone_name ILIKE '%north%'"
+
+    assert rebind(cache_module, "vehicles in zone north", sql, "vehicles in zone south") is None
+    assert rebind(cache_module, "vehicles in zone north", sql, "list vehicles in zone north") == sql
+
+
+def test_rebind_refuses_value_not_exactly_once_in_literals(cache_module):
+    # Twice: which one is the plant?
+    sql = "SELECT * FROM v WHERE plant = 'Hosp' OR depot = 'Hosp'"
+    assert rebind(cache_module, "vehicles at Hosp plant", sql, "vehicles at Pune plant") is None
+
+    # Only in an identifier
+    sql = "SELECT * FROM hosp_master"
+    assert rebind(cache_module, "vehicles at Hosp plant", sql, "vehicles at Pune plant") is None
+
+
+def test_rebind_refuses_incompatible_questions(cache_module):
+    sql = "SELECT * FROM complaints WHERE status = 'open'"
+
+    assert rebind(cache_module, "open complaints", sql, "closed complaints") is None
+    assert rebind(cache_module, "top 5 vehicles", "SELECT * FROM v LIMIT 5", "top 5 vehicles at Pune plant") is None
+
+
+class FakePatternStore:
+    """Stands in for SentenceEmbeddingManager's query_patterns table"""
+
+    def __init__(self, patterns):
+        self.patterns = dict(patterns)      # sql -> question
+
+    def find_similar_queries(self, question, threshold, limit, schema_version):
+        return [{'id': i, 'query': q, 'sql': sql, 'similarity': 0.99}
+                for i, (sql, q) in enumerate(self.patterns.items())]
+
+    def is_pattern_current(self, pattern_id, sql_query):
+        return sql_query in self.patterns
+
+    def record_pattern_hit(self, pattern_id):
+        pass
+
+    def disable_query_pattern(self, sql_query):
+        return int(self.patterns.pop(sql_query, None) is not None)
+
+
+class UndefinedTable(Exception):
+    pgcode = '42P01'
+
+
+class QueryCanceled(Exception):
+    pgcode = '57014'
+
+
+@pytest.fixture
+def failing_cached_pattern(cache_module, monkeypatch):
+    from src.core import sql
+    from src.core.schema_catalog import CatalogSnapshot
+
+    store = FakePatternStore({"SELECT * FROM trip_detials": "list all trips"})
+    monkeypatch.setattr(cache_module.schema_catalog, 'ensure_loaded', lambda: CatalogSnapshot(version='v1'))
+    monkeypatch.setattr(cache_module.semantic_cache, '_manager', lambda: store)
+    monkeypatch.setattr(sql, 'cache_manager', None)
+
+    def run(error):
+        def stream_query_with_retry(query, **kwargs):
+            raise error
+            yield
+        monkeypatch.setattr(sql.db_manager, 'stream_query_with_retry', stream_query_with_retry)
+
+        hit = cache_module.semantic_cache.lookup("list all trips")
+        parsed = {'sql': hit['sql'], 'answered_by': cache_module.SEMANTIC_CACHE_PATH,
+                  'semantic_cache': {'pattern_sql': hit['pattern_sql']}}
+        with pytest.raises(sql.QueryExecutionError) as failure:
+            sql.collect_query_stream(sql.run_query_iter(parsed['sql']))
+        cache_module.semantic_cache.forget_if_rejected(parsed, failure.value)
+        return failure.value
+
+    return run
+
+
+def test_cached_sql_the_database_rejects_is_not_served_again(cache_module, failing_cached_pattern):
+    error = failing_cached_pattern(UndefinedTable('relation "trip_detials" does not exist'))
+
+    assert error.sql_rejected and error.pgcode == '42P01'
+    assert cache_module.semantic_cache.lookup("list all trips") is None
+
+
+def test_cached_sql_that_timed_out_is_kept(cache_module, failing_cached_pattern):
+    error = failing_cached_pattern(QueryCanceled('canceling statement due to statement timeout'))
+
+    assert not error.sql_rejected
+    assert cache_module.semantic_cache.lookup("list all trips")['sql'] == "SELECT * FROM trip_detials"
@@ -0,0 +1,90 @@
+"""
+Unit tests for src/core/sql_rewrite.py: make_sargable() must produce predicates
+that select exactly the same rows, and leave anything it does not fully
+understand untouched.
+"""
+
+import pytest
+
+from src.core.sql_rewrite import add_date_bound, make_sargable
+
+JULY_2025 = "(from_tm >= '2025-07-01' AND from_tm < '2025-08-01')"
+YEAR_2025 = "(from_tm >= '2025-01-01' AND from_tm < '2026-01-01')"
+
+
+@pytest.mark.parametrize("predicate, expected", [
+    ("DATE(from_tm) = '2025-08-01'", "(from_tm >= '2025-08-01' AND from_tm < '2025-08-02')"),
+    ("from_tm::date >= '2025-08-01'", "from_tm >= '2025-08-01'"),
+    ("CAST(from_tm AS DATE) > '2025-08-01'", "from_tm >= '2025-08-02'"),
+    ("DATE(from_tm) < '2025-08-01'", "from_tm < '2025-08-01'"),
+    ("DATE(from_tm) <= '2025-08-31'", "from_tm < '2025-09-01'"),
+    ("DATE(from_tm) = CURRENT_DATE",
+     "(from_tm >= CURRENT_DATE AND from_tm < CURRENT_DATE + INTERVAL '1 day')"),
+    ("DATE(t.from_tm) BETWEEN '2025-08-01' AND '2025-08-05'",
+     "(t.from_tm >= '2025-08-01' AND t.from_tm < '2025-08-06')"),
+])
+def test_date_comparisons_become_ranges(predicate, expected):
+    sql = f"SELECT * FROM trips t WHERE {predicate} ORDER BY from_tm"
+    assert make_sargable(sql) == f"SELECT * FROM trips t WHERE {expected} ORDER BY from_tm"
+
+
+def test_month_and_year_pair_into_one_month():
+    sql = "SELECT * FROM trips WHERE EXTRACT(MONTH FROM from_tm) = 7 AND EXTRACT(YEAR FROM from_tm) = 2025"
+    assert make_sargable(sql) == f"SELECT * FROM trips WHERE {JULY_2025}"
+
+    reversed_order = "SELECT * FROM trips WHERE DATE_PART('year', from_tm) = 2025 AND DATE_PART('month', from_tm) = 7"
+    assert make_sargable(reversed_order) == f"SELECT * FROM trips WHERE {JULY_2025}"
+
+
+def test_december_rolls_over_to_next_year():
+    sql = "SELECT * FROM trips WHERE EXTRACT(MONTH FROM from_tm) = 12 AND EXTRACT(YEAR FROM from_tm) = 2025"
+    assert make_sargable(sql) == "SELECT * FROM trips WHERE (from_tm >= '2025-12-01' AND from_tm < '2026-01-01')"
+
+
+def test_negated_month_is_not_paired_with_year():
+    # NOT binds tighter than AND: only the month is negated
+    sql = "SELECT * FROM trips WHERE NOT EXTRACT(MONTH FROM from_tm) = 7 AND EXTRACT(YEAR FROM from_tm) = 2025"
+    assert make_sargable(sql) == (
+        f"SELECT * FROM trips WHERE NOT EXTRACT(MONTH FROM from_tm) = 7 AND {YEAR_2025}"
+    )
+
+
+def test_negated_year_is_rewritten_alone():
+    sql = "SELECT * FROM trips WHERE NOT EXTRACT(YEAR FROM from_tm) = 2025 AND EXTRACT(MONTH FROM from_tm) = 7"
+    assert make_sargable(sql) == (
+        f"SELECT * FROM trips WHERE NOT {YEAR_2025} AND EXTRACT(MONTH FROM from_tm) = 7"
+    )
+
+
+def test_month_pair_on_different_columns_is_not_merged():
+    sql = "SELECT * FROM trips WHERE EXTRACT(MONTH FROM from_tm) = 7 AND EXTRACT(YEAR FROM to_tm) = 2025"
+    assert make_sargable(sql) == (
+        "SELECT * FROM trips WHERE EXTRACT(MONTH FROM from_tm) = 7 "
+        "AND (to_tm >= '2025-01-01' AND to_tm < '2026-01-01')"
+    )
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM trips WHERE EXTRACT(MONTH FROM from_tm) = 7",            # no year - not a range
+    "SELECT * FROM trips WHERE DATE(from_tm) = '2025-02-30'",              # invalid date
+    "SELECT * FROM trips WHERE DATE(from_tm) = CURRENT_DATE + x",          # not known to be a whole day
+    "SELECT * FROM trips WHERE DATE(from_tm) = some_column",
+    "SELECT * FROM trips WHERE DATE(from_tm) = '2025-08-01' || 'x'",       # part of a larger expression
+    "SELECT DATE(from_tm) = CURRENT_DATE AS today FROM trips",             # not a boolean operand
+])
+def test_unsupported_shapes_are_left_alone(sql):
+    assert make_sargable(sql) == sql
+
+
+def test_add_date_bound_extends_existing_where():
+    sql = "SELECT * FROM public.trips t WHERE t.vehicle_id = 5 OR t.driver_id = 2 ORDER BY 1"
+    assert add_date_bound(sql, 'public.trips', 'from_tm', 30) == (
+        "SELECT * FROM public.trips t WHERE t.from_tm >= CURRENT_DATE - INTERVAL '30 days' "
+        "AND (t.vehicle_id = 5 OR t.driver_id = 2) ORDER BY 1"
+    )
+
+
+def test_add_date_bound_refuses_unsafe_statements():
+    assert add_date_bound("SELECT * FROM trips WHERE from_tm > '2025-01-01'", 'trips', 'from_tm', 30) is None
+    assert add_date_bound("SELECT 1 FROM trips UNION SELECT 1 FROM stops", 'trips', 'from_tm', 30) is None
+    assert add_date_bound("SELECT * FROM stops", 'trips', 'from_tm', 30) is None